@@ -0,0 +1,198 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * \brief Microbenchmark for GraphReference::enumeratePaths on dense synthetic graphs
+ *
+ * \file bench_enumeratepaths.cpp
+ *
+ */
+
+#include <boost/program_options.hpp>
+#include <boost/filesystem.hpp>
+
+#include <chrono>
+#include <fstream>
+#include <iostream>
+#include <random>
+
+#include "GraphReference.hh"
+#include "Variant.hh"
+#include "Version.hh"
+#include "Error.hh"
+
+using namespace variant;
+using namespace haplotypes;
+
+int main(int argc, char* argv[]) {
+    namespace po = boost::program_options;
+
+    int hets = 12;
+    int spacing = 3;
+    int repeats = 20;
+    int max_n_paths = 4096;
+
+    try
+    {
+        // Declare the supported options.
+        po::options_description desc("Allowed options");
+        desc.add_options()
+            ("help,h", "produce help message")
+            ("version", "Show version")
+            ("hets", po::value<int>(), "Number of het variants in the graph (default: 12).")
+            ("spacing", po::value<int>(), "Distance between variants (default: 3, must be >= 3).")
+            ("repeats", po::value<int>(), "Number of times to enumerate the paths (default: 20).")
+            ("max-n-paths,n", po::value<int>(), "Maximum number of paths to enumerate (default: 4096).")
+        ;
+
+        po::variables_map vm;
+
+        po::store(po::command_line_parser(argc, argv).options(desc).run(), vm);
+        po::notify(vm);
+
+        if (vm.count("version"))
+        {
+            std::cout << "bench_enumeratepaths version " << HAPLOTYPES_VERSION << "\n";
+            return 0;
+        }
+
+        if (vm.count("help"))
+        {
+            std::cout << desc << "\n";
+            return 1;
+        }
+
+        if (vm.count("hets"))
+        {
+            hets = vm["hets"].as< int >();
+        }
+
+        if (vm.count("spacing"))
+        {
+            spacing = std::max(3, vm["spacing"].as< int >());
+        }
+
+        if (vm.count("repeats"))
+        {
+            repeats = vm["repeats"].as< int >();
+        }
+
+        if (vm.count("max-n-paths"))
+        {
+            max_n_paths = vm["max-n-paths"].as< int >();
+        }
+    }
+    catch (po::error & e)
+    {
+        std::cerr << e.what() << "\n";
+        return 1;
+    }
+
+    boost::filesystem::path fasta = boost::filesystem::temp_directory_path() /
+                                    boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.fa");
+    try
+    {
+        // random reference sequence
+        const int64_t length = (int64_t) hets * spacing + 100;
+        const char * nts = "ACGT";
+        std::mt19937 rng(42);
+        std::string refsq;
+        for(int64_t i = 0; i < length; ++i)
+        {
+            refsq += nts[rng() % 4];
+        }
+        {
+            std::ofstream f(fasta.native());
+            f << ">chrB\n" << refsq << "\n";
+        }
+
+        // het SNPs, insertions and deletions
+        std::list<Variants> vars;
+        for(int i = 0; i < hets; ++i)
+        {
+            const int64_t pos = 50 + (int64_t) i * spacing;
+            const char ref = refsq[pos];
+            Variants v;
+            v.chr = "chrB";
+            v.pos = pos;
+            switch(i % 3)
+            {
+                case 0:
+                    v.variation.push_back(RefVar(pos, pos, std::string(1, ref == 'A' ? 'C' : 'A')));
+                    break;
+                case 1:
+                    v.variation.push_back(RefVar(pos, pos, std::string(1, ref) + "TG"));
+                    break;
+                default:
+                    v.variation.push_back(RefVar(pos, pos + 1, std::string(1, ref)));
+                    break;
+            }
+            v.len = v.variation.back().end - pos + 1;
+            Call c;
+            c.ngt = 2;
+            c.gt[0] = 0;
+            c.gt[1] = 1;
+            v.calls.push_back(c);
+            vars.push_back(v);
+        }
+
+        GraphReference gr(fasta.c_str());
+        std::vector<ReferenceNode> nodes;
+        std::vector<ReferenceEdge> edges;
+        gr.makeGraph(vars, 0, nodes, edges);
+
+        const int64_t start = 0;
+        const int64_t end = length - 1;
+        size_t paths = 0;
+        auto t0 = std::chrono::steady_clock::now();
+        for(int r = 0; r < repeats; ++r)
+        {
+            std::vector<Haplotype> target;
+            std::vector<bitsetutil::DynamicBitset> nodes_used;
+            gr.enumeratePaths("chrB", start, end, nodes, edges, target, 0, (size_t)-1, max_n_paths, &nodes_used);
+            paths += target.size();
+        }
+        const double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+
+        std::cout << "hets: " << hets << " nodes: " << nodes.size() << " edges: " << edges.size()
+                  << " paths per run: " << paths / std::max(1, repeats) << "\n";
+        std::cout << "time: " << elapsed << "s, " << repeats / elapsed << " runs/s, "
+                  << paths / elapsed << " paths/s\n";
+    }
+    catch(std::runtime_error & e)
+    {
+        std::cerr << e.what() << std::endl;
+        Haplotype::resetRefs();
+        boost::filesystem::remove(fasta);
+        boost::filesystem::remove(fasta.string() + ".fai");
+        return 1;
+    }
+
+    Haplotype::resetRefs();
+    boost::filesystem::remove(fasta);
+    boost::filesystem::remove(fasta.string() + ".fai");
+    return 0;
+}
@@ -0,0 +1,316 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * \brief Benchmark for reading benchmarking fields and counting annotated records in quantify
+ *
+ * \file bench_quantify.cpp
+ *
+ */
+
+#include <boost/program_options.hpp>
+#include <boost/filesystem.hpp>
+
+#include <chrono>
+#include <cmath>
+#include <cstring>
+#include <fstream>
+#include <iostream>
+#include <map>
+#include <random>
+#include <sstream>
+
+#include <htslib/kstring.h>
+
+#include "BlockQuantify.hh"
+#include "Fasta.hh"
+#include "helpers/BCFHelpers.hh"
+#include "helpers/Roc.hh"
+#include "Version.hh"
+#include "Error.hh"
+
+using namespace variant;
+
+namespace
+{
+    /** make annotated records, as written by xcmp + quantify for truth and query.
+     *  each record is in each of the strata stratification regions with probability 1/2 */
+    std::vector<bcf1_t *> makeRecords(bcf_hdr_t * hdr, std::string const & refsq, int n, int spacing, int strata)
+    {
+        // truth / query decisions
+        static const char * bds[][2] = {{"TP", "TP"}, {"TP", "TP"}, {"TP", "TP"},
+                                        {"FN", "."}, {".", "FP"}, {".", "UNK"}, {"FN", "FP"}};
+        static const char * bks[] = {"gm", "am", "lm"};
+        static const char * bis[] = {"ti", "tv", "i1_5", "d6_15", "c16_plus"};
+        static const char * blts[] = {"het", "homalt", "hetalt"};
+
+        std::mt19937 rng(42);
+        std::vector<bcf1_t *> result;
+        kstring_t line = {0, 0, NULL};
+        for(int i = 0; i < n; ++i)
+        {
+            const int pos = 50 + i * spacing;
+            const char ref = refsq[pos];
+            const char alt = ref == 'A' ? 'C' : 'A';
+            const auto & bd = bds[rng() % 7];
+            std::string regions = "CONF";
+            for(int r = 0; r < strata; ++r)
+            {
+                if(rng() % 2)
+                {
+                    regions += ",S" + std::to_string(r);
+                }
+            }
+            std::ostringstream os;
+            os << "chrB\t" << pos + 1 << "\t.\t" << ref << "\t" << alt << "\t" << (rng() % 100)
+               << "\t" << (rng() % 10 == 0 ? "LowQ" : "PASS")
+               << "\tBS=" << pos - pos % (4*spacing) << ";Regions=" << regions
+               << "\tGT:BD:BK:BI:BLT:BVT:QQ";
+            for(int s = 0; s < 2; ++s)
+            {
+                if(bd[s][0] != '.')
+                {
+                    os << "\t0/1:" << bd[s] << ":" << bks[rng() % 3] << ":" << bis[rng() % 5] << ":"
+                       << blts[rng() % 3] << ":SNP:" << (rng() % 1000) / 10.0;
+                }
+                else
+                {
+                    os << "\t./.:.:.:.:nocall:NOCALL:.";
+                }
+            }
+            const std::string l = os.str();
+            line.l = 0;
+            kputsn(l.c_str(), l.size(), &line);
+            bcf1_t * rec = bcf_init();
+            if(vcf_parse(&line, hdr, rec) < 0)
+            {
+                error("Cannot parse %s", l.c_str());
+            }
+            result.push_back(rec);
+        }
+        free(line.s);
+        return result;
+    }
+}
+
+int main(int argc, char* argv[]) {
+    namespace po = boost::program_options;
+
+    int64_t records = 5000000;
+    int64_t count_records = 500000;
+    int blocksize = 20000;
+    int strata = 3;
+
+    try
+    {
+        // Declare the supported options.
+        po::options_description desc("Allowed options");
+        desc.add_options()
+            ("help,h", "produce help message")
+            ("version", "Show version")
+            ("records", po::value<int64_t>(), "Number of records to read the benchmarking fields from (default: 5000000).")
+            ("count-records", po::value<int64_t>(), "Number of records to count using BlockQuantify (default: 500000).")
+            ("blocksize", po::value<int>(), "Number of records per block (default: 20000).")
+            ("strata", po::value<int>(), "Number of stratification regions (default: 3).")
+        ;
+
+        po::variables_map vm;
+
+        po::store(po::command_line_parser(argc, argv).options(desc).run(), vm);
+        po::notify(vm);
+
+        if (vm.count("version"))
+        {
+            std::cout << "bench_quantify version " << HAPLOTYPES_VERSION << "\n";
+            return 0;
+        }
+
+        if (vm.count("help"))
+        {
+            std::cout << desc << "\n";
+            return 1;
+        }
+
+        if (vm.count("records"))
+        {
+            records = vm["records"].as< int64_t >();
+        }
+
+        if (vm.count("count-records"))
+        {
+            count_records = vm["count-records"].as< int64_t >();
+        }
+
+        if (vm.count("blocksize"))
+        {
+            blocksize = std::max(1, vm["blocksize"].as< int >());
+        }
+
+        if (vm.count("strata"))
+        {
+            strata = std::max(0, vm["strata"].as< int >());
+        }
+    }
+    catch (po::error & e)
+    {
+        std::cerr << e.what() << "\n";
+        return 1;
+    }
+
+    boost::filesystem::path fasta = boost::filesystem::temp_directory_path() /
+                                    boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.fa");
+    bcf_hdr_t * hdr = nullptr;
+    std::vector<bcf1_t *> block;
+    try
+    {
+        // random reference sequence
+        const int spacing = 5;
+        const int64_t length = (int64_t) blocksize * spacing + 100;
+        const char * nts = "ACGT";
+        std::mt19937 rng(42);
+        std::string refsq;
+        for(int64_t i = 0; i < length; ++i)
+        {
+            refsq += nts[rng() % 4];
+        }
+        {
+            std::ofstream f(fasta.native());
+            f << ">chrB\n" << refsq << "\n";
+        }
+        FastaFile ref_fasta(fasta.c_str());
+
+        hdr = bcf_hdr_init("w");
+        bcf_hdr_append(hdr, ("##contig=<ID=chrB,length=" + std::to_string(length) + ">").c_str());
+        bcf_hdr_append(hdr, "##FILTER=<ID=LowQ,Description=\"Low quality\">");
+        bcf_hdr_append(hdr, "##INFO=<ID=BS,Number=1,Type=Integer,Description=\"Benchmarking superlocus ID\">");
+        bcf_hdr_add_sample(hdr, "TRUTH");
+        bcf_hdr_add_sample(hdr, "QUERY");
+        bcf_hdr_add_sample(hdr, NULL);
+        makeQuantifier(hdr, ref_fasta, "ga4gh", "")->updateHeader(hdr);
+
+        // records are reused for every block
+        block = makeRecords(hdr, refsq, blocksize, spacing, strata);
+
+        // read the fields for every record, looking up the fields by name
+        uint64_t checksum_by_name = 0;
+        auto t0 = std::chrono::steady_clock::now();
+        for(int64_t i = 0; i < records; ++i)
+        {
+            bcf1_t * v = block[i % blocksize];
+            checksum_by_name += bcfhelpers::getChrom(hdr, v).size();
+            checksum_by_name += bcfhelpers::getInfoInt(hdr, v, "BS");
+            checksum_by_name += bcfhelpers::getInfoString(hdr, v, "Regions", "").size();
+            for(int s = 0; s < 2; ++s)
+            {
+                checksum_by_name += bcfhelpers::getFormatString(hdr, v, "BD", s, ".") == "TP";
+                checksum_by_name += bcfhelpers::getFormatString(hdr, v, "BVT", s, ".") == "NOCALL";
+                checksum_by_name += roc::makeObservationFlags(bcfhelpers::getFormatString(hdr, v, "BK", s, "."),
+                                                              bcfhelpers::getFormatString(hdr, v, "BI", s, "."),
+                                                              bcfhelpers::getFormatString(hdr, v, "BLT", s, "."));
+                checksum_by_name += !std::isnan(bcfhelpers::getFormatFloat(hdr, v, "QQ", s));
+            }
+        }
+        const double by_name = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+
+        // read the same fields using accessors
+        const bcfhelpers::InfoAccessor bs(hdr, "BS"), reg(hdr, "Regions");
+        const bcfhelpers::FormatAccessor bd(hdr, "BD"), bvt(hdr, "BVT"), bk(hdr, "BK"),
+                                         bi(hdr, "BI"), blt(hdr, "BLT"), qq(hdr, "QQ");
+        uint64_t checksum_accessors = 0;
+        t0 = std::chrono::steady_clock::now();
+        for(int64_t i = 0; i < records; ++i)
+        {
+            bcf1_t * v = block[i % blocksize];
+            checksum_accessors += strlen(hdr->id[BCF_DT_CTG][v->rid].key);
+            checksum_accessors += bs.getInt(v);
+            checksum_accessors += reg.getString(v).len;
+            for(int s = 0; s < 2; ++s)
+            {
+                checksum_accessors += bd.getString(v, s) == "TP";
+                checksum_accessors += bvt.getString(v, s) == "NOCALL";
+                const bcfhelpers::StringRef k = bk.getString(v, s), b = bi.getString(v, s), l = blt.getString(v, s);
+                checksum_accessors += roc::makeObservationFlags(k.s, k.len, b.s, b.len, l.s, l.len);
+                checksum_accessors += !std::isnan(qq.getFloat(v, s));
+            }
+        }
+        const double accessors = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+
+        if(checksum_by_name != checksum_accessors)
+        {
+            error("Field values differ: %llu != %llu", (unsigned long long)checksum_by_name,
+                  (unsigned long long)checksum_accessors);
+        }
+
+        std::cout << "field reads, " << records << " records" << "\n";
+        std::cout << "  by name:   " << by_name << "s, " << records / by_name << " records/s\n";
+        std::cout << "  accessors: " << accessors << "s, " << records / accessors << " records/s\n";
+
+        // count records in blocks, as quantify does
+        t0 = std::chrono::steady_clock::now();
+        std::map<std::string, roc::Roc> rocs;
+        for(int64_t done = 0; done < count_records; done += blocksize)
+        {
+            std::unique_ptr<BlockQuantify> bq = makeQuantifier(hdr, ref_fasta, "ga4gh", "extended_counts;");
+            const int64_t n = std::min((int64_t) blocksize, count_records - done);
+            for(int64_t i = 0; i < n; ++i)
+            {
+                bq->add(bcf_dup(block[i]));
+            }
+            bq->count();
+            for(auto const & r : bq->getRocs())
+            {
+                rocs[r.first].add(r.second);
+            }
+        }
+        const double counting = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+        std::cout << "BlockQuantify::count, " << count_records << " records in " << rocs.size() << " ROCs" << "\n";
+        std::cout << "  " << counting << "s, " << count_records / counting << " records/s\n";
+    }
+    catch(std::runtime_error & e)
+    {
+        std::cerr << e.what() << std::endl;
+        for(auto v : block)
+        {
+            bcf_destroy(v);
+        }
+        if(hdr)
+        {
+            bcf_hdr_destroy(hdr);
+        }
+        boost::filesystem::remove(fasta);
+        boost::filesystem::remove(fasta.string() + ".fai");
+        return 1;
+    }
+
+    for(auto v : block)
+    {
+        bcf_destroy(v);
+    }
+    bcf_hdr_destroy(hdr);
+    boost::filesystem::remove(fasta);
+    boost::filesystem::remove(fasta.string() + ".fai");
+    return 0;
+}
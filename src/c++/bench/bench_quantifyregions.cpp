@@ -0,0 +1,229 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * \brief Benchmark for annotating variants with stratification regions in quantify
+ *
+ * \file bench_quantifyregions.cpp
+ *
+ */
+
+#include <boost/program_options.hpp>
+#include <boost/filesystem.hpp>
+
+#include <algorithm>
+#include <chrono>
+#include <fstream>
+#include <iostream>
+#include <random>
+
+#include "QuantifyRegions.hh"
+#include "helpers/BCFHelpers.hh"
+#include "Version.hh"
+#include "Error.hh"
+
+using namespace variant;
+
+namespace
+{
+    /** annotate records at random sorted positions, return the number of region labels assigned */
+    uint64_t annotate(QuantifyRegions & regions, bcf_hdr_t * hdr, int64_t records, int64_t length)
+    {
+        std::mt19937 rng(23);
+        const bcfhelpers::InfoAccessor reg(hdr, "Regions");
+        const int64_t spacing = std::max((int64_t) 1, length / std::max((int64_t) 1, records));
+        int64_t pos = 0;
+        uint64_t labels = 0;
+        for(int64_t i = 0; i < records; ++i)
+        {
+            pos += (int64_t) (rng() % (2*spacing));
+            if(pos >= length)
+            {
+                break;
+            }
+            // htslib doesn't allow updating INFO repeatedly without writing the record
+            bcf1_t * rec = bcf_init();
+            rec->rid = 0;
+            rec->pos = (int) pos;
+            bcf_update_alleles_str(hdr, rec, "A,C");
+            regions.annotate(hdr, rec);
+            const bcfhelpers::StringRef r = reg.getString(rec);
+            labels += r.missing() ? 0 : (uint64_t) std::count(r.s, r.s + r.len, ',') + 1;
+            bcf_destroy(rec);
+        }
+        return labels;
+    }
+}
+
+int main(int argc, char* argv[]) {
+    namespace po = boost::program_options;
+
+    int64_t records = 5000000;
+    int nregions = 300;
+    int intervals = 20000;
+    int64_t length = 100000000;
+
+    try
+    {
+        // Declare the supported options.
+        po::options_description desc("Allowed options");
+        desc.add_options()
+            ("help,h", "produce help message")
+            ("version", "Show version")
+            ("records", po::value<int64_t>(), "Number of records to annotate (default: 5000000).")
+            ("regions", po::value<int>(), "Number of stratification regions (default: 300).")
+            ("intervals", po::value<int>(), "Number of intervals per region (default: 20000).")
+            ("length", po::value<int64_t>(), "Contig length (default: 100000000).")
+        ;
+
+        po::variables_map vm;
+
+        po::store(po::command_line_parser(argc, argv).options(desc).run(), vm);
+        po::notify(vm);
+
+        if (vm.count("version"))
+        {
+            std::cout << "bench_quantifyregions version " << HAPLOTYPES_VERSION << "\n";
+            return 0;
+        }
+
+        if (vm.count("help"))
+        {
+            std::cout << desc << "\n";
+            return 1;
+        }
+
+        if (vm.count("records"))
+        {
+            records = vm["records"].as< int64_t >();
+        }
+
+        if (vm.count("regions"))
+        {
+            nregions = std::max(1, vm["regions"].as< int >());
+        }
+
+        if (vm.count("intervals"))
+        {
+            intervals = std::max(1, vm["intervals"].as< int >());
+        }
+
+        if (vm.count("length"))
+        {
+            length = std::max((int64_t) 1000, vm["length"].as< int64_t >());
+        }
+    }
+    catch (po::error & e)
+    {
+        std::cerr << e.what() << "\n";
+        return 1;
+    }
+
+    boost::filesystem::path dir = boost::filesystem::temp_directory_path() /
+                                  boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%");
+    bcf_hdr_t * hdr = nullptr;
+    try
+    {
+        // random non-overlapping intervals, with varying density per region
+        boost::filesystem::create_directories(dir);
+        std::mt19937 rng(42);
+        std::vector<std::string> rnames;
+        for(int r = 0; r < nregions; ++r)
+        {
+            const boost::filesystem::path bed = dir / ("S" + std::to_string(r) + ".bed");
+            std::ofstream f(bed.native());
+            const int64_t gap = std::max((int64_t) 2, 2 * length / intervals);
+            int64_t pos = 0;
+            for(int i = 0; i < intervals; ++i)
+            {
+                pos += (int64_t) (rng() % gap) + 1;
+                const int64_t end = pos + (int64_t) (rng() % (gap / 2 + 1)) + 1;
+                if(end >= length)
+                {
+                    break;
+                }
+                f << "chrS\t" << pos << "\t" << end << "\n";
+                pos = end;
+            }
+            rnames.push_back("S" + std::to_string(r) + ":" + bed.string());
+        }
+
+        hdr = bcf_hdr_init("w");
+        bcf_hdr_append(hdr, ("##contig=<ID=chrS,length=" + std::to_string(length) + ">").c_str());
+        bcf_hdr_append(hdr, "##INFO=<ID=Regions,Number=.,Type=String,Description=\"Tags for regions.\">");
+        bcf_hdr_sync(hdr);
+
+        std::cerr.setstate(std::ios::failbit);
+        auto t0 = std::chrono::steady_clock::now();
+        QuantifyRegions from_beds;
+        from_beds.load(rnames);
+        const double load_beds = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+
+        t0 = std::chrono::steady_clock::now();
+        QuantifyRegions::buildIndex(rnames, (dir / "index").string());
+        const double build_index = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+        t0 = std::chrono::steady_clock::now();
+        QuantifyRegions from_index;
+        from_index.loadIndex((dir / "index").string());
+        const double load_index = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+        std::cerr.clear();
+
+        t0 = std::chrono::steady_clock::now();
+        const uint64_t labels_beds = annotate(from_beds, hdr, records, length);
+        const double annotate_beds = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+        t0 = std::chrono::steady_clock::now();
+        const uint64_t labels_index = annotate(from_index, hdr, records, length);
+        const double annotate_index = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+
+        if(labels_beds != labels_index)
+        {
+            error("Annotations differ: %llu != %llu labels", (unsigned long long)labels_beds,
+                  (unsigned long long)labels_index);
+        }
+
+        std::cout << nregions << " regions x " << intervals << " intervals, " << records << " records, "
+                  << labels_beds << " labels assigned" << "\n";
+        std::cout << "  bed files:  load " << load_beds << "s, annotate " << annotate_beds << "s, "
+                  << records / annotate_beds << " records/s\n";
+        std::cout << "  index:      build " << build_index << "s, load " << load_index << "s, annotate "
+                  << annotate_index << "s, " << records / annotate_index << " records/s\n";
+    }
+    catch(std::runtime_error & e)
+    {
+        std::cerr.clear();
+        std::cerr << e.what() << std::endl;
+        if(hdr)
+        {
+            bcf_hdr_destroy(hdr);
+        }
+        boost::filesystem::remove_all(dir);
+        return 1;
+    }
+
+    bcf_hdr_destroy(hdr);
+    boost::filesystem::remove_all(dir);
+    return 0;
+}
@@ -0,0 +1,171 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * \brief Benchmark for ROC accumulation with and without binning
+ *
+ * \file bench_roc.cpp
+ *
+ */
+
+#include <boost/program_options.hpp>
+
+#include <chrono>
+#include <iostream>
+#include <random>
+#include <vector>
+
+#include <sys/resource.h>
+
+#include "helpers/Roc.hh"
+#include "Version.hh"
+#include "Error.hh"
+
+namespace
+{
+    /** maximum resident set size in MB */
+    double maxRSS()
+    {
+        struct rusage usage;
+        getrusage(RUSAGE_SELF, &usage);
+        return usage.ru_maxrss / 1024.0;
+    }
+
+    /** add observations with continuous levels, return the number of ROC levels */
+    size_t accumulate(roc::Roc & r, int64_t observations, double roc_delta)
+    {
+        static const roc::DecisionType dts[] = {roc::DecisionType::TP, roc::DecisionType::FN,
+                                                roc::DecisionType::TP2, roc::DecisionType::FP,
+                                                roc::DecisionType::UNK};
+        static const uint64_t flags[] = {roc::OBS_FLAG_HET, roc::OBS_FLAG_HOMALT, roc::OBS_FLAG_HETALT | roc::OBS_FLAG_AM};
+        std::mt19937 rng(42);
+        std::normal_distribution<double> vqslod(2.0, 5.0);
+        for(int64_t i = 0; i < observations; ++i)
+        {
+            r.add(roc::Observation{vqslod(rng), dts[rng() % 5], 1, flags[rng() % 3]});
+        }
+        std::vector<roc::Level> levels;
+        r.getLevels(levels, roc_delta);
+        r.getLevels(levels, roc_delta, roc::OBS_FLAG_HET);
+        return levels.size();
+    }
+}
+
+int main(int argc, char* argv[]) {
+    namespace po = boost::program_options;
+
+    int64_t observations = 20000000;
+    int bins = 10000;
+    double roc_delta = 0.01;
+
+    try
+    {
+        // Declare the supported options.
+        po::options_description desc("Allowed options");
+        desc.add_options()
+            ("help,h", "produce help message")
+            ("version", "Show version")
+            ("observations", po::value<int64_t>(), "Number of observations to add (default: 20000000).")
+            ("bins", po::value<int>(), "Maximum number of bins for the binned ROC (default: 10000).")
+            ("roc-delta", po::value<double>(), "Minimum spacing of levels, and initial bin width (default: 0.01).")
+        ;
+
+        po::variables_map vm;
+
+        po::store(po::command_line_parser(argc, argv).options(desc).run(), vm);
+        po::notify(vm);
+
+        if (vm.count("version"))
+        {
+            std::cout << "bench_roc version " << HAPLOTYPES_VERSION << "\n";
+            return 0;
+        }
+
+        if (vm.count("help"))
+        {
+            std::cout << desc << "\n";
+            return 1;
+        }
+
+        if (vm.count("observations"))
+        {
+            observations = vm["observations"].as< int64_t >();
+        }
+
+        if (vm.count("bins"))
+        {
+            bins = std::max(1, vm["bins"].as< int >());
+        }
+
+        if (vm.count("roc-delta"))
+        {
+            roc_delta = vm["roc-delta"].as< double >();
+        }
+    }
+    catch (po::error & e)
+    {
+        std::cerr << e.what() << "\n";
+        return 1;
+    }
+
+    try
+    {
+        // binned first, since we can only measure the peak memory use
+        const double rss0 = maxRSS();
+        auto t0 = std::chrono::steady_clock::now();
+        size_t levels_binned = 0;
+        double bin_width = 0;
+        {
+            roc::Roc binned((size_t) bins, roc_delta);
+            levels_binned = accumulate(binned, observations, roc_delta);
+            bin_width = binned.binWidth();
+        }
+        const double time_binned = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+        const double rss_binned = maxRSS();
+
+        t0 = std::chrono::steady_clock::now();
+        size_t levels_exact = 0;
+        {
+            roc::Roc exact;
+            levels_exact = accumulate(exact, observations, roc_delta);
+        }
+        const double time_exact = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+        const double rss_exact = maxRSS();
+
+        std::cout << observations << " observations, roc-delta " << roc_delta << "\n";
+        std::cout << "  all observations: " << time_exact << "s, " << levels_exact << " ROC levels, peak memory +"
+                  << rss_exact - rss_binned << "MB\n";
+        std::cout << "  " << bins << " bins:       " << time_binned << "s, " << levels_binned << " ROC levels, peak memory +"
+                  << rss_binned - rss0 << "MB, bin width " << bin_width << "\n";
+    }
+    catch(std::runtime_error & e)
+    {
+        std::cerr << e.what() << std::endl;
+        return 1;
+    }
+
+    return 0;
+}
@@ -48,6 +48,7 @@
 namespace variant {
 
     class BlockQuantify;
+    struct QuantifyRecord;
 
     /** factory method */
     std::unique_ptr<BlockQuantify> makeQuantifier(
@@ -103,11 +104,12 @@ namespace variant {
         virtual void rocEvaluate(bcf1_t * v);
 
         // add ROC decision point
-        void addROCValue(std::string const & roc_identifier,
+        void addROCValue(int roc_type,
                          roc::DecisionType dt,
                          double level,
                          uint64_t n,
-                         bcf1_t * v);
+                         bcf1_t * v,
+                         QuantifyRecord const & rec);
 
         struct BlockQuantifyImpl;
         std::unique_ptr<BlockQuantifyImpl> _impl;
@@ -0,0 +1,94 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// 
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+/**
+ * \brief Diploid haplotype comparison by dynamic programming
+ *
+ * \file DPDiploidCompare.hh
+ *
+ */
+
+#pragma once
+
+#include "Variant.hh"
+#include "DiploidComparisonResult.hh"
+
+#include <list>
+
+namespace haplotypes
+{
+
+/**
+ * @brief Decide if truth and query genotypes can produce the same pair of haplotype sequences
+ * @details Unlike DiploidCompare, this doesn't enumerate the haplotypes of each sample.
+ * The four haplotype sequences (two each for truth and query) are built from left to right
+ * over the genotype calls, keeping only the part of each sequence which hasn't been matched
+ * yet. Partial assignments which reach the same state are merged, so for most blocks the
+ * number of states stays small and is reset when all haplotypes are in sync on a shared
+ * reference position.
+ *
+ * Het calls are assigned to either haplotype unless they are phased; phased calls keep their
+ * orientation relative to each other. Calls which overlap on the same haplotype cannot be
+ * combined.
+ */
+struct DPDiploidCompareImpl;
+class DPDiploidCompare
+{
+public:
+    DPDiploidCompare(const char * ref_fasta);
+    DPDiploidCompare(DPDiploidCompare const & );
+    ~DPDiploidCompare();
+    DPDiploidCompare const & operator=(DPDiploidCompare const & );
+
+    /**
+     * Set the maximum number of states to keep before aborting (result is dco_unknown)
+     */
+    void setMaxStates(int max_states=4096);
+
+    /**
+     * Set the maximum time in milliseconds to spend on a region (<= 0: no limit).
+     * When the limit is exceeded, the outcome is dco_timeout.
+     */
+    void setTimeLimit(int64_t time_limit_ms=-1);
+
+    /**
+     * @brief Compare truth (ix1) and query (ix2) calls in a region
+     */
+    void setRegion(const char * chr, int64_t start, int64_t end,
+                   std::list<variant::Variants> const & vars, int ix1, int ix2);
+
+    /**
+     * @brief return comparison outcome after setRegion
+     */
+    DiploidComparisonResult const & getResult();
+
+private:
+    DPDiploidCompareImpl * _impl;
+};
+
+} // namespace haplotypes
@@ -64,6 +64,12 @@ public:
      */
     void setMaxHapEnum(int nhap=4096);
 
+    /**
+     * Set the maximum time in milliseconds to spend enumerating haplotypes for a region
+     * (<= 0: no limit). When the limit is exceeded, the outcome is dco_timeout.
+     */
+    void setTimeLimit(int64_t time_limit_ms=-1);
+
     /**
      * Enable / disable the alignment step to find the best approximately matching
      * haplotypes (i.e. stop after match/mismatch status have been established)
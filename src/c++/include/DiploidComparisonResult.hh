@@ -54,7 +54,9 @@ typedef enum _DiploidComparisonOutcome
     dco_match,
     dco_mismatch,
     // failure when comparing
-    dco_unknown
+    dco_unknown,
+    // time limit exceeded
+    dco_timeout
 } DiploidComparisonOutcome;
 
 
@@ -116,12 +118,19 @@ struct DiploidComparisonResult
     DiploidComparisonOutcome outcome;
 
     // combinatorics + performance: how many possibilities did we look at
+    //
+    // n_paths1 / n_paths2 give the number of truth / query haplotypes. DPDiploidCompare
+    // doesn't enumerate haplotypes, it gives the number of dp states kept after each
+    // truth / query call, summed over all calls; its n_pathsc is the sum of both.
     int64_t n_paths1, n_paths2, 
             n_pathsc; ///< and how many "expensive" comparisons / alignments did we do
 
+    // number of nodes in the truth / query graphs
+    int64_t n_nodes1, n_nodes2;
+
     int64_t n_nonsnp;
 
-    // matched haplotype pair types
+    // matched haplotype pair types (dt_unknown for DPDiploidCompare, which doesn't pick a pair)
     DiploidType type1, type2;
 
     // hap-cmp / DiploidCompare outputs
@@ -52,6 +52,9 @@ struct DiploidRef {
     std::string h1, h2;
     // reference sequence for this region
     std::string refsq;
+    // fingerprints of h1 and h2 (std::hash), used to find matching pairs
+    // without comparing all sequences
+    size_t h1_hash, h2_hash;
 };
 
 std::ostream & operator<<(std::ostream & o, DiploidRef const & r);
@@ -76,6 +79,16 @@ public:
      */
     void setNPaths(int max_n_paths=-1);
 
+    /**
+     * Set the time after which enumeration is aborted by throwing TimeLimitExceeded
+     */
+    void setDeadline(Deadline deadline=Deadline::max());
+
+    /**
+     * Number of nodes in the reference graph for the current region
+     */
+    size_t getNNodes() const;
+
     /**
      * Enumerate from set of Variants
      */
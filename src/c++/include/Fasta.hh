@@ -28,7 +28,7 @@
 
 
 /**
- *  \brief Wrapper for htslib faidx
+ *  \brief Fasta file reader (memory-mapped, or via htslib faidx for compressed files)
  *
  * \file Fasta.hh
  * \author Peter Krusche
@@ -55,6 +55,28 @@ public:
 
 	std::string query(std::string const & location) const;
 	std::string query(const char * chr, int64_t start, int64_t end) const;
+
+	/**
+	 * Get the uppercase sequence for chr:start-end (zero-based, inclusive) without copying.
+	 *
+	 * The first call for a contig reads the whole contig into memory; the returned
+	 * pointer stays valid for the lifetime of this object. This is thread-safe.
+	 *
+	 * @param len set to the number of characters available at the returned pointer
+	 * @return pointer to the first base, or nullptr if the range is outside the contig
+	 */
+	const char * view(const char * chr, int64_t start, int64_t end, int64_t & len) const;
+
+	/**
+	 * Write a packed image of a fasta file with two bits per base.
+	 *
+	 * FastaFile objects read the image at filename + ".packed" instead of the fasta
+	 * file if it is up to date; the image is memory-mapped read-only, so processes
+	 * that use the same reference share it through the page cache.
+	 *
+	 * @param filename the fasta file; the image is written to filename + ".packed"
+	 */
+	static void pack(const char * filename);
 private:
 	FastaFileImpl * _impl;
 };
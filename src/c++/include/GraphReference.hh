@@ -40,12 +40,25 @@
 #include "Haplotype.hh"
 #include "Fasta.hh"
 #include "Variant.hh"
+#include "helpers/DynamicBitset.hh"
 
+#include <chrono>
+#include <stdexcept>
+#include <string>
 #include <vector>
 
 namespace haplotypes
 {
 
+/** thrown when path enumeration runs past its deadline */
+struct TimeLimitExceeded : public std::runtime_error
+{
+    explicit TimeLimitExceeded(std::string const & what) : std::runtime_error(what) {}
+};
+
+/** point in time after which enumeration is aborted */
+typedef std::chrono::steady_clock::time_point Deadline;
+
 struct ReferenceNode;
 struct ReferenceEdge;
 
@@ -96,7 +109,9 @@ public:
      *
      * Finally, each Haplotype block corresponds to traversing or skipping a set of het nodes. The nodes_used
      * vector gives a mask for each path which indicate which het nodes were used in its creation. n_hets will
-     * return the total number of het nodes (so nodes_used[*] will always be < 2^(*n_hets + 1))
+     * return the total number of het nodes (so nodes_used[*] will only have bits 0 .. *n_hets - 1 set)
+     *
+     * If a deadline is given, enumeration throws TimeLimitExceeded once the deadline has passed.
      *
      */
     void enumeratePaths(
@@ -109,8 +124,9 @@ public:
         size_t source=0,
         size_t sink=(size_t)-1,
         int max_n_paths=-1,
-        std::vector<uint64_t> * nodes_used = NULL,
-        size_t * n_hets = NULL
+        std::vector<bitsetutil::DynamicBitset> * nodes_used = NULL,
+        size_t * n_hets = NULL,
+        Deadline deadline = Deadline::max()
     );
 
 private:
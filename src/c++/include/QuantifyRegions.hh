@@ -39,6 +39,7 @@
 #include <memory>
 #include <map>
 #include <string>
+#include <vector>
 
 #include <htslib/vcf.h>
 
@@ -52,6 +53,14 @@ namespace variant
     public:
         QuantifyRegions();
         ~QuantifyRegions();
+
+        /**
+         * Copies share the loaded regions, but have their own position for
+         * annotation, so each thread can annotate records using its own copy.
+         */
+        QuantifyRegions(QuantifyRegions const & rhs);
+        QuantifyRegions & operator=(QuantifyRegions const & rhs);
+
         /** load named regions
          *
          *  Each name must give a region name and a bed file:
@@ -61,6 +70,24 @@ namespace variant
          */
         void load(std::vector<std::string> const & rnames, bool fixchr=false);
 
+        /**
+         * Load a stratification index written by buildIndex. The index is
+         * memory-mapped, and can be combined with regions from load.
+         */
+        void loadIndex(std::string const & filename);
+
+        /**
+         * Read named regions (see load) and write them to a binary index
+         * which can be loaded using loadIndex.
+         *
+         * For each contig, the index stores the sorted breakpoints of all
+         * regions, and for each segment between two breakpoints the set of
+         * region labels that cover it.
+         */
+        static void buildIndex(std::vector<std::string> const & rnames,
+                               std::string const & filename,
+                               bool fixchr=false);
+
         /**
          * Returns true if confident regions were loaded.
          * (i.e. if regions named "CONF" are present)
@@ -69,7 +96,9 @@ namespace variant
 
         /** add Regions annotation to a record
          *
-         * Records must be passed in sorted order.
+         * Records should be passed in sorted order, which makes annotation a
+         * single cursor advance over the region segments. All bed files must
+         * be loaded before the first record is annotated.
          *
          */
         void annotate(bcf_hdr_t * hdr, bcf1_t * record);
@@ -39,8 +39,10 @@
 
 #pragma once
 
+#include <cstring>
 #include <iostream>
 #include <list>
+#include <string>
 #include <vector>
 #include <memory>
 
@@ -150,6 +152,77 @@ namespace bcfhelpers {
     /** read a format field as string. result will not be overwritten on failure */
     std::string getFormatString(const bcf_hdr_t * header, bcf1_t * line, const char * field, int isample, const char * def_result = ".");
 
+    /** string value stored in a bcf1_t record. The value is not copied and not null-terminated. */
+    struct StringRef
+    {
+        const char * s = nullptr;
+        size_t len = 0;
+
+        /** true if the record has no value */
+        bool missing() const { return s == nullptr; }
+
+        bool operator==(const char * rhs) const
+        {
+            return s != nullptr && strlen(rhs) == len && memcmp(s, rhs, len) == 0;
+        }
+
+        bool operator!=(const char * rhs) const { return !(*this == rhs); }
+
+        /** copy the value, use def_result if missing */
+        std::string str(const char * def_result = ".") const
+        {
+            return s != nullptr ? std::string(s, len) : std::string(def_result);
+        }
+    };
+
+    /**
+     * @brief Read a FORMAT field from many records
+     *
+     * The header ID is resolved once when the accessor is created, values are
+     * read from the unpacked record without copying.
+     */
+    class FormatAccessor
+    {
+    public:
+        FormatAccessor() {}
+        FormatAccessor(const bcf_hdr_t * header, const char * field);
+
+        /** string value for a sample, missing if not present. Valid until the record is modified. */
+        StringRef getString(bcf1_t * line, int isample) const;
+
+        /** single float value for a sample, NaN if not present (same as getFormatFloat) */
+        float getFloat(bcf1_t * line, int isample) const;
+    private:
+        const bcf_fmt_t * find(bcf1_t * line, int isample) const;
+
+        const bcf_hdr_t * hdr = nullptr;
+        std::string field;
+        int tag_id = -1;
+    };
+
+    /**
+     * @brief Read an INFO field from many records
+     *
+     * The header ID is resolved once when the accessor is created, values are
+     * read from the unpacked record without copying.
+     */
+    class InfoAccessor
+    {
+    public:
+        InfoAccessor() {}
+        InfoAccessor(const bcf_hdr_t * header, const char * field);
+
+        /** integer value, def_result if not present (same as getInfoInt) */
+        int getInt(bcf1_t * line, int def_result = -1) const;
+
+        /** value of a string field, missing if not present. Valid until the record is modified. */
+        StringRef getString(bcf1_t * line) const;
+    private:
+        const bcf_info_t * find(bcf1_t * line) const;
+
+        int tag_id = -1;
+    };
+
     /** update format string for a single sample.  */
     void setFormatStrings(const bcf_hdr_t * header, bcf1_t * line, const char * field,
                           const std::vector<std::string> & value);
@@ -165,6 +238,16 @@ namespace bcfhelpers {
     /** return number of reference padding bases */
     int isRefPadded(bcf1_t * line);
 
+    /**
+     * Append VCF / BCF parts to a file at the block level, without decoding the records.
+     *
+     * The parts must have been written without a header using the same hts_open mode
+     * as output, and output must contain the header. BGZF end-of-file markers are
+     * removed from output and the parts, and a single one is written at the end
+     * when the output is compressed.
+     */
+    void appendParts(std::string const & output, std::vector<std::string> const & parts);
+
     /** shared pointer support for keeping bcf types around */
     typedef std::shared_ptr<bcf_hdr_t> p_bcf_hdr;
     typedef std::shared_ptr<bcf1_t> p_bcf1;
@@ -0,0 +1,210 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// 
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ *  \brief Dynamically sized bitset which doesn't allocate for up to 64 bits
+ *
+ * \file DynamicBitset.hh
+ *
+ */
+
+#pragma once
+
+#include <algorithm>
+#include <cstdint>
+#include <functional>
+#include <string>
+#include <vector>
+
+namespace bitsetutil
+{
+
+/**
+ * Bitset which grows as bits are set. Bits 0-63 are stored inline, higher bits
+ * are stored in a vector, so the common case of <= 64 bits doesn't allocate.
+ */
+class DynamicBitset
+{
+public:
+    DynamicBitset() : small(0) {}
+    explicit DynamicBitset(uint64_t bits) : small(bits) {}
+
+    inline void set(size_t i)
+    {
+        if(i < 64)
+        {
+            small |= uint64_t(1) << i;
+        }
+        else
+        {
+            const size_t w = i / 64;
+            if(large.size() < w)
+            {
+                large.resize(w, 0);
+            }
+            large[w - 1] |= uint64_t(1) << (i % 64);
+        }
+    }
+
+    inline bool test(size_t i) const
+    {
+        if(i < 64)
+        {
+            return ((small >> i) & 1) != 0;
+        }
+        const size_t w = i / 64;
+        return w <= large.size() && ((large[w - 1] >> (i % 64)) & 1) != 0;
+    }
+
+    /** true if any bit is set */
+    inline bool any() const
+    {
+        if(small)
+        {
+            return true;
+        }
+        for(uint64_t w : large)
+        {
+            if(w)
+            {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    inline DynamicBitset & operator|=(DynamicBitset const & rhs)
+    {
+        small |= rhs.small;
+        if(large.size() < rhs.large.size())
+        {
+            large.resize(rhs.large.size(), 0);
+        }
+        for(size_t w = 0; w < rhs.large.size(); ++w)
+        {
+            large[w] |= rhs.large[w];
+        }
+        return *this;
+    }
+
+    inline bool operator==(DynamicBitset const & rhs) const
+    {
+        if(small != rhs.small)
+        {
+            return false;
+        }
+        const size_t n = std::max(large.size(), rhs.large.size());
+        for(size_t w = 0; w < n; ++w)
+        {
+            if((w < large.size() ? large[w] : 0) != (w < rhs.large.size() ? rhs.large[w] : 0))
+            {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    inline bool operator!=(DynamicBitset const & rhs) const
+    {
+        return !(*this == rhs);
+    }
+
+    /** complement of the lowest nbits bits (higher bits are zero in the result) */
+    inline DynamicBitset flipped(size_t nbits) const
+    {
+        DynamicBitset result;
+        result.small = ~small;
+        if(nbits < 64)
+        {
+            result.small &= (uint64_t(1) << nbits) - 1;
+            return result;
+        }
+        const size_t nwords = (nbits - 64 + 63) / 64;
+        result.large.resize(nwords, 0);
+        for(size_t w = 0; w < nwords; ++w)
+        {
+            result.large[w] = ~(w < large.size() ? large[w] : 0);
+        }
+        if(nbits % 64 != 0)
+        {
+            result.large.back() &= (uint64_t(1) << (nbits % 64)) - 1;
+        }
+        return result;
+    }
+
+    inline size_t hash() const
+    {
+        size_t h = std::hash<uint64_t>()(small);
+        size_t n = large.size();
+        // trailing zero words don't change the value
+        while(n > 0 && large[n - 1] == 0)
+        {
+            --n;
+        }
+        for(size_t w = 0; w < n; ++w)
+        {
+            h ^= std::hash<uint64_t>()(large[w]) + 0x9e3779b97f4a7c15ull + (h << 6) + (h >> 2);
+        }
+        return h;
+    }
+
+    /** binary representation, highest bit first, padded to at least width characters */
+    inline std::string to_string(size_t width = 64) const
+    {
+        size_t nbits = 64 * (1 + large.size());
+        while(nbits > width && !test(nbits - 1))
+        {
+            --nbits;
+        }
+        std::string result(std::max(nbits, width), '0');
+        for(size_t i = 0; i < nbits; ++i)
+        {
+            if(test(i))
+            {
+                result[result.size() - 1 - i] = '1';
+            }
+        }
+        return result;
+    }
+
+private:
+    uint64_t small;
+    std::vector<uint64_t> large;  // bits 64 and up
+};
+
+} // namespace bitsetutil
+
+namespace std
+{
+template<> struct hash<bitsetutil::DynamicBitset>
+{
+    size_t operator()(bitsetutil::DynamicBitset const & b) const
+    {
+        return b.hash();
+    }
+};
+} // namespace std
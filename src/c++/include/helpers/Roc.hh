@@ -96,6 +96,10 @@ namespace roc
     static const uint64_t OBS_FLAG_C16_PLUS = 0x10000;
 
     uint64_t makeObservationFlags(const std::string & bk, const std::string & bi, const std::string & lt);
+    /** same for strings which are not null-terminated (e.g. read from a bcf1_t) */
+    uint64_t makeObservationFlags(const char * bk, size_t bk_len,
+                                  const char * bi, size_t bi_len,
+                                  const char * lt, size_t lt_len);
 
     struct Observation
     {
@@ -194,6 +198,19 @@ namespace roc
     class Roc {
     public:
         Roc();
+        /**
+         * Make a ROC which bins observation levels rather than storing all observations.
+         *
+         * Observations are binned into intervals of width bin_width, and their counts are
+         * added up for each bin, decision type and set of flags. The level of a binned
+         * observation is the smallest level added to it. When there are more than max_bins
+         * bins, the bin width is doubled, so the levels on the ROC are accurate to within
+         * binWidth().
+         *
+         * @param max_bins maximum number of bins to keep
+         * @param bin_width initial bin width
+         */
+        Roc(size_t max_bins, double bin_width);
         ~Roc();
         Roc(Roc const & rhs);
         Roc(Roc && rhs);
@@ -207,6 +224,14 @@ namespace roc
 
         void getLevels(std::vector<Level> & target, double roc_delta=0, uint64_t flag_mask=0) const;
         Level getTotals(uint64_t flag_mask=0) const;
+
+        /** current bin width, 0 if observations are not binned */
+        double binWidth() const;
+        /** maximum number of bins, 0 if observations are not binned */
+        size_t maxBins() const;
+
+        /** append all observations (or binned observations) to target */
+        void getObservations(std::vector<Observation> & target) const;
     private:
         struct RocImpl;
         std::unique_ptr<RocImpl> _impl;
@@ -0,0 +1,84 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * Read and write ROCs as mergeable binary files
+ *
+ * \file RocArtifact.hh
+ *
+ */
+#ifndef HAPLOTYPES_ROCARTIFACT_HH
+#define HAPLOTYPES_ROCARTIFACT_HH
+
+#include "RocOutput.hh"
+
+#include <map>
+#include <string>
+
+namespace roc
+{
+    /** version of the artifact format written by writeArtifact */
+    extern const uint32_t ARTIFACT_VERSION;
+
+    /**
+     * Write ROCs to a compressed binary file, together with the sizes of the
+     * stratification regions they refer to. Artifacts from runs on different parts
+     * of the input can be summed up using addArtifact.
+     *
+     * @param filename output file name
+     * @param rocs the ROCs to write
+     * @param qq_field the name of the QQ field
+     * @param regions stratification regions, for the region sizes
+     */
+    void writeArtifact(std::string const & filename,
+                       RocMap const & rocs,
+                       std::string const & qq_field,
+                       variant::QuantifyRegions const & regions);
+
+    /** write an artifact using region sizes from a map, e.g. to write merged artifacts */
+    void writeArtifact(std::string const & filename,
+                       RocMap const & rocs,
+                       std::string const & qq_field,
+                       std::map<std::string, size_t> const & region_sizes);
+
+    /**
+     * Add the ROCs from an artifact to a set of ROCs.
+     *
+     * Fails if the artifact's QQ field or region sizes differ from the ones in
+     * qq_field and region_sizes. Empty / missing values are filled in.
+     *
+     * @param filename artifact file name
+     * @param rocs the ROCs to add to
+     * @param qq_field the name of the QQ field
+     * @param region_sizes sizes of the stratification regions by name
+     */
+    void addArtifact(std::string const & filename,
+                     RocMap & rocs,
+                     std::string & qq_field,
+                     std::map<std::string, size_t> & region_sizes);
+}
+
+#endif //HAPLOTYPES_ROCARTIFACT_HH
@@ -39,6 +39,9 @@
 #include "Roc.hh"
 #include "QuantifyRegions.hh"
 
+#include <functional>
+#include <map>
+
 namespace roc
 {
     typedef std::map<std::string, roc::Roc> RocMap;
@@ -65,7 +68,29 @@ namespace roc
             qq_field(_qq_field),
             output_rocs(_output_rocs),
             roc_delta(_roc_delta),
-            regions(_regions),
+            region_size([&_regions](std::string const & r) { return _regions.getRegionSize(r); }),
+            roc_regions(_roc_regions)
+        {}
+
+        /**
+         * ROC output with region sizes from a map, e.g. when writing merged ROC artifacts
+         *
+         * @param _region_sizes sizes of the stratification regions by name
+         */
+        ROCOutput(RocMap const & r,
+                  std::string _qq_field,
+                  bool _output_rocs,
+                  double _roc_delta,
+                  std::map<std::string, size_t> const & _region_sizes,
+                  std::vector<std::string> const & _roc_regions
+        ) : rocs(r),
+            qq_field(_qq_field),
+            output_rocs(_output_rocs),
+            roc_delta(_roc_delta),
+            region_size([&_region_sizes](std::string const & r) -> size_t {
+                auto it = _region_sizes.find(r);
+                return it == _region_sizes.end() ? 0 : it->second;
+            }),
             roc_regions(_roc_regions)
         {}
 
@@ -76,7 +101,7 @@ namespace roc
         std::string qq_field;
         bool output_rocs;
         double roc_delta;
-        variant::QuantifyRegions const & regions;
+        std::function<size_t(std::string const &)> region_size;
         std::vector<std::string> const & roc_regions;
    };
 }
@@ -0,0 +1,434 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * \brief Diploid haplotype comparison by dynamic programming
+ *
+ * \file DPDiploidCompare.cpp
+ *
+ */
+
+#include "DPDiploidCompare.hh"
+#include "Fasta.hh"
+#include "RefVar.hh"
+
+#include <algorithm>
+#include <chrono>
+#include <limits>
+#include <unordered_set>
+#include <vector>
+
+#include "Error.hh"
+
+/* #define DEBUG_DPDIPLOIDCOMPARE */
+
+using namespace variant;
+
+namespace haplotypes
+{
+
+namespace
+{
+/** one genotype call in one sample */
+struct DPSite
+{
+    int sample;        // 0 = truth, 1 = query
+    bool phased;
+    bool hom;          // both haplotypes have the same allele
+    bool has[2];       // haplotype 0 / 1 has a non-reference allele
+    RefVar al[2];
+    int64_t pos;       // leftmost start of the alleles
+    int64_t end;       // leftmost end, used to order insertions before other alleles
+};
+
+/**
+ * Partial assignment of calls to haplotypes: we have truth haplotypes 0 and 1 and
+ * query haplotypes 0 and 1 (numbered 0-3). Truth haplotype h must match query haplotype h.
+ */
+struct DPState
+{
+    // orientation of phased query calls, -1 if we haven't seen one yet. We can fix the
+    // orientation of phased truth calls since swapping both samples gives the same match.
+    int query_phase;
+    int64_t cursor[4];          // next reference position to append to each haplotype
+    std::string pending[4];     // haplotype sequence which hasn't been matched yet
+
+    bool operator==(DPState const & rhs) const
+    {
+        if(query_phase != rhs.query_phase)
+        {
+            return false;
+        }
+        for(int k = 0; k < 4; ++k)
+        {
+            if(cursor[k] != rhs.cursor[k] || pending[k] != rhs.pending[k])
+            {
+                return false;
+            }
+        }
+        return true;
+    }
+};
+
+struct DPStateHash
+{
+    size_t operator()(DPState const & s) const
+    {
+        size_t h = std::hash<int>()(s.query_phase);
+        for(int k = 0; k < 4; ++k)
+        {
+            h ^= std::hash<int64_t>()(s.cursor[k]) + 0x9e3779b97f4a7c15ull + (h << 6) + (h >> 2);
+            h ^= std::hash<std::string>()(s.pending[k]) + 0x9e3779b97f4a7c15ull + (h << 6) + (h >> 2);
+        }
+        return h;
+    }
+};
+
+typedef std::unordered_set<DPState, DPStateHash> DPStateSet;
+} // namespace
+
+struct DPDiploidCompareImpl
+{
+    explicit DPDiploidCompareImpl(const char * ref_fasta) :
+        ref(ref_fasta), max_states(4096), time_limit_ms(-1) {}
+
+    FastaFile ref;
+    int max_states;
+    int64_t time_limit_ms;
+
+    DiploidComparisonResult cr;
+
+    // reference sequence for the current block, starting at refsq_start
+    std::string refsq;
+    int64_t refsq_start;
+
+    /** append reference bases up to (excluding) pos to haplotype k */
+    void advance(DPState & s, int k, int64_t pos) const
+    {
+        if(s.cursor[k] < pos)
+        {
+            s.pending[k].append(refsq, (size_t) (s.cursor[k] - refsq_start), (size_t) (pos - s.cursor[k]));
+            s.cursor[k] = pos;
+        }
+    }
+
+    /** remove the common prefix of matching truth / query haplotypes
+     *  @return false if the haplotypes cannot match anymore */
+    static bool reduce(DPState & s)
+    {
+        for(int h = 0; h < 2; ++h)
+        {
+            std::string & t = s.pending[h];
+            std::string & q = s.pending[h + 2];
+            const size_t n = std::min(t.size(), q.size());
+            if(t.compare(0, n, q, 0, n) != 0)
+            {
+                return false;
+            }
+            t.erase(0, n);
+            q.erase(0, n);
+        }
+        return true;
+    }
+};
+
+DPDiploidCompare::DPDiploidCompare(const char * ref_fasta)
+{
+    _impl = new DPDiploidCompareImpl(ref_fasta);
+}
+
+DPDiploidCompare::DPDiploidCompare(DPDiploidCompare const & rhs)
+{
+    _impl = new DPDiploidCompareImpl(rhs._impl->ref.getFilename().c_str());
+    _impl->max_states = rhs._impl->max_states;
+    _impl->time_limit_ms = rhs._impl->time_limit_ms;
+}
+
+DPDiploidCompare::~DPDiploidCompare()
+{
+    delete _impl;
+}
+
+DPDiploidCompare const & DPDiploidCompare::operator=(DPDiploidCompare const & rhs)
+{
+    if (&rhs == this)
+    {
+        return *this;
+    }
+    delete _impl;
+    _impl = new DPDiploidCompareImpl(rhs._impl->ref.getFilename().c_str());
+    _impl->max_states = rhs._impl->max_states;
+    _impl->time_limit_ms = rhs._impl->time_limit_ms;
+    return *this;
+}
+
+/**
+ * Set the maximum number of states to keep before aborting (result is dco_unknown)
+ */
+void DPDiploidCompare::setMaxStates(int max_states)
+{
+    _impl->max_states = max_states;
+}
+
+/**
+ * Set the maximum time in milliseconds to spend on a region
+ */
+void DPDiploidCompare::setTimeLimit(int64_t time_limit_ms)
+{
+    _impl->time_limit_ms = time_limit_ms;
+}
+
+/**
+ * @brief Compare truth (ix1) and query (ix2) calls in a region
+ */
+void DPDiploidCompare::setRegion(const char * chr, int64_t start, int64_t end,
+                                 std::list<variant::Variants> const & vars, int ix1, int ix2)
+{
+    const auto deadline = std::chrono::steady_clock::now() + std::chrono::milliseconds(std::max(int64_t(0), _impl->time_limit_ms));
+    DiploidComparisonResult & cr = _impl->cr;
+    cr.chr = chr;
+    cr.start = start;
+    cr.end = end;
+    cr.refsq = ".";
+    cr.outcome = dco_unknown;
+    cr.type1 = dt_unknown;
+    cr.type2 = dt_unknown;
+    cr.n_paths1 = 0;
+    cr.n_paths2 = 0;
+    cr.n_pathsc = 0;
+    cr.n_nodes1 = 0;
+    cr.n_nodes2 = 0;
+    cr.n_nonsnp = -1;
+    cr.diffs[0] = HaplotypeDiff();
+    cr.diffs[1] = HaplotypeDiff();
+
+    // collect the called alleles in both samples (trimmed like in GraphReference::makeGraph)
+    std::vector<DPSite> sites;
+    int64_t min_pos = start;
+    int64_t max_pos = end + 1;
+    for(Variants const & v : vars)
+    {
+        for(int sample = 0; sample < 2; ++sample)
+        {
+            const int ix = sample == 0 ? ix1 : ix2;
+            if(ix < 0 || ix >= (int) v.calls.size())
+            {
+                continue;
+            }
+            Call const & c = v.calls[ix];
+            const gttype gtt = getGTType(c);
+            if(gtt != gt_het && gtt != gt_hetalt && gtt != gt_homalt)
+            {
+                continue;
+            }
+            DPSite site;
+            site.sample = sample;
+            site.phased = c.phased;
+            site.hom = gtt == gt_homalt;
+            site.pos = std::numeric_limits<int64_t>::max();
+            site.end = std::numeric_limits<int64_t>::max();
+            for(int g = 0; g < 2; ++g)
+            {
+                site.has[g] = c.gt[g] > 0;
+                if(!site.has[g])
+                {
+                    continue;
+                }
+                if(c.gt[g] > (int) v.variation.size())
+                {
+                    error("invalid GT at %s:%i", v.chr.c_str(), v.pos);
+                }
+                site.al[g] = v.variation[c.gt[g] - 1];
+                ++(sample == 0 ? cr.n_nodes1 : cr.n_nodes2);
+                trimLeft(_impl->ref, v.chr.c_str(), site.al[g], false);
+                trimRight(_impl->ref, v.chr.c_str(), site.al[g], false);
+                site.pos = std::min(site.pos, site.al[g].start);
+                site.end = std::min(site.end, site.al[g].end);
+                min_pos = std::min(min_pos, site.al[g].start);
+                max_pos = std::max(max_pos, site.al[g].end + 1);
+            }
+            sites.push_back(site);
+        }
+    }
+    std::stable_sort(sites.begin(), sites.end(), [](DPSite const & a, DPSite const & b) {
+        return a.pos < b.pos || (a.pos == b.pos && a.end < b.end);
+    });
+
+    min_pos = std::max(int64_t(0), min_pos);
+    _impl->refsq_start = min_pos;
+    _impl->refsq = _impl->ref.query(chr, min_pos, max_pos - 1);
+    if((int64_t) _impl->refsq.size() < max_pos - min_pos)
+    {
+        // past the end of the contig
+        _impl->refsq.resize((size_t) (max_pos - min_pos), 'N');
+    }
+
+    DPStateSet states;
+    {
+        DPState initial;
+        initial.query_phase = -1;
+        for(int k = 0; k < 4; ++k)
+        {
+            initial.cursor[k] = min_pos;
+        }
+        states.insert(initial);
+    }
+
+    bool any_mismatch = false;
+    for(DPSite const & site : sites)
+    {
+        if(_impl->time_limit_ms > 0 && std::chrono::steady_clock::now() > deadline)
+        {
+            cr.outcome = dco_timeout;
+            return;
+        }
+        DPStateSet next;
+        for(DPState const & current : states)
+        {
+            DPState synced(current);
+            for(int k = 0; k < 4; ++k)
+            {
+                _impl->advance(synced, k, site.pos);
+            }
+            if(!DPDiploidCompareImpl::reduce(synced))
+            {
+                any_mismatch = true;
+                continue;
+            }
+
+            // possible orientations of this call
+            int orientations[2] = {0, 1};
+            int n_orientations = 2;
+            if(site.hom)
+            {
+                n_orientations = 1;
+            }
+            else if(site.phased)
+            {
+                n_orientations = 1;
+                if(site.sample == 1 && synced.query_phase >= 0)
+                {
+                    orientations[0] = synced.query_phase;
+                }
+                else if(site.sample == 1)
+                {
+                    n_orientations = 2;
+                }
+            }
+
+            for(int oi = 0; oi < n_orientations; ++oi)
+            {
+                const int o = orientations[oi];
+                DPState s(synced);
+                if(site.phased && site.sample == 1)
+                {
+                    s.query_phase = o;
+                }
+                bool ok = true;
+                for(int g = 0; g < 2 && ok; ++g)
+                {
+                    if(!site.has[g])
+                    {
+                        continue;
+                    }
+                    const int k = 2 * site.sample + (g ^ o);
+                    if(site.al[g].start < s.cursor[k])
+                    {
+                        // overlaps with an allele we have used on this haplotype
+                        ok = false;
+                        break;
+                    }
+                    _impl->advance(s, k, site.al[g].start);
+                    s.pending[k] += site.al[g].alt;
+                    s.cursor[k] = site.al[g].end + 1;
+                }
+                if(!ok)
+                {
+                    continue;
+                }
+                if(!DPDiploidCompareImpl::reduce(s))
+                {
+                    any_mismatch = true;
+                    continue;
+                }
+                next.insert(std::move(s));
+            }
+        }
+        // work done: states kept after each truth / query call
+        if(site.sample == 0)
+        {
+            cr.n_paths1 += (int64_t) next.size();
+        }
+        else
+        {
+            cr.n_paths2 += (int64_t) next.size();
+        }
+        cr.n_pathsc += (int64_t) next.size();
+        if(_impl->max_states > 0 && next.size() > (size_t) _impl->max_states)
+        {
+            // give up
+            return;
+        }
+        states.swap(next);
+#ifdef DEBUG_DPDIPLOIDCOMPARE
+        std::cerr << "At " << chr << ":" << site.pos << " sample " << site.sample << " states: " << states.size() << "\n";
+#endif
+    }
+
+    if(states.empty())
+    {
+        cr.outcome = any_mismatch ? dco_mismatch : dco_unknown;
+        return;
+    }
+
+    for(DPState const & current : states)
+    {
+        DPState s(current);
+        for(int k = 0; k < 4; ++k)
+        {
+            _impl->advance(s, k, max_pos);
+        }
+        if(DPDiploidCompareImpl::reduce(s)
+           && s.pending[0].empty() && s.pending[1].empty()
+           && s.pending[2].empty() && s.pending[3].empty())
+        {
+            cr.outcome = dco_match;
+            return;
+        }
+    }
+    cr.outcome = dco_mismatch;
+}
+
+/**
+ * @brief return comparison outcome after setRegion
+ */
+DiploidComparisonResult const & DPDiploidCompare::getResult()
+{
+    return _impl->cr;
+}
+
+} // namespace haplotypes
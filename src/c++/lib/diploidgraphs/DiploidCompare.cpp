@@ -45,6 +45,8 @@
 #include <map>
 #include <set>
 #include <limits>
+#include <unordered_map>
+#include <vector>
 
 #include "Error.hh"
 
@@ -53,11 +55,55 @@
 namespace haplotypes
 {
 
+/**
+ * The non-reference haplotype of a het / hom / homref pair
+ * (for hom pairs, h1 is the alt haplotype, for het pairs one of h1 / h2 is the reference)
+ */
+static inline std::string const & altHaplotype(DiploidRef const & d)
+{
+    if(d.het && d.h1 == d.refsq)
+    {
+        return d.h2;
+    }
+    return d.h1;
+}
+
+static inline size_t altHash(DiploidRef const & d)
+{
+    if(d.het && d.h1 == d.refsq)
+    {
+        return d.h2_hash;
+    }
+    return d.h1_hash;
+}
+
+static inline size_t hashCombine(size_t seed, size_t h)
+{
+    return seed ^ (h + 0x9e3779b97f4a7c15ull + (seed << 6) + (seed >> 2));
+}
+
+/** hash of type + haplotypes, the same for d.h1|d.h2 and d.h2|d.h1 */
+static inline size_t pairHash(DiploidRef const & d, DiploidType dt)
+{
+    size_t h = hashCombine(0, (size_t) dt);
+    if(d.het)
+    {
+        h = hashCombine(h, std::min(d.h1_hash, d.h2_hash));
+        h = hashCombine(h, std::max(d.h1_hash, d.h2_hash));
+    }
+    else
+    {
+        h = hashCombine(h, d.h1_hash);
+    }
+    return h;
+}
+
 struct DiploidCompareImpl
 {
     DiploidCompareImpl(const char * ref_fasta) :
             dr(ref_fasta),
             nhap(4096),
+            time_limit_ms(-1),
             doAlignments(true)
     {
         matchScore = hcomp.getAlignment()->bestScore(1);
@@ -66,6 +112,7 @@ struct DiploidCompareImpl
     DiploidCompareImpl(DiploidCompareImpl const & rhs) :
             dr(rhs.dr),
             nhap(rhs.nhap),
+            time_limit_ms(rhs.time_limit_ms),
             doAlignments(rhs.doAlignments)
     {
         matchScore = hcomp.getAlignment()->bestScore(1);
@@ -76,6 +123,7 @@ struct DiploidCompareImpl
 
     // parameters
     int nhap;
+    int64_t time_limit_ms;
 
     HaploCompare hcomp;
     int matchScore;
@@ -120,6 +168,14 @@ void DiploidCompare::setMaxHapEnum(int nhap)
     _impl->nhap = nhap;
 }
 
+/**
+ * Set the maximum time to spend enumerating haplotypes for a region
+ */
+void DiploidCompare::setTimeLimit(int64_t time_limit_ms)
+{
+    _impl->time_limit_ms = time_limit_ms;
+}
+
 /**
  * Enable / disable the alignment step to find the best approximately matching
  * haplotypes (i.e. stop after match/mismatch status have been established)
@@ -151,6 +207,8 @@ void DiploidCompare::setRegion(const char * chr, int64_t start, int64_t end,
     _impl->cr.n_paths1 = -1;
     _impl->cr.n_paths2 = -1;
     _impl->cr.n_pathsc = -1;
+    _impl->cr.n_nodes1 = -1;
+    _impl->cr.n_nodes2 = -1;
     _impl->cr.n_nonsnp = -1;
     _impl->cr.diffs[0] = HaplotypeDiff();
     _impl->cr.diffs[1] = HaplotypeDiff();
@@ -161,10 +219,37 @@ void DiploidCompare::setRegion(const char * chr, int64_t start, int64_t end,
         return;
     }
     _impl->dr.setNPaths(_impl->nhap);
-    _impl->dr.setRegion(chr, start, end, vars, ix1);
-    std::list<DiploidRef> di_haps1(_impl->dr.result());
-    _impl->dr.setRegion(chr, start, end, vars, ix2);
-    std::list<DiploidRef> di_haps2(_impl->dr.result());
+    if(_impl->time_limit_ms > 0)
+    {
+        _impl->dr.setDeadline(std::chrono::steady_clock::now() + std::chrono::milliseconds(_impl->time_limit_ms));
+    }
+    else
+    {
+        _impl->dr.setDeadline();
+    }
+    std::list<DiploidRef> di_haps1, di_haps2;
+    try
+    {
+        _impl->dr.setRegion(chr, start, end, vars, ix1);
+        _impl->cr.n_nodes1 = (int64_t) _impl->dr.getNNodes();
+        di_haps1 = _impl->dr.result();
+        _impl->dr.setRegion(chr, start, end, vars, ix2);
+        _impl->cr.n_nodes2 = (int64_t) _impl->dr.getNNodes();
+        di_haps2 = _impl->dr.result();
+    }
+    catch(TimeLimitExceeded &)
+    {
+        if(_impl->cr.n_nodes1 < 0)
+        {
+            _impl->cr.n_nodes1 = (int64_t) _impl->dr.getNNodes();
+        }
+        else
+        {
+            _impl->cr.n_nodes2 = (int64_t) _impl->dr.getNNodes();
+        }
+        _impl->cr.outcome = dco_timeout;
+        return;
+    }
 
 #ifdef DEBUG_DIPLOIDCOMPARE
     std::cerr << "Input variants: " << "\n";
@@ -202,123 +287,122 @@ void DiploidCompare::setRegion(const char * chr, int64_t start, int64_t end,
     std::string matched_haplotypes_2[2];
 
     // 1. see if we can find a perfect allele match
+    //
+    // query pairs are indexed by their haplotype fingerprints, so sequences only need
+    // to be compared for candidate matches. The result is the same as comparing all
+    // pairs: we use the first truth pair that has a match, and the first query pair
+    // it matches.
+    std::vector<DiploidRef const *> query_pairs;
+    query_pairs.reserve(di_haps2.size());
+    std::unordered_multimap<size_t, size_t> query_by_pair;
+    std::unordered_multimap<size_t, size_t> query_by_alt;
+    for (DiploidRef const & d2 : di_haps2)
+    {
+        DiploidType dt2 = makeDiploidType(d2.het, d2.homref);
+        query_by_pair.emplace(pairHash(d2, dt2), query_pairs.size());
+        if(dt2 != dt_hetalt)
+        {
+            query_by_alt.emplace(altHash(d2), query_pairs.size());
+        }
+        query_pairs.push_back(&d2);
+    }
+
     bool match_found = false;
     bool gt_mismatch_found = false; // detect cases where the alleles match, but the GT is wrong
     for (DiploidRef const & d1 : di_haps1)
     {
         DiploidType dt1 = makeDiploidType(d1.het, d1.homref);
-        for (DiploidRef const & d2 : di_haps2)
-        {
-            DiploidType dt2 = makeDiploidType(d2.het, d2.homref);
+        size_t best = query_pairs.size();
+        bool best_is_match = false;
 
-            if(dt1 == dt2)
+        auto candidates = query_by_pair.equal_range(pairHash(d1, dt1));
+        for (auto c = candidates.first; c != candidates.second; ++c)
+        {
+            DiploidRef const & d2 = *query_pairs[c->second];
+            if(c->second >= best || makeDiploidType(d2.het, d2.homref) != dt1)
             {
-                if(d1.het)  // d1.het == d2.het since dt1 == dt2
-                {
-                    bool direct_match = (d1.h1 == d2.h1 && d1.h2 == d2.h2);
-                    bool flipped_match = (d1.h1 == d2.h2 && d1.h2 == d2.h1);
-                    if( direct_match || flipped_match )
-                    {
-                        if(direct_match)
-                        {
-                            matched_haplotypes_1[0] = d1.h1;
-                            matched_haplotypes_2[0] = d2.h1;
-                            matched_haplotypes_1[1] = d1.h2;
-                            matched_haplotypes_2[1] = d2.h2;
-                        }
-                        else
-                        {
-                            matched_haplotypes_1[0] = d1.h1;
-                            matched_haplotypes_2[0] = d2.h2;
-                            matched_haplotypes_1[1] = d1.h1;
-                            matched_haplotypes_2[1] = d2.h2;
-                        }
-                        // het match
-                        _impl->cr.type1 = dt1;
-                        _impl->cr.type2 = dt2;
-                        match_found = true;
-                        break;
-                    }
-                }
-                else
-                {
-                    // hom
-                    if(d1.h1 == d2.h1)
-                    {
-                        matched_haplotypes_1[0] = d1.h1;
-                        matched_haplotypes_2[0] = d2.h1;
-
-                        _impl->cr.type1 = dt1;
-                        _impl->cr.type2 = dt2;
-                        match_found = true;
-                        break;
-                    }
-                }
+                continue;
             }
-            else if(dt1 != dt_hetalt && dt2 != dt_hetalt) // undercall / overcall?
+            bool matches;
+            if(d1.het)  // d1.het == d2.het since dt1 == dt2
             {
-                std::string d1_alt;
-                std::string d2_alt;
+                matches = (d1.h1 == d2.h1 && d1.h2 == d2.h2) || (d1.h1 == d2.h2 && d1.h2 == d2.h1);
+            }
+            else
+            {
+                matches = d1.h1 == d2.h1;
+            }
+            if(matches)
+            {
+                best = c->second;
+                best_is_match = true;
+            }
+        }
 
-                if(d1.het)
+        if(dt1 != dt_hetalt) // undercall / overcall?
+        {
+            std::string const & d1_alt = altHaplotype(d1);
+            candidates = query_by_alt.equal_range(altHash(d1));
+            for (auto c = candidates.first; c != candidates.second; ++c)
+            {
+                DiploidRef const & d2 = *query_pairs[c->second];
+                if(c->second >= best || makeDiploidType(d2.het, d2.homref) == dt1)
                 {
-                    // one of the haplotypes in d1 is the reference sequence
-                    if(d1.h1 == d1.refsq)
-                    {
-                        d1_alt = d1.h2;
-                    }
-                    else
-                    {
-                        d1_alt = d1.h1;
-                    }
+                    continue;
                 }
-                else
+                if(d1_alt == altHaplotype(d2))
                 {
-                    d1_alt = d1.h1;
+                    best = c->second;
+                    best_is_match = false;
                 }
+            }
+        }
+        // hetalt vs het or hom doesn't need handling here
+
+        if(best == query_pairs.size())
+        {
+            continue;
+        }
 
-                if(d2.het)
+        DiploidRef const & d2 = *query_pairs[best];
+        _impl->cr.type1 = dt1;
+        _impl->cr.type2 = makeDiploidType(d2.het, d2.homref);
+        _impl->cr.n_pathsc = 0;
+        if(best_is_match)
+        {
+            if(d1.het)
+            {
+                if(d1.h1 == d2.h1 && d1.h2 == d2.h2)
                 {
-                    // one of the haplotypes in d2 is the reference sequence
-                    if(d2.h1 == d2.refsq)
-                    {
-                        d2_alt = d2.h2;
-                    }
-                    else
-                    {
-                        d2_alt = d2.h1;
-                    }
+                    matched_haplotypes_1[0] = d1.h1;
+                    matched_haplotypes_2[0] = d2.h1;
+                    matched_haplotypes_1[1] = d1.h2;
+                    matched_haplotypes_2[1] = d2.h2;
                 }
                 else
                 {
-                    d2_alt = d2.h1;
-                }
-
-                if(d1_alt == d2_alt)
-                {
-                    matched_haplotypes_1[0] = d1_alt;
-                    matched_haplotypes_2[0] = d2_alt;
-                    gt_mismatch_found = true;
-                    _impl->cr.type1 = dt1;
-                    _impl->cr.type2 = dt2;
-                    break;
+                    matched_haplotypes_1[0] = d1.h1;
+                    matched_haplotypes_2[0] = d2.h2;
+                    matched_haplotypes_1[1] = d1.h1;
+                    matched_haplotypes_2[1] = d2.h2;
                 }
             }
-            // hetalt vs het or hom doesn't need handling here
-        }
-
-        if(match_found)
-        {
+            else
+            {
+                matched_haplotypes_1[0] = d1.h1;
+                matched_haplotypes_2[0] = d2.h1;
+            }
+            match_found = true;
             _impl->cr.outcome = dco_match;
-            _impl->cr.n_pathsc = 0;
-            break;
         }
-        if(gt_mismatch_found)
+        else
         {
+            matched_haplotypes_1[0] = altHaplotype(d1);
+            matched_haplotypes_2[0] = altHaplotype(d2);
+            gt_mismatch_found = true;
             _impl->cr.outcome = dco_mismatch;
-            _impl->cr.n_pathsc = 0;
-            break;
         }
+        break;
     }
 
     if(!_impl->doAlignments && !match_found && !gt_mismatch_found)
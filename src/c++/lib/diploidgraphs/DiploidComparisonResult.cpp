@@ -68,6 +68,9 @@ std::ostream & operator<<(std::ostream & o, DiploidComparisonOutcome oc)
         case dco_mismatch:
             o << "dco_mismatch";
             break;
+        case dco_timeout:
+            o << "dco_timeout";
+            break;
         case dco_unknown:
         default:
             o << "dco_unknown";
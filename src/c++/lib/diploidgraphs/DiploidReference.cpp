@@ -83,6 +83,7 @@ struct DiploidReferenceImpl
 {
     DiploidReferenceImpl(GraphReference const & _gr) :
         chr(""), start(-1), end(-1), max_n_paths(-1),
+        deadline(Deadline::max()), n_nodes(0),
         gr(_gr)
         {}
 
@@ -91,6 +92,10 @@ struct DiploidReferenceImpl
     int64_t end;
 
     int max_n_paths;
+    Deadline deadline;
+
+    // size of the graph for the current region
+    size_t n_nodes;
 
     /* created by DiploidReference */
     GraphReference gr;
@@ -149,6 +154,22 @@ void DiploidReference::setNPaths(int max_n_paths)
     _impl->max_n_paths = max_n_paths;
 }
 
+/**
+ * Set the time after which enumeration is aborted
+ */
+void DiploidReference::setDeadline(Deadline deadline)
+{
+    _impl->deadline = deadline;
+}
+
+/**
+ * Number of nodes in the reference graph for the current region
+ */
+size_t DiploidReference::getNNodes() const
+{
+    return _impl->n_nodes;
+}
+
 /**
  * Set region and restart enumeration
  */
@@ -163,6 +184,7 @@ void DiploidReference::setRegion(
     _impl->start = start;
     _impl->end = end;
     _impl->di_haps.clear();
+    _impl->n_nodes = 0;
 
     if(std::string(chr) != "" && start >= 0 && end >= 0 && end - start + 1 > 0)
     {
@@ -171,6 +193,7 @@ void DiploidReference::setRegion(
 
         size_t nhets = 0;
         _impl->gr.makeGraph(vars, sample_ix, nodes, edges, &nhets);
+        _impl->n_nodes = nodes.size();
 
 #ifdef _DEBUG_DIPLOIDREFERENCE
         std::cerr << "nhets : " << nhets << " mp: " << _impl->max_n_paths << "\n";
@@ -184,12 +207,12 @@ void DiploidReference::setRegion(
         std::string refsq = _impl->gr.getRefFasta().query(chr, start, end);
 
         std::vector<Haplotype> target;
-        std::vector<uint64_t> nodes_used;
+        std::vector<bitsetutil::DynamicBitset> nodes_used;
 
         _impl->gr.enumeratePaths(chr, start, end,
                           nodes, edges, target,
                           0, (size_t)-1, _impl->max_n_paths,
-                          &nodes_used, &nhets);
+                          &nodes_used, &nhets, _impl->deadline);
 
 #ifdef _DEBUG_DIPLOIDREFERENCE
         std::cerr << "Nodes: " << "\n";
@@ -206,16 +229,14 @@ void DiploidReference::setRegion(
         for (size_t i = 0; i < target.size(); ++i)
         {
             std::cerr << target[i].repr(start, end) << "\n";
-            std::cerr << "NU: " << std::bitset<64>(nodes_used[i]) << "\n";
+            std::cerr << "NU: " << nodes_used[i].to_string() << "\n";
         }
 #endif
 
         // if we have het nodes, each pair of haplotypes must cover them all
         if(nhets != 0)
         {
-            std::unordered_map<uint64_t, size_t> nu_haps;
-            uint64_t nh_mask = 1;
-            nh_mask = (nh_mask << (int)(nhets)) - 1;
+            std::unordered_map<bitsetutil::DynamicBitset, size_t> nu_haps;
 
             for (size_t p1 = 0; p1 < nodes_used.size(); ++p1)
             {
@@ -226,7 +247,7 @@ void DiploidReference::setRegion(
             {
                 size_t p1 = nu_haps.begin()->second;
 
-                auto opposite_path = nu_haps.find((~nodes_used[p1]) & nh_mask);
+                auto opposite_path = nu_haps.find(nodes_used[p1].flipped(nhets));
                 if(opposite_path != nu_haps.end() && opposite_path != nu_haps.begin())
                 {
                     size_t p2 = opposite_path->second;
@@ -239,7 +260,8 @@ void DiploidReference::setRegion(
                         false,
                         target[p1].seq(start, end),
                         target[p2].seq(start, end),
-                        refsq
+                        refsq,
+                        0, 0
                     };
 
                     /** homref in the het case means that we have a het+homref call vs.
@@ -251,6 +273,8 @@ void DiploidReference::setRegion(
                     {
                         r.homref = true;
                     }
+                    r.h1_hash = std::hash<std::string>()(r.h1);
+                    r.h2_hash = std::hash<std::string>()(r.h2);
 
 #ifdef _DEBUG_DIPLOIDREFERENCE
                     std::cerr << "Found pair: " << r.h1 << ":" << r.h2 << " - homref: " << r.homref << " het : " << r.het << "\n";
@@ -260,7 +284,7 @@ void DiploidReference::setRegion(
                 else
                 {
 #ifdef _DEBUG_DIPLOIDREFERENCE
-                    std::cerr << "het path " << nodes_used[p1] << " does not have corresponding opposite path at " <<
+                    std::cerr << "het path " << nodes_used[p1].to_string() << " does not have corresponding opposite path at " <<
                                  chr << ":" << start << "-" << end << std::endl;
 #endif
                     nu_haps.erase(nu_haps.begin());
@@ -273,11 +297,13 @@ void DiploidReference::setRegion(
             // give us one result, except if filtered variant calls give multiple hom alts
             for(Haplotype & hap : target)
             {
-                DiploidRef r = {false, hap.noVar(), hap.seq(start, end), "", refsq};
+                DiploidRef r = {false, hap.noVar(), hap.seq(start, end), "", refsq, 0, 0};
                 if(r.h1 == refsq)
                 {
                     r.homref = true;
                 }
+                r.h1_hash = std::hash<std::string>()(r.h1);
+                r.h2_hash = std::hash<std::string>()(r.h2);
                 _impl->di_haps.push_back(r);
             }
         }
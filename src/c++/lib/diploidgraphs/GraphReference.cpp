@@ -54,14 +54,11 @@
 #include <map>
 #include <set>
 #include <bitset>
+#include <deque>
 #include <queue>
 
 /* #define _DEBUG_GRAPHREFERENCE */
 
-#ifndef MAX_GRAPHREFERENCE_NODES
-#define MAX_GRAPHREFERENCE_NODES 4096
-#endif
-
 #include "Error.hh"
 
 
@@ -70,6 +67,31 @@ using namespace variant;
 namespace haplotypes
 {
 
+/** 128 bit sequence hash to detect repeated sequences in enumeratePaths */
+struct SequenceFingerprint
+{
+    uint64_t h1, h2;
+
+    bool operator==(SequenceFingerprint const & rhs) const
+    {
+        return h1 == rhs.h1 && h2 == rhs.h2;
+    }
+};
+
+static inline SequenceFingerprint sequenceFingerprint(std::string const & s)
+{
+    SequenceFingerprint f;
+    f.h1 = (uint64_t) std::hash<std::string>()(s);
+    // FNV-1a
+    f.h2 = 0xcbf29ce484222325ull;
+    for(char c : s)
+    {
+        f.h2 ^= (uint64_t) (unsigned char) c;
+        f.h2 *= 0x100000001b3ull;
+    }
+    return f;
+}
+
 struct GraphReferenceImpl
 {
     GraphReferenceImpl( const char * _ref_fasta) : refsq(_ref_fasta)
@@ -378,10 +400,6 @@ void GraphReference::makeGraph(
         {
             if(current[j].type != ReferenceNode::invalid)
             {
-                if(nodes.size() >= MAX_GRAPHREFERENCE_NODES)
-                {
-                    error("Cannot create reference graph with more than %i nodes (this is determined at compile time).", MAX_GRAPHREFERENCE_NODES);
-                }
                 current_pos[j] = nodes.size();
                 nodes.push_back(current[j]);
                 next_previous.push_back(current_pos[j]);
@@ -506,22 +524,24 @@ void GraphReference::enumeratePaths(
     size_t source,
     size_t sink,
     int max_n_paths,
-    std::vector<uint64_t> * nodes_used_vec,
-    size_t * n_hets
+    std::vector<bitsetutil::DynamicBitset> * nodes_used_vec,
+    size_t * n_hets,
+    Deadline deadline
 )
 {
+    const bool has_deadline = deadline != Deadline::max();
     // make adjacency list from edge list
     std::vector< std::list< size_t > > adj;
     graphutil::adjList(nodes.size(), edges, adj);
 
-    std::vector<uint64_t> node_masks(nodes.size());
+    // index of each het node in the nodes_used masks
+    static const size_t no_het = (size_t)-1;
+    std::vector<size_t> het_index(nodes.size(), no_het);
     size_t hets = 0;
-    uint64_t het_mask = 1;
     size_t homs = 0;
     for(size_t ni = 0; ni < nodes.size(); ++ni)
     {
         auto const & n  = nodes[ni];
-        node_masks[ni] = 0;
 
         bool outside_source_sink = ni < source || (sink != (size_t)-1 && n.start > nodes[sink].start);
         if(n.color == ReferenceNode::black && n.type == ReferenceNode::alternative && !outside_source_sink)
@@ -531,16 +551,11 @@ void GraphReference::enumeratePaths(
         }
         else if(n.color != ReferenceNode::black && n.type == ReferenceNode::alternative && !outside_source_sink)
         {
-            ++hets;
-            if(hets > 63)
-            {
-                error("Maximum number of hets in block exceeded for %s:%i-%i", chr, start, end);
-            }
-            node_masks[ni] = het_mask;
+            het_index[ni] = hets;
 #ifdef _DEBUG_GRAPHREFERENCE
-            std::cerr << "Node " << n << " has mask " << std::bitset<64>(het_mask).to_string() << "\n";
+            std::cerr << "Node " << n << " has het index " << hets << "\n";
 #endif
-            het_mask <<= 1;
+            ++hets;
         }
     }
 
@@ -553,21 +568,32 @@ void GraphReference::enumeratePaths(
     static int bp_id_ctr = 0;
 #endif
 
+    // Paths are stored as a tree of steps with parent pointers. A branchpoint only
+    // keeps the last step of the path that leads to it, so creating a branch doesn't
+    // copy the haplotype or the sequences seen on the path.
+    static const size_t no_step = (size_t)-1;
+    struct PathStep
+    {
+        size_t parent;   // previous step on the path, or no_step
+        size_t node;     // node appended to the haplotype in this step
+        bool has_seq;    // was the sequence after this step recorded for HAP-147?
+        SequenceFingerprint seq;
+    };
+    std::vector<PathStep> steps;
+
     // we assume the reference graph is loop free
     // otherwise, this doesn't really work
     typedef struct _branchpoint
     {
         _branchpoint(size_t _node,
-                     std::list<size_t>::iterator _next_choice,
+                     std::list<size_t>::const_iterator _next_choice,
                      ReferenceNode::color_t _color,
-                     Haplotype const & _up_to_here,
-                     uint64_t _nodes_used,
-                     std::set < std::string > const & _sequences_seen,
+                     size_t _step,
+                     bitsetutil::DynamicBitset const & _nodes_used,
                      size_t _homs_used
         ) :
             node(_node),  next_choice(_next_choice), color(_color),
-            up_to_here(_up_to_here), nodes_used(_nodes_used),
-            sequences_seen(_sequences_seen), homs_used(_homs_used)
+            step(_step), nodes_used(_nodes_used), homs_used(_homs_used)
 #ifdef _DEBUG_GRAPHREFERENCE
             , bp_id(bp_id_ctr++)
 #endif
@@ -575,15 +601,13 @@ void GraphReference::enumeratePaths(
 
         size_t node;  // node to start with
 
-        std::list<size_t>::iterator next_choice; // next edge to go through
+        std::list<size_t>::const_iterator next_choice; // next edge to go through
 
         ReferenceNode::color_t color; // path color for respecting phasing
 
-        Haplotype up_to_here; // observed haplotype up to here
+        size_t step; // last step of the path up to here
 
-        uint64_t nodes_used; // track which nodes were used
-
-        std::set<std::string> sequences_seen; // HAP-147 track sequences we have seen already
+        bitsetutil::DynamicBitset nodes_used; // track which nodes were used
 
         size_t homs_used;  // count the hom variants we have used already
 
@@ -592,15 +616,19 @@ void GraphReference::enumeratePaths(
 #endif
     } branchpoint;
 
-    std::list< branchpoint > hlist;
+    std::deque< branchpoint > hlist;
 
     // generate starting hap block
     ReferenceNode::color_t current_path_color = nodes[source].color;
-    Haplotype ht(chr, _impl->refsq.getFilename().c_str());
+    const Haplotype empty_ht(chr, _impl->refsq.getFilename().c_str());
+    Haplotype ht(empty_ht);
     nodes[source].appendToHaplotype(ht);
-    std::set<std::string> sequences_seen;
-    sequences_seen.insert(ht.seq(start, end));
-    uint64_t nodes_used = node_masks[source];
+    steps.push_back(PathStep{no_step, source, true, sequenceFingerprint(ht.seq(start, end))});
+    bitsetutil::DynamicBitset nodes_used;
+    if(het_index[source] != no_het)
+    {
+        nodes_used.set(het_index[source]);
+    }
     size_t homs_used = 0;
     if(nodes[source].color == ReferenceNode::black && nodes[source].type == ReferenceNode::alternative)
     {
@@ -608,11 +636,17 @@ void GraphReference::enumeratePaths(
     }
 
     // first branch point
-    hlist.push_back(branchpoint(source, adj[source].begin(), current_path_color, ht,
-                                nodes_used, sequences_seen, homs_used));
+    hlist.push_back(branchpoint(source, adj[source].begin(), current_path_color, 0,
+                                nodes_used, homs_used));
 
+    std::vector<size_t> path_nodes;
     while(!hlist.empty() && target.size() < ((size_t)max_n_paths))
     {
+        if(has_deadline && std::chrono::steady_clock::now() > deadline)
+        {
+            throw TimeLimitExceeded("Time limit exceeded when enumerating paths at " + std::string(chr) + ":"
+                                    + std::to_string(start) + "-" + std::to_string(end));
+        }
         branchpoint & current(hlist.front());
 
         // exhaustively go through all the choices from this point on
@@ -623,25 +657,29 @@ void GraphReference::enumeratePaths(
             // through the first branch
             current.next_choice++;
 
-            // copy unique haplotype to start from
+            // rebuild the haplotype to start from
             current_path_color = current.color;
-            ht = current.up_to_here;
+            size_t step = current.step;
             nodes_used = current.nodes_used;
-            sequences_seen = current.sequences_seen;
             homs_used = current.homs_used;
 
+            path_nodes.clear();
+            for(size_t s = step; s != no_step; s = steps[s].parent)
+            {
+                path_nodes.push_back(steps[s].node);
+            }
+            ht = empty_ht;
+            for(auto n = path_nodes.rbegin(); n != path_nodes.rend(); ++n)
+            {
+                nodes[*n].appendToHaplotype(ht);
+            }
+
 #ifdef _DEBUG_GRAPHREFERENCE
             std::cerr << "(Re)starting at bp " << current.bp_id << ": "
-                                               << current.up_to_here.repr()
+                                               << ht.repr()
                                                << " nu: "
-                                               << std::bitset<64>(current.nodes_used).to_string();
-
-            std::cerr << " sequences_seen: ";
-            for (auto x : sequences_seen) {
-                std::cerr << " " << x;
-            }
-
-            std::cerr << "\n";
+                                               << current.nodes_used.to_string()
+                                               << "\n";
 #endif
             bool cont = true;
             while(cont)
@@ -666,32 +704,48 @@ void GraphReference::enumeratePaths(
                 // update path color
                 current_path_color = std::max(nodes[nextone].color, current_path_color);
 
-                nodes[nextone].appendToHaplotype(ht);
-
-                // HAP-147: check that we haven't appended a variant that brought us back
-                //          to a sequence we already observed (e.g. insert an A and then
-                //          delete it again). We assume that VCFs don't contain cases where
-                //          this is valid choice of paths.
-                // Note we only need to do this if we already used het variants. Otherwise,
-                // we don't really have a choice and need to produce the same sequence twice.
-                std::string modified_rp = ht.seq(start, end);
                 // mark that we used this node on this path
-                nodes_used |= node_masks[nextone];
-                if(nodes[nextone].type == ReferenceNode::alternative && nodes_used != 0)
+                if(het_index[nextone] != no_het)
                 {
-                    if(sequences_seen.count(modified_rp))
+                    nodes_used.set(het_index[nextone]);
+                }
+
+                if(nodes[nextone].type == ReferenceNode::alternative)
+                {
+                    nodes[nextone].appendToHaplotype(ht);
+
+                    PathStep next_step{step, nextone, false, SequenceFingerprint()};
+
+                    // HAP-147: check that we haven't appended a variant that brought us back
+                    //          to a sequence we already observed (e.g. insert an A and then
+                    //          delete it again). We assume that VCFs don't contain cases where
+                    //          this is valid choice of paths.
+                    // Note we only need to do this if we already used het variants. Otherwise,
+                    // we don't really have a choice and need to produce the same sequence twice.
+                    if(nodes_used.any())
                     {
-#ifdef _DEBUG_GRAPHREFERENCE
-                        std::cerr << "Ignoring branch where we see the same sequence twice " << start << "-" << end << ": " << modified_rp << " seen: ";
-                        for (auto i : sequences_seen) {
-                            std::cerr << i << ", ";
+                        next_step.has_seq = true;
+                        next_step.seq = sequenceFingerprint(ht.seq(start, end));
+                        bool seen = false;
+                        for(size_t s = step; s != no_step; s = steps[s].parent)
+                        {
+                            if(steps[s].has_seq && steps[s].seq == next_step.seq)
+                            {
+                                seen = true;
+                                break;
+                            }
                         }
-                        std::cerr << "\n";
+                        if(seen)
+                        {
+#ifdef _DEBUG_GRAPHREFERENCE
+                            std::cerr << "Ignoring branch where we see the same sequence twice " << start << "-" << end << ": " << ht.seq(start, end) << "\n";
 #endif
-                        cont = false;
-                        break;
+                            cont = false;
+                            break;
+                        }
                     }
-                    sequences_seen.insert(modified_rp);
+                    step = steps.size();
+                    steps.push_back(next_step);
                 }
 
                 if(nodes[nextone].color == ReferenceNode::black && nodes[nextone].type == ReferenceNode::alternative)
@@ -700,7 +754,7 @@ void GraphReference::enumeratePaths(
                 }
 
 #ifdef _DEBUG_GRAPHREFERENCE
-                std::cerr << "Appending " << nodes[nextone] << " to HT, now: " << modified_rp << "\n";
+                std::cerr << "Appending " << nodes[nextone] << " to HT, now: " << ht.seq(start, end) << "\n";
 #endif
 
                 // end of path?
@@ -720,7 +774,7 @@ void GraphReference::enumeratePaths(
                         std::cerr << "Finished path from BP " << current.bp_id << " at " << target[target.size()-1].seq(start, end);
                         if(nodes_used_vec)
                         {
-                            std::cerr << " u: " << std::bitset<64>((*nodes_used_vec)[nodes_used_vec->size()-1]).to_string();
+                            std::cerr << " u: " << (*nodes_used_vec)[nodes_used_vec->size()-1].to_string();
                         }
                         std::cerr << "\n";
 #endif
@@ -747,9 +801,8 @@ void GraphReference::enumeratePaths(
                         branchpoint(nextone,
                                     std::next(adj[nextone].begin()),
                                     current_path_color,
-                                    ht,
+                                    step,
                                     nodes_used,
-                                    sequences_seen,
                                     homs_used));
 #ifdef _DEBUG_GRAPHREFERENCE
                     std::cerr << "Creating BP " << hlist.back().bp_id << "\n";
@@ -768,7 +821,7 @@ void GraphReference::enumeratePaths(
 
         if(nodes_used_vec != NULL)
         {
-            nodes_used_vec->push_back(0);
+            nodes_used_vec->push_back(bitsetutil::DynamicBitset());
         }
     }
 
@@ -45,6 +45,7 @@
 #include <sstream>
 #include <cassert>
 #include <limits>
+#include <mutex>
 
 using namespace variant;
 
@@ -53,9 +54,12 @@ namespace haplotypes
 
 
 static std::map<std::string, std::shared_ptr<FastaFile> > FS_REF;
+// haplotypes may be created from several threads (e.g. xcmp --threads)
+static std::mutex FS_REF_MUTEX;
 
 void Haplotype::resetRefs()
 {
+    std::lock_guard<std::mutex> l(FS_REF_MUTEX);
     FS_REF.clear();
 }
 
@@ -66,6 +70,7 @@ struct HaplotypeData
     HaplotypeData(std::string _chr, std::string refname) :
         chr(_chr), start(-1), end(-1)
     {
+        std::lock_guard<std::mutex> l(FS_REF_MUTEX);
         auto rf = FS_REF.find(refname);
         if(rf == FS_REF.end())
         {
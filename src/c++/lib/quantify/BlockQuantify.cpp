@@ -42,6 +42,7 @@
 
 #include <htslib/hts.h>
 
+#include <algorithm>
 #include <array>
 #include <list>
 #include <htslib/vcf.h>
@@ -86,6 +87,145 @@ namespace variant {
         return {"xcmp", "ga4gh"};
     }
 
+    QuantifyFields::QuantifyFields(const bcf_hdr_t * hdr) :
+        pass_id(bcf_hdr_id2int(hdr, BCF_DT_ID, "PASS")),
+        bs(hdr, "BS"), regions(hdr, "Regions"),
+        bd(hdr, "BD"), bk(hdr, "BK"), bi(hdr, "BI"), blt(hdr, "BLT"), bvt(hdr, "BVT"), qq(hdr, "QQ")
+    {
+    }
+
+    void QuantifyRecord::read(QuantifyFields const & fields, bcf1_t * v)
+    {
+        for(int s = 0; s < 2; ++s)
+        {
+            bd[s] = fields.bd.getString(v, s);
+            bvt[s] = fields.bvt.getString(v, s);
+            qq[s] = fields.qq.getFloat(v, s);
+            const bcfhelpers::StringRef bk = fields.bk.getString(v, s);
+            const bcfhelpers::StringRef bi = fields.bi.getString(v, s);
+            const bcfhelpers::StringRef blt = fields.blt.getString(v, s);
+            flags[s] = roc::makeObservationFlags(bk.s, bk.len, bi.s, bi.len, blt.s, blt.len);
+        }
+        regions = fields.regions.getString(v);
+    }
+
+    RocSlots::pass_sel_all_t RocIndex::makeRocs(std::string const & prefix, bool with_sel)
+    {
+        static const char * suffixes[] = {":PASS", ":SEL", ":ALL"};
+        RocSlots::pass_sel_all_t result {{-1, -1, -1}};
+        for(int i = 0; i < 3; ++i)
+        {
+            if(i == 1 && !with_sel)
+            {
+                continue;
+            }
+            result[i] = (int)rocs.size();
+            rocs.emplace_back();
+            names.push_back(prefix + suffixes[i]);
+        }
+        return result;
+    }
+
+    int RocIndex::rocType(bcfhelpers::StringRef const & name, bool with_sel)
+    {
+        const std::string missing = ".";
+        for(size_t i = 0; i < slots.size(); ++i)
+        {
+            if(name.missing() ? slots[i].name == missing : name == slots[i].name.c_str())
+            {
+                return (int)i;
+            }
+        }
+        slots.emplace_back();
+        slots.back().name = name.str();
+        slots.back().all = makeRocs("a:" + slots.back().name, with_sel);
+        return (int)slots.size() - 1;
+    }
+
+    std::vector<int> const & RocIndex::regionSet(bcfhelpers::StringRef const & regions)
+    {
+        region_key.assign(regions.s, regions.len);
+        auto it = region_sets.find(region_key);
+        if(it != region_sets.end())
+        {
+            return it->second;
+        }
+        std::vector<int> result;
+        std::vector<std::string> rs;
+        stringutil::split(region_key, rs, ",");
+        for(auto const & r : rs)
+        {
+            if(r == "CONF")
+            {
+                continue;
+            }
+            auto r_it = std::find(region_names.begin(), region_names.end(), r);
+            result.push_back((int)(r_it - region_names.begin()));
+            if(r_it == region_names.end())
+            {
+                region_names.push_back(r);
+            }
+        }
+        return region_sets.emplace(region_key, std::move(result)).first->second;
+    }
+
+    int RocIndex::filterType(const bcf_hdr_t * hdr, int filter_id, std::set<std::string> const & filters_to_ignore)
+    {
+        if(filter_id >= (int)filter_types.size())
+        {
+            filter_types.resize((size_t)filter_id + 1, 0);
+        }
+        int & ftype = filter_types[filter_id];
+        if(ftype == 0)
+        {
+            const std::string filter = bcf_hdr_int2id(hdr, BCF_DT_ID, filter_id);
+            if(filter == "PASS" || filter == "")
+            {
+                ftype = 1;
+            }
+            else if(!filters_to_ignore.count("*") && !filters_to_ignore.count(filter))
+            {
+                ftype = 2;
+            }
+            else
+            {
+                ftype = 3;
+            }
+        }
+        return ftype;
+    }
+
+    int RocIndex::filterRoc(const bcf_hdr_t * hdr, int type, int filter_id, bool ignored)
+    {
+        std::vector<int> & filters = slots[type].filters;
+        if(filter_id >= (int)filters.size())
+        {
+            filters.resize((size_t)filter_id + 1, -1);
+        }
+        if(filters[filter_id] < 0)
+        {
+            filters[filter_id] = (int)rocs.size();
+            rocs.emplace_back();
+            names.push_back("f:" + slots[type].name + ":" + (ignored ? "SEL_IGN_" : "")
+                            + bcf_hdr_int2id(hdr, BCF_DT_ID, filter_id));
+        }
+        return filters[filter_id];
+    }
+
+    RocSlots::pass_sel_all_t const & RocIndex::regionRocs(int type, int region, bool with_sel)
+    {
+        std::vector<RocSlots::pass_sel_all_t> & regions = slots[type].regions;
+        if(region >= (int)regions.size())
+        {
+            regions.resize((size_t)region + 1, RocSlots::pass_sel_all_t {{-1, -1, -1}});
+        }
+        if(regions[region][0] < 0)
+        {
+            regions[region] = makeRocs("s|" + region_names[region] + ":" + slots[type].name, with_sel);
+        }
+        return regions[region];
+    }
+
     BlockQuantify::BlockQuantifyImpl::~BlockQuantifyImpl()
     {
         for(auto x : variants)
@@ -108,9 +248,23 @@ namespace variant {
                                                     params.find("count_unk") != std::string::npos,
                                                     params.find("output_vtc") != std::string::npos,
                                                     params.find("count_homref") != std::string::npos,
-                                                    params.find("extended_counts") != std::string::npos
+                                                    params.find("extended_counts") != std::string::npos,
+                                                    QuantifyFields(),
+                                                    RocIndex(),
+                                                    0,
+                                                    0
         }))
     {
+        auto p1 = params.find("roc_bins:");
+        if(p1 != std::string::npos)
+        {
+            _impl->roc_bins = (size_t)std::stoull(params.substr(p1 + 9));
+        }
+        p1 = params.find("roc_bin_width:");
+        if(p1 != std::string::npos)
+        {
+            _impl->roc_bin_width = std::stod(params.substr(p1 + 14));
+        }
     }
 
     BlockQuantify::~BlockQuantify() {}
@@ -131,14 +285,17 @@ namespace variant {
     }
 
     // add ROC decision point
-    void BlockQuantify::addROCValue(std::string const & roc_identifier,
+    void BlockQuantify::addROCValue(int roc_type,
                                     roc::DecisionType dt,
                                     double level,
                                     uint64_t n,
-                                    bcf1_t * v)
+                                    bcf1_t * v,
+                                    QuantifyRecord const & rec)
     {
+        RocIndex & ri = _impl->roc_index;
+
         // add observation to a roc
-        auto observe = [this, level, dt, n, v](std::string const & name, bool f) {
+        auto observe = [&ri, level, dt, n, &rec](int roc, bool f) {
             roc::DecisionType final_dt = dt;
             if(f)
             {
@@ -165,33 +322,17 @@ namespace variant {
             {
                 case roc::DecisionType::FN:
                 case roc::DecisionType::TP:
-                {
-                    const std::string bk_truth = bcfhelpers::getFormatString(_impl->hdr, v, "BK", 0, ".");
-                    const std::string bi_truth = bcfhelpers::getFormatString(_impl->hdr, v, "BI", 0, ".");
-                    const std::string blt_truth = bcfhelpers::getFormatString(_impl->hdr, v, "BLT", 0, ".");
-                    flags = roc::makeObservationFlags(bk_truth, bi_truth, blt_truth);
+                    flags = rec.flags[0];
                     break;
-                }
                 case roc::DecisionType::FP:
                 case roc::DecisionType::UNK:
                 case roc::DecisionType::TP2:
                 case roc::DecisionType::FN2:
-                {
-                    const std::string bk_query = bcfhelpers::getFormatString(_impl->hdr, v, "BK", 1, ".");
-                    const std::string bi_query = bcfhelpers::getFormatString(_impl->hdr, v, "BI", 1, ".");
-                    const std::string blt_query = bcfhelpers::getFormatString(_impl->hdr, v, "BLT", 1, ".");
-                    flags = roc::makeObservationFlags(bk_query, bi_query, blt_query);
+                    flags = rec.flags[1];
                     break;
-                }
                 default: break;
             }
 
-            auto it = _impl->rocs.find(name);
-            if(it == _impl->rocs.end())
-            {
-                it = _impl->rocs.insert(std::make_pair(name, roc::Roc())).first;
-            }
-
             // make sure FN and N always come first
             if( (   final_dt == roc::DecisionType::FN
                  || final_dt == roc::DecisionType::FN2
@@ -199,65 +340,60 @@ namespace variant {
                 && level == 0
                 )
             {
-                it->second.add(roc::Observation{std::numeric_limits<double>::min(), final_dt, n, flags});
+                ri.rocs[roc].add(roc::Observation{std::numeric_limits<double>::min(), final_dt, n, flags});
             }
             else
             {
-                it->second.add(roc::Observation{level, final_dt, n, flags});
+                ri.rocs[roc].add(roc::Observation{level, final_dt, n, flags});
             }
         };
 
+        const bool with_sel = !_impl->filters_to_ignore.empty();
+
         bcf_unpack(v, BCF_UN_FLT);
         bool fail = false;  // fails any of the non-blocked filters
         bool fail_any = false;  // fails any filter
         for(int j = 0; j < v->d.n_flt; ++j)
         {
-            std::string filter = "PASS";
-            int k = v->d.flt[j];
-            if(k >= 0)
+            const int k = v->d.flt[j];
+            if(k < 0)
             {
-                filter = bcf_hdr_int2id(_impl->hdr, BCF_DT_ID, v->d.flt[j]);
+                continue;
             }
-            if(filter != "PASS" && filter != "")
+            const int ftype = ri.filterType(_impl->hdr, k, _impl->filters_to_ignore);
+            if(ftype == 1)
             {
-                if(!_impl->filters_to_ignore.count("*") && !_impl->filters_to_ignore.count(filter))
-                {
-                    fail = true;
-                    observe("f:" + roc_identifier + ":" + filter, false);
-                }
-                else
-                {
-                    observe("f:" + roc_identifier + ":SEL_IGN_" + filter, false);
-                }
-                fail_any = true;
+                // PASS
+                continue;
+            }
+            if(ftype == 2)
+            {
+                fail = true;
             }
+            observe(ri.filterRoc(_impl->hdr, roc_type, k, ftype == 3), false);
+            fail_any = true;
         }
 
-        observe("a:" + roc_identifier + ":PASS", fail_any);
+        RocSlots::pass_sel_all_t const all = ri.slots[roc_type].all;
+        observe(all[0], fail_any);
         // selectively-filtered ROCs
-        if(!_impl->filters_to_ignore.empty())
+        if(with_sel)
         {
-            observe("a:" + roc_identifier + ":SEL", fail);
+            observe(all[1], fail);
         }
-        observe("a:" + roc_identifier + ":ALL", false);
+        observe(all[2], false);
 
-        const std::string regions = bcfhelpers::getInfoString(_impl->hdr, v, "Regions", "");
-        if(!regions.empty() && regions != "CONF")
+        if(!rec.regions.missing() && rec.regions != "CONF")
         {
-            std::vector<std::string> rs;
-            stringutil::split(regions, rs, ",");
-            for(auto const & r : rs)
+            for(int r : ri.regionSet(rec.regions))
             {
-                if(r == "CONF")
+                RocSlots::pass_sel_all_t const & rr = ri.regionRocs(roc_type, r, with_sel);
+                observe(rr[0], fail_any);
+                if(with_sel)
                 {
-                    continue;
-                }
-                observe("s|" + r + ":" + roc_identifier + ":PASS", fail_any);
-                if(!_impl->filters_to_ignore.empty())
-                {
-                    observe("s|" + r + ":" + roc_identifier + ":SEL", fail);
+                    observe(rr[1], fail);
                 }
-                observe("s|" + r + ":" + roc_identifier + ":ALL", false);
+                observe(rr[2], false);
             }
         }
     }
@@ -270,18 +406,21 @@ namespace variant {
     void BlockQuantify::count()
     {
         _impl->fasta_to_use.reset(new FastaFile(_impl->ref_fasta));
+        // the header may have been updated since we were constructed
+        _impl->fields = QuantifyFields(_impl->hdr);
+        QuantifyFields const & fields = _impl->fields;
 #ifdef DEBUG_BLOCKQUANTIFY
         int lastpos = 0;
         std::cerr << "starting block." << "\n";
 #endif
         auto current_bs_start = _impl->variants.begin();
-        std::string current_chr;
+        int current_chr = -1;
         int current_bs = -1;
         bool current_bs_valid = false;
 
         // function to compute the QQ values for truth variants in the current
         // benchmarking superlocus
-        const auto update_bs_filters = [this, &current_bs_start](BlockQuantifyImpl::variantlist_t::iterator to)
+        const auto update_bs_filters = [this, &fields, &current_bs_start](BlockQuantifyImpl::variantlist_t::iterator to)
         {
             std::set<int> bs_filters;
             for(auto cur = current_bs_start; cur != to; ++cur)
@@ -289,7 +428,7 @@ namespace variant {
                 for(int nf = 0; nf < (*cur)->d.n_flt; ++nf)
                 {
                     const int f = (*cur)->d.flt[nf];
-                    if(f != bcf_hdr_id2int(_impl->hdr, BCF_DT_ID, "PASS"))
+                    if(f != fields.pass_id)
                     {
                         bs_filters.insert(f);
                     }
@@ -303,10 +442,8 @@ namespace variant {
 
             for(auto cur = current_bs_start; cur != to; ++cur)
             {
-                const std::string bdt = bcfhelpers::getFormatString(_impl->hdr, *cur, "BD", 0);
-                const std::string bvq = bcfhelpers::getFormatString(_impl->hdr, *cur, "BVT", 1);
                 // filter TPs where the query call in NOCALL
-                if(bdt == "TP" && bvq == "NOCALL")
+                if(fields.bd.getString(*cur, 0) == "TP" && fields.bvt.getString(*cur, 1) == "NOCALL")
                 {
                     for(auto f : bs_filters)
                     {
@@ -318,19 +455,18 @@ namespace variant {
 
         // function to compute the QQ values for truth variants in the current
         // benchmarking superlocus
-        const auto update_bs_qq = [this, &current_bs_start](BlockQuantifyImpl::variantlist_t::iterator to)
+        const auto update_bs_qq = [this, &fields, &current_bs_start](BlockQuantifyImpl::variantlist_t::iterator to)
         {
             std::vector<float> tp_qqs;
             for(auto cur = current_bs_start; cur != to; ++cur)
             {
-                const float qqq = bcfhelpers::getFormatFloat(_impl->hdr, *cur, "QQ", 1);
+                const float qqq = fields.qq.getFloat(*cur, 1);
                 if(std::isnan(qqq))
                 {
                     continue;
                 }
-                const std::string bd = bcfhelpers::getFormatString(_impl->hdr, *cur, "BD", 1);
                 // we want the scores of all TPs in this BS
-                if(bd == "TP")
+                if(fields.bd.getString(*cur, 1) == "TP")
                 {
                     tp_qqs.push_back(qqq);
                 }
@@ -347,9 +483,9 @@ namespace variant {
             float * fmt = (float*)calloc((size_t) fsize, sizeof(float));
             for(auto cur = current_bs_start; cur != to; ++cur)
             {
-                const std::string bd = bcfhelpers::getFormatString(_impl->hdr, *cur, "BD", 0);
+                const bool is_tp = fields.bd.getString(*cur, 0) == "TP";
                 bcf_get_format_float(_impl->hdr, *cur, "QQ", &fmt, &fsize);
-                if(bd != "TP")
+                if(!is_tp)
                 {
                     fmt[0] = bcfhelpers::missing_float();
                 }
@@ -378,8 +514,8 @@ namespace variant {
             countVariants(*v_it);
 
             // determine benchmarking superlocus
-            const std::string vchr = bcfhelpers::getChrom(_impl->hdr, *v_it);
-            const int vbs = bcfhelpers::getInfoInt(_impl->hdr, *v_it, "BS");
+            const int vchr = (*v_it)->rid;
+            const int vbs = fields.bs.getInt(*v_it);
             if(!current_bs_valid)
             {
                 current_bs = vbs;
@@ -414,6 +550,30 @@ namespace variant {
             // use BD and BVT to make ROCs
             rocEvaluate(v);
         }
+
+        // move the ROCs to the map returned by getRocs
+        RocIndex & ri = _impl->roc_index;
+        for(size_t i = 0; i < ri.rocs.size(); ++i)
+        {
+            auto it = _impl->rocs.find(ri.names[i]);
+            if(it == _impl->rocs.end())
+            {
+                if(_impl->roc_bins > 0)
+                {
+                    it = _impl->rocs.emplace(ri.names[i], roc::Roc(_impl->roc_bins, _impl->roc_bin_width)).first;
+                    it->second.add(ri.rocs[i]);
+                }
+                else
+                {
+                    _impl->rocs.emplace(ri.names[i], std::move(ri.rocs[i]));
+                }
+            }
+            else
+            {
+                it->second.add(ri.rocs[i]);
+            }
+        }
+        ri = RocIndex();
 #ifdef DEBUG_BLOCKQUANTIFY
         std::cerr << "finished block " << lastpos << " - " << _impl->variants.size() << " records on thread " << std::this_thread::get_id() << "\n";
 #endif
@@ -428,47 +588,48 @@ namespace variant {
             // number of samples must be two, first one is truth, second is query
             return;
         }
-        const std::string bd_truth = bcfhelpers::getFormatString(_impl->hdr, v, "BD", 0, ".");
-        const std::string bd_query = bcfhelpers::getFormatString(_impl->hdr, v, "BD", 1, ".");
-        const std::string vt_truth = bcfhelpers::getFormatString(_impl->hdr, v, "BVT", 0, ".");
-        const std::string vt_query = bcfhelpers::getFormatString(_impl->hdr, v, "BVT", 1, ".");
+        QuantifyRecord rec;
+        rec.read(_impl->fields, v);
+        RocIndex & ri = _impl->roc_index;
+        const bool with_sel = !_impl->filters_to_ignore.empty();
 
-        if(vt_truth != "NOCALL")
+        if(rec.bvt[0] != "NOCALL")
         {
-            double qq = bcfhelpers::getFormatFloat(_impl->hdr, v, "QQ", 0);
+            double qq = rec.qq[0];
             if(std::isnan(qq))
             {
                 qq = 0;
             }
 
-            if(bd_truth == "TP")
+            if(rec.bd[0] == "TP")
             {
-                addROCValue(vt_truth, roc::DecisionType::TP, qq, 1, v);
+                addROCValue(ri.rocType(rec.bvt[0], with_sel), roc::DecisionType::TP, qq, 1, v, rec);
             }
-            else if(bd_truth == "FN")
+            else if(rec.bd[0] == "FN")
             {
-                addROCValue(vt_truth, roc::DecisionType::FN, qq, 1, v);
+                addROCValue(ri.rocType(rec.bvt[0], with_sel), roc::DecisionType::FN, qq, 1, v, rec);
             }
         }
 
-        if(vt_query != "NOCALL")
+        if(rec.bvt[1] != "NOCALL")
         {
-            double qq = bcfhelpers::getFormatFloat(_impl->hdr, v, "QQ", 1);
+            double qq = rec.qq[1];
             if(std::isnan(qq))
             {
                 qq = 0;
             }
-            if(bd_query == "FP")
+
+            if(rec.bd[1] == "FP")
             {
-                addROCValue(vt_query, roc::DecisionType::FP, qq, 1, v);
+                addROCValue(ri.rocType(rec.bvt[1], with_sel), roc::DecisionType::FP, qq, 1, v, rec);
             }
-            else if(bd_query == "TP")
+            else if(rec.bd[1] == "TP")
             {
-                addROCValue(vt_query, roc::DecisionType::TP2, qq, 1, v);
+                addROCValue(ri.rocType(rec.bvt[1], with_sel), roc::DecisionType::TP2, qq, 1, v, rec);
             }
-            else if(bd_query == "UNK")
+            else if(rec.bd[1] == "UNK")
             {
-                addROCValue(vt_query, roc::DecisionType::UNK, qq, 1, v);
+                addROCValue(ri.rocType(rec.bvt[1], with_sel), roc::DecisionType::UNK, qq, 1, v, rec);
             }
         }
     }
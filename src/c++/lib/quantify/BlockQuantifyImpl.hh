@@ -45,7 +45,9 @@
 #include <htslib/hts.h>
 
 #include <array>
+#include <deque>
 #include <list>
+#include <unordered_map>
 #include <htslib/vcf.h>
 #include <thread>
 
@@ -54,6 +56,70 @@
 
 namespace variant
 {
+    /** header IDs of the fields we read in count / rocEvaluate */
+    struct QuantifyFields
+    {
+        QuantifyFields() {}
+        explicit QuantifyFields(const bcf_hdr_t * hdr);
+
+        int pass_id = -1;
+        bcfhelpers::InfoAccessor bs, regions;
+        bcfhelpers::FormatAccessor bd, bk, bi, blt, bvt, qq;
+    };
+
+    /** field values of a record, sample 0 is the truth, 1 is the query */
+    struct QuantifyRecord
+    {
+        void read(QuantifyFields const & fields, bcf1_t * v);
+
+        bcfhelpers::StringRef bd[2], bvt[2];
+        float qq[2];
+        uint64_t flags[2];  // see roc::makeObservationFlags
+        bcfhelpers::StringRef regions;
+    };
+
+    /** indexes into RocIndex::rocs for one ROC identifier (variant type), -1 if not created */
+    struct RocSlots
+    {
+        typedef std::array<int, 3> pass_sel_all_t;  // <prefix>:PASS, <prefix>:SEL, <prefix>:ALL
+
+        std::string name;
+        pass_sel_all_t all;                         // a:<name>:...
+        std::vector<pass_sel_all_t> regions;        // s|<region>:<name>:..., by region index
+        std::vector<int> filters;                   // f:<name>:<filter>, by header filter ID
+    };
+
+    /**
+     * ROCs for a block. Each combination of ROC identifier, stratification
+     * region and filter is given an index the first time we see it, records
+     * then only need integer lookups to find their ROCs.
+     */
+    struct RocIndex
+    {
+        std::deque<roc::Roc> rocs;
+        std::vector<std::string> names;
+        std::vector<RocSlots> slots;
+        std::vector<std::string> region_names;
+        // region indices for each value of the Regions INFO field
+        std::unordered_map<std::string, std::vector<int>> region_sets;
+        std::string region_key;
+        // by header filter ID: 0 = not seen yet, 1 = PASS, 2 = fails, 3 = ignored in SEL ROCs
+        std::vector<int> filter_types;
+
+        /** add ROCs <prefix>:PASS/SEL/ALL, SEL only if with_sel is true */
+        RocSlots::pass_sel_all_t makeRocs(std::string const & prefix, bool with_sel);
+        /** index into slots for a ROC identifier */
+        int rocType(bcfhelpers::StringRef const & name, bool with_sel);
+        /** region indices for a Regions INFO value, without CONF */
+        std::vector<int> const & regionSet(bcfhelpers::StringRef const & regions);
+        /** the type of a filter, see filter_types */
+        int filterType(const bcf_hdr_t * hdr, int filter_id, std::set<std::string> const & filters_to_ignore);
+        /** index of the f:<name>:<filter> ROC */
+        int filterRoc(const bcf_hdr_t * hdr, int type, int filter_id, bool ignored);
+        /** index of the s|<region>:<name>:... ROCs */
+        RocSlots::pass_sel_all_t const & regionRocs(int type, int region, bool with_sel);
+    };
+
     struct BlockQuantify::BlockQuantifyImpl
     {
         ~BlockQuantifyImpl();
@@ -78,6 +144,13 @@ namespace variant
         bool output_vtc;
         bool count_homref;
         bool extended_counts;
+
+        QuantifyFields fields;
+        RocIndex roc_index;
+
+        // bin ROC observations when roc_bins > 0, see roc::Roc(size_t, double)
+        size_t roc_bins;
+        double roc_bin_width;
     };
 }
 
@@ -37,262 +37,856 @@
 #include <boost/iostreams/filtering_streambuf.hpp>
 #include <boost/iostreams/copy.hpp>
 #include <boost/iostreams/filter/gzip.hpp>
+#include <boost/iostreams/device/mapped_file.hpp>
 
 #include "QuantifyRegions.hh"
 
-#include "helpers/IntervalBuffer.hh"
 #include "helpers/BCFHelpers.hh"
 
+#include <algorithm>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <limits>
 #include <map>
 #include <unordered_map>
+#include <unordered_set>
 
 #include "Error.hh"
 
+/**
+ * Stratification index (see QuantifyRegions::buildIndex)
+ *
+ * Layout: StratHeader, nlabels x StratLabel, ncontigs x StratContig, label and
+ * contig names, the table of label sets (nsets x set_words bitsets), and for each
+ * contig the segment start positions followed by the label set of each segment.
+ * Segment i covers [starts[i], starts[i+1]), the last segment has no labels.
+ * Labels are sorted by name.
+ */
+static const char STRAT_MAGIC[8] = {'H', 'A', 'P', 'S', 'T', 'R', 'A', '\1'};
+
+struct StratHeader
+{
+    char magic[8];
+    uint64_t nlabels;
+    uint64_t ncontigs;
+    uint64_t nsets;
+    uint64_t set_words;
+    uint64_t sets_offset;
+};
+
+struct StratLabel
+{
+    uint64_t name_offset;
+    uint64_t name_length;
+    uint64_t size;
+};
+
+struct StratContig
+{
+    uint64_t name_offset;
+    uint64_t name_length;
+    uint64_t nsegments;
+    uint64_t starts_offset;
+    uint64_t segment_sets_offset;
+    // labels for zero-length variants on this contig
+    uint64_t zero_length_set;
+};
 namespace variant
 {
-    struct QuantifyRegions::QuantifyRegionsImpl
+    namespace
     {
-        std::vector<std::string> names;
-        std::unordered_map<std::string, size_t> label_map;
-        std::unordered_map<std::string, std::unique_ptr<intervals::IntervalBuffer>> ib;
-        std::unordered_map<std::string, std::unique_ptr<intervals::IntervalBuffer>>::iterator current_chr = ib.end();
-        std::unordered_map<size_t, size_t> region_sizes;
-        int64_t current_pos = -1;
-    };
-
-    QuantifyRegions::QuantifyRegions() : _impl(new QuantifyRegionsImpl())
-    { }
+        struct Interval
+        {
+            int64_t start;
+            int64_t stop;
+            size_t label_id;
+        };
 
-    QuantifyRegions::~QuantifyRegions()
-    { }
+        typedef std::map<std::string, std::vector<Interval>> intervals_t;
 
-    /**
-     * Returns true if regions were loaded.
-     *
-     * Note that this will also return true when an empty bed file was loaded.
-     * This is intentional to distinguish the case where we don't have confident
-     * regions (everything unknown is a FP) from the one where the confident
-     * region file is empty (every FP is unknown).
-     */
-    bool QuantifyRegions::hasRegions(std::string const & rname) const
-    {
-        return _impl->label_map.find(rname) != _impl->label_map.cend();
-    }
+        /** elementary segments on a contig, segment i covers [starts[i], starts[i+1]) */
+        struct ContigSegments
+        {
+            const int64_t * starts;
+            const uint32_t * sets;
+            uint64_t nsegments;
+            // labels for zero-length variants on this contig
+            uint64_t zero_length_set;
+        };
 
-    void QuantifyRegions::load(std::vector<std::string> const &rnames, bool fixchr)
-    {
-        std::unordered_map<std::string, size_t> label_map;
-        for (std::string const &f : rnames)
+        /**
+         * Label sets for all segments between breakpoints of a set of regions.
+         *
+         * Lookups keep a cursor on the current contig, so for sorted records
+         * annotation is a cursor advance rather than one query per label.
+         */
+        struct SegmentTable
         {
-            std::vector<std::string> v;
-            stringutil::split(f, v, ":");
-            bool fixed_label = false;
+            // label name for each bit, in sorted order
+            std::vector<std::string> names;
+            uint64_t set_words = 0;
+            const uint64_t * sets = nullptr;
+            std::unordered_map<std::string, ContigSegments> contigs;
 
-            std::string filename, label = "";
+            std::string current_chr;
+            bool has_current_chr = false;
+            ContigSegments const * current = nullptr;
+            uint64_t cursor = 0;
 
-            // in case someone passes a ":"
-            if (v.size() == 0)
+            /** forget the current contig, must be called when contigs change */
+            void reset()
             {
-                error("Invalid region name: %s", f.c_str());
+                has_current_chr = false;
+                current = nullptr;
             }
 
-            if (v.size() > 1)
+            /**
+             * Add labels overlapping [refstart, refend] to labels
+             * @return true if any labels were added
+             */
+            bool lookup(std::string const & chr, int64_t refstart, int64_t refend, std::vector<uint64_t> & labels)
             {
-                label = v[0];
-                filename = v[1];
-                if(label[0] == '=')
+                if(!has_current_chr || chr != current_chr)
                 {
-                    label = label.substr(1);
-                    fixed_label = true;
+                    // also remember contigs we don't have segments for
+                    current_chr = chr;
+                    has_current_chr = true;
+                    cursor = 0;
+                    auto it = contigs.find(chr);
+                    current = it == contigs.end() ? nullptr : &it->second;
                 }
-                if(label == "CONF")
+                if(current == nullptr)
                 {
-                    fixed_label = true;
+                    return false;
                 }
+
+                const auto add_set = [this, &labels](uint64_t set)
+                {
+                    const uint64_t * bits = sets + set*set_words;
+                    for(uint64_t w = 0; w < set_words; ++w)
+                    {
+                        labels[w] |= bits[w];
+                    }
+                };
+
+                if(refend < refstart)
+                {
+                    // intervals of zero length count as covered
+                    add_set(current->zero_length_set);
+                }
+                else
+                {
+                    addSegments(refstart, refend, add_set);
+                }
+                for(uint64_t w = 0; w < set_words; ++w)
+                {
+                    if(labels[w] != 0)
+                    {
+                        return true;
+                    }
+                }
+                return false;
             }
-            else
+
+            /** call add_set for the sets of all segments overlapping [refstart, refend] on the current contig */
+            template<typename F>
+            void addSegments(int64_t refstart, int64_t refend, F const & add_set)
             {
-                filename = v[0];
-                label = boost::filesystem::path(filename).stem().string();
+                const int64_t * starts = current->starts;
+                const uint64_t n = current->nsegments;
+                if(cursor >= n || starts[cursor] > refstart)
+                {
+                    // records out of order
+                    cursor = (uint64_t) (std::upper_bound(starts, starts + n, refstart) - starts);
+                    cursor = cursor > 0 ? cursor - 1 : 0;
+                }
+                else
+                {
+                    // step forward, skip larger distances using binary search
+                    for(int steps = 0; cursor + 1 < n && starts[cursor + 1] <= refstart; ++steps)
+                    {
+                        if(steps == 8)
+                        {
+                            cursor = (uint64_t) (std::upper_bound(starts + cursor, starts + n, refstart) - starts) - 1;
+                            break;
+                        }
+                        ++cursor;
+                    }
+                }
+                for(uint64_t i = cursor; i < n && starts[i] <= refend; ++i)
+                {
+                    add_set(current->sets[i]);
+                }
             }
+        };
 
-            htsFile *bedfile = NULL;
-
-            if (stringutil::endsWith(filename, ".gz"))
+        /** segments computed from intervals in memory */
+        struct SegmentStorage
+        {
+            struct Contig
             {
-                bedfile = hts_open(filename.c_str(), "rz");
-            }
-            else
+                std::vector<int64_t> starts;
+                std::vector<uint32_t> sets;
+                uint64_t zero_length_set;
+            };
+
+            // label id for each bit, sorted by label name
+            std::vector<size_t> order;
+            uint64_t set_words = 1;
+            // nsets x set_words bitsets, set 0 is empty
+            std::vector<uint64_t> sets;
+            std::map<std::string, Contig> contigs;
+
+            /** make a SegmentTable for this */
+            void makeTable(std::vector<std::string> const & names, SegmentTable & table) const
             {
-                bedfile = hts_open(filename.c_str(), "r");
+                table.names.clear();
+                for(size_t l : order)
+                {
+                    table.names.push_back(names[l]);
+                }
+                table.set_words = set_words;
+                table.sets = sets.data();
+                table.contigs.clear();
+                for(auto const & c : contigs)
+                {
+                    table.contigs[c.first] = ContigSegments{c.second.starts.data(), c.second.sets.data(),
+                                                            (uint64_t) c.second.starts.size(),
+                                                            c.second.zero_length_set};
+                }
+                table.reset();
             }
+        };
 
-            size_t icount = 0;
-            kstring_t l;
-            l.l = l.m = 0;
-            l.s = NULL;
-            size_t label_id;
-            auto li_it = label_map.find(label);
-            if (li_it == label_map.end())
+        /**
+         * Sweep over the start / end points of all intervals and record the set
+         * of labels covering each elementary segment.
+         *
+         * @param intervals intervals by contig, these are cleared
+         * @param names label names
+         * @param segments output
+         */
+        void makeSegments(intervals_t & intervals, std::vector<std::string> const & names,
+                          SegmentStorage & segments)
+        {
+            // label bits are sorted by name, so annotations are sorted also
+            segments.order.resize(names.size());
+            for(size_t i = 0; i < names.size(); ++i)
             {
-                label_id = _impl->names.size();
-                _impl->names.push_back(label);
-                label_map[label] = label_id;
+                segments.order[i] = i;
             }
-            else
+            std::sort(segments.order.begin(), segments.order.end(),
+                      [&names](size_t a, size_t b) { return names[a] < names[b]; });
+            std::vector<size_t> rank(names.size());
+            for(size_t i = 0; i < names.size(); ++i)
             {
-                label_id = li_it->second;
+                rank[segments.order[i]] = i;
             }
-            while (hts_getline(bedfile, 2, &l) > 0)
+
+            const uint64_t words = std::max((uint64_t) 1, (uint64_t) (names.size() + 63) / 64);
+            segments.set_words = words;
+            segments.sets.clear();
+            segments.contigs.clear();
+            // set ids, hashed / compared by their bits in segments.sets
+            std::vector<uint64_t> & sets = segments.sets;
+            const auto set_hash = [&sets, words](uint64_t id) -> size_t
             {
-                std::string line(l.s);
-                v.clear();
-                stringutil::split(line, v, "\t");
-                // we want >= 3 columns
-                if (v.size() >= 3)
+                uint64_t h = 0;
+                for(uint64_t w = 0; w < words; ++w)
+                {
+                    h = (h ^ sets[id*words + w]) * 0x100000001b3ULL;
+                    h ^= h >> 29;
+                }
+                return (size_t) h;
+            };
+            const auto set_equal = [&sets, words](uint64_t a, uint64_t b) -> bool
+            {
+                return std::equal(sets.begin() + a*words, sets.begin() + (a + 1)*words, sets.begin() + b*words);
+            };
+            std::unordered_set<uint64_t, decltype(set_hash), decltype(set_equal)> set_ids(1024, set_hash, set_equal);
+            const auto set_id = [&sets, &set_ids, words](std::vector<uint64_t> const & set) -> uint64_t
+            {
+                // add as a new set, remove again if we have seen it before
+                const uint64_t id = sets.size() / words;
+                sets.insert(sets.end(), set.begin(), set.end());
+                auto r = set_ids.insert(id);
+                if(!r.second)
+                {
+                    sets.resize(id*words);
+                }
+                return *r.first;
+            };
+            set_id(std::vector<uint64_t>(words, 0));
+
+            for(auto & c : intervals)
+            {
+                // +(bit + 1) at start, -(bit + 1) after stop
+                std::vector<std::pair<int64_t, int64_t>> events;
+                events.reserve(c.second.size() * 2);
+                size_t max_label = 0;
+                for(auto const & i : c.second)
+                {
+                    events.emplace_back(i.start, (int64_t) rank[i.label_id] + 1);
+                    events.emplace_back(i.stop + 1, -((int64_t) rank[i.label_id] + 1));
+                    max_label = std::max(max_label, i.label_id);
+                }
+                c.second.clear();
+                c.second.shrink_to_fit();
+                std::sort(events.begin(), events.end(),
+                          [](std::pair<int64_t, int64_t> const & a, std::pair<int64_t, int64_t> const & b)
+                          {
+                              return a.first < b.first;
+                          });
+
+                SegmentStorage::Contig & contig = segments.contigs[c.first];
+
+                // variants with end < start are reported in all labels with
+                // ids up to the largest one on the contig (same as IntervalBuffer)
+                std::vector<uint64_t> current(words, 0);
+                for(size_t l = 0; l <= max_label; ++l)
+                {
+                    current[rank[l] / 64] |= ((uint64_t) 1) << (rank[l] % 64);
+                }
+                contig.zero_length_set = set_id(current);
+
+                std::fill(current.begin(), current.end(), 0);
+                std::vector<int64_t> coverage(names.size(), 0);
+                uint64_t current_id = 0;
+                auto e_it = events.begin();
+                while(e_it != events.end())
                 {
-                    if (fixchr)
+                    const int64_t pos = e_it->first;
+                    for(; e_it != events.end() && e_it->first == pos; ++e_it)
                     {
-                        if(v[0].size() > 0 && (
-                            v[0].at(0) == '1' ||
-                            v[0].at(0) == '2' ||
-                            v[0].at(0) == '3' ||
-                            v[0].at(0) == '4' ||
-                            v[0].at(0) == '5' ||
-                            v[0].at(0) == '6' ||
-                            v[0].at(0) == '7' ||
-                            v[0].at(0) == '8' ||
-                            v[0].at(0) == '9' ||
-                            v[0].at(0) == 'X' ||
-                            v[0].at(0) == 'Y' ||
-                            v[0].at(0) == 'M' ))
+                        const size_t l = (size_t) std::abs(e_it->second) - 1;
+                        coverage[l] += e_it->second > 0 ? 1 : -1;
+                        if(coverage[l] > 0)
                         {
-                            v[0] = std::string("chr") + v[0];
+                            current[l / 64] |= ((uint64_t) 1) << (l % 64);
+                        }
+                        else
+                        {
+                            current[l / 64] &= ~(((uint64_t) 1) << (l % 64));
                         }
                     }
-                    auto chr_it = _impl->ib.find(v[0]);
-                    if (chr_it == _impl->ib.end())
+                    const uint64_t id = set_id(current);
+                    if(contig.starts.empty() || id != current_id)
+                    {
+                        contig.starts.push_back(pos);
+                        contig.sets.push_back((uint32_t) id);
+                        current_id = id;
+                    }
+                }
+                if(set_ids.size() > std::numeric_limits<uint32_t>::max())
+                {
+                    error("Too many combinations of stratification regions.");
+                }
+            }
+        }
+
+        /**
+         * Read named bed files, see QuantifyRegions::load
+         *
+         * @param rnames region names and files
+         * @param fixchr add chr prefix to contig names
+         * @param names label names, new labels are appended
+         * @param label_map label name -> index in names
+         * @param region_sizes label index -> total size of the intervals
+         * @param intervals intervals by contig, new intervals are appended
+         */
+        void readRegions(std::vector<std::string> const & rnames, bool fixchr,
+                         std::vector<std::string> & names,
+                         std::unordered_map<std::string, size_t> & label_map,
+                         std::unordered_map<size_t, size_t> & region_sizes,
+                         intervals_t & intervals)
+        {
+            for (std::string const &f : rnames)
+            {
+                std::vector<std::string> v;
+                stringutil::split(f, v, ":");
+                bool fixed_label = false;
+
+                std::string filename, label = "";
+
+                // in case someone passes a ":"
+                if (v.size() == 0)
+                {
+                    error("Invalid region name: %s", f.c_str());
+                }
+
+                if (v.size() > 1)
+                {
+                    label = v[0];
+                    filename = v[1];
+                    if(label[0] == '=')
                     {
-                        chr_it = _impl->ib.emplace(
-                            v[0],
-                            std::move(
-                                std::unique_ptr<intervals::IntervalBuffer>(new intervals::IntervalBuffer()))).first;
+                        label = label.substr(1);
+                        fixed_label = true;
                     }
-                    // intervals are both zero-based
-                    try
+                    if(label == "CONF")
                     {
+                        fixed_label = true;
+                    }
+                }
+                else
+                {
+                    filename = v[0];
+                    label = boost::filesystem::path(filename).stem().string();
+                }
 
-                        int64_t start = (int64_t) std::stoll(v[1]), stop = (int64_t) (std::stoll(v[2]) - 1);
-                        if (start > stop)
+                htsFile *bedfile = NULL;
+
+                if (stringutil::endsWith(filename, ".gz"))
+                {
+                    bedfile = hts_open(filename.c_str(), "rz");
+                }
+                else
+                {
+                    bedfile = hts_open(filename.c_str(), "r");
+                }
+
+                size_t icount = 0;
+                kstring_t l;
+                l.l = l.m = 0;
+                l.s = NULL;
+                size_t label_id;
+                auto li_it = label_map.find(label);
+                if (li_it == label_map.end())
+                {
+                    label_id = names.size();
+                    names.push_back(label);
+                    label_map[label] = label_id;
+                }
+                else
+                {
+                    label_id = li_it->second;
+                }
+                while (hts_getline(bedfile, 2, &l) > 0)
+                {
+                    std::string line(l.s);
+                    v.clear();
+                    stringutil::split(line, v, "\t");
+                    // we want >= 3 columns
+                    if (v.size() >= 3)
+                    {
+                        if (fixchr)
                         {
-                            std::cerr << "[W] ignoring invalid interval in " << filename << " : " << line << "\n";
-                            continue;
+                            if(v[0].size() > 0 && (
+                                v[0].at(0) == '1' ||
+                                v[0].at(0) == '2' ||
+                                v[0].at(0) == '3' ||
+                                v[0].at(0) == '4' ||
+                                v[0].at(0) == '5' ||
+                                v[0].at(0) == '6' ||
+                                v[0].at(0) == '7' ||
+                                v[0].at(0) == '8' ||
+                                v[0].at(0) == '9' ||
+                                v[0].at(0) == 'X' ||
+                                v[0].at(0) == 'Y' ||
+                                v[0].at(0) == 'M' ))
+                            {
+                                v[0] = std::string("chr") + v[0];
+                            }
                         }
+                        // intervals are both zero-based
+                        try
+                        {
 
-                        size_t this_label_id = label_id;
-                        if(!fixed_label && v.size() > 3) {
-                            const std::string entry_label = label + "_" + v[3];
-                            auto li_it2 = label_map.find(entry_label);
-                            if (li_it2 == label_map.end())
+                            int64_t start = (int64_t) std::stoll(v[1]), stop = (int64_t) (std::stoll(v[2]) - 1);
+                            if (start > stop)
                             {
-                                this_label_id = _impl->names.size();
-                                _impl->names.push_back(entry_label);
-                                label_map[entry_label] = this_label_id;
+                                std::cerr << "[W] ignoring invalid interval in " << filename << " : " << line << "\n";
+                                continue;
                             }
-                            else
-                            {
-                                this_label_id = li_it2->second;
+
+                            size_t this_label_id = label_id;
+                            if(!fixed_label && v.size() > 3) {
+                                const std::string entry_label = label + "_" + v[3];
+                                auto li_it2 = label_map.find(entry_label);
+                                if (li_it2 == label_map.end())
+                                {
+                                    this_label_id = names.size();
+                                    names.push_back(entry_label);
+                                    label_map[entry_label] = this_label_id;
+                                }
+                                else
+                                {
+                                    this_label_id = li_it2->second;
+                                }
                             }
-                        }
-                        auto size_it = _impl->region_sizes.find(this_label_id);
-                        if(size_it == _impl->region_sizes.end())
-                        {
-                            _impl->region_sizes[this_label_id] = (unsigned long) (stop - start + 1);
-                        }
-                        else
-                        {
-                            size_it->second += (unsigned long) (stop - start + 1);
-                        }
-                        chr_it->second->addInterval(start, stop, this_label_id);
-                        if(this_label_id != label_id)
-                        {
-                            // also add to total for this bed file
-                            size_it = _impl->region_sizes.find(label_id);
-                            if(size_it == _impl->region_sizes.end())
+                            auto size_it = region_sizes.find(this_label_id);
+                            if(size_it == region_sizes.end())
                             {
-                                _impl->region_sizes[label_id] = (unsigned long) (stop - start + 1);
+                                region_sizes[this_label_id] = (unsigned long) (stop - start + 1);
                             }
                             else
                             {
                                 size_it->second += (unsigned long) (stop - start + 1);
                             }
-                            chr_it->second->addInterval(start, stop, label_id);
+                            intervals[v[0]].push_back(Interval{start, stop, this_label_id});
+                            if(this_label_id != label_id)
+                            {
+                                // also add to total for this bed file
+                                size_it = region_sizes.find(label_id);
+                                if(size_it == region_sizes.end())
+                                {
+                                    region_sizes[label_id] = (unsigned long) (stop - start + 1);
+                                }
+                                else
+                                {
+                                    size_it->second += (unsigned long) (stop - start + 1);
+                                }
+                                intervals[v[0]].push_back(Interval{start, stop, label_id});
+                            }
+                            ++icount;
+                        }
+                        catch (std::invalid_argument const &)
+                        {
+                            std::cerr << "[W] ignoring invalid interval in " << filename << " : " << line << "\n";
+                        }
+                        catch (std::out_of_range const &)
+                        {
+                            std::cerr << "[W] ignoring invalid interval in " << filename << " : " << line << "\n";
                         }
-                        ++icount;
-                    }
-                    catch (std::invalid_argument const &)
-                    {
-                        std::cerr << "[W] ignoring invalid interval in " << filename << " : " << line << "\n";
                     }
-                    catch (std::out_of_range const &)
+                    else if (line != "" && line != "\n")
                     {
-                        std::cerr << "[W] ignoring invalid interval in " << filename << " : " << line << "\n";
+                        std::cerr << "[W] ignoring mis-formatted input line in " << filename << " : " << line << "\n";
                     }
                 }
-                else if (line != "" && line != "\n")
-                {
-                    std::cerr << "[W] ignoring mis-formatted input line in " << filename << " : " << line << "\n";
-                }
+                free(l.s);
+                hts_close(bedfile);
+                std::cerr << "Added region file '" << filename << "' as '" << label << "' (" << icount << " intervals)" <<
+                "\n";
             }
-            free(l.s);
-            hts_close(bedfile);
-            std::cerr << "Added region file '" << filename << "' as '" << label << "' (" << icount << " intervals)" <<
-            "\n";
         }
-        _impl->label_map = label_map;
+    }
+
+    struct QuantifyRegions::QuantifyRegionsImpl
+    {
+        std::vector<std::string> names;
+        std::unordered_map<std::string, size_t> label_map;
+        std::unordered_map<size_t, size_t> region_sizes;
+
+        // intervals from bed files, these are turned into segments before the first annotation
+        intervals_t intervals;
+        bool segments_built = false;
+        std::shared_ptr<SegmentStorage> bed_segments;
+        SegmentTable beds;
+
+        // stratification index
+        boost::iostreams::mapped_file_source index;
+        std::unordered_map<std::string, size_t> index_label_map;
+        std::vector<uint64_t> index_sizes;
+        SegmentTable index_segments;
+
+        std::vector<uint64_t> bed_labels;
+        std::vector<uint64_t> index_labels;
+
+        void buildSegments()
+        {
+            if(segments_built)
+            {
+                return;
+            }
+            bed_segments = std::make_shared<SegmentStorage>();
+            makeSegments(intervals, names, *bed_segments);
+            bed_segments->makeTable(names, beds);
+            bed_labels.resize(bed_segments->set_words);
+            segments_built = true;
+        }
+    };
+
+    QuantifyRegions::QuantifyRegions() : _impl(new QuantifyRegionsImpl())
+    { }
+
+    QuantifyRegions::QuantifyRegions(QuantifyRegions const & rhs)
+    {
+        // segments are shared, so they must be built before copying
+        rhs._impl->buildSegments();
+        _impl.reset(new QuantifyRegionsImpl(*rhs._impl));
+        _impl->beds.reset();
+        _impl->index_segments.reset();
+    }
+
+    QuantifyRegions & QuantifyRegions::operator=(QuantifyRegions const & rhs)
+    {
+        if(&rhs != this)
+        {
+            rhs._impl->buildSegments();
+            _impl.reset(new QuantifyRegionsImpl(*rhs._impl));
+            _impl->beds.reset();
+            _impl->index_segments.reset();
+        }
+        return *this;
+    }
+
+    QuantifyRegions::~QuantifyRegions()
+    { }
+
+    /**
+     * Returns true if regions were loaded.
+     *
+     * Note that this will also return true when an empty bed file was loaded.
+     * This is intentional to distinguish the case where we don't have confident
+     * regions (everything unknown is a FP) from the one where the confident
+     * region file is empty (every FP is unknown).
+     */
+    bool QuantifyRegions::hasRegions(std::string const & rname) const
+    {
+        return _impl->label_map.find(rname) != _impl->label_map.cend()
+            || _impl->index_label_map.find(rname) != _impl->index_label_map.cend();
+    }
+
+    void QuantifyRegions::load(std::vector<std::string> const &rnames, bool fixchr)
+    {
+        if(_impl->segments_built)
+        {
+            error("Regions must be loaded before annotating variants.");
+        }
+        readRegions(rnames, fixchr, _impl->names, _impl->label_map, _impl->region_sizes, _impl->intervals);
+        for(auto const & l : _impl->label_map)
+        {
+            if(_impl->index_label_map.count(l.first))
+            {
+                error("Region %s is present in the stratification index and in a bed file.", l.first.c_str());
+            }
+        }
+    }
+
+    void QuantifyRegions::buildIndex(std::vector<std::string> const & rnames,
+                                     std::string const & filename,
+                                     bool fixchr)
+    {
+        std::vector<std::string> names;
+        std::unordered_map<std::string, size_t> label_map;
+        std::unordered_map<size_t, size_t> region_sizes;
+        intervals_t intervals;
+        readRegions(rnames, fixchr, names, label_map, region_sizes, intervals);
+        SegmentStorage segments;
+        makeSegments(intervals, names, segments);
+
+        StratHeader header;
+        memcpy(header.magic, STRAT_MAGIC, sizeof(STRAT_MAGIC));
+        header.nlabels = names.size();
+        header.ncontigs = segments.contigs.size();
+        header.nsets = segments.sets.size() / segments.set_words;
+        header.set_words = segments.set_words;
+
+        std::string strings;
+        std::vector<StratLabel> labels;
+        for(size_t i : segments.order)
+        {
+            StratLabel sl;
+            memset(&sl, 0, sizeof(StratLabel));
+            sl.name_offset = strings.size();
+            sl.name_length = names[i].size();
+            auto size_it = region_sizes.find(i);
+            sl.size = size_it == region_sizes.end() ? 0 : size_it->second;
+            strings += names[i];
+            labels.push_back(sl);
+        }
+        std::vector<StratContig> contigs;
+        for(auto const & c : segments.contigs)
+        {
+            StratContig sc;
+            memset(&sc, 0, sizeof(StratContig));
+            sc.name_offset = strings.size();
+            sc.name_length = c.first.size();
+            strings += c.first;
+            contigs.push_back(sc);
+        }
+
+        const boost::filesystem::path temp_name = boost::filesystem::unique_path(filename + ".%%%%-%%%%");
+        std::ofstream out(temp_name.c_str(), std::ios::binary);
+        const auto align = [&out]() {
+            while(out.tellp() % 8)
+            {
+                out.put(0);
+            }
+        };
+        const uint64_t strings_offset = sizeof(StratHeader)
+                                      + labels.size() * sizeof(StratLabel)
+                                      + contigs.size() * sizeof(StratContig);
+        out.seekp((std::streamoff) strings_offset);
+        out.write(strings.c_str(), (std::streamsize) strings.size());
+        align();
+
+        header.sets_offset = (uint64_t) out.tellp();
+        out.write((const char *) segments.sets.data(), (std::streamsize) (segments.sets.size() * sizeof(uint64_t)));
+
+        auto sc_it = contigs.begin();
+        for(auto const & c : segments.contigs)
+        {
+            StratContig & sc = *sc_it++;
+            sc.name_offset += strings_offset;
+            sc.nsegments = c.second.starts.size();
+            sc.zero_length_set = c.second.zero_length_set;
+            sc.starts_offset = (uint64_t) out.tellp();
+            out.write((const char *) c.second.starts.data(),
+                      (std::streamsize) (c.second.starts.size() * sizeof(int64_t)));
+            sc.segment_sets_offset = (uint64_t) out.tellp();
+            out.write((const char *) c.second.sets.data(),
+                      (std::streamsize) (c.second.sets.size() * sizeof(uint32_t)));
+            align();
+        }
+        for(auto & sl : labels)
+        {
+            sl.name_offset += strings_offset;
+        }
+
+        out.seekp(0);
+        out.write((const char *) &header, sizeof(StratHeader));
+        out.write((const char *) labels.data(), (std::streamsize) (labels.size() * sizeof(StratLabel)));
+        out.write((const char *) contigs.data(), (std::streamsize) (contigs.size() * sizeof(StratContig)));
+        out.close();
+        if(!out)
+        {
+            boost::filesystem::remove(temp_name);
+            error("Cannot write %s", filename.c_str());
+        }
+        boost::filesystem::rename(temp_name, filename);
+        std::cerr << "Wrote stratification index " << filename << " (" << names.size() << " labels, "
+                  << header.nsets << " label sets)" << "\n";
+    }
+
+    void QuantifyRegions::loadIndex(std::string const & filename)
+    {
+        if(_impl->index.is_open())
+        {
+            error("Only one stratification index can be loaded.");
+        }
+        try
+        {
+            _impl->index.open(filename);
+        }
+        catch(std::exception const & e)
+        {
+            error("Cannot map stratification index %s: %s", filename.c_str(), e.what());
+        }
+
+        const char * data = _impl->index.data();
+        const uint64_t size = (uint64_t) _impl->index.size();
+        const StratHeader * header = (const StratHeader *) data;
+        if(size < sizeof(StratHeader) || memcmp(header->magic, STRAT_MAGIC, sizeof(STRAT_MAGIC)) != 0
+           || size < sizeof(StratHeader) + header->nlabels * sizeof(StratLabel) + header->ncontigs * sizeof(StratContig)
+           || size < header->sets_offset + header->nsets * header->set_words * sizeof(uint64_t))
+        {
+            _impl->index.close();
+            error("Invalid stratification index %s", filename.c_str());
+        }
+
+        SegmentTable & table = _impl->index_segments;
+        const StratLabel * labels = (const StratLabel *) (data + sizeof(StratHeader));
+        for(uint64_t i = 0; i < header->nlabels; ++i)
+        {
+            StratLabel const & sl = labels[i];
+            if(sl.name_offset + sl.name_length > size)
+            {
+                _impl->index.close();
+                error("Truncated stratification index %s", filename.c_str());
+            }
+            const std::string name(data + sl.name_offset, sl.name_length);
+            if(_impl->label_map.count(name))
+            {
+                error("Region %s is present in the stratification index and in a bed file.", name.c_str());
+            }
+            _impl->index_label_map[name] = table.names.size();
+            table.names.push_back(name);
+            _impl->index_sizes.push_back(sl.size);
+        }
+
+        const StratContig * contigs = (const StratContig *) (data + sizeof(StratHeader)
+                                                             + header->nlabels * sizeof(StratLabel));
+        for(uint64_t i = 0; i < header->ncontigs; ++i)
+        {
+            StratContig const & sc = contigs[i];
+            if(sc.name_offset + sc.name_length > size
+               || sc.starts_offset + sc.nsegments * sizeof(int64_t) > size
+               || sc.segment_sets_offset + sc.nsegments * sizeof(uint32_t) > size
+               || sc.zero_length_set >= header->nsets)
+            {
+                _impl->index.close();
+                error("Truncated stratification index %s", filename.c_str());
+            }
+            table.contigs[std::string(data + sc.name_offset, sc.name_length)] =
+                ContigSegments{(const int64_t *) (data + sc.starts_offset),
+                               (const uint32_t *) (data + sc.segment_sets_offset),
+                               sc.nsegments, sc.zero_length_set};
+        }
+
+        table.set_words = header->set_words;
+        table.sets = (const uint64_t *) (data + header->sets_offset);
+        table.reset();
+        _impl->index_labels.resize(header->set_words);
+        std::cerr << "Loaded stratification index " << filename << " (" << header->nlabels << " labels on "
+                  << header->ncontigs << " contigs)" << "\n";
     }
 
     /** add Regions annotation to a record
      *
-     * Records must be passed in sorted order.
+     * Annotation is fastest when records are passed in sorted order.
      *
      */
     void QuantifyRegions::annotate(bcf_hdr_t * hdr, bcf1_t *record)
     {
+        _impl->buildSegments();
+
         std::string chr = bcfhelpers::getChrom(hdr, record);
         int64_t refstart = 0, refend = 0;
         bcfhelpers::getLocation(hdr, record, refstart, refend);
 
-        std::string tag_string = "";
-        std::set<std::string> regions;
-
-        auto p_chr = _impl->current_chr;
-        if(p_chr == _impl->ib.end() || p_chr->first != chr)
+        // usually only one of these is loaded, don't touch the other one
+        bool in_beds = false;
+        if(!_impl->beds.contigs.empty())
+        {
+            std::fill(_impl->bed_labels.begin(), _impl->bed_labels.end(), 0);
+            in_beds = _impl->beds.lookup(chr, refstart, refend, _impl->bed_labels);
+        }
+        bool in_index = false;
+        if(!_impl->index_segments.contigs.empty())
         {
-            _impl->current_pos = -1;
-            p_chr = _impl->ib.find(chr);
+            std::fill(_impl->index_labels.begin(), _impl->index_labels.end(), 0);
+            in_index = _impl->index_segments.lookup(chr, refstart, refend, _impl->index_labels);
         }
 
-        if(p_chr != _impl->ib.end())
+        // label bits are in sorted order; the set is only needed to merge beds and index
+        std::string tag_string = "";
+        std::set<std::string> regions;
+        const auto add_labels = [&tag_string, &regions](SegmentTable const & table,
+                                                        std::vector<uint64_t> const & labels, bool merge)
         {
-            if(refstart < _impl->current_pos)
-            {
-                error("Variants out of order at %s:%i", chr.c_str(), refstart);
-            }
-            for(size_t i = 0; i < _impl->names.size(); ++i)
+            for(size_t w = 0; w < labels.size(); ++w)
             {
-                if(p_chr->second->hasOverlap(refstart, refend, i))
+                uint64_t bits = labels[w];
+                while(bits)
                 {
-                    regions.insert(_impl->names[i]);
+                    std::string const & name = table.names[w*64 + __builtin_ctzll(bits)];
+                    bits &= bits - 1;
+                    if(merge)
+                    {
+                        regions.insert(name);
+                    }
+                    else
+                    {
+                        if(!tag_string.empty())
+                        {
+                            tag_string += ",";
+                        }
+                        tag_string += name;
+                    }
                 }
             }
-            if(refstart > 1)
-            {
-                _impl->current_pos = refstart - 1;
-                p_chr->second->advance(refstart-1);
-            }
+        };
+        if(in_beds)
+        {
+            add_labels(_impl->beds, _impl->bed_labels, in_index);
+        }
+        if(in_index)
+        {
+            add_labels(_impl->index_segments, _impl->index_labels, in_beds);
         }
-        // regions set is sorted, make sure Regions is sorted also
         for(auto const & r : regions)
         {
             if(!tag_string.empty())
@@ -301,6 +895,7 @@ namespace variant
             }
             tag_string += r;
         }
+
         if(!tag_string.empty())
         {
             bcf_update_info_string(hdr, record, "Regions", tag_string.c_str());
@@ -318,6 +913,11 @@ namespace variant
      */
     size_t QuantifyRegions::getRegionSize(std::string const & region_name) const
     {
+        auto index_it = _impl->index_label_map.find(region_name);
+        if(index_it != _impl->index_label_map.cend())
+        {
+            return (size_t) _impl->index_sizes[index_it->second];
+        }
         auto label_it = _impl->label_map.find(region_name);
         if(label_it == _impl->label_map.cend())
         {
@@ -331,5 +931,3 @@ namespace variant
         return size_it->second;
     }
 }
-
-
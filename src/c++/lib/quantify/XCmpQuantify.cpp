@@ -138,6 +138,8 @@ namespace variant
         const bool hapmatch = bcfhelpers::getInfoFlag(_impl->hdr, v, "HapMatch");
         const bool fail = bcfhelpers::getInfoFlag(_impl->hdr, v, "IMPORT_FAIL");
         const bool q_filtered = bcfhelpers::getInfoFlag(_impl->hdr, v, "Q_FILTERED");
+        // haplotype comparison ran out of time, decisions come from the simple comparison
+        const bool hap_timeout = ctype.compare(0, 11, "haptimeout:") == 0;
         float QQ = std::numeric_limits<float>::quiet_NaN();
         if(roc_field_is_info)
         {
@@ -260,6 +262,10 @@ namespace variant
             {
                 bis.push_back(".");
             }
+            if(hap_timeout)
+            {
+                bis.back() = bis.back() == "." ? "timeout" : bis.back() + ",timeout";
+            }
 
             /** vt = 0 -> UNK
              *  vt = 1 -> SNP
@@ -38,6 +38,7 @@
 #include "Error.hh"
 
 #include <cstdio>
+#include <fstream>
 #include <sstream>
 #include <htslib/vcf.h>
 #include <memory>
@@ -739,6 +740,104 @@ namespace bcfhelpers
         return str_result;
     }
 
+    FormatAccessor::FormatAccessor(const bcf_hdr_t * header, const char * _field) :
+        hdr(header), field(_field)
+    {
+        tag_id = bcf_hdr_id2int(hdr, BCF_DT_ID, field.c_str());
+        if ( !bcf_hdr_idinfo_exists(hdr, BCF_HL_FMT, tag_id) )
+        {
+            tag_id = -1;
+        }
+    }
+
+    const bcf_fmt_t * FormatAccessor::find(bcf1_t * line, int isample) const
+    {
+        if(tag_id < 0 || isample >= bcf_hdr_nsamples(hdr))
+        {
+            return nullptr;
+        }
+        const bcf_fmt_t * fmt = bcf_get_fmt_id(line, tag_id);
+        if(fmt == nullptr || fmt->n < 1)
+        {
+            return nullptr;
+        }
+        return fmt;
+    }
+
+    StringRef FormatAccessor::getString(bcf1_t * line, int isample) const
+    {
+        StringRef result;
+        const bcf_fmt_t * fmt = find(line, isample);
+        // numeric values would need formatting, use getFormatString for these
+        if(fmt == nullptr || fmt->type != BCF_BT_CHAR || fmt->size == 0)
+        {
+            return result;
+        }
+        result.s = (const char *)fmt->p + isample*fmt->size;
+        // deal with 0 padding
+        while(result.len < (size_t)fmt->size && result.s[result.len] != 0)
+        {
+            ++result.len;
+        }
+        return result;
+    }
+
+    float FormatAccessor::getFloat(bcf1_t * line, int isample) const
+    {
+        const bcf_fmt_t * fmt = find(line, isample);
+        if(fmt == nullptr)
+        {
+            return std::numeric_limits<float>::quiet_NaN();
+        }
+        if(fmt->type != BCF_BT_FLOAT || fmt->n > 1)
+        {
+            // conversions and errors as in getFormatFloat
+            return getFormatFloat(hdr, line, field.c_str(), isample);
+        }
+        return *((const float*)(fmt->p + isample*fmt->size));
+    }
+
+    InfoAccessor::InfoAccessor(const bcf_hdr_t * header, const char * field)
+    {
+        tag_id = bcf_hdr_id2int(header, BCF_DT_ID, field);
+        if ( !bcf_hdr_idinfo_exists(header, BCF_HL_INFO, tag_id) )
+        {
+            tag_id = -1;
+        }
+    }
+
+    const bcf_info_t * InfoAccessor::find(bcf1_t * line) const
+    {
+        if(tag_id < 0)
+        {
+            return nullptr;
+        }
+        return bcf_get_info_id(line, tag_id);
+    }
+
+    int InfoAccessor::getInt(bcf1_t * line, int def_result) const
+    {
+        bcf_info_t * info_ptr = const_cast<bcf_info_t *>(find(line));
+        if(info_ptr)
+        {
+            static const bcfhelpers::_impl::bcf_get_info<int> i;
+            return i(info_ptr);
+        }
+        return def_result;
+    }
+
+    StringRef InfoAccessor::getString(bcf1_t * line) const
+    {
+        StringRef result;
+        const bcf_info_t * info_ptr = find(line);
+        if(info_ptr && info_ptr->type == BCF_BT_CHAR && info_ptr->vptr && info_ptr->len > 0)
+        {
+            result.s = (const char *)info_ptr->vptr;
+            result.len = (size_t)info_ptr->len;
+        }
+        return result;
+    }
+
     /** update format string for a single sample.  */
     void setFormatStrings(const bcf_hdr_t * hdr, bcf1_t * line, const char * field,
                          const std::vector<std::string> & formats)
@@ -920,4 +1019,63 @@ namespace bcfhelpers
         }
         return max_match;
     }
+
+    void appendParts(std::string const & output, std::vector<std::string> const & parts)
+    {
+        // empty BGZF block which htslib writes at the end of compressed files
+        static const char BGZF_EOF[28] = {
+            '\37', '\213', '\10', '\4', 0, 0, 0, 0, 0, '\377', '\6', 0, 'B', 'C',
+            '\2', 0, '\33', 0, '\3', 0, 0, 0, 0, 0, 0, 0, 0, 0
+        };
+        // size without the EOF marker, and whether there was one
+        const auto content_size = [](std::string const & filename, bool & has_eof) -> std::streamoff
+        {
+            std::ifstream f(filename, std::ios::binary | std::ios::ate);
+            if(!f)
+            {
+                error("Cannot read %s", filename.c_str());
+            }
+            const std::streamoff size = f.tellg();
+            has_eof = false;
+            if(size >= (std::streamoff) sizeof(BGZF_EOF))
+            {
+                char tail[sizeof(BGZF_EOF)];
+                f.seekg(size - (std::streamoff) sizeof(BGZF_EOF));
+                f.read(tail, sizeof(BGZF_EOF));
+                has_eof = f && memcmp(tail, BGZF_EOF, sizeof(BGZF_EOF)) == 0;
+            }
+            return has_eof ? size - (std::streamoff) sizeof(BGZF_EOF) : size;
+        };
+
+        bool compressed = false;
+        const std::streamoff header_size = content_size(output, compressed);
+        std::fstream out(output, std::ios::binary | std::ios::in | std::ios::out);
+        out.seekp(header_size);
+        std::vector<char> buffer(1024*1024);
+        for(auto const & part : parts)
+        {
+            bool part_eof = false;
+            std::streamoff remaining = content_size(part, part_eof);
+            std::ifstream in(part, std::ios::binary);
+            while(remaining > 0 && in)
+            {
+                in.read(buffer.data(), std::min((std::streamoff) buffer.size(), remaining));
+                out.write(buffer.data(), in.gcount());
+                remaining -= in.gcount();
+            }
+            if(remaining > 0)
+            {
+                error("Cannot read %s", part.c_str());
+            }
+        }
+        if(compressed)
+        {
+            out.write(BGZF_EOF, sizeof(BGZF_EOF));
+        }
+        out.close();
+        if(!out)
+        {
+            error("Cannot write %s", output.c_str());
+        }
+    }
 } // namespace bcfhelpers
@@ -40,13 +40,17 @@
 #include "helpers/StringUtil.hh"
 
 #include <boost/filesystem.hpp>
+#include <boost/iostreams/device/mapped_file.hpp>
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
 #include <iostream>
 #include <limits>
 #include <map>
+#include <memory>
 #include <fstream>
 #include <mutex>
-
-#include <boost/algorithm/string.hpp>
+#include <vector>
 
 extern "C" {
 
@@ -59,10 +63,64 @@ extern "C" {
 #pragma GCC diagnostic pop
 }
 
+/**
+ * Packed reference image (see FastaFile::pack)
+ *
+ * Layout: PackedHeader, ncontigs x PackedContig, contig names, and for each contig
+ * the bases with 2 bits per base (A=0, C=1, G=2, T=3, four bases per byte starting
+ * at the low bits) followed by a list of PackedRun entries giving the runs of other
+ * characters (usually N) in the contig. Bases are stored in uppercase.
+ */
+static const char PACKED_MAGIC[8] = {'H', 'A', 'P', 'P', 'A', 'C', 'K', '\1'};
+
+struct PackedHeader
+{
+    char magic[8];
+    uint64_t ncontigs;
+    // size and modification time of the fasta file the image was built from
+    uint64_t fasta_size;
+    int64_t fasta_mtime;
+};
+
+struct PackedContig
+{
+    uint64_t name_offset;
+    uint64_t name_length;
+    uint64_t length;
+    uint64_t bases_offset;
+    uint64_t runs_offset;
+    uint64_t nruns;
+};
+
+struct PackedRun
+{
+    uint64_t start;
+    uint64_t length;
+    uint64_t base;
+};
+
+/** contig information from the fai file */
+struct FastaContig
+{
+    int64_t length;
+    int64_t offset;
+    int64_t line_bases;
+    int64_t line_width;
+
+    // location in the packed image if we have one
+    const uint8_t * packed_bases = nullptr;
+    const PackedRun * packed_runs = nullptr;
+    uint64_t packed_nruns = 0;
+
+    // uppercase copy of the whole contig, see FastaFile::view
+    std::once_flag cached;
+    std::string sequence;
+};
+
 struct FastaFileImpl
 {
-    FastaFileImpl(const char * _filename) :
-        filename(_filename)
+    explicit FastaFileImpl(const char * _filename, bool use_packed = true) :
+        filename(_filename), idx(nullptr)
     {
         boost::filesystem::path iname(_filename);
         iname += ".fai";
@@ -73,13 +131,8 @@ struct FastaFileImpl
                 error("Cannot index %s", _filename);
             }
         }
-        idx = fai_load(_filename);
-        if(!idx)
-        {
-            error("Cannot load index for %s", _filename);
-        }
 
-        // read contig lengths from fai since htslib doesn't expose this
+        // read contig lengths and line layout from fai since htslib doesn't expose this
         std::ifstream fai(iname.c_str());
         while(fai.good())
         {
@@ -91,22 +144,255 @@ struct FastaFileImpl
             if(v.size() == 5)
             {
                 contig_lengths[v[0]] = std::stol(v[1]);
-                // std::cerr << v[0] << ":" << std::stol(v[1]) << "\n";
+                std::unique_ptr<FastaContig> c(new FastaContig());
+                c->length = std::stol(v[1]);
+                c->offset = std::stol(v[2]);
+                c->line_bases = std::stol(v[3]);
+                c->line_width = std::stol(v[4]);
+                contigs[v[0]] = std::move(c);
+            }
+        }
+
+        if(!boost::filesystem::exists(_filename))
+        {
+            error("Cannot load index for %s", _filename);
+        }
+
+        if(use_packed && loadPacked())
+        {
+            return;
+        }
+
+        // compressed files are read through htslib, everything else is memory-mapped
+        bool compressed = false;
+        {
+            std::ifstream f(_filename, std::ios::binary);
+            char magic[2] = {0, 0};
+            f.read(magic, 2);
+            compressed = f.gcount() == 2 && magic[0] == '\x1f' && magic[1] == '\x8b';
+        }
+
+        if(compressed || boost::filesystem::file_size(_filename) == 0)
+        {
+            idx = fai_load(_filename);
+            if(!idx)
+            {
+                error("Cannot load index for %s", _filename);
+            }
+        }
+        else
+        {
+            try
+            {
+                mapped.open(filename);
+            }
+            catch(std::exception const & e)
+            {
+                error("Cannot map %s: %s", _filename, e.what());
             }
         }
     }
 
     ~FastaFileImpl()
     {
-        fai_destroy(idx);
+        if(idx)
+        {
+            fai_destroy(idx);
+        }
+    }
+
+    /**
+     * Map the packed image for the fasta file if there is an up-to-date one
+     * @return true if the packed image can be used
+     */
+    bool loadPacked()
+    {
+        const std::string pname = filename + ".packed";
+        if(!boost::filesystem::exists(pname))
+        {
+            return false;
+        }
+        try
+        {
+            packed.open(pname);
+        }
+        catch(std::exception const & e)
+        {
+            std::cerr << "[W] Cannot map packed reference " << pname << ": " << e.what() << "\n";
+            return false;
+        }
+
+        const char * data = packed.data();
+        const uint64_t size = (uint64_t) packed.size();
+        const PackedHeader * header = (const PackedHeader *) data;
+        if(size < sizeof(PackedHeader) || memcmp(header->magic, PACKED_MAGIC, sizeof(PACKED_MAGIC)) != 0
+           || size < sizeof(PackedHeader) + header->ncontigs * sizeof(PackedContig))
+        {
+            std::cerr << "[W] Ignoring invalid packed reference " << pname << "\n";
+            packed.close();
+            return false;
+        }
+        if(header->fasta_size != (uint64_t) boost::filesystem::file_size(filename)
+           || header->fasta_mtime != (int64_t) boost::filesystem::last_write_time(filename))
+        {
+            std::cerr << "[W] Ignoring packed reference " << pname << " since " << filename << " has changed.\n";
+            packed.close();
+            return false;
+        }
+
+        const PackedContig * pcontigs = (const PackedContig *) (data + sizeof(PackedHeader));
+        std::map<std::string, PackedContig const *> found;
+        for(uint64_t i = 0; i < header->ncontigs; ++i)
+        {
+            PackedContig const & pc = pcontigs[i];
+            if(pc.name_offset + pc.name_length > size
+               || pc.bases_offset + (pc.length + 3) / 4 > size
+               || pc.runs_offset + pc.nruns * sizeof(PackedRun) > size)
+            {
+                std::cerr << "[W] Ignoring truncated packed reference " << pname << "\n";
+                packed.close();
+                return false;
+            }
+            found[std::string(data + pc.name_offset, pc.name_length)] = &pc;
+        }
+
+        for(auto & c : contigs)
+        {
+            auto pc = found.find(c.first);
+            if(pc == found.end() || (int64_t) pc->second->length != c.second->length)
+            {
+                std::cerr << "[W] Ignoring packed reference " << pname << " since it doesn't match " << filename << ".fai\n";
+                packed.close();
+                return false;
+            }
+        }
+        for(auto & c : contigs)
+        {
+            PackedContig const * pc = found[c.first];
+            c.second->packed_bases = (const uint8_t *) (data + pc->bases_offset);
+            c.second->packed_runs = (const PackedRun *) (data + pc->runs_offset);
+            c.second->packed_nruns = pc->nruns;
+        }
+        return true;
+    }
+
+    /**
+     * Retrieve [start, end] from a contig, with the same clipping as faidx_fetch_seq
+     *
+     * @return number of characters retrieved, or < 0 on error
+     */
+    int64_t fetch(const char * chr, int64_t start, int64_t end, std::string & result)
+    {
+        result.clear();
+        if(idx)
+        {
+            int len = 0;
+            char * data = nullptr;
+            {
+                std::lock_guard<std::mutex> l(mutex);
+                data = faidx_fetch_seq(idx, chr, (int) start, (int) end, &len);
+            }
+            if(len > 0)
+            {
+                result.assign(data, (unsigned long) len);
+            }
+            if(data)
+            {
+                free(data);
+            }
+            return len;
+        }
+
+        auto ci = contigs.find(chr);
+        if(ci == contigs.end())
+        {
+            std::cerr << "[fai_fetch_seq] The sequence \"" << chr << "\" not found\n";
+            return -2;
+        }
+        FastaContig const & c = *(ci->second);
+        if(c.length <= 0 || c.line_bases <= 0)
+        {
+            return 0;
+        }
+
+        if(end < start) start = end;
+        if(start < 0) start = 0;
+        else if(c.length <= start) start = c.length - 1;
+        if(end < 0) end = 0;
+        else if(c.length <= end) end = c.length - 1;
+
+        if(c.packed_bases)
+        {
+            static const char BASES[4] = {'A', 'C', 'G', 'T'};
+            result.resize((size_t) (end - start + 1));
+            for(int64_t pos = start; pos <= end; ++pos)
+            {
+                result[pos - start] = BASES[(c.packed_bases[pos >> 2] >> ((pos & 3) << 1)) & 3];
+            }
+
+            // runs are sorted by start and don't overlap
+            const PackedRun * runs_end = c.packed_runs + c.packed_nruns;
+            const PackedRun * run = std::upper_bound(c.packed_runs, runs_end, (uint64_t) start,
+                                                     [](uint64_t pos, PackedRun const & r) { return pos < r.start; });
+            if(run != c.packed_runs)
+            {
+                --run;
+            }
+            for(; run < runs_end && (int64_t) run->start <= end; ++run)
+            {
+                const int64_t rs = std::max((int64_t) run->start, start);
+                const int64_t re = std::min((int64_t) (run->start + run->length) - 1, end);
+                for(int64_t pos = rs; pos <= re; ++pos)
+                {
+                    result[pos - start] = (char) run->base;
+                }
+            }
+            return (int64_t) result.size();
+        }
+
+        const char * data = mapped.data();
+        const int64_t size = (int64_t) mapped.size();
+        int64_t pos = start;
+        result.reserve((size_t) (end - start + 1));
+        while(pos <= end)
+        {
+            // copy up to the end of the current line
+            const int64_t col = pos % c.line_bases;
+            const int64_t offset = c.offset + (pos / c.line_bases) * c.line_width + col;
+            const int64_t n = std::min(std::min(c.line_bases - col, end - pos + 1), size - offset);
+            if(n <= 0)
+            {
+                break;
+            }
+            result.append(data + offset, (size_t) n);
+            pos += n;
+        }
+        return (int64_t) result.size();
     }
 
-    faidx_t * idx;
     std::string filename;
     std::map<std::string, int64_t> contig_lengths;
+    std::map<std::string, std::unique_ptr<FastaContig> > contigs;
+
+    boost::iostreams::mapped_file_source mapped;
+    boost::iostreams::mapped_file_source packed;
+
+    // only for compressed files, which we read through faidx
+    faidx_t * idx;
     std::mutex mutex;
 };
 
+static inline void toUpper(std::string & s)
+{
+    for(char & c : s)
+    {
+        if(c >= 'a' && c <= 'z')
+        {
+            c = (char) (c - 'a' + 'A');
+        }
+    }
+}
+
 FastaFile::FastaFile() {
     _impl = NULL;
 }
@@ -185,15 +471,11 @@ std::string FastaFile::query(const char * chr, int64_t start, int64_t end) const
     {
         return "";
     }
-    int len = 0;
-    // faidx_fetch_seq (..., start, end) gets [start, end]
-    char * data = nullptr;
-    {
-        // TODO -- this is sub-optimal. for proper thread-safe Fasta support, we should
-        // TODO memory-map the file, which means we can read without blocking
-        std::lock_guard<std::mutex> l(_impl->mutex);
-        data = faidx_fetch_seq(_impl->idx, chr, (int) start, (int) end, &len);
-    }
+
+    // fetch(..., start, end) gets [start, end]; this doesn't need to lock unless
+    // the file is compressed
+    std::string result;
+    const int64_t len = _impl->fetch(chr, start, end, result);
 
     if(len == 0)
     {
@@ -202,11 +484,151 @@ std::string FastaFile::query(const char * chr, int64_t start, int64_t end) const
 
     if(len < 0)
     {
-        error("Fasta retrieval failed with return code %i at %s:%i-%i", len, chr, start, end);
+        error("Fasta retrieval failed with return code %i at %s:%i-%i", (int) len, chr, start, end);
     }
 
-    std::string result(data, (unsigned long) std::min(requested_length, (int64_t)len));
-    free(data);
-    boost::to_upper(result);
+    if(requested_length < len)
+    {
+        result.resize((size_t) requested_length);
+    }
+    toUpper(result);
     return result;
 }
+
+const char * FastaFile::view(const char * chr, int64_t start, int64_t end, int64_t & len) const
+{
+    if(!_impl) {
+        error("FastaFile object not initialized before use");
+    }
+    len = 0;
+    auto ci = _impl->contigs.find(chr);
+    if(ci == _impl->contigs.end())
+    {
+        error("Unknown contig in FastaFile::view: %s", chr);
+    }
+    FastaContig & c = *(ci->second);
+    std::call_once(c.cached, [this, &c, chr]() {
+        if(c.length > 0)
+        {
+            _impl->fetch(chr, 0, c.length - 1, c.sequence);
+            toUpper(c.sequence);
+        }
+    });
+
+    const int64_t clen = (int64_t) c.sequence.size();
+    if(start < 0)
+    {
+        start = 0;
+    }
+    if(end < 0 || end >= clen)
+    {
+        end = clen - 1;
+    }
+    if(start > end)
+    {
+        return nullptr;
+    }
+    len = end - start + 1;
+    return c.sequence.c_str() + start;
+}
+
+void FastaFile::pack(const char * filename)
+{
+    const std::string out_name = std::string(filename) + ".packed";
+    // don't pick up an existing image while reading
+    FastaFileImpl fasta(filename, false);
+
+    PackedHeader header;
+    memcpy(header.magic, PACKED_MAGIC, sizeof(PACKED_MAGIC));
+    header.ncontigs = (uint64_t) fasta.contigs.size();
+    header.fasta_size = (uint64_t) boost::filesystem::file_size(filename);
+    header.fasta_mtime = (int64_t) boost::filesystem::last_write_time(filename);
+
+    std::vector<PackedContig> pcontigs;
+    std::string names;
+    for(auto const & c : fasta.contigs)
+    {
+        PackedContig pc;
+        memset(&pc, 0, sizeof(PackedContig));
+        pc.name_offset = names.size();
+        pc.name_length = c.first.size();
+        pc.length = (uint64_t) c.second->length;
+        names += c.first;
+        pcontigs.push_back(pc);
+    }
+
+    const boost::filesystem::path temp_name = boost::filesystem::unique_path(out_name + ".%%%%-%%%%");
+    std::ofstream out(temp_name.c_str(), std::ios::binary);
+    const auto align = [&out]() {
+        while(out.tellp() % 8)
+        {
+            out.put(0);
+        }
+    };
+    uint64_t names_offset = sizeof(PackedHeader) + pcontigs.size() * sizeof(PackedContig);
+    out.seekp((std::streamoff) names_offset);
+    out.write(names.c_str(), (std::streamsize) names.size());
+    align();
+
+    size_t i = 0;
+    for(auto const & c : fasta.contigs)
+    {
+        PackedContig & pc = pcontigs[i++];
+        pc.name_offset += names_offset;
+
+        std::string seq;
+        if(c.second->length > 0)
+        {
+            const int64_t len = fasta.fetch(c.first.c_str(), 0, c.second->length - 1, seq);
+            if(len != c.second->length)
+            {
+                error("Cannot read %s from %s", c.first.c_str(), filename);
+            }
+        }
+        toUpper(seq);
+
+        std::vector<uint8_t> bases((seq.size() + 3) / 4, 0);
+        std::vector<PackedRun> runs;
+        for(size_t pos = 0; pos < seq.size(); ++pos)
+        {
+            uint8_t b = 0;
+            switch(seq[pos])
+            {
+                case 'A': b = 0; break;
+                case 'C': b = 1; break;
+                case 'G': b = 2; break;
+                case 'T': b = 3; break;
+                default:
+                    if(!runs.empty() && runs.back().base == (uint64_t) (uint8_t) seq[pos]
+                       && runs.back().start + runs.back().length == pos)
+                    {
+                        ++runs.back().length;
+                    }
+                    else
+                    {
+                        runs.push_back(PackedRun{pos, 1, (uint64_t) (uint8_t) seq[pos]});
+                    }
+                    break;
+            }
+            bases[pos >> 2] |= (uint8_t) (b << ((pos & 3) << 1));
+        }
+
+        pc.bases_offset = (uint64_t) out.tellp();
+        out.write((const char *) bases.data(), (std::streamsize) bases.size());
+        align();
+        pc.runs_offset = (uint64_t) out.tellp();
+        pc.nruns = runs.size();
+        out.write((const char *) runs.data(), (std::streamsize) (runs.size() * sizeof(PackedRun)));
+    }
+
+    out.seekp(0);
+    out.write((const char *) &header, sizeof(PackedHeader));
+    out.write((const char *) pcontigs.data(), (std::streamsize) (pcontigs.size() * sizeof(PackedContig)));
+    out.close();
+    if(!out)
+    {
+        boost::filesystem::remove(temp_name);
+        error("Cannot write %s", out_name.c_str());
+    }
+    boost::filesystem::rename(temp_name, out_name);
+}
@@ -34,11 +34,14 @@
  */
 
 #include "helpers/Roc.hh"
+#include "Error.hh"
 
 #include <algorithm>
 #include <cmath>
+#include <cstring>
 #include <fstream>
-#include <helpers/StringUtil.hh>
+#include <map>
+#include <tuple>
 
 namespace roc
 {
@@ -46,101 +49,186 @@ namespace roc
     const char * DecisionTypes[NDecisionTypes] { "TRUTH.FN", "TRUTH.TP", "QUERY.FN", "QUERY.TP", "QUERY.FP", "QUERY.UNK", "N" };
 
 
+    namespace
+    {
+        /** compare a string which is not null-terminated to a flag name */
+        inline bool flagIs(const char * s, size_t len, const char * name)
+        {
+            return strlen(name) == len && (len == 0 || memcmp(s, name, len) == 0);
+        }
+    }
+
     uint64_t makeObservationFlags(const std::string & bk, const std::string & bi, const std::string & blt)
+    {
+        return makeObservationFlags(bk.c_str(), bk.size(), bi.c_str(), bi.size(), blt.c_str(), blt.size());
+    }
+
+    uint64_t makeObservationFlags(const char * bk, size_t bk_len,
+                                  const char * bi, size_t bi_len,
+                                  const char * blt, size_t blt_len)
     {
         uint64_t result = 0;
 
-        if(bk == "lm")
+        if(flagIs(bk, bk_len, "lm"))
         {
             result |= OBS_FLAG_LM;
         }
-        else if(bk == "am")
+        else if(flagIs(bk, bk_len, "am"))
         {
             result |= OBS_FLAG_AM;
         }
-        else if(bk == "gm")
+        else if(flagIs(bk, bk_len, "gm"))
         {
             result |= OBS_FLAG_GM;
         }
 
-        if(blt == "het")
+        if(flagIs(blt, blt_len, "het"))
         {
             result |= OBS_FLAG_HET;
         }
-        else if(blt == "hetalt")
+        else if(flagIs(blt, blt_len, "hetalt"))
         {
             result |= OBS_FLAG_HETALT;
         }
-        else if(blt == "homalt")
+        else if(flagIs(blt, blt_len, "homalt"))
         {
             result |= OBS_FLAG_HOMALT;
         }
 
-        std::vector<std::string> bis;
-        stringutil::split(bi, bis, ",");
+        static const std::pair<const char *, uint64_t> bi_flags[] = {
+            {"ti", OBS_FLAG_TI},
+            {"tv", OBS_FLAG_TV},
+            {"i1_5", OBS_FLAG_I1_5},
+            {"i6_15", OBS_FLAG_I6_15},
+            {"i16_plus", OBS_FLAG_I16_PLUS},
+            {"d1_5", OBS_FLAG_D1_5},
+            {"d6_15", OBS_FLAG_D6_15},
+            {"d16_plus", OBS_FLAG_D16_PLUS},
+            {"c1_5", OBS_FLAG_C1_5},
+            {"c6_15", OBS_FLAG_C6_15},
+            {"c16_plus", OBS_FLAG_C16_PLUS},
+        };
 
-        for(auto const & b : bis)
+        // BI is a comma-separated list
+        size_t b_start = 0;
+        while(b_start < bi_len)
         {
-            if(b == "ti")
-            {
-                result |= OBS_FLAG_TI;
-            }
-            else if(b == "tv")
-            {
-                result |= OBS_FLAG_TV;
-            }
-            else if(b == "tv")
+            size_t b_end = b_start;
+            while(b_end < bi_len && bi[b_end] != ',')
             {
-                result |= OBS_FLAG_TV;
+                ++b_end;
             }
-            else if(b == "i1_5")
+            for(auto const & f : bi_flags)
             {
-                result |= OBS_FLAG_I1_5;
-            }
-            else if(b == "i6_15")
-            {
-                result |= OBS_FLAG_I6_15;
-            }
-            else if(b == "i16_plus")
-            {
-                result |= OBS_FLAG_I16_PLUS;
-            }
-            else if(b == "d1_5")
-            {
-                result |= OBS_FLAG_D1_5;
+                if(flagIs(bi + b_start, b_end - b_start, f.first))
+                {
+                    result |= f.second;
+                    break;
+                }
             }
-            else if(b == "d6_15")
+            b_start = b_end + 1;
+        }
+
+        return result;
+    }
+
+
+    struct Roc::RocImpl
+    {
+        std::vector<Observation> obs;
+
+        /** binned observations, by bin index (see Roc(size_t, double)) */
+        size_t max_bins = 0;
+        double bin_width = 0;
+        std::map<double, std::vector<Observation>> bins;
+
+        /** add an observation to its bin */
+        void addBinned(Observation const & o)
+        {
+            auto & bin = bins[std::floor(o.level / bin_width)];
+            for(auto & b : bin)
             {
-                result |= OBS_FLAG_D6_15;
+                if(b.dt == o.dt && b.flags == o.flags)
+                {
+                    b.n += o.n;
+                    b.level = std::min(b.level, o.level);
+                    return;
+                }
             }
-            else if(b == "d16_plus")
+            bin.push_back(o);
+            if(bins.size() > max_bins)
             {
-                result |= OBS_FLAG_D16_PLUS;
+                widen();
             }
-            else if(b == "c1_5")
+        }
+
+        /** double the bin width until we have at most max_bins bins */
+        void widen()
+        {
+            while(bins.size() > max_bins && std::isfinite(bin_width * 2))
             {
-                result |= OBS_FLAG_C1_5;
+                doubleWidth();
             }
-            else if(b == "c6_15")
+        }
+
+        /** double the bin width and merge pairs of bins */
+        void doubleWidth()
+        {
+            bin_width *= 2;
+            std::map<double, std::vector<Observation>> old_bins;
+            std::swap(old_bins, bins);
+            for(auto const & bin : old_bins)
             {
-                result |= OBS_FLAG_C6_15;
+                auto & new_bin = bins[std::floor(bin.first / 2)];
+                for(auto const & o : bin.second)
+                {
+                    auto it = std::find_if(new_bin.begin(), new_bin.end(), [&o](Observation const & b) -> bool {
+                        return b.dt == o.dt && b.flags == o.flags;
+                    });
+                    if(it == new_bin.end())
+                    {
+                        new_bin.push_back(o);
+                    }
+                    else
+                    {
+                        it->n += o.n;
+                        it->level = std::min(it->level, o.level);
+                    }
+                }
             }
-            else if(b == "c16_plus")
+        }
+
+        /** all observations; for binned ROCs these are collected from the bins */
+        std::vector<Observation> & observations()
+        {
+            if(max_bins > 0)
             {
-                result |= OBS_FLAG_C16_PLUS;
+                obs.clear();
+                for(auto const & bin : bins)
+                {
+                    obs.insert(obs.end(), bin.second.cbegin(), bin.second.cend());
+                }
+                // the order of observations in a bin depends on the order they were added in,
+                // sort them so ROCs don't depend on how the input was split up
+                std::sort(obs.begin(), obs.end(), [](Observation const & o1, Observation const & o2) -> bool {
+                    return std::make_tuple(o1.level, to_underlying(o1.dt), o1.flags)
+                         < std::make_tuple(o2.level, to_underlying(o2.dt), o2.flags);
+                });
             }
+            return obs;
         }
-
-        return result;
-    }
-
-
-    struct Roc::RocImpl
-    {
-        std::vector<Observation> obs;
     };
 
     Roc::Roc() : _impl(new RocImpl()) { }
+    Roc::Roc(size_t max_bins, double bin_width) : _impl(new RocImpl())
+    {
+        if(max_bins == 0 || !(bin_width > 0))
+        {
+            error("Invalid ROC binning: %i bins of width %f", (int)max_bins, bin_width);
+        }
+        _impl->max_bins = max_bins;
+        _impl->bin_width = bin_width;
+    }
     Roc::~Roc() { }
     Roc::Roc(Roc const & rhs) : _impl(new RocImpl()) { add(rhs); }
     Roc::Roc(Roc && rhs) : _impl(std::move(rhs._impl)) { }
@@ -154,18 +242,86 @@ namespace roc
     // add observations from second ROC
     void Roc::add(Roc const &rhs)
     {
-        _impl->obs.insert(_impl->obs.end(), rhs._impl->obs.cbegin(), rhs._impl->obs.cend());
+        if(rhs._impl->max_bins > 0)
+        {
+            if(_impl->max_bins == 0)
+            {
+                // binning carries over to ROCs we add binned observations to
+                _impl->max_bins = rhs._impl->max_bins;
+                _impl->bin_width = rhs._impl->bin_width;
+                for(auto const & o : _impl->obs)
+                {
+                    _impl->addBinned(o);
+                }
+                _impl->obs.clear();
+            }
+            while(_impl->bin_width < rhs._impl->bin_width && std::isfinite(_impl->bin_width * 2))
+            {
+                _impl->doubleWidth();
+            }
+            for(auto const & bin : rhs._impl->bins)
+            {
+                for(auto const & o : bin.second)
+                {
+                    _impl->addBinned(o);
+                }
+            }
+        }
+        else if(_impl->max_bins > 0)
+        {
+            for(auto const & o : rhs._impl->obs)
+            {
+                _impl->addBinned(o);
+            }
+        }
+        else
+        {
+            _impl->obs.insert(_impl->obs.end(), rhs._impl->obs.cbegin(), rhs._impl->obs.cend());
+        }
     }
 
     void Roc::add(Observation const &rhs)
     {
-        _impl->obs.push_back(rhs);
+        if(_impl->max_bins > 0)
+        {
+            _impl->addBinned(rhs);
+        }
+        else
+        {
+            _impl->obs.push_back(rhs);
+        }
+    }
+
+    double Roc::binWidth() const
+    {
+        return _impl->bin_width;
+    }
+
+    size_t Roc::maxBins() const
+    {
+        return _impl->max_bins;
+    }
+
+    void Roc::getObservations(std::vector<Observation> & target) const
+    {
+        if(_impl->max_bins > 0)
+        {
+            for(auto const & bin : _impl->bins)
+            {
+                target.insert(target.end(), bin.second.cbegin(), bin.second.cend());
+            }
+        }
+        else
+        {
+            target.insert(target.end(), _impl->obs.cbegin(), _impl->obs.cend());
+        }
     }
 
     Level Roc::getTotals(uint64_t flag_mask) const
     {
+        std::vector<Observation> const & obs = _impl->observations();
         Level last;
-        for(auto const & x : _impl->obs)
+        for(auto const & x : obs)
         {
 
             if(flag_mask > 0 && ((x.flags & flag_mask) != flag_mask))
@@ -181,7 +337,8 @@ namespace roc
 
     void Roc::getLevels(std::vector<Level> & output, double roc_delta, uint64_t flag_mask) const
     {
-        std::sort(_impl->obs.begin(), _impl->obs.end(),
+        std::vector<Observation> & obs = _impl->observations();
+        std::sort(obs.begin(), obs.end(),
                   [](Observation const & o1, Observation const & o2) -> bool {
                       return o1.level < o2.level;
                   });
@@ -189,7 +346,7 @@ namespace roc
         Level last;
         std::vector<Level> target;
         last.level = std::numeric_limits<double>::quiet_NaN();
-        for(auto const & x : _impl->obs)
+        for(auto const & x : obs)
         {
             if(flag_mask > 0 && ((x.flags & flag_mask) != flag_mask))
             {
@@ -0,0 +1,337 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * Read and write ROCs as mergeable binary files
+ *
+ * File format (gzip-compressed, values in native byte order, i.e. little-endian on x86):
+ *
+ * magic "HAPROCS\0", uint32 version
+ * string QQ field name
+ * uint32 number of regions, followed by (string name, uint64 size) for each region
+ * uint32 number of ROCs, followed by each ROC as
+ *     string name, uint64 maximum number of bins, double bin width, uint64 number of observations,
+ *     and (double level, uint8 decision type, uint64 count, uint64 flags) for each observation
+ *
+ * Strings are stored as uint32 length followed by the characters.
+ *
+ * \file RocArtifact.cpp
+ *
+ */
+
+#include "helpers/RocArtifact.hh"
+#include "helpers/StringUtil.hh"
+#include "Error.hh"
+
+#include <boost/filesystem.hpp>
+
+#include <algorithm>
+#include <cstring>
+#include <vector>
+
+#include <zlib.h>
+
+namespace roc
+{
+    const uint32_t ARTIFACT_VERSION = 1;
+
+    namespace
+    {
+        const char ARTIFACT_MAGIC[8] = {'H', 'A', 'P', 'R', 'O', 'C', 'S', '\0'};
+
+        /** buffer values and write them to a gzip file */
+        class ArtifactWriter
+        {
+        public:
+            explicit ArtifactWriter(std::string const & _filename) : filename(_filename)
+            {
+                f = gzopen(filename.c_str(), "wb");
+                if(!f)
+                {
+                    error("Cannot write ROC artifact %s", filename.c_str());
+                }
+            }
+            ~ArtifactWriter()
+            {
+                if(f)
+                {
+                    gzclose(f);
+                }
+            }
+
+            template<typename T> void put(T value)
+            {
+                const size_t pos = buffer.size();
+                buffer.resize(pos + sizeof(T));
+                memcpy(&buffer[pos], &value, sizeof(T));
+                if(buffer.size() > 1024*1024)
+                {
+                    flush();
+                }
+            }
+
+            void putString(std::string const & s)
+            {
+                put<uint32_t>((uint32_t) s.size());
+                buffer.insert(buffer.end(), s.cbegin(), s.cend());
+            }
+
+            void flush()
+            {
+                if(!buffer.empty() && gzwrite(f, buffer.data(), (unsigned) buffer.size()) != (int) buffer.size())
+                {
+                    error("Failed to write ROC artifact %s", filename.c_str());
+                }
+                buffer.clear();
+            }
+
+            void close()
+            {
+                flush();
+                const int result = gzclose(f);
+                f = nullptr;
+                if(result != Z_OK)
+                {
+                    error("Failed to write ROC artifact %s", filename.c_str());
+                }
+            }
+        private:
+            std::string filename;
+            gzFile f;
+            std::vector<char> buffer;
+        };
+
+        /** read values from a gzip file */
+        class ArtifactReader
+        {
+        public:
+            explicit ArtifactReader(std::string const & _filename) : filename(_filename), pos(0)
+            {
+                f = gzopen(filename.c_str(), "rb");
+                if(!f)
+                {
+                    error("Cannot open ROC artifact %s", filename.c_str());
+                }
+            }
+            ~ArtifactReader()
+            {
+                gzclose(f);
+            }
+
+            void read(void * target, size_t len)
+            {
+                char * t = (char *) target;
+                while(len > 0)
+                {
+                    if(pos == buffer.size())
+                    {
+                        buffer.resize(1024*1024);
+                        const int result = gzread(f, buffer.data(), (unsigned) buffer.size());
+                        if(result <= 0)
+                        {
+                            error("ROC artifact %s is truncated or corrupt", filename.c_str());
+                        }
+                        buffer.resize((size_t) result);
+                        pos = 0;
+                    }
+                    const size_t n = std::min(len, buffer.size() - pos);
+                    memcpy(t, &buffer[pos], n);
+                    pos += n;
+                    t += n;
+                    len -= n;
+                }
+            }
+
+            template<typename T> T get()
+            {
+                T value;
+                read(&value, sizeof(T));
+                return value;
+            }
+
+            std::string getString()
+            {
+                std::string s(get<uint32_t>(), '\0');
+                read(&s[0], s.size());
+                return s;
+            }
+        private:
+            std::string filename;
+            gzFile f;
+            std::vector<char> buffer;
+            size_t pos;
+        };
+    }
+
+    void writeArtifact(std::string const & filename,
+                       RocMap const & rocs,
+                       std::string const & qq_field,
+                       variant::QuantifyRegions const & regions)
+    {
+        // ROCs are named <a|f|s|region>:<type>:<filter>, see BlockQuantify
+        std::map<std::string, size_t> region_sizes;
+        region_sizes["*"] = regions.getRegionSize("*");
+        for(auto const & r : rocs)
+        {
+            std::vector<std::string> subs;
+            stringutil::split(r.first, subs, ":");
+            if(subs.size() == 3 && subs[0].substr(0, 2) == "s|")
+            {
+                region_sizes[subs[0].substr(2)] = regions.getRegionSize(subs[0].substr(2));
+            }
+        }
+        writeArtifact(filename, rocs, qq_field, region_sizes);
+    }
+
+    void writeArtifact(std::string const & filename,
+                       RocMap const & rocs,
+                       std::string const & qq_field,
+                       std::map<std::string, size_t> const & region_sizes)
+    {
+        const boost::filesystem::path temp_name = boost::filesystem::unique_path(filename + ".%%%%-%%%%");
+        {
+            ArtifactWriter w(temp_name.string());
+            for(char c : ARTIFACT_MAGIC)
+            {
+                w.put<char>(c);
+            }
+            w.put<uint32_t>(ARTIFACT_VERSION);
+            w.putString(qq_field);
+
+            w.put<uint32_t>((uint32_t) region_sizes.size());
+            for(auto const & r : region_sizes)
+            {
+                w.putString(r.first);
+                w.put<uint64_t>(r.second);
+            }
+
+            w.put<uint32_t>((uint32_t) rocs.size());
+            std::vector<Observation> obs;
+            for(auto const & r : rocs)
+            {
+                obs.clear();
+                r.second.getObservations(obs);
+                w.putString(r.first);
+                w.put<uint64_t>(r.second.maxBins());
+                w.put<double>(r.second.binWidth());
+                w.put<uint64_t>(obs.size());
+                for(auto const & o : obs)
+                {
+                    w.put<double>(o.level);
+                    w.put<uint8_t>((uint8_t) to_underlying(o.dt));
+                    w.put<uint64_t>(o.n);
+                    w.put<uint64_t>(o.flags);
+                }
+            }
+            w.close();
+        }
+        boost::filesystem::rename(temp_name, filename);
+    }
+
+    void addArtifact(std::string const & filename,
+                     RocMap & rocs,
+                     std::string & qq_field,
+                     std::map<std::string, size_t> & region_sizes)
+    {
+        ArtifactReader r(filename);
+        char magic[sizeof(ARTIFACT_MAGIC)];
+        r.read(magic, sizeof(magic));
+        if(memcmp(magic, ARTIFACT_MAGIC, sizeof(magic)) != 0)
+        {
+            error("%s is not a ROC artifact", filename.c_str());
+        }
+        const uint32_t version = r.get<uint32_t>();
+        if(version != ARTIFACT_VERSION)
+        {
+            error("ROC artifact %s has version %u, only version %u is supported",
+                  filename.c_str(), version, ARTIFACT_VERSION);
+        }
+
+        const std::string file_qq_field = r.getString();
+        if(qq_field.empty())
+        {
+            qq_field = file_qq_field;
+        }
+        else if(qq_field != file_qq_field)
+        {
+            error("ROC artifact %s uses QQ field %s rather than %s",
+                  filename.c_str(), file_qq_field.c_str(), qq_field.c_str());
+        }
+
+        const uint32_t nregions = r.get<uint32_t>();
+        for(uint32_t i = 0; i < nregions; ++i)
+        {
+            const std::string name = r.getString();
+            const size_t size = (size_t) r.get<uint64_t>();
+            auto it = region_sizes.find(name);
+            if(it == region_sizes.end())
+            {
+                region_sizes[name] = size;
+            }
+            else if(it->second != size)
+            {
+                error("ROC artifact %s has a size of %llu for region %s rather than %llu, "
+                      "all artifacts must be created using the same stratification regions.",
+                      filename.c_str(), (unsigned long long) size, name.c_str(), (unsigned long long) it->second);
+            }
+        }
+
+        const uint32_t nrocs = r.get<uint32_t>();
+        for(uint32_t i = 0; i < nrocs; ++i)
+        {
+            const std::string name = r.getString();
+            const uint64_t max_bins = r.get<uint64_t>();
+            const double bin_width = r.get<double>();
+            uint64_t nobs = r.get<uint64_t>();
+
+            Roc roc = max_bins > 0 ? Roc((size_t) max_bins, bin_width) : Roc();
+            while(nobs-- > 0)
+            {
+                Observation o;
+                o.level = r.get<double>();
+                const uint8_t dt = r.get<uint8_t>();
+                if(dt >= NDecisionTypes)
+                {
+                    error("ROC artifact %s is truncated or corrupt", filename.c_str());
+                }
+                o.dt = (DecisionType) dt;
+                o.n = r.get<uint64_t>();
+                o.flags = r.get<uint64_t>();
+                roc.add(o);
+            }
+
+            auto it = rocs.find(name);
+            if(it == rocs.end())
+            {
+                rocs.emplace(name, std::move(roc));
+            }
+            else
+            {
+                it->second.add(roc);
+            }
+        }
+    }
+}
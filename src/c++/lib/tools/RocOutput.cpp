@@ -167,7 +167,7 @@ namespace roc
                    Level const & l,
                    table::Table & table,
                    bool counts_only,
-                   variant::QuantifyRegions const & regions)
+                   std::function<size_t(std::string const &)> const & region_size)
     {
         // don't write rows for ti / tv / genotypes, but rather show the counts inline
         if(subtype != "ti" && subtype != "tv" && genotype == "*")
@@ -197,7 +197,7 @@ namespace roc
             table.set(prefix, _S(METRICS::UNK), l.unk());
             table.set(prefix, _S(METRICS::FP_al), l.fp_al());
             table.set(prefix, _S(METRICS::FP_gt), l.fp_gt());
-            table.set(prefix, _S(METRICS::Subset_Size), regions.getRegionSize(subset));
+            table.set(prefix, _S(METRICS::Subset_Size), region_size(subset));
             if(!counts_only)
             {
                 table.set(prefix, _S(METRICS::FN), l.fn());
@@ -351,7 +351,7 @@ namespace roc
             for (auto const &st : subtypes)
             {
                 const roc::Level l = m.second.getTotals(st.second);
-                _addLevel(type, st.first.first, st.first.second, filter, subset, qq_field, l, output_values, counts_only, regions);
+                _addLevel(type, st.first.first, st.first.second, filter, subset, qq_field, l, output_values, counts_only, region_size);
 
                 // don't write ROCs for filters
                 // we could make this optional, but not sure it is really necessary
@@ -361,7 +361,7 @@ namespace roc
                     m.second.getLevels(levels, roc_delta, st.second);
                     for (auto const &l2 : levels)
                     {
-                        _addLevel(type, st.first.first, st.first.second, filter, subset, qq_field, l2, output_values, counts_only, regions);
+                        _addLevel(type, st.first.first, st.first.second, filter, subset, qq_field, l2, output_values, counts_only, region_size);
                     }
                 }
             }
@@ -191,6 +191,12 @@ int VariantReader::addSample(const char * filename, const char * sname)
     }
     else
     {
+        // a single input can be streamed from stdin; this is only
+        // possible without an index, so no regions / rewind in this case
+        if(std::string(filename) == "-" && _impl->files->nreaders == 0)
+        {
+            _impl->files->require_index = 0;
+        }
         if (!bcf_sr_add_reader(_impl->files, filename))
         {
             error("Failed to open or file not indexed: %s\n", filename);
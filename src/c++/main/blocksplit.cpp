@@ -42,6 +42,8 @@
 
 #include <fstream>
 #include <limits>
+#include <cmath>
+#include <cstring>
 #include <htslib/synced_bcf_reader.h>
 #include <htslib/vcf.h>
 
@@ -50,6 +52,20 @@
 
 using namespace variant;
 
+/**
+ * Estimate the cost of comparing a superlocus in xcmp.
+ *
+ * GraphReference::enumeratePaths enumerates all combinations of het alleles,
+ * and each path is built and compared over the whole span of the block; indels and
+ * complex alleles make this more expensive than SNPs. The number of paths is capped
+ * at 4096 like in xcmp (--max-n-haplotypes), beyond which blocks are not enumerated.
+ */
+static inline double superlocusCost(int64_t vars, int64_t hets, int64_t nonsnp, int64_t span)
+{
+    const double paths = std::pow(2.0, (double)std::min(hets, (int64_t)12));
+    return (double)vars + paths * (1.0 + nonsnp) * (1.0 + span / 1000.0);
+}
+
 int main(int argc, char* argv[]) {
     namespace po = boost::program_options;
 
@@ -68,6 +84,7 @@ int main(int argc, char* argv[]) {
     int64_t message = -1;
     int64_t window = 30;
     bool apply_filters = false;
+    bool write_estimates = false;
 
     int nblocks = 32;
     int nvars = 100;
@@ -92,6 +109,7 @@ int main(int argc, char* argv[]) {
             ("nblocks,b", po::value<int>(), "Maximum number of blocks to break into (32).")
             ("nvars,v", po::value<int>(), "Minimum number of variants per block (100).")
             ("apply-filters,f", po::value<bool>(), "Apply filtering in VCF.")
+            ("estimates,e", po::value<bool>(), "Add a fourth column to the output which gives the estimated comparison cost for each block.")
             ("verbose", po::value<bool>(), "Verbose output.")
         ;
 
@@ -195,6 +213,11 @@ int main(int argc, char* argv[]) {
             apply_filters = vm["apply-filters"].as< bool >();
         }
 
+        if (vm.count("estimates"))
+        {
+            write_estimates = vm["estimates"].as< bool >();
+        }
+
         if (vm.count("window"))
         {
             window = vm["window"].as< int64_t >();
@@ -294,26 +317,58 @@ int main(int argc, char* argv[]) {
         int64_t rcount = 0;
         int64_t last_end = -1;
         int64_t vars = 0, total_vars = 0;
+        double cost = 0, total_cost = 0;
+
+        // statistics for the current superlocus
+        int64_t sl_vars = 0, sl_hets = 0, sl_nonsnp = 0, sl_start = -1;
 
         struct Breakpoint
         {
             std::string chr;
-            int64_t pos;
+            int64_t pos;        // -1 marks the end of a chromosome
             int64_t vars;
+            double cost;
         };
 
         std::list< Breakpoint > breakpoints;
 
-        const auto add_bp = [&breakpoints, nvars, nblocks, &chr, &vars, verbose](int64_t bp)
+        const auto end_superlocus = [&](int64_t sl_end)
+        {
+            if(sl_vars > 0)
+            {
+                const double c = superlocusCost(sl_vars, sl_hets, sl_nonsnp, sl_end - sl_start + 1);
+                cost += c;
+                total_cost += c;
+            }
+            sl_vars = 0;
+            sl_hets = 0;
+            sl_nonsnp = 0;
+            sl_start = -1;
+        };
+
+        const auto add_bp = [&breakpoints, nvars, nblocks, &chr, &vars, &cost, verbose](int64_t bp)
         {
             if (vars > nvars)
             {
                 if(verbose)
                 {
-                    std::cerr << "Break point at " << chr << ":" << bp << " (" << vars << " variants)" << "\n";
+                    std::cerr << "Break point at " << chr << ":" << bp << " (" << vars << " variants, "
+                              << "estimated cost " << cost << ")" << "\n";
                 }
-                breakpoints.push_back(Breakpoint{chr, bp, vars});
+                breakpoints.push_back(Breakpoint{chr, bp, vars, cost});
+                vars = 0;
+                cost = 0;
+            }
+        };
+
+        // variants after the last breakpoint on a chromosome belong to its last block
+        const auto end_chr = [&breakpoints, &chr, &vars, &cost]()
+        {
+            if(!chr.empty() && vars > 0)
+            {
+                breakpoints.push_back(Breakpoint{chr, -1, vars, cost});
                 vars = 0;
+                cost = 0;
             }
         };
 
@@ -338,6 +393,7 @@ int main(int argc, char* argv[]) {
 
             std::string v_chr;
             int64_t v_pos = -1, v_end = -1;
+            bool v_het = false, v_nonsnp = false;
             for(int isample = 0; isample < reader->nreaders; ++isample)
             {
                 if(!bcf_sr_has_line(reader, isample))
@@ -386,12 +442,11 @@ int main(int argc, char* argv[]) {
                         if(gts[j] > 0)
                         {
                             call_this_pos = true;
-                            break;
                         }
-                    }
-                    if(call_this_pos)
-                    {
-                        break;
+                        if(j > 0 && gts[j] != gts[0])
+                        {
+                            v_het = true;
+                        }
                     }
                 }
 
@@ -400,6 +455,16 @@ int main(int argc, char* argv[]) {
                     continue;
                 }
 
+                const size_t ref_len = strlen(line->d.allele[0]);
+                for(int j = 1; j < line->n_allele; ++j)
+                {
+                    if(ref_len != 1 || strlen(line->d.allele[j]) != 1)
+                    {
+                        v_nonsnp = true;
+                        break;
+                    }
+                }
+
                 v_chr = bcfhelpers::getChrom(hdr, line);
                 // rely on synced_reader to give us records on the same chr
                 int64_t this_v_pos = -1;
@@ -443,6 +508,8 @@ int main(int argc, char* argv[]) {
             }
             if(chr != "" && v_chr != chr)
             {
+                end_superlocus(last_end);
+                end_chr();
                 last_end = -1;
             }
             chr = v_chr;
@@ -459,12 +526,29 @@ int main(int argc, char* argv[]) {
 
             if(last_end >= 0 && v_pos > last_end + window) // can split here
             {
+                end_superlocus(last_end);
                 add_bp(last_end);
             }
             last_end = std::max(last_end, v_end);
 
+            if(sl_start < 0)
+            {
+                sl_start = v_pos;
+            }
+            ++sl_vars;
+            if(v_het)
+            {
+                ++sl_hets;
+            }
+            if(v_nonsnp)
+            {
+                ++sl_nonsnp;
+            }
+
             ++rcount;
         }
+        end_superlocus(last_end);
+        end_chr();
 
         // write blocks
         std::ostream * outputfile = NULL;
@@ -484,34 +568,51 @@ int main(int argc, char* argv[]) {
 
         chr = firstchr;
         start = 0;
-        int64_t vpb = 0;
-        int64_t target_vpb = std::max(nvars, ((int)total_vars) / nblocks);
+        // blocks are balanced by estimated cost rather than by number of variants;
+        // each breakpoint already has at least nvars variants before it
+        double cpb = 0;
+        const double target_cpb = total_cost / std::max(1, nblocks);
+
+        if(verbose)
+        {
+            std::cerr << "Total " << total_vars << " variants, estimated cost " << total_cost << "\n";
+        }
 
         if(end <= 0)
         {
             end = std::numeric_limits<int>::max();
         }
 
+        const auto write_block = [&outputfile, &chr, write_estimates](int64_t b_start, int64_t b_end, double b_cost)
+        {
+            *outputfile << chr << "\t" << b_start << "\t" << b_end;
+            if(write_estimates)
+            {
+                *outputfile << "\t" << (int64_t)std::ceil(b_cost);
+            }
+            *outputfile << "\n";
+        };
+
         for (auto & b : breakpoints)
         {
             if (chr != b.chr)
             {
-                *outputfile << chr << "\t" << start << "\t" << std::max(start + window + 1, end) << "\n";
+                write_block(start, std::max(start + window + 1, end), cpb);
                 chr = b.chr;
                 start = 1;
-                vpb = 0;
+                cpb = 0;
             }
-            vpb += b.vars;
-            if(vpb > target_vpb)
+            cpb += b.cost;
+            if(b.pos >= 0 && cpb > target_cpb)
             {
-                *outputfile << chr << "\t" << start << "\t" << b.pos + window + 1 << "\n";
+                write_block(start, b.pos + window + 1, cpb);
                 start = b.pos + window + 1;
-                vpb = 0;
+                cpb = 0;
             }
         }
         if(chr != "")
         {
-            *outputfile << chr << "\t" << start << "\t" << std::max(start + window + 1, end) << "\n";
+            write_block(start, std::max(start + window + 1, end), cpb);
         }
 
         if(out_bed != "-" && out_bed != "")
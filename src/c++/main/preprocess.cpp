@@ -99,7 +99,7 @@ int main(int argc, char* argv[]) {
         desc.add_options()
             ("help,h", "produce help message")
             ("version", "Show version")
-            ("input-vcf", po::value<std::string>(), "VCF files to preprocess (use file:sample for a specific sample column).")
+            ("input-vcf", po::value<std::string>(), "VCF files to preprocess (use file:sample for a specific sample column; - reads an unindexed stream from stdin).")
             ("output-vcf,o", po::value<std::string>(), "Output variant comparison results to VCF.")
             ("reference,r", po::value<std::string>(), "The reference fasta file.")
             ("location,l", po::value<std::string>(), "The location to start at.")
@@ -52,9 +52,14 @@
 #include <queue>
 #include <mutex>
 #include <future>
+#include <atomic>
+#include <algorithm>
+#include <limits>
 #include <htslib/synced_bcf_reader.h>
+#include <htslib/tbx.h>
 #include <helpers/BCFHelpers.hh>
 #include <helpers/RocOutput.hh>
+#include <helpers/RocArtifact.hh>
 #include <htslib/vcf.h>
 
 #include "Error.hh"
@@ -64,6 +69,69 @@
 
 using namespace variant;
 
+namespace
+{
+    /** a contig in the input file */
+    struct Shard
+    {
+        std::string name;
+        // number of records according to the index
+        uint64_t records;
+        // file offset of the first record
+        uint64_t offset;
+    };
+
+    /** contigs which have records in the index of an input file, in file order */
+    std::vector<Shard> indexedContigs(bcf_sr_t const & r)
+    {
+        int count = 0;
+        const char ** names = nullptr;
+        hts_idx_t * idx = nullptr;
+        if(r.tbx_idx)
+        {
+            names = tbx_seqnames(r.tbx_idx, &count);
+            idx = r.tbx_idx->idx;
+        }
+        else if(r.bcf_idx)
+        {
+            names = bcf_index_seqnames(r.bcf_idx, r.header, &count);
+            idx = r.bcf_idx;
+        }
+        else
+        {
+            error("Input file must be indexed.");
+        }
+
+        std::vector<Shard> result;
+        for(int i = 0; i < count; ++i)
+        {
+            const int tid = r.tbx_idx ? tbx_name2id(r.tbx_idx, names[i]) : bcf_hdr_name2id(r.header, names[i]);
+            uint64_t mapped = 0, unmapped = 0;
+            if(hts_idx_get_stat(idx, tid, &mapped, &unmapped) < 0)
+            {
+                mapped = 0;
+            }
+            hts_itr_t * itr = hts_itr_query(idx, tid, 0, std::numeric_limits<int>::max(),
+                                            r.tbx_idx ? tbx_readrec : bcf_readrec);
+            uint64_t offset = std::numeric_limits<uint64_t>::max();
+            if(itr)
+            {
+                if(itr->n_off > 0)
+                {
+                    offset = itr->off[0].u;
+                }
+                hts_itr_destroy(itr);
+            }
+            result.push_back(Shard{names[i], mapped, offset});
+        }
+        free(names);
+        std::stable_sort(result.begin(), result.end(), [](Shard const & a, Shard const & b) {
+            return a.offset < b.offset;
+        });
+        return result;
+    }
+}
+
 
 int main(int argc, char* argv[]) {
     namespace po = boost::program_options;
@@ -72,6 +140,8 @@ int main(int argc, char* argv[]) {
     std::string file;
     std::string output_roc;
     std::string output_vcf;
+    std::string output_artifact;
+    std::vector<std::string> merge_artifacts;
     std::string ref;
     std::string only_regions;
     std::string qtype = "xcmp";
@@ -79,6 +149,7 @@ int main(int argc, char* argv[]) {
     std::string qq_header = "QUAL";
     std::string roc_filter = "";
     double roc_delta = 0.1;
+    int roc_bins = 0;
 
     // limits
     std::string chr;
@@ -96,6 +167,7 @@ int main(int argc, char* argv[]) {
     bool output_rocs = true;
 
     int threads = 1;
+    int shards = 0;
     int blocksize = 20000;
     std::vector<std::string> roc_regions = {"*"};
 
@@ -113,16 +185,26 @@ int main(int argc, char* argv[]) {
                 ("input-file", po::value<std::string>(), "The input file")
                 ("output-file,o", po::value<std::string>(), "The output file name (TSV Format).")
                 ("output-vcf,v", po::value<std::string>(), "Annotated VCF file (with bed annotations).")
+                ("output-artifact", po::value<std::string>(), "Write the ROCs and region sizes to a binary file which can be "
+                                                              "merged with the ones from other runs using --merge-artifact.")
+                ("merge-artifact", po::value< std::vector<std::string> >(),
+                    "Rather than reading an input file, add up the ROCs from files written using --output-artifact, "
+                    "and write the output table.")
                 ("output-summary", po::value<std::string>(), "Output a summary table with TP / FP / FN / UNK counts, precision, recall, etc.")
                 ("output-filter-rocs", po::value<bool>(), "Output ROC levels for filters.")
                 ("roc-filter", po::value<std::string>(), "Ignore certain filters when creating a ROC.")
                 ("roc-delta", po::value<double>(), "Minium spacing of levels on ROC QQ trace.")
+                ("roc-bins", po::value<int>(), "Bin QQ values into at most this number of bins per ROC rather than keeping all "
+                                               "observations. Bins are --roc-delta wide initially, and double in width when "
+                                               "a ROC has too many of them (default is 0, no binning).")
                 ("qq", po::value<std::string>(), "Field to use for QQ (ROC quantity). Can be QUAL / GQ / ... / any INFO field name.")
                 ("qq-header", po::value<std::string>(), "Field header to use for QQ in output tables (ROC quantity). Defaults to QQ.")
                 ("reference,r", po::value<std::string>(), "The reference fasta file (needed only for VCF output).")
                 ("location,l", po::value<std::string>(), "Start location.")
                 ("regions,R", po::value< std::vector<std::string> >(),
                     "Region bed file. You can attach a label by prefixing with a colon, e.g. -R FP2:false-positives-type2.bed")
+                ("stratification-index", po::value<std::string>(),
+                    "Stratification index file written by strat-index. Regions from the index are added to the ones given via -R.")
                 ("roc-regions", po::value< std::vector<std::string> >(),
                     "Regions to compute ROCs in. By default, only the '*' region (total unstratified counts) will produce ROC counts. "
                     "For example, --roc-regions '*' --roc-regions FP2 also produces a ROC in the FP2 regions.")
@@ -137,6 +219,8 @@ int main(int argc, char* argv[]) {
                 ("output-rocs", po::value<bool>(), "Output ROCs with full set of levels of QQ values (default is 1, disable for more concise output)")
                 ("fix-chr-regions", po::value<bool>(), "Add chr prefix to regions if necessary (default is off).")
                 ("threads", po::value<int>(), "Number of threads to use.")
+                ("shards", po::value<int>(), "Process each contig of the (indexed) input file separately, using this number of "
+                                             "threads. Counts are combined at the end. This replaces --threads.")
                 ("blocksize", po::value<int>(), "Number of variants per block.")
             ;
 
@@ -181,6 +265,20 @@ int main(int argc, char* argv[]) {
                 output_vcf = vm["output-vcf"].as< std::string >();
             }
 
+            if (vm.count("output-artifact"))
+            {
+                output_artifact = vm["output-artifact"].as< std::string >();
+            }
+
+            if (vm.count("merge-artifact"))
+            {
+                merge_artifacts = vm["merge-artifact"].as< std::vector<std::string> >();
+                if(!file.empty() || !output_vcf.empty())
+                {
+                    error("--merge-artifact cannot be combined with an input file or --output-vcf.");
+                }
+            }
+
             if (vm.count("reference"))
             {
                 ref = vm["reference"].as< std::string >();
@@ -229,6 +327,15 @@ int main(int argc, char* argv[]) {
                 roc_delta = vm["roc-delta"].as< double >();
             }
 
+            if (vm.count("roc-bins"))
+            {
+                roc_bins = vm["roc-bins"].as< int >();
+                if(roc_bins < 0)
+                {
+                    error("--roc-bins must not be negative.");
+                }
+            }
+
             if (vm.count("limit-records"))
             {
                 rlimit = vm["limit-records"].as< int64_t >();
@@ -274,12 +381,17 @@ int main(int argc, char* argv[]) {
                 threads = vm["threads"].as< int >();
             }
 
+            if (vm.count("shards"))
+            {
+                shards = vm["shards"].as< int >();
+            }
+
             if (vm.count("blocksize"))
             {
                 blocksize = vm["blocksize"].as< int >();
             }
 
-            if(file.size() == 0)
+            if(file.size() == 0 && merge_artifacts.empty())
             {
                 std::cerr << "Please specify one input file / sample.\n";
                 return 1;
@@ -297,6 +409,11 @@ int main(int argc, char* argv[]) {
                 regions.load(rnames, fixchr);
             }
 
+            if (vm.count("stratification-index"))
+            {
+                regions.loadIndex(vm["stratification-index"].as< std::string >());
+            }
+
             if (vm.count("roc-regions"))
             {
                 roc_regions = vm["roc-regions"].as< std::vector<std::string> >();
@@ -308,23 +425,63 @@ int main(int argc, char* argv[]) {
             return 1;
         }
 
-        FastaFile ref_fasta(ref.c_str());
-        bcf_srs_t * reader = bcf_sr_init();
-        reader->require_index = 1;
-        reader->collapse = COLLAPSE_NONE;
-        reader->streaming = 0;
-        if(!only_regions.empty()) {
-            int result = bcf_sr_set_regions(reader, only_regions.c_str(), 1);
-            if(result < 0)
+        if(!merge_artifacts.empty())
+        {
+            roc::RocMap roc_map;
+            std::map<std::string, size_t> region_sizes;
+            std::string artifact_qq;
+            for(auto const & a : merge_artifacts)
             {
-                error("Failed to set regions string %s.", only_regions.c_str());
+                roc::addArtifact(a, roc_map, artifact_qq, region_sizes);
             }
+            if(!output_artifact.empty())
+            {
+                roc::writeArtifact(output_artifact, roc_map, artifact_qq, region_sizes);
+            }
+            std::ofstream out_roc(output_roc);
+            roc::ROCOutput ro(roc_map, artifact_qq, output_rocs, roc_delta, region_sizes, roc_regions);
+            ro.write(out_roc);
+            out_roc.close();
+            return 0;
         }
-        if (!bcf_sr_add_reader(reader, file.c_str()))
+
+        if(shards > 0)
         {
-            error("Failed to open or file not indexed: %s\n", file.c_str());
+            if(!chr.empty() || !only_regions.empty() || rlimit != -1)
+            {
+                error("--shards cannot be combined with --location, --only or --limit-records.");
+            }
+            if(!output_vcf.empty() && output_vcf[0] == '-')
+            {
+                error("Cannot write the output VCF to stdout when using --shards.");
+            }
         }
 
+        FastaFile ref_fasta(ref.c_str());
+
+        /** open the input file, optionally restricted to a set of regions */
+        const auto open_reader = [&file](std::string const & reader_regions) -> bcf_srs_t *
+        {
+            bcf_srs_t * reader = bcf_sr_init();
+            reader->require_index = 1;
+            reader->collapse = COLLAPSE_NONE;
+            reader->streaming = 0;
+            if(!reader_regions.empty()) {
+                int result = bcf_sr_set_regions(reader, reader_regions.c_str(), 1);
+                if(result < 0)
+                {
+                    error("Failed to set regions string %s.", reader_regions.c_str());
+                }
+            }
+            if (!bcf_sr_add_reader(reader, file.c_str()))
+            {
+                error("Failed to open or file not indexed: %s\n", file.c_str());
+            }
+            return reader;
+        };
+
+        bcf_srs_t * reader = open_reader(only_regions);
+
         if(!chr.empty())
         {
             int success = 0;
@@ -367,20 +524,21 @@ int main(int argc, char* argv[]) {
             qparams += "QQ:" + qq + ";";
         }
         qparams += "extended_counts;";
-
-        std::unique_ptr<BlockQuantify> p_bq(std::move(makeQuantifier(hdr, ref_fasta, qtype, qparams)));
-        p_bq->rocFiltering(roc_filter);
+        if(roc_bins > 0)
+        {
+            // bins of width 1e-6 distinguish the same levels as --roc-delta 0
+            qparams += "roc_bins:" + std::to_string(roc_bins) + ";";
+            qparams += "roc_bin_width:" + std::to_string(std::max(roc_delta, 1e-6)) + ";";
+        }
 
         // update the header
-        p_bq->updateHeader(hdr);
+        makeQuantifier(hdr, ref_fasta, qtype, qparams)->updateHeader(hdr);
 
         htsFile * writer = nullptr;
+        const char * mode = "wu";
 
         if (output_vcf != "")
         {
-
-            const char * mode = "wu";
-
             if(stringutil::endsWith(output_vcf, ".vcf.gz"))
             {
                 mode = "wz";
@@ -401,21 +559,6 @@ int main(int argc, char* argv[]) {
             bcf_hdr_write(writer, hdr);
         }
 
-        /** local function to count variants in all samples */
-        int64_t rcount = 0;
-        std::string current_chr = "";
-        int vars_in_block = 0;
-        /** async stuff. each block can be counted in parallel, but we need to
-         *  write out the variants sequentially.
-         *  Therefore, we keep a future for each block to be able to join
-         *  when it's processed
-         */
-        std::queue<std::pair <
-            std::future<void>,
-            std::unique_ptr<BlockQuantify>
-        >> blocks;
-
-
         int truth_sample_id = -1;
         int query_sample_id = -1;
 
@@ -456,154 +599,336 @@ int main(int argc, char* argv[]) {
             roc_map.reset(new std::map<std::string, roc::Roc>());
         }
 
-        /** this is where things actually get written to files */
-        auto output_counts = [&writer, &roc_map, &blocks, hdr, truth_sample_id, query_sample_id](int min_size) {
-            while(blocks.size() > (unsigned )min_size)
+        /** read, annotate and count the variants from a reader. Blocks are counted
+         *  on up to threads additional threads, or sequentially when threads is zero.
+         *  When only_chr is given, reading stops at the end of this chromosome. */
+        const auto quantify_records = [&](bcf_srs_t * reader, bcf_hdr_t * hdr, QuantifyRegions & regions,
+                                          htsFile * writer, std::map<std::string, roc::Roc> * roc_map,
+                                          std::string const & only_chr, int threads)
+        {
+            /** local function to count variants in all samples */
+            int64_t rcount = 0;
+            std::string current_chr = "";
+            int vars_in_block = 0;
+            /** async stuff. each block can be counted in parallel, but we need to
+             *  write out the variants sequentially.
+             *  Therefore, we keep a future for each block to be able to join
+             *  when it's processed
+             */
+            std::queue<std::pair <
+                std::future<void>,
+                std::unique_ptr<BlockQuantify>
+            >> blocks;
+            const std::launch policy = threads > 0 ? std::launch::async : std::launch::deferred;
+
+            /** this is where things actually get written to files */
+            auto output_counts = [&writer, &roc_map, &blocks, hdr](int min_size) {
+                while(blocks.size() > (unsigned )min_size)
+                {
+                    // make sure we have run this block
+                    blocks.front().first.get();
+
+                    // output variants
+                    if(writer)
+                    {
+                        auto const & variants = blocks.front().second->getVariants();
+                        for(auto & v : variants)
+                        {
+                            bcf_write1(writer, hdr, v);
+                        }
+                    }
+
+                    // update ROC data
+                    if(roc_map)
+                    {
+                        auto const & rm = blocks.front().second->getRocs();
+                        for(auto const & r : rm)
+                        {
+                            auto it = roc_map->find(r.first);
+                            if (it == roc_map->end()) {
+                                roc_map->insert(r);
+                            }
+                            else
+                            {
+                                it->second.add(r.second);
+                            }
+                        }
+                    }
+
+                    blocks.pop();
+                }
+            };
+
+            std::unique_ptr<BlockQuantify> p_bq(std::move(makeQuantifier(hdr, ref_fasta, qtype, qparams)));
+            p_bq->rocFiltering(roc_filter);
+
+            const bcfhelpers::InfoAccessor bs_field(hdr, "BS");
+            int nl = 1;
+            int previous_bs = -1;
+            while(nl)
             {
-                // make sure we have run this block
-                blocks.front().first.get();
+                nl = bcf_sr_next_line(reader);
+                if (nl <= 0)
+                {
+                    break;
+                }
+                if(!bcf_sr_has_line(reader, 0))
+                {
+                    continue;
+                }
+                bcf1_t *line = reader->readers[0].buffer[0];
 
-                // output variants
-                if(writer)
+                if(rlimit != -1)
                 {
-                    auto const & variants = blocks.front().second->getVariants();
-                    for(auto & v : variants)
+                    if(rcount >= rlimit)
                     {
-                        bcf_write1(writer, hdr, v);
+                        break;
                     }
                 }
+                const std::string vchr = bcfhelpers::getChrom(hdr, line);
+                if(end != -1 && ((!current_chr.empty() && vchr != current_chr) || line->pos > end))
+                {
+                    break;
+                }
+                if(!only_chr.empty() && vchr != only_chr)
+                {
+                    break;
+                }
 
-                // update ROC data
-                if(roc_map)
+                if(vchr != current_chr)
+                {
+                    // reset bs on chr switch
+                    previous_bs = -1;
+                }
+
+                if(apply_filters)
                 {
-                    auto const & rm = blocks.front().second->getRocs();
-                    for(auto const & r : rm)
+                    bcf_unpack(line, BCF_UN_FLT);
+
+                    bool fail = false;
+                    for(int j = 0; j < line->d.n_flt; ++j)
                     {
-                        auto it = roc_map->find(r.first);
-                        if (it == roc_map->end()) {
-                            roc_map->insert(r);
+                        std::string filter = "PASS";
+                        int k = line->d.flt[j];
+
+                        if(k >= 0)
+                        {
+                            filter = bcf_hdr_int2id(hdr, BCF_DT_ID, line->d.flt[j]);
                         }
-                        else
+                        if(filter != "PASS")
                         {
-                            it->second.add(r.second);
+                            fail = true;
+                            break;
                         }
                     }
+
+                    // skip failing
+                    if(fail)
+                    {
+                        continue;
+                    }
                 }
 
-                blocks.pop();
-            }
-        };
+                bcf_unpack(line, BCF_UN_INFO);
+                regions.annotate(hdr, line);
 
-        int nl = 1;
-        int previous_bs = -1;
-        while(nl)
-        {
-            nl = bcf_sr_next_line(reader);
-            if (nl <= 0)
-            {
-                break;
+                current_chr = vchr;
+
+                const int current_bs = bs_field.getInt(line);
+
+                // don't break benchmarking superloci across threads
+                if(vars_in_block > blocksize && (current_bs < 0 || previous_bs < 0 || (current_bs != previous_bs)))
+                {
+                    std::future<void> f = std::async(policy, &BlockQuantify::count, p_bq.get());
+                    // clear / write out some blocks (make sure we have at least 2xthreads tasks left)
+                    output_counts(threads);
+                    blocks.emplace(std::move(f), std::move(p_bq));
+                    p_bq = std::move(makeQuantifier(hdr, ref_fasta, qtype, qparams));
+                    p_bq->rocFiltering(roc_filter);
+                    vars_in_block = 0;
+
+                }
+
+                p_bq->add(bcf_dup(line));
+                ++vars_in_block;
+                previous_bs = current_bs;
+
+                if (message > 0 && (rcount % message) == 0)
+                {
+                    std::cout << stringutil::formatPos(vchr.c_str(), line->pos) << "\n";
+                }
+                // count variants here
+                ++rcount;
             }
-            if(!bcf_sr_has_line(reader, 0))
+
             {
-                continue;
+                std::future<void> f = std::async(policy, &BlockQuantify::count, p_bq.get());
+                // clear / write out some blocks (make sure we have at least 2xthreads tasks left)
+                blocks.emplace(std::move(f), std::move(p_bq));
             }
-            bcf1_t *line = reader->readers[0].buffer[0];
+            // clear remaining
+            output_counts(0);
+        };
 
-            if(rlimit != -1)
-            {
-                if(rcount >= rlimit)
+        if(shards <= 0)
+        {
+            quantify_records(reader, hdr, regions, writer, roc_map.get(), "", threads);
+        }
+        else
+        {
+            // one shard per contig, each shard has its own reader, region cursor and counts
+            const std::vector<Shard> contig_shards = indexedContigs(reader->readers[0]);
+            std::vector<std::unique_ptr<std::map<std::string, roc::Roc>>> shard_rocs(contig_shards.size());
+            std::vector<std::string> parts;
+            // each shard annotates using its own copy of the regions
+            std::vector<QuantifyRegions> shard_regions;
+            for(size_t i = 0; i < contig_shards.size(); ++i)
+            {
+                shard_regions.push_back(regions);
+                if(writer)
                 {
-                    break;
+                    parts.push_back(bf::unique_path(output_vcf + ".part.%%%%-%%%%").string());
+                }
+                if(roc_map)
+                {
+                    shard_rocs[i].reset(new std::map<std::string, roc::Roc>());
                 }
-            }
-            const std::string vchr = bcfhelpers::getChrom(hdr, line);
-            if(end != -1 && ((!current_chr.empty() && vchr != current_chr) || line->pos > end))
-            {
-                break;
             }
 
-            if(vchr != current_chr)
+            // largest shards first
+            std::vector<size_t> order(contig_shards.size());
+            for(size_t i = 0; i < order.size(); ++i)
             {
-                // reset bs on chr switch
-                previous_bs = -1;
+                order[i] = i;
             }
+            std::stable_sort(order.begin(), order.end(), [&contig_shards](size_t a, size_t b) {
+                return contig_shards[a].records > contig_shards[b].records;
+            });
 
-            if(apply_filters)
+            std::atomic<size_t> next_shard(0);
+            const auto run_shards = [&]()
             {
-                bcf_unpack(line, BCF_UN_FLT);
-
-                bool fail = false;
-                for(int j = 0; j < line->d.n_flt; ++j)
+                for(size_t k = next_shard++; k < order.size(); k = next_shard++)
                 {
-                    std::string filter = "PASS";
-                    int k = line->d.flt[j];
-
-                    if(k >= 0)
+                    const size_t i = order[k];
+                    bcf_srs_t * shard_reader = open_reader("");
+                    htsFile * part = nullptr;
+                    try
                     {
-                        filter = bcf_hdr_int2id(hdr, BCF_DT_ID, line->d.flt[j]);
+                        if(bcf_sr_seek(shard_reader, contig_shards[i].name.c_str(), 0) < 0)
+                        {
+                            error("Cannot seek to %s", contig_shards[i].name.c_str());
+                        }
+                        bcf_hdr_t * shard_hdr = shard_reader->readers[0].header;
+                        makeQuantifier(shard_hdr, ref_fasta, qtype, qparams)->updateHeader(shard_hdr);
+                        if(writer)
+                        {
+                            // parts have no header, they are appended to the output below
+                            part = hts_open(parts[i].c_str(), mode);
+                            if(!part)
+                            {
+                                error("Cannot write %s", parts[i].c_str());
+                            }
+                        }
+                        quantify_records(shard_reader, shard_hdr, shard_regions[i], part, shard_rocs[i].get(),
+                                         contig_shards[i].name, 0);
                     }
-                    if(filter != "PASS")
+                    catch(std::exception const &)
                     {
-                        fail = true;
-                        break;
+                        if(part)
+                        {
+                            hts_close(part);
+                        }
+                        bcf_sr_destroy(shard_reader);
+                        throw;
+                    }
+                    if(part)
+                    {
+                        hts_close(part);
                     }
+                    bcf_sr_destroy(shard_reader);
                 }
+            };
 
-                // skip failing
-                if(fail)
+            try
+            {
+                std::vector<std::future<void>> workers;
+                for(int t = 0; t < shards && t < (int) order.size(); ++t)
                 {
-                    continue;
+                    workers.push_back(std::async(std::launch::async, run_shards));
+                }
+                for(auto & w : workers)
+                {
+                    w.get();
                 }
-            }
-
-            bcf_unpack(line, BCF_UN_INFO);
-            regions.annotate(hdr, line);
-
-            current_chr = vchr;
 
-            const int current_bs = bcfhelpers::getInfoInt(hdr, line, "BS");
+                // reduce counts in file order
+                if(roc_map)
+                {
+                    for(auto const & sr : shard_rocs)
+                    {
+                        for(auto const & r : *sr)
+                        {
+                            auto it = roc_map->find(r.first);
+                            if (it == roc_map->end()) {
+                                roc_map->insert(r);
+                            }
+                            else
+                            {
+                                it->second.add(r.second);
+                            }
+                        }
+                    }
+                }
 
-            // don't break benchmarking superloci across threads
-            if(vars_in_block > blocksize && (current_bs < 0 || previous_bs < 0 || (current_bs != previous_bs)))
+                if(writer)
+                {
+                    hts_close(writer);
+                    writer = nullptr;
+                    bcfhelpers::appendParts(output_vcf, parts);
+                }
+            }
+            catch(std::exception const &)
             {
-                std::future<void> f = std::async(std::launch::async, &BlockQuantify::count, p_bq.get());
-                // clear / write out some blocks (make sure we have at least 2xthreads tasks left)
-                output_counts(threads);
-                blocks.emplace(std::move(f), std::move(p_bq));
-                p_bq = std::move(makeQuantifier(hdr, ref_fasta, qtype, qparams));
-                p_bq->rocFiltering(roc_filter);
-                vars_in_block = 0;
-
+                for(auto const & p : parts)
+                {
+                    bf::remove(p);
+                }
+                throw;
             }
-
-            p_bq->add(bcf_dup(line));
-            ++vars_in_block;
-            previous_bs = current_bs;
-
-            if (message > 0 && (rcount % message) == 0)
+            for(auto const & p : parts)
             {
-                std::cout << stringutil::formatPos(vchr.c_str(), line->pos) << "\n";
+                bf::remove(p);
             }
-            // count variants here
-            ++rcount;
         }
 
-        {
-            std::future<void> f = std::async(&BlockQuantify::count, p_bq.get());
-            // clear / write out some blocks (make sure we have at least 2xthreads tasks left)
-            blocks.emplace(std::move(f), std::move(p_bq));
-        }
-        // clear remaining
-        output_counts(0);
-
         if(writer)
         {
             hts_close(writer);
         }
         bcf_sr_destroy(reader);
 
+        // write this before computing the ROCs, which reorders their observations
+        if(!output_artifact.empty())
+        {
+            roc::writeArtifact(output_artifact, roc_map ? *roc_map : roc::RocMap(), qq_header, regions);
+        }
+
         if(roc_map)
         {
+            if(roc_bins > 0)
+            {
+                double bin_width = 0;
+                for(auto const & r : *roc_map)
+                {
+                    bin_width = std::max(bin_width, r.second.binWidth());
+                }
+                if(bin_width > std::max(roc_delta, 1e-6))
+                {
+                    std::cerr << "[W] ROC levels were binned with a bin width of up to " << bin_width
+                              << ", increase --roc-bins for more precise ROCs." << "\n";
+                }
+            }
             std::ofstream out_roc(output_roc);
             roc::ROCOutput ro(*roc_map, qq_header, output_rocs, roc_delta, regions, roc_regions);
             ro.write(out_roc);
@@ -0,0 +1,192 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ * \brief Compile stratification regions into a binary index for quantify
+ *
+ * \file strat-index.cpp
+ *
+ */
+
+#include <boost/program_options.hpp>
+#include <boost/filesystem.hpp>
+#include <fstream>
+#include <iostream>
+#include <set>
+
+#include "Version.hh"
+#include "QuantifyRegions.hh"
+#include "Error.hh"
+
+int main(int argc, char* argv[]) {
+    namespace po = boost::program_options;
+
+    std::vector<std::string> rnames;
+    std::string output;
+    bool fixchr = false;
+
+    try
+    {
+        // Declare the supported options.
+        po::options_description desc("Allowed options");
+        desc.add_options()
+            ("help,h", "produce help message")
+            ("version", "Show version")
+            ("stratification", po::value< std::vector<std::string> >(),
+                "Stratification file list (TSV format -- first column is region name, second column is file name). "
+                "Relative file names are resolved against the directory of the TSV file.")
+            ("regions,R", po::value< std::vector<std::string> >(),
+                "Region bed file. You can attach a label by prefixing with a colon, e.g. -R FP2:false-positives-type2.bed")
+            ("fix-chr-regions", po::value<bool>(), "Add chr prefix to regions if necessary (default is off).")
+            ("output-file,o", po::value<std::string>(), "The output file name.")
+        ;
+
+        po::options_description cmdline_options;
+        cmdline_options
+            .add(desc)
+        ;
+
+        po::variables_map vm;
+
+        po::store(po::command_line_parser(argc, argv).
+                  options(cmdline_options).run(), vm);
+        po::notify(vm);
+
+        if (vm.count("version"))
+        {
+            std::cout << "strat-index version " << HAPLOTYPES_VERSION << "\n";
+            return 0;
+        }
+
+        if (vm.count("help"))
+        {
+            std::cout << desc << "\n";
+            return 1;
+        }
+
+        std::set<std::string> seen;
+        if (vm.count("stratification"))
+        {
+            for(std::string const & tsv : vm["stratification"].as< std::vector<std::string> >())
+            {
+                std::ifstream sf(tsv);
+                if(!sf)
+                {
+                    std::cerr << "Cannot open stratification file " << tsv << "\n";
+                    return 1;
+                }
+                const boost::filesystem::path tsv_dir = boost::filesystem::absolute(tsv).parent_path();
+                std::string line;
+                while(std::getline(sf, line))
+                {
+                    const size_t tab = line.find('\t');
+                    const std::string n = line.substr(0, tab);
+                    std::string f = tab == std::string::npos ? "" : line.substr(tab + 1);
+                    while(!f.empty() && isspace(f.back()))
+                    {
+                        f.pop_back();
+                    }
+                    if(f.empty())
+                    {
+                        if(!n.empty())
+                        {
+                            std::cerr << "No file for stratification region " << n << "\n";
+                            return 1;
+                        }
+                        continue;
+                    }
+                    if(!seen.insert(n).second)
+                    {
+                        std::cerr << "Duplicate stratification region ID: " << n << "\n";
+                        return 1;
+                    }
+                    if(!boost::filesystem::exists(f))
+                    {
+                        f = (tsv_dir / f).string();
+                    }
+                    if(!boost::filesystem::exists(f))
+                    {
+                        std::cerr << "Quantification region file " << f << " not found\n";
+                        return 1;
+                    }
+                    rnames.push_back(n + ":" + f);
+                }
+            }
+        }
+
+        if (vm.count("regions"))
+        {
+            for(std::string const & r : vm["regions"].as< std::vector<std::string> >())
+            {
+                rnames.push_back(r);
+            }
+        }
+
+        if (vm.count("fix-chr-regions"))
+        {
+            fixchr = vm["fix-chr-regions"].as< bool >();
+        }
+
+        if (vm.count("output-file"))
+        {
+            output = vm["output-file"].as< std::string >();
+        }
+
+        if(output.empty())
+        {
+            std::cerr << "Please specify an output file.\n";
+            return 1;
+        }
+
+        if(rnames.empty())
+        {
+            std::cerr << "Please specify regions to index.\n";
+            return 1;
+        }
+    }
+    catch (po::error & e)
+    {
+        std::cerr << e.what() << "\n";
+        return 1;
+    }
+
+    try
+    {
+        variant::QuantifyRegions::buildIndex(rnames, output, fixchr);
+    }
+    catch(std::runtime_error & e)
+    {
+        std::cerr << e.what() << std::endl;
+        return 1;
+    }
+    catch(std::logic_error & e)
+    {
+        std::cerr << e.what() << std::endl;
+        return 1;
+    }
+
+    return 0;
+}
@@ -44,6 +44,7 @@
 #include "helpers/GraphUtil.hh"
 #include "GraphReference.hh"
 #include "DiploidCompare.hh"
+#include "DPDiploidCompare.hh"
 #include "VariantInput.hh"
 
 #include <iostream>
@@ -51,6 +52,10 @@
 #include <chrono>
 #include <limits>
 #include <memory>
+#include <sstream>
+#include <queue>
+#include <mutex>
+#include <future>
 
 // error needs to come after boost headers.
 #include "Error.hh"
@@ -60,6 +65,98 @@
 using namespace variant;
 using namespace haplotypes;
 
+/** a haplotype block together with the result of comparing it */
+struct XcmpBlock
+{
+    XcmpBlock() : start(-1), end(-1), n_nonsnp(0), calls_1(0), calls_2(0),
+                  has_mismatch(false), hap_match(false), hap_timeout(false), hap_time_ms(0),
+                  hap_run(false), time_ms(0), n_paths1(-1), n_paths2(-1), n_nodes(-1) {}
+
+    std::string chr;
+    std::list<Variants> variants;
+    // for each record in variants: do truth and query match exactly
+    std::vector<bool> record_match;
+    int64_t start;
+    int64_t end;
+    int n_nonsnp, calls_1, calls_2;
+    bool has_mismatch;
+
+    // comparison outcome
+    bool hap_match;
+    // haplotype comparison was aborted after the time limit
+    bool hap_timeout;
+    int64_t hap_time_ms;
+    std::string result;
+
+    // profiling information for --profile-blocks
+    bool hap_run;
+    double time_ms;
+    int64_t n_paths1, n_paths2, n_nodes;
+    // failure information for --output-errors
+    std::string errors;
+};
+
+/**
+ * Select the records of a block to pass to the haplotype comparison.
+ *
+ * Records which match exactly in truth and query can be placed on the same haplotypes
+ * in both, so we only need to compare the records around them which don't match.
+ * Exact matches with unphased het or homref calls which lie entirely before the first
+ * or after the last mismatching record (and don't touch it) are left out, every het
+ * call we leave out halves the number of haplotypes to enumerate. Matches in between
+ * mismatching records and hom-alt matches are always compared: sequence changes within
+ * a repeat can make haplotypes equal or different depending on these.
+ */
+static void hapcmpVariants(XcmpBlock const & b, int r1, int r2, std::list<Variants> & result)
+{
+    int64_t mismatch_start = std::numeric_limits<int64_t>::max();
+    int64_t mismatch_end = std::numeric_limits<int64_t>::min();
+    auto m_it = b.record_match.begin();
+    for(Variants const & v : b.variants)
+    {
+        if(!*m_it++)
+        {
+            mismatch_start = std::min(mismatch_start, v.pos);
+            mismatch_end = std::max(mismatch_end, v.pos + v.len - 1);
+        }
+    }
+
+    const auto can_leave_out = [](Call const & c) -> bool
+    {
+        return c.isNocall() || c.isHomref() || ((c.isHet() || c.isHetAlt()) && !c.phased);
+    };
+
+    m_it = b.record_match.begin();
+    for(Variants const & v : b.variants)
+    {
+        if(*m_it++ && can_leave_out(v.calls[r1]) && can_leave_out(v.calls[r2])
+           && (v.pos + v.len < mismatch_start || v.pos - 1 > mismatch_end))
+        {
+            continue;
+        }
+        result.push_back(v);
+    }
+}
+
+/** haplotype comparison engine for one thread */
+struct XcmpComparer
+{
+    std::unique_ptr<DiploidCompare> enumerate;
+    std::unique_ptr<DPDiploidCompare> dp;
+
+    DiploidComparisonResult const & compare(const char * chr, int64_t start, int64_t end,
+                                            std::list<Variants> const & vars, int ix1, int ix2)
+    {
+        if(dp)
+        {
+            dp->setRegion(chr, start, end, vars, ix1, ix2);
+            return dp->getResult();
+        }
+        enumerate->setRegion(chr, start, end, vars, ix1, ix2);
+        return enumerate->getResult();
+    }
+};
+
 int main(int argc, char* argv[]) {
     namespace po = boost::program_options;
 
@@ -94,6 +191,14 @@ int main(int argc, char* argv[]) {
     bool apply_filters_truth = true;
     bool always_hapcmp = false;
     bool no_hapcmp = false;
+    std::string hap_engine = "enumerate";
+    int64_t block_time_limit_ms = -1;
+    std::string block_time_report = "";
+    int profile_blocks = 0;
+    std::string profile_output = "";
+
+    int threads = 1;
+    int blocksize = 1000;
 
     try
     {
@@ -120,6 +225,13 @@ int main(int argc, char* argv[]) {
             ("apply-filters-query,f", po::value<bool>(), "Apply filtering in query VCF (off by default).")
             ("always-hapcmp", po::value<bool>(), "Always compare haplotype blocks (even if they match). Testing use only/slow.")
             ("no-hapcmp", po::value<bool>(), "Disable haplotype comparison. This overrides all other haplotype comparison options.")
+            ("hap-engine", po::value<std::string>(), "Haplotype comparison engine: enumerate (default) or dp.")
+            ("block-time-limit-ms", po::value<int64_t>(), "Maximum time to spend on the haplotype comparison for a block. Blocks which exceed this use the simple comparison result.")
+            ("block-time-report", po::value<std::string>(), "Write the blocks which exceeded the time limit to this file.")
+            ("profile-blocks", po::value<int>(), "Record the comparison time for each block and output the n slowest blocks.")
+            ("profile-output", po::value<std::string>(), "Output file for --profile-blocks (default: stderr).")
+            ("threads", po::value<int>(), "Number of threads to use for comparing haplotype blocks.")
+            ("blocksize", po::value<int>(), "Number of variants per batch of blocks compared on one thread.")
         ;
 
         po::positional_options_description popts;
@@ -270,6 +382,45 @@ int main(int argc, char* argv[]) {
         {
             no_hapcmp = vm["no-hapcmp"].as< bool >();
         }
+
+        if (vm.count("hap-engine"))
+        {
+            hap_engine = vm["hap-engine"].as< std::string >();
+            if(hap_engine != "enumerate" && hap_engine != "dp")
+            {
+                error("Unknown haplotype comparison engine: %s", hap_engine.c_str());
+            }
+        }
+
+        if (vm.count("block-time-limit-ms"))
+        {
+            block_time_limit_ms = vm["block-time-limit-ms"].as< int64_t >();
+        }
+
+        if (vm.count("block-time-report"))
+        {
+            block_time_report = vm["block-time-report"].as< std::string >();
+        }
+
+        if (vm.count("profile-blocks"))
+        {
+            profile_blocks = vm["profile-blocks"].as< int >();
+        }
+
+        if (vm.count("profile-output"))
+        {
+            profile_output = vm["profile-output"].as< std::string >();
+        }
+
+        if (vm.count("threads"))
+        {
+            threads = vm["threads"].as< int >();
+        }
+
+        if (vm.count("blocksize"))
+        {
+            blocksize = vm["blocksize"].as< int >();
+        }
     }
     catch (po::error & e)
     {
@@ -347,43 +498,61 @@ int main(int argc, char* argv[]) {
         {
             error_out_stream = new std::ofstream(out_errors.c_str());
         }
-        DiploidCompare hc(ref_fasta.c_str());
-        hc.setMaxHapEnum(max_n_haplotypes);
-        hc.setDoAlignments(false);
+        /** one comparer object per thread. Objects are taken
+         *  from this pool when a block of work starts and returned after */
+        std::mutex hc_mutex;
+        std::list< std::unique_ptr<XcmpComparer> > hc_pool;
+        const auto make_compare = [&ref_fasta, &hap_engine, max_n_haplotypes,
+                                   block_time_limit_ms] () -> std::unique_ptr<XcmpComparer>
+        {
+            std::unique_ptr<XcmpComparer> hc(new XcmpComparer());
+            if(hap_engine == "dp")
+            {
+                hc->dp.reset(new DPDiploidCompare(ref_fasta.c_str()));
+                hc->dp->setMaxStates(max_n_haplotypes);
+                hc->dp->setTimeLimit(block_time_limit_ms);
+            }
+            else
+            {
+                hc->enumerate.reset(new DiploidCompare(ref_fasta.c_str()));
+                hc->enumerate->setMaxHapEnum(max_n_haplotypes);
+                hc->enumerate->setTimeLimit(block_time_limit_ms);
+                hc->enumerate->setDoAlignments(false);
+            }
+            return hc;
+        };
 
-        int64_t nhb = 0;
-        int64_t last_pos = std::numeric_limits<int64_t>::max();
+        const bool write_errors = error_out_stream != NULL;
 
-        // hap-block status + update
-        std::list<Variants> block_variants;
-        int64_t block_start = -1;
-        int64_t block_end = -1;
-        int n_nonsnp = 0, calls_1 = 0, calls_2 = 0;
-        bool has_mismatch = false;
-
-        const auto finish_block = [&block_variants, r1, r2,
-                                   &chr,
-                                   &block_start,
-                                   &block_end,
-                                   &n_nonsnp, &calls_1, &calls_2,
-                                   &has_mismatch,
-                                   &pvw, &error_out_stream,
-                                   &hc,
-                                   qq,
-                                   hb_expand,
-                                   no_hapcmp,
-                                   always_hapcmp,
-                                   apply_filters_query] ()
-        {
-            bool hap_match = false, hap_fail = false, hap_run = false;
+        /** compare a single block. This doesn't touch any shared state apart
+         *  from the reference, so we can run it on many threads */
+        const auto compare_block = [r1, r2,
+                                    write_errors,
+                                    hb_expand,
+                                    no_hapcmp,
+                                    always_hapcmp,
+                                    apply_filters_query] (XcmpBlock & b, XcmpComparer & hc)
+        {
+            const auto block_start = std::chrono::steady_clock::now();
+            std::ostringstream errors;
+            bool hap_match = false, hap_fail = false, hap_run = false, hap_timeout = false;
             // try HC if we have mismatches, and if the number of calls is > 0
-            if (!no_hapcmp && (always_hapcmp || (has_mismatch && calls_1 > 0 && calls_2 > 0 && n_nonsnp > 0)))
+            if (!no_hapcmp && (always_hapcmp || (b.has_mismatch && b.calls_1 > 0 && b.calls_2 > 0 && b.n_nonsnp > 0)))
             {
                 try
                 {
                     hap_run = true;
                     hap_fail = true;
-                    std::list<Variants> vl_filtered = block_variants;
+                    const auto hap_start = std::chrono::steady_clock::now();
+                    std::list<Variants> vl_filtered;
+                    if(b.has_mismatch)
+                    {
+                        hapcmpVariants(b, r1, r2, vl_filtered);
+                    }
+                    else
+                    {
+                        vl_filtered = b.variants;
+                    }
                     if(apply_filters_query)
                     {
                         for(auto & v : vl_filtered)
@@ -402,12 +571,11 @@ int main(int argc, char* argv[]) {
                             }
                         }
                     }
-                    hc.setRegion(chr.c_str(), std::max(int64_t(0), block_start-hb_expand), block_end + hb_expand,
-                                 vl_filtered, r1, r2);
-                    DiploidComparisonResult const & hcr = hc.getResult();
+                    DiploidComparisonResult const & hcr = hc.compare(b.chr.c_str(), std::max(int64_t(0), b.start-hb_expand),
+                                                                     b.end + hb_expand, vl_filtered, r1, r2);
 #ifdef DEBUG_XCMP
-                    std::cerr << chr << ":" << block_start << "-" << block_end << " variants: " << "\n";
-                    for(auto const & x : block_variants)
+                    std::cerr << b.chr << ":" << b.start << "-" << b.end << " variants: " << "\n";
+                    for(auto const & x : b.variants)
                     {
                         std::cerr << x << "\n";
                     }
@@ -416,30 +584,41 @@ int main(int argc, char* argv[]) {
 #endif
                     hap_match = hcr.outcome == dco_match;
                     hap_fail = !(hcr.outcome == dco_match || hcr.outcome == dco_mismatch);
+                    hap_timeout = hcr.outcome == dco_timeout;
+                    b.n_paths1 = hcr.n_paths1;
+                    b.n_paths2 = hcr.n_paths2;
+                    b.n_nodes = (hcr.n_nodes1 < 0 || hcr.n_nodes2 < 0) ? -1 : hcr.n_nodes1 + hcr.n_nodes2;
+                    b.hap_time_ms = std::chrono::duration_cast<std::chrono::milliseconds>(
+                        std::chrono::steady_clock::now() - hap_start).count();
                 }
                 catch(std::runtime_error &e)
                 {
-                    if (error_out_stream)
+                    if (write_errors)
                     {
-                        *error_out_stream << chr << "\t" << block_start << "\t" << block_end+1 << "\t" << "hap_error\t" << e.what() << "\n";
+                        errors << b.chr << "\t" << b.start << "\t" << b.end+1 << "\t" << "hap_error\t" << e.what() << "\n";
                     }
                 }
                 catch(std::logic_error &e)
                 {
-                    if (error_out_stream)
+                    if (write_errors)
                     {
-                        *error_out_stream << chr << "\t" << block_start << "\t" << block_end+1 << "\t" << "hap_error\t" << e.what() << "\n";
+                        errors << b.chr << "\t" << b.start << "\t" << b.end+1 << "\t" << "hap_error\t" << e.what() << "\n";
                     }
                 }
             }
             std::string result;
             if(hap_run)
             {
-                if (hap_fail)
+                if (hap_timeout)
+                {
+                    // fall back to the simple comparison result
+                    result = "haptimeout:";
+                }
+                else if (hap_fail)
                 {
                     result = "hapfail:";
                 }
-                else if(has_mismatch)
+                else if(b.has_mismatch)
                 {
                     result = "hap:";
                 }
@@ -453,14 +632,14 @@ int main(int argc, char* argv[]) {
                 result = "simple:";
             }
 
-            if(hap_run && !has_mismatch && !hap_match)
+            if(hap_run && !hap_timeout && !b.has_mismatch && !hap_match)
             {
                 result += "suspicious_simple_match";
             }
-            else if(always_hapcmp && hap_match && ((calls_1 == 0 && calls_2 > 0) || (calls_1 > 0 && calls_2 == 0)))
+            else if(always_hapcmp && hap_match && ((b.calls_1 == 0 && b.calls_2 > 0) || (b.calls_1 > 0 && b.calls_2 == 0)))
             {
                 bool any_filtered = false;
-                for (Variants const & v : block_variants)
+                for (Variants const & v : b.variants)
                 {
                     for (Call const & c : v.calls)
                     {
@@ -488,7 +667,7 @@ int main(int argc, char* argv[]) {
                     result += "suspicious_hap_match";
                 }
             }
-            else if(hap_match || !has_mismatch)
+            else if(hap_match || !b.has_mismatch)
             {
                 result += "match";
             }
@@ -497,17 +676,84 @@ int main(int argc, char* argv[]) {
                 result += "mismatch";
             }
 
-            if(error_out_stream && hap_fail)
+            if(write_errors && hap_fail)
             {
-                *error_out_stream << chr << "\t" << block_start << "\t" << block_end+1 << "\t" << result << "\t"
-                                  << has_mismatch << ":" << hap_match << ":" << hap_fail << ":"
-                                  << calls_1 << ":" << calls_2 << ":" << n_nonsnp << "\n";
+                errors << b.chr << "\t" << b.start << "\t" << b.end+1 << "\t" << result << "\t"
+                       << b.has_mismatch << ":" << hap_match << ":" << hap_fail << ":"
+                       << b.calls_1 << ":" << b.calls_2 << ":" << b.n_nonsnp << "\n";
+            }
+
+            b.hap_match = hap_match;
+            b.hap_timeout = hap_timeout;
+            b.hap_run = hap_run;
+            b.result = result;
+            b.errors = errors.str();
+            b.time_ms = std::chrono::duration<double, std::milli>(std::chrono::steady_clock::now() - block_start).count();
+        };
+
+        std::unique_ptr<std::ofstream> time_report_stream;
+        if(block_time_report != "")
+        {
+            time_report_stream.reset(new std::ofstream(block_time_report.c_str()));
+        }
+        int64_t n_timeouts = 0;
+
+        /** --profile-blocks: totals and the slowest blocks seen so far (smallest time on top) */
+        int64_t n_blocks = 0, n_hap_blocks = 0;
+        double total_block_ms = 0;
+        typedef std::pair<double, std::string> ProfileEntry;
+        std::priority_queue<ProfileEntry, std::vector<ProfileEntry>, std::greater<ProfileEntry> > slowest_blocks;
+
+        /** write a compared block. Must be called in genomic order. */
+        const auto write_block = [r2,
+                                  &pvw, &error_out_stream,
+                                  &time_report_stream, &n_timeouts,
+                                  profile_blocks, &n_blocks, &n_hap_blocks, &total_block_ms, &slowest_blocks,
+                                  qq,
+                                  apply_filters_query] (XcmpBlock & b)
+        {
+            if(profile_blocks > 0 && !b.variants.empty())
+            {
+                ++n_blocks;
+                if(b.hap_run)
+                {
+                    ++n_hap_blocks;
+                }
+                total_block_ms += b.time_ms;
+                if(slowest_blocks.size() < (size_t)profile_blocks || slowest_blocks.top().first < b.time_ms)
+                {
+                    std::ostringstream line;
+                    line << b.chr << "\t" << b.start << "\t" << b.end+1 << "\t"
+                         << b.time_ms << "\t"
+                         << b.calls_1 << "\t" << b.calls_2 << "\t"
+                         << b.n_paths1 << "\t" << b.n_paths2 << "\t" << b.n_nodes << "\t"
+                         << b.result;
+                    slowest_blocks.emplace(b.time_ms, line.str());
+                    if(slowest_blocks.size() > (size_t)profile_blocks)
+                    {
+                        slowest_blocks.pop();
+                    }
+                }
+            }
+            if(error_out_stream && !b.errors.empty())
+            {
+                *error_out_stream << b.errors;
+            }
+            if(b.hap_timeout)
+            {
+                ++n_timeouts;
+                if(time_report_stream)
+                {
+                    *time_report_stream << b.chr << "\t" << b.start << "\t" << b.end+1 << "\t"
+                                        << b.calls_1 << "\t" << b.calls_2 << "\t" << b.n_nonsnp << "\t"
+                                        << b.hap_time_ms << "\n";
+                }
             }
             if (pvw)
             {
-                for (Variants & v : block_variants)
+                for (Variants & v : b.variants)
                 {
-                    v.setInfo("BS", (int)block_start + 1);
+                    v.setInfo("BS", (int)b.start + 1);
 
                     if(qq == "QUAL")
                     {
@@ -522,8 +768,8 @@ int main(int argc, char* argv[]) {
                         v.setInfo("IQQ", v.calls[r2].formats[qq].asFloat());
                     }
 
-                    v.setInfo("ctype", result.c_str());
-                    if (hap_match)
+                    v.setInfo("ctype", b.result.c_str());
+                    if (b.hap_match)
                     {
                         v.setInfo("HapMatch", true);
                     }
@@ -541,16 +787,102 @@ int main(int argc, char* argv[]) {
                     pvw->put(v);
                 }
             }
+        };
+
+        /** async stuff (same as in quantify). Blocks are compared in parallel in
+         *  batches, but we need to write out the variants sequentially.
+         *  Therefore, we keep a future for each batch to be able to join
+         *  when it's processed
+         */
+        typedef std::list<XcmpBlock> XcmpBatch;
+        std::queue<std::pair <
+            std::future<void>,
+            std::unique_ptr<XcmpBatch>
+        >> batches;
+
+        const auto compare_batch = [&hc_mutex, &hc_pool, &make_compare, &compare_block] (XcmpBatch * batch)
+        {
+            std::unique_ptr<XcmpComparer> hc;
+            {
+                std::lock_guard<std::mutex> l(hc_mutex);
+                if(!hc_pool.empty())
+                {
+                    hc = std::move(hc_pool.back());
+                    hc_pool.pop_back();
+                }
+            }
+            if(!hc)
+            {
+                hc = make_compare();
+            }
+            for(XcmpBlock & b : *batch)
+            {
+                compare_block(b, *hc);
+            }
+            std::lock_guard<std::mutex> l(hc_mutex);
+            hc_pool.push_back(std::move(hc));
+        };
+
+        /** write out finished batches until at most min_size are left */
+        const auto output_batches = [&batches, &write_block](size_t min_size) {
+            while(batches.size() > min_size)
+            {
+                // make sure we have run this batch
+                batches.front().first.get();
+                for(XcmpBlock & b : *batches.front().second)
+                {
+                    write_block(b);
+                }
+                batches.pop();
+            }
+        };
 
-            block_variants.clear();
-            block_start = -1;
-            block_end = -1;
-            n_nonsnp = 0;
-            calls_1 = 0;
-            calls_2 = 0;
-            has_mismatch = false;
+        std::unique_ptr<XcmpComparer> serial_hc;
+        if(threads <= 1)
+        {
+            serial_hc = make_compare();
+        }
+
+        // hap-block status + update
+        std::unique_ptr<XcmpBatch> current_batch(new XcmpBatch());
+        size_t vars_in_batch = 0;
+        XcmpBlock block;
+
+        const auto finish_block = [&block, &chr, &current_batch, &vars_in_batch, &serial_hc,
+                                   &compare_block, &write_block] ()
+        {
+            block.chr = chr;
+            if(serial_hc)
+            {
+                compare_block(block, *serial_hc);
+                write_block(block);
+            }
+            else
+            {
+                vars_in_batch += block.variants.size();
+                current_batch->push_back(std::move(block));
+            }
+            block = XcmpBlock();
         };
 
+        /** start comparing the current batch asynchronously */
+        const auto finish_batch = [&current_batch, &vars_in_batch, &batches,
+                                   &compare_batch, &output_batches, threads] ()
+        {
+            if(current_batch->empty())
+            {
+                return;
+            }
+            std::future<void> f = std::async(std::launch::async, compare_batch, current_batch.get());
+            // clear / write out some batches (make sure we have at least threads tasks left)
+            output_batches((size_t)threads);
+            batches.emplace(std::move(f), std::move(current_batch));
+            current_batch.reset(new XcmpBatch());
+            vars_in_batch = 0;
+        };
+
+        int64_t nhb = 0;
+        int64_t last_pos = std::numeric_limits<int64_t>::max();
         auto start_time = std::chrono::high_resolution_clock::now();
         auto last_time = std::chrono::high_resolution_clock::now();
         while(vr.advance())
@@ -579,45 +911,52 @@ int main(int argc, char* argv[]) {
                 chr = v.chr;
             }
 
-            if (v.chr != chr || (block_end > 0 && block_end + hb_window < v.pos))
+            if (v.chr != chr || (block.end > 0 && block.end + hb_window < v.pos))
             {
                 finish_block();
+                if(!serial_hc && vars_in_batch > (size_t)blocksize)
+                {
+                    finish_batch();
+                }
             }
             chr = v.chr;
 
-            if (block_start < 0)
+            if (block.start < 0)
             {
-                block_start = v.pos;
+                block.start = v.pos;
             }
             else
             {
-                block_start = std::min(block_start, v.pos);
+                block.start = std::min(block.start, v.pos);
             }
 
-            if (block_end < 0)
+            if (block.end < 0)
             {
-                block_end = v.pos + v.len - 1;
+                block.end = v.pos + v.len - 1;
             }
             else
             {
-                block_end = std::max(v.pos + v.len - 1, block_end);
+                block.end = std::max(v.pos + v.len - 1, block.end);
             }
 
-            if(compareVariants(v, r1, r2, n_nonsnp, calls_1, calls_2, !apply_filters_truth, !apply_filters_query) != dco_match)
+            const bool record_match = compareVariants(v, r1, r2, block.n_nonsnp, block.calls_1, block.calls_2,
+                                                      !apply_filters_truth, !apply_filters_query) == dco_match;
+            if(!record_match)
             {
-                has_mismatch = true;
+                block.has_mismatch = true;
             }
 
-            block_variants.push_back(v);
+            block.variants.push_back(v);
+            block.record_match.push_back(record_match);
 
 #ifdef DEBUG_XCMP
             std::cerr << v << "\n";
-            std::cerr << "block_start : " << block_start << "\t"
-                      << "block_end : " << block_end << "\t"
-                      << "block_size : " << block_variants.size() << "\t"
-                      << "n_nonsnp : " << n_nonsnp << "\t"
-                      << "calls_1 : " << calls_1 << "\t"
-                      << "calls_2 : " << calls_2 << "\t"
+            std::cerr << "block_start : " << block.start << "\t"
+                      << "block_end : " << block.end << "\t"
+                      << "block_size : " << block.variants.size() << "\t"
+                      << "n_nonsnp : " << block.n_nonsnp << "\t"
+                      << "calls_1 : " << block.calls_1 << "\t"
+                      << "calls_2 : " << block.calls_2 << "\t"
                       << "\n";
 #endif
 
@@ -648,15 +987,51 @@ int main(int argc, char* argv[]) {
         }
 #ifdef DEBUG_XCMP
         std::cerr << "END\n";
-        std::cerr << "block_start : " << block_start << "\t"
-                  << "block_end : " << block_end << "\t"
-                  << "block_size : " << block_variants.size() << "\t"
-                  << "n_nonsnp : " << n_nonsnp << "\t"
-                  << "calls_1 : " << calls_1 << "\t"
-                  << "calls_2 : " << calls_2 << "\t"
+        std::cerr << "block_start : " << block.start << "\t"
+                  << "block_end : " << block.end << "\t"
+                  << "block_size : " << block.variants.size() << "\t"
+                  << "n_nonsnp : " << block.n_nonsnp << "\t"
+                  << "calls_1 : " << block.calls_1 << "\t"
+                  << "calls_2 : " << block.calls_2 << "\t"
                   << "\n";
 #endif
         finish_block();
+        finish_batch();
+        // clear remaining
+        output_batches(0);
+        if(profile_blocks > 0)
+        {
+            std::unique_ptr<std::ofstream> profile_file;
+            std::ostream * profile_stream = &std::cerr;
+            if(profile_output != "" && profile_output != "-")
+            {
+                profile_file.reset(new std::ofstream(profile_output.c_str()));
+                profile_stream = profile_file.get();
+            }
+            const double wall_ms = std::chrono::duration<double, std::milli>(
+                std::chrono::high_resolution_clock::now() - start_time).count();
+            *profile_stream << "#total\tblocks=" << n_blocks
+                            << "\thapcmp_blocks=" << n_hap_blocks
+                            << "\tcompare_ms=" << total_block_ms
+                            << "\twall_ms=" << wall_ms << "\n";
+            *profile_stream << "#chr\tstart\tend\ttime_ms\tcalls_truth\tcalls_query"
+                            << "\tpaths_truth\tpaths_query\tnodes\tctype\n";
+            std::vector<ProfileEntry> slowest;
+            while(!slowest_blocks.empty())
+            {
+                slowest.push_back(slowest_blocks.top());
+                slowest_blocks.pop();
+            }
+            for(auto x = slowest.rbegin(); x != slowest.rend(); ++x)
+            {
+                *profile_stream << x->second << "\n";
+            }
+        }
+        if(n_timeouts > 0)
+        {
+            std::cerr << n_timeouts << " haplotype blocks exceeded the time limit of "
+                      << block_time_limit_ms << "ms." << "\n";
+        }
         if(error_out_stream && out_errors != "-")
         {
             delete error_out_stream;
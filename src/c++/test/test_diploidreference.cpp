@@ -76,6 +76,13 @@ struct DiploidReferenceTester
         dr.setNPaths(max_n_paths);
     }
 
+    /**
+     * Set the time after which enumeration is aborted
+     */
+    void setDeadline(Deadline deadline=Deadline::max()) {
+        dr.setDeadline(deadline);
+    }
+
     /**
      * Enumerate from set of Variants
      */
@@ -220,8 +227,12 @@ BOOST_AUTO_TEST_CASE(diploidReferenceBasicHet)
     while(dr.hasNext())
     {
         std::ostringstream ss;
-        ss << dr.next();
+        DiploidRef const & r = dr.next();
+        ss << r;
         BOOST_CHECK_EQUAL(expected.count(ss.str()), (size_t)1);
+        // fingerprints used by DiploidCompare
+        BOOST_CHECK_EQUAL(r.h1_hash, std::hash<std::string>()(r.h1));
+        BOOST_CHECK_EQUAL(r.h2_hash, std::hash<std::string>()(r.h2));
         dr.advance();
         ++count;
     }
@@ -283,3 +294,63 @@ BOOST_AUTO_TEST_CASE(diploidReferenceHomref)
     }
     BOOST_CHECK_EQUAL(count, (size_t)1);
 }
+
+BOOST_AUTO_TEST_CASE(diploidReferenceDeadline)
+{
+    boost::filesystem::path p(__FILE__);
+    boost::filesystem::path tp = p.parent_path()
+                                   .parent_path()   // test
+                                   .parent_path()   // c++
+                                    / boost::filesystem::path("data");
+
+    std::string datapath = tp.string();
+
+    DiploidReferenceTester dr((datapath + "/refgraph1.vcf.gz").c_str(),
+                        "NA12877", (datapath + "/chrQ.fa").c_str());
+
+    dr.setDeadline(std::chrono::steady_clock::now() - std::chrono::milliseconds(1));
+    BOOST_CHECK_THROW(dr.setRegion("chrQ", 0, 25), TimeLimitExceeded);
+
+    dr.setDeadline();
+    dr.setRegion("chrQ", 0, 25);
+    BOOST_CHECK_EQUAL(dr.result().size(), (size_t)4);
+}
+
+BOOST_AUTO_TEST_CASE(diploidReferenceManyHets)
+{
+    boost::filesystem::path p(__FILE__);
+    boost::filesystem::path tp = p.parent_path()
+                                   .parent_path()   // test
+                                   .parent_path()   // c++
+                                    / boost::filesystem::path("data");
+
+    std::string datapath = tp.string();
+
+    // 70 het SNPs, all phased except for two
+    DiploidReferenceTester dr((datapath + "/manyhets.vcf.gz").c_str(),
+                        "NA12877", (datapath + "/microhg19.fa").c_str());
+
+    dr.setRegion("chr1", 10000, 30000);
+
+    // pairs of complementary paths: one per combination of the unphased hets
+    size_t count = 0;
+    while(dr.hasNext())
+    {
+        DiploidRef const & r = dr.next();
+        BOOST_CHECK(r.het);
+        BOOST_CHECK_EQUAL(r.h1.size(), r.h2.size());
+        // every het is on exactly one of the two haplotypes
+        size_t diffs = 0;
+        for(size_t i = 0; i < std::min(r.h1.size(), r.h2.size()); ++i)
+        {
+            if(r.h1[i] != r.h2[i])
+            {
+                ++diffs;
+            }
+        }
+        BOOST_CHECK_EQUAL(diffs, (size_t)70);
+        dr.advance();
+        ++count;
+    }
+    BOOST_CHECK_EQUAL(count, (size_t)4);
+}
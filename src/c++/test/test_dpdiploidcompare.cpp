@@ -0,0 +1,194 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+/**
+ *
+ * Test cases for the dynamic programming diploid comparison
+ *
+ * \file test_dpdiploidcompare.cpp
+ *
+ */
+
+#define BOOST_TEST_NO_MAIN
+#include <boost/test/unit_test.hpp>
+#include <boost/test/test_tools.hpp>
+#include <boost/filesystem/path.hpp>
+
+#include "DPDiploidCompare.hh"
+
+#include <list>
+
+using namespace variant;
+using namespace haplotypes;
+
+namespace
+{
+/** add a call for one allele in sample 0 (truth) or 1 (query) */
+void addCall(std::list<Variants> & vars, int sample,
+             int64_t start, int64_t end, const char * alt,
+             int g0, int g1, bool phased=false)
+{
+    Variants v;
+    v.chr = "chrQ";
+    v.pos = start;
+    v.len = end - start + 1;
+    v.variation.push_back(RefVar(start, end, alt));
+    v.calls.resize(2);
+    Call & c = v.calls[sample];
+    c.ngt = 2;
+    c.gt[0] = g0;
+    c.gt[1] = g1;
+    c.phased = phased;
+    vars.push_back(v);
+}
+
+std::string chrQ()
+{
+    boost::filesystem::path p(__FILE__);
+    boost::filesystem::path tp = p.parent_path()
+                                    .parent_path()  // test
+                                    .parent_path()  // c++
+                                  / boost::filesystem::path("data")
+                                  / boost::filesystem::path("chrQ.fa");
+    return tp.string();
+}
+
+DiploidComparisonOutcome compare(std::list<Variants> const & vars)
+{
+    DPDiploidCompare dc(chrQ().c_str());
+    dc.setRegion("chrQ", 0, 35, vars, 0, 1);
+    return dc.getResult().outcome;
+}
+}
+
+BOOST_AUTO_TEST_SUITE(dpDiploidCompare)
+
+// chrQ is AAACCCAAACCCAAACCCGGGTTTGGGTTTGGGTTT
+
+BOOST_AUTO_TEST_CASE(dpDiploidCompareShiftedDeletion)
+{
+    std::list<Variants> vars;
+    // AC -> A and CC -> C delete one C in CCC
+    addCall(vars, 0, 2, 3, "A", 0, 1);
+    addCall(vars, 1, 4, 5, "C", 0, 1);
+    BOOST_CHECK_EQUAL(compare(vars), dco_match);
+
+    vars.clear();
+    addCall(vars, 0, 2, 3, "A", 1, 1);
+    addCall(vars, 1, 4, 5, "C", 0, 1);
+    BOOST_CHECK_EQUAL(compare(vars), dco_mismatch);
+}
+
+BOOST_AUTO_TEST_CASE(dpDiploidCompareSNPMismatch)
+{
+    std::list<Variants> vars;
+    addCall(vars, 0, 10, 10, "G", 0, 1);
+    addCall(vars, 1, 10, 10, "T", 0, 1);
+    BOOST_CHECK_EQUAL(compare(vars), dco_mismatch);
+
+    vars.clear();
+    addCall(vars, 0, 10, 10, "G", 0, 1);
+    addCall(vars, 1, 10, 10, "G", 1, 0);
+    BOOST_CHECK_EQUAL(compare(vars), dco_match);
+}
+
+BOOST_AUTO_TEST_CASE(dpDiploidCompareMNP)
+{
+    // two unphased hets in the truth can be on the same haplotype
+    std::list<Variants> vars;
+    addCall(vars, 0, 1, 1, "G", 0, 1);
+    addCall(vars, 0, 7, 7, "G", 0, 1);
+    addCall(vars, 1, 1, 7, "GACCCAG", 1, 0);
+    BOOST_CHECK_EQUAL(compare(vars), dco_match);
+
+    // ... but not if they are phased onto different haplotypes
+    vars.clear();
+    addCall(vars, 0, 1, 1, "G", 0, 1, true);
+    addCall(vars, 0, 7, 7, "G", 1, 0, true);
+    addCall(vars, 1, 1, 7, "GACCCAG", 1, 0);
+    BOOST_CHECK_EQUAL(compare(vars), dco_mismatch);
+}
+
+BOOST_AUTO_TEST_CASE(dpDiploidComparePhasing)
+{
+    // phasing matches if we swap the query haplotypes
+    std::list<Variants> vars;
+    addCall(vars, 0, 1, 1, "G", 0, 1, true);
+    addCall(vars, 0, 7, 7, "G", 1, 0, true);
+    addCall(vars, 1, 1, 1, "G", 1, 0, true);
+    addCall(vars, 1, 7, 7, "G", 0, 1, true);
+    BOOST_CHECK_EQUAL(compare(vars), dco_match);
+
+    // phase switch
+    vars.clear();
+    addCall(vars, 0, 1, 1, "G", 0, 1, true);
+    addCall(vars, 0, 7, 7, "G", 1, 0, true);
+    addCall(vars, 1, 1, 1, "G", 0, 1, true);
+    addCall(vars, 1, 7, 7, "G", 0, 1, true);
+    BOOST_CHECK_EQUAL(compare(vars), dco_mismatch);
+}
+
+BOOST_AUTO_TEST_CASE(dpDiploidCompareManyHets)
+{
+    // unphased het insertions every three bases
+    std::list<Variants> vars;
+    for(int64_t pos = 0; pos < 36; pos += 3)
+    {
+        addCall(vars, 0, pos, pos - 1, "T", 0, 1);
+        addCall(vars, 1, pos, pos - 1, "T", 1, 0);
+    }
+    BOOST_CHECK_EQUAL(compare(vars), dco_match);
+
+    addCall(vars, 1, 35, 35, "A", 0, 1);
+    BOOST_CHECK_EQUAL(compare(vars), dco_mismatch);
+}
+
+BOOST_AUTO_TEST_CASE(dpDiploidCompareWork)
+{
+    // the path counts give the number of dp states after each truth / query call
+    std::list<Variants> vars;
+    addCall(vars, 0, 10, 10, "G", 1, 1);
+    addCall(vars, 1, 10, 10, "G", 1, 1);
+    DPDiploidCompare dc(chrQ().c_str());
+    dc.setRegion("chrQ", 0, 35, vars, 0, 1);
+    BOOST_CHECK_EQUAL(dc.getResult().outcome, dco_match);
+    BOOST_CHECK_EQUAL(dc.getResult().n_paths1, 1);
+    BOOST_CHECK_EQUAL(dc.getResult().n_paths2, 1);
+    BOOST_CHECK_EQUAL(dc.getResult().n_pathsc, 2);
+
+    // unphased hets have two orientations
+    vars.clear();
+    addCall(vars, 0, 2, 3, "A", 0, 1);
+    addCall(vars, 1, 4, 5, "C", 0, 1);
+    dc.setRegion("chrQ", 0, 35, vars, 0, 1);
+    BOOST_CHECK_EQUAL(dc.getResult().outcome, dco_match);
+    BOOST_CHECK_EQUAL(dc.getResult().n_paths1, 2);
+    BOOST_CHECK_GT(dc.getResult().n_paths2, 0);
+    BOOST_CHECK_EQUAL(dc.getResult().n_pathsc, dc.getResult().n_paths1 + dc.getResult().n_paths2);
+}
+
+BOOST_AUTO_TEST_SUITE_END()
@@ -0,0 +1,95 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ *
+ * \file test_dynamicbitset.cpp
+ *
+ */
+
+#define BOOST_TEST_NO_MAIN
+#include <boost/test/unit_test.hpp>
+#include <boost/test/test_tools.hpp>
+
+#include "helpers/DynamicBitset.hh"
+
+#include <bitset>
+#include <unordered_map>
+
+using namespace bitsetutil;
+
+BOOST_AUTO_TEST_CASE(testDynamicBitsetSmall)
+{
+    DynamicBitset b;
+    BOOST_CHECK(!b.any());
+    b.set(0);
+    b.set(5);
+    BOOST_CHECK(b.any());
+    BOOST_CHECK(b.test(5));
+    BOOST_CHECK(!b.test(4));
+    BOOST_CHECK(!b.test(200));
+    BOOST_CHECK_EQUAL(b.to_string(), std::bitset<64>(33).to_string());
+    BOOST_CHECK_EQUAL(b.to_string(8), "00100001");
+    BOOST_CHECK(b == DynamicBitset(33));
+    BOOST_CHECK(b.flipped(8) == DynamicBitset(0xde));
+    BOOST_CHECK(b.flipped(64) == DynamicBitset(~uint64_t(33)));
+}
+
+BOOST_AUTO_TEST_CASE(testDynamicBitsetLarge)
+{
+    DynamicBitset a, b;
+    a.set(1);
+    a.set(130);
+    b.set(64);
+    BOOST_CHECK(a.test(130));
+    BOOST_CHECK(!a.test(129));
+    BOOST_CHECK(a != b);
+
+    DynamicBitset c(a);
+    c |= b;
+    BOOST_CHECK(c.test(1) && c.test(64) && c.test(130));
+    BOOST_CHECK_EQUAL(c.to_string(8).size(), (size_t)131);
+
+    // complement of the lowest 131 bits, and back
+    DynamicBitset f = c.flipped(131);
+    BOOST_CHECK(!f.test(1) && !f.test(64) && !f.test(130));
+    BOOST_CHECK(f.test(0) && f.test(65) && f.test(129));
+    BOOST_CHECK(!f.test(131));
+    BOOST_CHECK(f.flipped(131) == c);
+
+    // the same bits compare and hash equal regardless of storage size
+    DynamicBitset d;
+    d.set(200);
+    d = d.flipped(64);
+    BOOST_CHECK(d == DynamicBitset(~uint64_t(0)));
+    BOOST_CHECK_EQUAL(d.hash(), DynamicBitset(~uint64_t(0)).hash());
+
+    std::unordered_map<DynamicBitset, int> m;
+    m[c] = 1;
+    m[f] = 2;
+    BOOST_CHECK_EQUAL(m[f.flipped(131)], 1);
+    BOOST_CHECK_EQUAL(m.size(), (size_t)2);
+}
@@ -38,10 +38,15 @@
 #include <boost/test/unit_test.hpp>
 #include <boost/test/test_tools.hpp>
 #include <boost/filesystem/path.hpp>
+#include <boost/filesystem/operations.hpp>
+#include <boost/algorithm/string.hpp>
 
 #include "Fasta.hh"
 
 #include <iostream>
+#include <fstream>
+#include <thread>
+#include <vector>
 
 BOOST_AUTO_TEST_CASE(fastaRead)
 {
@@ -73,3 +78,147 @@ BOOST_AUTO_TEST_CASE(fastaReadEnd)
     FastaFile f(tp.string().c_str());
     BOOST_CHECK_EQUAL(f.query("chrS:151"), "");
 }
+
+BOOST_AUTO_TEST_CASE(fastaReadMultiline)
+{
+    // line-wrapped fasta with lowercase bases
+    boost::filesystem::path temp = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.fa");
+    std::string ref1, ref2;
+    const char * nts = "ACGTNacgtn";
+    for(int i = 0; i < 1000; ++i)
+    {
+        ref1 += nts[(i * 7 + i / 13) % 10];
+    }
+    for(int i = 0; i < 77; ++i)
+    {
+        ref2 += nts[(i * 3) % 10];
+    }
+    {
+        std::ofstream f(temp.native());
+        f << ">chrA description\n";
+        for(size_t i = 0; i < ref1.size(); i += 60)
+        {
+            f << ref1.substr(i, 60) << "\n";
+        }
+        f << ">chrB\n";
+        for(size_t i = 0; i < ref2.size(); i += 60)
+        {
+            f << ref2.substr(i, 60) << "\n";
+        }
+    }
+    std::string uref1(ref1), uref2(ref2);
+    boost::to_upper(uref1);
+    boost::to_upper(uref2);
+
+    {
+        FastaFile f(temp.string().c_str());
+        for(int64_t start = 0; start < 1000; start += 37)
+        {
+            for(int64_t len = 1; len < 200; len += 23)
+            {
+                const int64_t end = start + len - 1;
+                BOOST_CHECK_EQUAL(f.query("chrA", start, end), uref1.substr((size_t) start, (size_t) len));
+            }
+        }
+        BOOST_CHECK_EQUAL(f.query("chrB", 50, 1000), uref2.substr(50));
+        BOOST_CHECK_EQUAL(f.query("chrB:59-62"), uref2.substr(58, 4));
+        BOOST_CHECK_EQUAL(f.query("chrB", 77, 80), "");
+
+        int64_t len = 0;
+        const char * v = f.view("chrA", 55, 64, len);
+        BOOST_REQUIRE(v != nullptr);
+        BOOST_CHECK_EQUAL(std::string(v, (size_t) len), uref1.substr(55, 10));
+        v = f.view("chrB", 70, 100, len);
+        BOOST_REQUIRE(v != nullptr);
+        BOOST_CHECK_EQUAL(std::string(v, (size_t) len), uref2.substr(70));
+        BOOST_CHECK(f.view("chrB", 77, 100, len) == nullptr);
+
+        // concurrent reads
+        std::vector<std::thread> threads;
+        std::vector<int> failures(4, 0);
+        for(int t = 0; t < 4; ++t)
+        {
+            threads.emplace_back([&f, &uref1, &failures, t]() {
+                for(int64_t start = t; start < 900; start += 3)
+                {
+                    if(f.query("chrA", start, start + 99) != uref1.substr((size_t) start, 100))
+                    {
+                        ++failures[t];
+                    }
+                    int64_t vlen = 0;
+                    const char * vv = f.view("chrA", start, start + 99, vlen);
+                    if(!vv || std::string(vv, (size_t) vlen) != uref1.substr((size_t) start, 100))
+                    {
+                        ++failures[t];
+                    }
+                }
+            });
+        }
+        for(auto & t : threads)
+        {
+            t.join();
+        }
+        for(int t = 0; t < 4; ++t)
+        {
+            BOOST_CHECK_EQUAL(failures[t], 0);
+        }
+    }
+
+    boost::filesystem::remove(temp);
+    boost::filesystem::remove(temp.string() + ".fai");
+}
+
+BOOST_AUTO_TEST_CASE(fastaReadPacked)
+{
+    // IUPAC codes and N runs must come back unchanged from the packed image
+    boost::filesystem::path temp = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.fa");
+    std::string ref1, ref2;
+    const char * nts = "ACGTacgtNNNNnRYKMSWBDHV";
+    for(int i = 0; i < 1000; ++i)
+    {
+        ref1 += nts[(i * 7 + i / 13) % 23];
+    }
+    for(int i = 0; i < 77; ++i)
+    {
+        ref2 += i < 20 ? 'N' : nts[(i * 3) % 8];
+    }
+    {
+        std::ofstream f(temp.native());
+        f << ">chrA\n";
+        for(size_t i = 0; i < ref1.size(); i += 60)
+        {
+            f << ref1.substr(i, 60) << "\n";
+        }
+        f << ">chrB\n" << ref2 << "\n";
+        f << ">chrC\n";
+    }
+
+    FastaFile plain(temp.string().c_str());
+    FastaFile::pack(temp.string().c_str());
+    BOOST_REQUIRE(boost::filesystem::exists(temp.string() + ".packed"));
+
+    {
+        FastaFile f(temp.string().c_str());
+        for(int64_t start = 0; start < 1000; start += 37)
+        {
+            for(int64_t len = 1; len < 200; len += 23)
+            {
+                const int64_t end = start + len - 1;
+                BOOST_CHECK_EQUAL(f.query("chrA", start, end), plain.query("chrA", start, end));
+            }
+        }
+        BOOST_CHECK_EQUAL(f.query("chrB", 0, 100), plain.query("chrB", 0, 100));
+        BOOST_CHECK_EQUAL(f.query("chrB", 15, 25), plain.query("chrB", 15, 25));
+        BOOST_CHECK_EQUAL(f.query("chrB", 77, 80), "");
+
+        int64_t len = 0, plen = 0;
+        const char * v = f.view("chrA", 0, 999, len);
+        const char * pv = plain.view("chrA", 0, 999, plen);
+        BOOST_REQUIRE(v != nullptr && pv != nullptr);
+        BOOST_CHECK_EQUAL(std::string(v, (size_t) len), std::string(pv, (size_t) plen));
+    }
+
+    boost::filesystem::remove(temp);
+    boost::filesystem::remove(temp.string() + ".fai");
+    boost::filesystem::remove(temp.string() + ".packed");
+}
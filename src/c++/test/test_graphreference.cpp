@@ -141,13 +141,13 @@ struct GraphReferenceTester
         size_t sink=(size_t)-1,
         std::vector<std::string> * nodes_used = NULL
     ) {
-        std::vector<uint64_t> unodes_used;
+        std::vector<bitsetutil::DynamicBitset> unodes_used;
         gr.enumeratePaths(chr, start, end, nodes, edges, target, source, sink, max_n_paths, &unodes_used);
         if(nodes_used)
         {
             for(auto n : unodes_used)
             {
-                nodes_used->push_back(std::bitset<64>(n).to_string());
+                nodes_used->push_back(n.to_string(64));
             }
         }
     }
@@ -408,3 +408,45 @@ BOOST_AUTO_TEST_CASE(graphHomref)
     }
     BOOST_CHECK_EQUAL(is, expected.size());
 }
+
+BOOST_AUTO_TEST_CASE(graphNodesUsedManyHets)
+{
+    boost::filesystem::path p(__FILE__);
+    boost::filesystem::path tp = p.parent_path()
+                                   .parent_path()   // test
+                                   .parent_path()   // c++
+                                    / boost::filesystem::path("data");
+
+    std::string datapath = tp.string();
+
+    // 70 het SNPs, all phased except for two
+    GraphReferenceTester gr((datapath + "/manyhets.vcf.gz").c_str(),
+                            "NA12877", (datapath + "/microhg19.fa").c_str());
+
+    std::vector<ReferenceNode> nodes;
+    std::vector<ReferenceEdge> edges;
+    size_t nhets = 0;
+
+    gr.makeGraph("chr1", 10000, 30000, nodes, edges, &nhets);
+
+    BOOST_CHECK_EQUAL(nhets, (size_t)2);
+
+    std::vector<Haplotype> target;
+    std::vector<std::string> nodes_used;
+
+    gr.enumeratePaths("chr1", 10000, 30000, nodes, edges, target, 0, -1, -1, &nodes_used);
+
+    // two phased haplotypes x two unphased hets
+    BOOST_CHECK_EQUAL(target.size(), (size_t)8);
+    BOOST_CHECK_EQUAL(nodes_used.size(), target.size());
+
+    std::set<std::string> unique_nodes_used;
+    for(std::string const & s : nodes_used)
+    {
+        // all paths use het nodes beyond the first 64
+        BOOST_CHECK_GT(s.size(), (size_t)64);
+        BOOST_CHECK(s.substr(0, s.size() - 64).find('1') != std::string::npos);
+        unique_nodes_used.insert(s);
+    }
+    BOOST_CHECK_EQUAL(unique_nodes_used.size(), target.size());
+}
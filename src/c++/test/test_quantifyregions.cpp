@@ -0,0 +1,175 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ *  \brief Test region annotation in quantify
+ *
+ * \file test_quantifyregions.cpp
+ *
+ */
+
+#define BOOST_TEST_NO_MAIN
+#include <boost/test/unit_test.hpp>
+#include <boost/test/test_tools.hpp>
+#include <boost/filesystem.hpp>
+
+#include <fstream>
+#include <string>
+#include <vector>
+
+#include "QuantifyRegions.hh"
+#include "helpers/BCFHelpers.hh"
+
+using namespace variant;
+
+BOOST_AUTO_TEST_CASE(quantifyRegionsIndex)
+{
+    // the index must annotate exactly like the bed files it was built from
+    std::vector<boost::filesystem::path> beds;
+    std::vector<std::string> rnames;
+    const char * bed_contents[] = {
+        "chrA\t10\t20\nchrA\t15\t30\nchrA\t100\t101\nchrB\t5\t6\n",
+        "chrA\t0\t12\tx\nchrA\t25\t40\ty\nchrA\t35\t50\tx\n",
+        "chrA\t30\t31\nchrA\t60\t80\n",
+    };
+    const char * labels[] = {"R1", "R2", "R0"};
+    for(int i = 0; i < 3; ++i)
+    {
+        beds.push_back(boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.bed"));
+        std::ofstream f(beds.back().native());
+        f << bed_contents[i];
+        rnames.push_back(std::string(labels[i]) + ":" + beds.back().string());
+    }
+    boost::filesystem::path index = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.idx");
+
+    QuantifyRegions from_beds;
+    from_beds.load(rnames);
+    QuantifyRegions::buildIndex(rnames, index.string());
+    QuantifyRegions from_index;
+    from_index.loadIndex(index.string());
+
+    for(const char * r : {"R0", "R1", "R2", "R2_x", "R2_y", "CONF"})
+    {
+        BOOST_CHECK_EQUAL(from_beds.hasRegions(r), from_index.hasRegions(r));
+        BOOST_CHECK_EQUAL(from_beds.getRegionSize(r), from_index.getRegionSize(r));
+    }
+    BOOST_CHECK_EQUAL(from_index.getRegionSize("R2_x"), (size_t) 27);
+
+    bcf_hdr_t * hdr = bcf_hdr_init("w");
+    bcf_hdr_append(hdr, "##contig=<ID=chrA,length=200>");
+    bcf_hdr_append(hdr, "##contig=<ID=chrB,length=200>");
+    bcf_hdr_append(hdr, "##contig=<ID=chrC,length=200>");
+    bcf_hdr_append(hdr, "##INFO=<ID=END,Number=1,Type=Integer,Description=\"End\">");
+    bcf_hdr_append(hdr, "##INFO=<ID=Regions,Number=.,Type=String,Description=\"Regions\">");
+    bcf_hdr_sync(hdr);
+
+    bcf1_t * rec = bcf_init();
+    int annotated = 0;
+    for(const char * chr : {"chrA", "chrB", "chrC"})
+    {
+        for(int pos = 0; pos < 120; pos += 3)
+        {
+            for(int len = -1; len < 6; len += 2)
+            {
+                bcf_clear(rec);
+                rec->rid = bcf_hdr_name2id(hdr, chr);
+                rec->pos = pos;
+                bcf_update_alleles_str(hdr, rec, "A,C");
+                // END < POS gives a variant with zero length
+                const int32_t end = pos + len + 1;
+                bcf_update_info_int32(hdr, rec, "END", &end, 1);
+
+                from_beds.annotate(hdr, rec);
+                const std::string expected = bcfhelpers::getInfoString(hdr, rec, "Regions", "");
+                annotated += expected.empty() ? 0 : 1;
+                from_index.annotate(hdr, rec);
+                BOOST_CHECK_EQUAL(bcfhelpers::getInfoString(hdr, rec, "Regions", ""), expected);
+            }
+        }
+    }
+    BOOST_CHECK(annotated > 0);
+    bcf_destroy(rec);
+    bcf_hdr_destroy(hdr);
+
+    for(auto const & b : beds)
+    {
+        boost::filesystem::remove(b);
+    }
+    boost::filesystem::remove(index);
+}
+
+BOOST_AUTO_TEST_CASE(quantifyRegionsAnnotate)
+{
+    boost::filesystem::path bed1 = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.bed");
+    boost::filesystem::path bed2 = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.bed");
+    {
+        std::ofstream f1(bed1.native());
+        f1 << "chrA\t10\t20\nchrA\t15\t30\nchrA\t1000\t1001\n";
+        std::ofstream f2(bed2.native());
+        f2 << "chrA\t0\t12\nchrA\t25\t40\n";
+    }
+    QuantifyRegions regions;
+    regions.load({"B:" + bed1.string(), "A:" + bed2.string()});
+
+    bcf_hdr_t * hdr = bcf_hdr_init("w");
+    bcf_hdr_append(hdr, "##contig=<ID=chrA,length=2000>");
+    bcf_hdr_append(hdr, "##contig=<ID=chrB,length=2000>");
+    bcf_hdr_append(hdr, "##INFO=<ID=Regions,Number=.,Type=String,Description=\"Regions\">");
+    bcf_hdr_sync(hdr);
+
+    // records out of order are annotated correctly also
+    const struct {
+        const char * chr;
+        int pos;
+        const char * ref;
+        const char * expected;
+    } cases[] = {
+        {"chrA", 5, "A", "A"},
+        {"chrA", 11, "A", "A,B"},
+        {"chrA", 12, "AAAAAAAAAAAAA", "B"},
+        {"chrA", 30, "A", "A"},
+        {"chrA", 40, "A", ""},
+        {"chrA", 1000, "A", "B"},
+        {"chrA", 26, "A", "A,B"},
+        {"chrB", 11, "A", ""},
+        {"chrA", 1500, "A", ""},
+        {"chrA", 0, "A", "A"},
+    };
+    for(auto const & c : cases)
+    {
+        bcf1_t * rec = bcf_init();
+        rec->rid = bcf_hdr_name2id(hdr, c.chr);
+        rec->pos = c.pos;
+        bcf_update_alleles_str(hdr, rec, (std::string(c.ref) + ",C").c_str());
+        regions.annotate(hdr, rec);
+        BOOST_CHECK_EQUAL(bcfhelpers::getInfoString(hdr, rec, "Regions", ""), c.expected);
+        bcf_destroy(rec);
+    }
+    bcf_hdr_destroy(hdr);
+
+    boost::filesystem::remove(bed1);
+    boost::filesystem::remove(bed2);
+}
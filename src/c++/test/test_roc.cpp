@@ -0,0 +1,186 @@
+// -*- mode: c++; indent-tabs-mode: nil; -*-
+//
+// Copyright (c) 2010-2015 Illumina, Inc.
+// All rights reserved.
+
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+
+// 1. Redistributions of source code must retain the above copyright notice, this
+//    list of conditions and the following disclaimer.
+
+// 2. Redistributions in binary form must reproduce the above copyright notice,
+//    this list of conditions and the following disclaimer in the documentation
+//    and/or other materials provided with the distribution.
+
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+/**
+ *  \brief Test ROC level computation
+ *
+ * \file test_roc.cpp
+ *
+ */
+
+#define BOOST_TEST_NO_MAIN
+#include <boost/test/unit_test.hpp>
+#include <boost/test/test_tools.hpp>
+#include <boost/filesystem.hpp>
+
+#include <cstdlib>
+#include <fstream>
+#include <vector>
+
+#include "helpers/Roc.hh"
+#include "helpers/RocArtifact.hh"
+
+using namespace roc;
+
+BOOST_AUTO_TEST_CASE(rocBinnedDiscrete)
+{
+    // with bins narrower than the spacing of levels, binning must not change the counts
+    Roc exact;
+    Roc binned(100, 0.5);
+    for(int i = 0; i < 1000; ++i)
+    {
+        const Observation tp{(double)(i % 50), DecisionType::TP, 1, OBS_FLAG_HET};
+        const Observation fp{(double)(i % 30), DecisionType::FP, 2, OBS_FLAG_HOMALT};
+        exact.add(tp);
+        exact.add(fp);
+        binned.add(tp);
+        binned.add(fp);
+    }
+    BOOST_CHECK_EQUAL(binned.binWidth(), 0.5);
+
+    const Level t_exact = exact.getTotals();
+    const Level t_binned = binned.getTotals();
+    BOOST_CHECK_EQUAL(t_exact.tp(), t_binned.tp());
+    BOOST_CHECK_EQUAL(t_exact.fp(), t_binned.fp());
+
+    std::vector<Level> levels;
+    binned.getLevels(levels, 0, OBS_FLAG_HET);
+    // with roc_delta = 0, the first level is not output
+    BOOST_REQUIRE_EQUAL(levels.size(), (size_t) 49);
+    for(auto const & l : levels)
+    {
+        // all TPs above the level
+        BOOST_CHECK_EQUAL(l.tp(), (uint64_t)(49 - l.level) * 20);
+        BOOST_CHECK_EQUAL(l.fn(), (uint64_t)(l.level + 1) * 20);
+    }
+
+    // copies and ROCs we add binned observations to stay binned
+    Roc merged;
+    merged.add(exact);
+    merged.add(binned);
+    BOOST_CHECK_EQUAL(merged.binWidth(), 0.5);
+    BOOST_CHECK_EQUAL(merged.getTotals().tp(), 2*t_exact.tp());
+    BOOST_CHECK_EQUAL(Roc(binned).binWidth(), 0.5);
+}
+
+BOOST_AUTO_TEST_CASE(rocBinnedContinuous)
+{
+    // continuous levels: the number of bins is bounded, and each point on the ROC
+    // counts the TPs above a threshold within one bin width of its level
+    srand(42);
+    Roc binned(64, 0.01);
+    std::vector<double> tp_levels;
+    for(int i = 0; i < 100000; ++i)
+    {
+        const double level = 100.0 * rand() / RAND_MAX;
+        tp_levels.push_back(level);
+        binned.add(Observation{level, DecisionType::TP, 1, 0});
+    }
+    const double w = binned.binWidth();
+    BOOST_CHECK_GT(w, 100.0 / 64);
+    BOOST_CHECK_LE(w, 4 * 100.0 / 64);
+
+    std::vector<Level> levels;
+    binned.getLevels(levels, 0);
+    BOOST_CHECK_LE(levels.size(), (size_t) 64);
+    BOOST_CHECK_EQUAL(binned.getTotals().tp(), (uint64_t) 100000);
+    for(auto const & l : levels)
+    {
+        uint64_t above_level = 0, above_level_w = 0;
+        for(double x : tp_levels)
+        {
+            above_level += x >= l.level;
+            above_level_w += x >= l.level + w;
+        }
+        BOOST_CHECK_LE(l.tp(), above_level);
+        BOOST_CHECK_GE(l.tp(), above_level_w);
+    }
+}
+
+BOOST_AUTO_TEST_CASE(rocArtifactMerge)
+{
+    // ROCs added up from artifacts must match the ROCs for all observations
+    RocMap all, part1, part2;
+    std::map<std::string, size_t> sizes {{"*", 0}, {"R", 100}};
+    for(int i = 0; i < 1000; ++i)
+    {
+        const Observation o{(double)(i % 37), i % 3 ? DecisionType::TP : DecisionType::FP, 1, OBS_FLAG_HET};
+        for(const char * name : {"a:SNP:PASS", "s|R:SNP:PASS"})
+        {
+            all[name].add(o);
+            (i < 600 ? part1 : part2)[name].add(o);
+        }
+    }
+    part2.emplace("a:INDEL:ALL", Roc(10, 0.5));
+    part2["a:INDEL:ALL"].add(Observation{1.5, DecisionType::FN, 2, 0});
+
+    const boost::filesystem::path a1 = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.art");
+    const boost::filesystem::path a2 = boost::filesystem::unique_path("%%%%-%%%%-%%%%-%%%%.art");
+    writeArtifact(a1.string(), part1, "QUAL", sizes);
+    writeArtifact(a2.string(), part2, "QUAL", sizes);
+
+    RocMap merged;
+    std::string qq_field;
+    std::map<std::string, size_t> merged_sizes;
+    addArtifact(a1.string(), merged, qq_field, merged_sizes);
+    addArtifact(a2.string(), merged, qq_field, merged_sizes);
+    BOOST_CHECK_EQUAL(qq_field, "QUAL");
+    BOOST_CHECK(merged_sizes == sizes);
+    BOOST_REQUIRE_EQUAL(merged.size(), (size_t) 3);
+    BOOST_CHECK_EQUAL(merged["a:INDEL:ALL"].binWidth(), 0.5);
+    BOOST_CHECK_EQUAL(merged["a:INDEL:ALL"].getTotals().fn(), (uint64_t) 2);
+
+    for(const char * name : {"a:SNP:PASS", "s|R:SNP:PASS"})
+    {
+        std::vector<Level> expected, actual;
+        all[name].getLevels(expected);
+        merged[name].getLevels(actual);
+        BOOST_REQUIRE_EQUAL(expected.size(), actual.size());
+        for(size_t i = 0; i < expected.size(); ++i)
+        {
+            BOOST_CHECK_EQUAL(expected[i].level, actual[i].level);
+            BOOST_CHECK_EQUAL(expected[i].tp(), actual[i].tp());
+            BOOST_CHECK_EQUAL(expected[i].fp(), actual[i].fp());
+            BOOST_CHECK_EQUAL(expected[i].fn(), actual[i].fn());
+        }
+    }
+
+    // different QQ fields and region sizes cannot be added up
+    std::string other_qq = "GQ";
+    BOOST_CHECK_THROW(addArtifact(a1.string(), merged, other_qq, merged_sizes), std::runtime_error);
+    merged_sizes["R"] = 99;
+    BOOST_CHECK_THROW(addArtifact(a1.string(), merged, qq_field, merged_sizes), std::runtime_error);
+
+    // truncated files
+    boost::filesystem::resize_file(a2, 20);
+    RocMap failed;
+    std::map<std::string, size_t> failed_sizes;
+    std::string failed_qq;
+    BOOST_CHECK_THROW(addArtifact(a2.string(), failed, failed_qq, failed_sizes), std::runtime_error);
+
+    boost::filesystem::remove(a1);
+    boost::filesystem::remove(a2);
+}
@@ -31,13 +31,18 @@ def blocksplitWrapper(location_str, args):
                                      suffix=".chunks.bed")
     tf.close()
 
+    vcf1, vcf2 = args.vcf1, args.vcf2
+    if args.parts:
+        # preprocessed per contig, see pre.preprocessByContig
+        vcf1, vcf2 = args.parts[location_str]
+
     if location_str:
         loc = " -l %s" % location_str
     else:
         loc = ""
-    to_run = "blocksplit %s %s%s -o %s --window %i --nblocks %i -f 0" % \
-             (args.vcf1.replace(" ", "\\ "),
-              args.vcf2.replace(" ", "\\ "),
+    to_run = "blocksplit %s %s%s -o %s --window %i --nblocks %i -f 0 -e 1" % \
+             (vcf1.replace(" ", "\\ "),
+              vcf2.replace(" ", "\\ "),
               loc,
               tf.name,
               args.window*2,
@@ -24,34 +24,62 @@ import time
 import itertools
 import multiprocessing
 
-from Tools.parallel import runParallel, getPool
+from Tools.parallel import runScheduled, getPool
 from Tools.bcftools import runBcftools, concatenateParts
-from Tools.vcfextract import extractHeadersJSON
+from Tools.vcfextract import extractHeadersJSON, sortByContigOrder
+from Tools.fastasize import fastaContigLengths, calculateLength
 
 
 def preprocessWrapper(file_and_location, args):
+    """ Run preprocess on a file + location, or on a stream
+
+    :param file_and_location: tuple (filename, location) or (filename, location, output name)
+    :param args: dictionary of preprocessing settings. When args["stream"] is set, filename
+                 is a shell command which writes the input VCF to stdout; location is then
+                 only used for logging.
+    """
     starttime = time.time()
-    filename, location_str = file_and_location
+    filename, location_str = file_and_location[:2]
     if args["bcf"]:
         int_suffix = "bcf"
     else:
         int_suffix = "vcf.gz"
 
-    tf = tempfile.NamedTemporaryFile(delete=False,
-                                     prefix="input.%s" % location_str,
-                                     suffix=".prep." + int_suffix)
-    tf.close()
+    if len(file_and_location) > 2:
+        output_name = file_and_location[2]
+    else:
+        tf = tempfile.NamedTemporaryFile(delete=False,
+                                         prefix="input.%s" % location_str,
+                                         suffix=".prep." + int_suffix)
+        tf.close()
+        output_name = tf.name
+
+    if args.get("stream"):
+        source = "%s | " % filename
+        # "--" so "-" isn't taken to be an option
+        filename = "-- -"
+        location = ""
+    else:
+        source = ""
+        filename = filename.replace(" ", "\\ ")
+        location = ("-l %s " % location_str) if location_str else ""
+
+    if not args.get("stream") or args["decompose"] or args["leftshift"] or args["haploid_x"]:
+        to_run = "%spreprocess %s-o %s -V %i -L %i -r %s" % \
+                 (source,
+                  location,
+                  output_name,
+                  args["decompose"],
+                  args["leftshift"],
+                  args["reference"])
 
-    to_run = "preprocess %s:* %s-o %s -V %i -L %i -r %s" % \
-             (filename.replace(" ", "\\ "),
-              ("-l %s " % location_str) if location_str else "",
-              tf.name,
-              args["decompose"],
-              args["leftshift"],
-              args["reference"])
+        if args["haploid_x"]:
+            to_run += " --haploid-x 1"
 
-    if args["haploid_x"]:
-        to_run += " --haploid-x 1"
+        to_run += " %s:*" % filename
+    else:
+        # nothing to do other than writing the stream
+        to_run = "%sbcftools view -o %s -O %s" % (source, output_name, "b" if args["bcf"] else "z")
 
     tfe = tempfile.NamedTemporaryFile(delete=False,
                                       prefix="stderr",
@@ -76,12 +104,15 @@ def preprocessWrapper(file_and_location, args):
 
     elapsed = time.time() - starttime
     logging.info("preprocess for %s -- time taken %.2f" % (location_str, elapsed))
-    runBcftools("index", tf.name)
-    return tf.name
+    runBcftools("index", output_name)
+    return output_name
 
 
 def blocksplitWrapper(location_str, bargs):
-    """ Blocksplit for partial credit preprocessing """
+    """ Blocksplit for partial credit preprocessing
+
+    :return: list of tuples (location, estimated cost)
+    """
     starttime = time.time()
     tf = tempfile.NamedTemporaryFile(delete=False,
                                      prefix="result.%s" % location_str,
@@ -90,7 +121,7 @@ def blocksplitWrapper(location_str, bargs):
     try:
         tf.close()
 
-        to_run = "blocksplit %s -l %s -o %s --window %i --nblocks %i -f 0" % \
+        to_run = "blocksplit %s -l %s -o %s --window %i --nblocks %i -f 0 -e 1" % \
                  (bargs["vcf"],
                   location_str,
                   tf.name,
@@ -127,7 +158,7 @@ def blocksplitWrapper(location_str, bargs):
                 xchr = ll[0]
                 start = int(ll[1]) + 1
                 end = int(ll[2])
-                r.append("%s:%i-%i" % (xchr, start, end))
+                r.append(("%s:%i-%i" % (xchr, start, end), int(ll[3]) if len(ll) > 3 else None))
         result = r
 
     finally:
@@ -151,8 +182,8 @@ def partialCredit(vcfname,
     if threads > 1:
         logging.info("Partial credit processing uses %i parallel processes." % threads)
 
+        h = extractHeadersJSON(vcfname)
         if not locations:
-            h = extractHeadersJSON(vcfname)
             if not h["tabix"]["chromosomes"]:
                 logging.warn("Empty input or not tabix indexed")
                 if outputname.endswith(".bcf"):
@@ -167,42 +198,57 @@ def partialCredit(vcfname,
         elif type(locations) is str or type(locations) is unicode:
             locations = locations.split(",")
 
+        # blocks are in order unless we were given ranges, which might overlap or be unsorted
+        locations_ordered = not [l for l in locations if ":" in l]
+
         # use blocksplit to subdivide input
-        res = runParallel(pool,
-                          blocksplitWrapper,
-                          locations,
-                          {"vcf": vcfname,
-                           "dist": window,
-                           "pieces": min(40, threads*4)})
+        contig_lengths = fastaContigLengths(reference)
+        res = runScheduled(pool,
+                           blocksplitWrapper,
+                           locations,
+                           [calculateLength(contig_lengths, l) for l in locations],
+                           {"vcf": vcfname,
+                            "dist": window,
+                            "pieces": min(40, threads*4)})
 
         if None in res:
             raise Exception("One of the blocksplit processes failed.")
 
-        locations = list(itertools.chain.from_iterable(res))
+        blocks = list(itertools.chain.from_iterable(res))
+        locations = [b[0] for b in blocks]
+        location_costs = [b[1] for b in blocks]
         if not len(locations):
             logging.warn("Blocksplit returned no blocks. This can happen when "
                          "an input contains no valid variants.")
             locations = [""]
+            location_costs = None
     else:
         locations = [""]
+        location_costs = None
+        locations_ordered = True
 
     res = []
     try:
-        res = runParallel(pool,
-                          preprocessWrapper,
-                          itertools.izip(itertools.repeat(vcfname), locations),
-                          {"reference": reference,
-                           "decompose": decompose,
-                           "leftshift": leftshift,
-                           "haploid_x": haploid_x,
-                           "bcf": outputname.endswith(".bcf")})
+        res = runScheduled(pool,
+                           preprocessWrapper,
+                           itertools.izip(itertools.repeat(vcfname), locations),
+                           location_costs,
+                           {"reference": reference,
+                            "decompose": decompose,
+                            "leftshift": leftshift,
+                            "haploid_x": haploid_x,
+                            "bcf": outputname.endswith(".bcf")})
 
         if None in res:
             raise Exception("One of the preprocess jobs failed")
         if not res:
             raise Exception("No blocks were processed. List of locations: %s" % str(list(locations)))
 
-        concatenateParts(outputname, *res)
+        parts = res
+        if locations_ordered and location_costs is not None:
+            # locations may be sorted by name, the parts must follow the contig order of the header
+            parts = sortByContigOrder(locations, res, h)
+        concatenateParts(outputname, *parts, pool=pool, ordered=locations_ordered)
         if outputname.endswith(".vcf.gz"):
             runBcftools("index", "-f", "-t", outputname)
         else:  # use bcf
@@ -60,10 +60,48 @@ def _locations_tmp_bed_file(locations):
     return tf.name
 
 
+def _run_logged(run_str):
+    """ Run a command and log its stdout / stderr """
+    tfe = tempfile.NamedTemporaryFile(delete=False,
+                                      prefix="stderr",
+                                      suffix=".log")
+    tfo = tempfile.NamedTemporaryFile(delete=False,
+                                      prefix="stdout",
+                                      suffix=".log")
+
+    logging.info("Running '%s'" % run_str)
+
+    try:
+        subprocess.check_call(run_str, shell=True, stdout=tfo, stderr=tfe)
+    except:
+        tfo.close()
+        tfe.close()
+        with open(tfo.name) as f:
+            for l in f:
+                logging.error("[stdout] " + l.replace("\n", ""))
+        os.unlink(tfo.name)
+        with open(tfe.name) as f:
+            for l in f:
+                logging.error("[stderr] " + l.replace("\n", ""))
+        os.unlink(tfe.name)
+        raise
+
+    tfo.close()
+    tfe.close()
+    with open(tfo.name) as f:
+        for l in f:
+            logging.info("[stdout] " + l.replace("\n", ""))
+    os.unlink(tfo.name)
+    with open(tfe.name) as f:
+        for l in f:
+            logging.info("[stderr] " + l.replace("\n", ""))
+    os.unlink(tfe.name)
+
+
 def run_quantify(filename,
                  output_file=None, write_vcf=False, regions=None,
                  reference=Tools.defaultReference(),
-                 locations=None, threads=1,
+                 locations=None, threads=1, shards=0,
                  output_vtc=False,
                  output_rocs=False,
                  qtype=None,
@@ -72,9 +110,12 @@ def run_quantify(filename,
                  roc_header=None,
                  roc_filter=None,
                  roc_delta=None,
+                 roc_bins=0,
                  roc_regions=None,
                  clean_info=True,
-                 strat_fixchr=False):
+                 strat_fixchr=False,
+                 strat_index=None,
+                 artifact=None):
     """Run quantify and return parsed JSON
 
     :param filename: the VCF file name
@@ -84,6 +125,7 @@ def run_quantify(filename,
     :param regions: dictionary of stratification region names and file names
     :param reference: reference fasta path
     :param locations: a location to use
+    :param shards: number of contigs to quantify in parallel (0 to read the file sequentially)
     :param output_vtc: enable / disable the VTC field
     :param output_rocs: enable / disable output of ROCs by QQ level
     :param roc_file: filename for a TSV file with ROC observations
@@ -91,9 +133,12 @@ def run_quantify(filename,
     :param roc_header: name of ROC value for tables
     :param roc_filter: ROC filtering settings
     :param roc_delta: ROC minimum spacing between levels
+    :param roc_bins: maximum number of QQ bins per ROC (0 to keep all observations)
     :param roc_regions: List of regions to output full ROCs for
     :param clean_info: remove unused INFO fields
     :param strat_fixchr: fix chr naming in stratification regions
+    :param strat_index: stratification index file written by strat-index
+    :param artifact: write ROCs to this file, see merge_artifacts
     :returns: parsed counts JSON
     """
 
@@ -103,6 +148,8 @@ def run_quantify(filename,
     run_str = "quantify '%s' -o '%s'" % (filename.replace(" ", "\\ "), output_file)
     run_str += " -r '%s'" % reference.replace(" ", "\\ ")
     run_str += " --threads %i" % threads
+    if shards:
+        run_str += " --shards %i" % shards
 
     if output_vtc:
         run_str += " --output-vtc 1"
@@ -133,6 +180,9 @@ def run_quantify(filename,
     if roc_delta:
         run_str += " --roc-delta %f" % roc_delta
 
+    if roc_bins:
+        run_str += " --roc-bins %i" % roc_bins
+
     if clean_info:
         run_str += " --clean-info 1"
     else:
@@ -152,6 +202,12 @@ def run_quantify(filename,
         for k, v in regions.iteritems():
             run_str += " -R '%s:%s'" % (k, v)
 
+    if strat_index:
+        run_str += " --stratification-index '%s'" % strat_index
+
+    if artifact:
+        run_str += " --output-artifact '%s'" % artifact
+
     if roc_regions:
         for r in roc_regions:
             run_str += " --roc-regions '%s'" % r
@@ -161,44 +217,11 @@ def run_quantify(filename,
         location_file = _locations_tmp_bed_file(locations)
         run_str += " --only '%s'" % location_file
 
-    tfe = tempfile.NamedTemporaryFile(delete=False,
-                                      prefix="stderr",
-                                      suffix=".log")
-    tfo = tempfile.NamedTemporaryFile(delete=False,
-                                      prefix="stdout",
-                                      suffix=".log")
-
-    logging.info("Running '%s'" % run_str)
-
     try:
-        subprocess.check_call(run_str, shell=True, stdout=tfo, stderr=tfe)
-    except:
-        tfo.close()
-        tfe.close()
-        with open(tfo.name) as f:
-            for l in f:
-                logging.error("[stdout] " + l.replace("\n", ""))
-        os.unlink(tfo.name)
-        with open(tfe.name) as f:
-            for l in f:
-                logging.error("[stderr] " + l.replace("\n", ""))
-        os.unlink(tfe.name)
+        _run_logged(run_str)
+    finally:
         if location_file:
             os.unlink(location_file)
-        raise
-
-    tfo.close()
-    tfe.close()
-    with open(tfo.name) as f:
-        for l in f:
-            logging.info("[stdout] " + l.replace("\n", ""))
-    os.unlink(tfo.name)
-    with open(tfe.name) as f:
-        for l in f:
-            logging.info("[stderr] " + l.replace("\n", ""))
-    os.unlink(tfe.name)
-    if location_file:
-        os.unlink(location_file)
 
     if write_vcf and write_vcf.endswith(".bcf"):
         runBcftools("index", write_vcf)
@@ -208,3 +231,40 @@ def run_quantify(filename,
         subprocess.check_call(to_run, shell=True)
 
 
+def merge_artifacts(artifacts,
+                    output_file,
+                    output_rocs=False,
+                    roc_delta=None,
+                    roc_regions=None,
+                    artifact=None):
+    """Add up the ROCs in artifacts written by run_quantify and write
+    the same table run_quantify writes
+
+    :param artifacts: list of artifact file names
+    :param output_file: output file name
+    :param output_rocs: enable / disable output of ROCs by QQ level
+    :param roc_delta: ROC minimum spacing between levels
+    :param roc_regions: List of regions to output full ROCs for
+    :param artifact: write the merged ROCs to this file
+    """
+    run_str = "quantify -o '%s'" % output_file
+
+    for a in artifacts:
+        run_str += " --merge-artifact '%s'" % a
+
+    if output_rocs:
+        run_str += " --output-rocs 1"
+    else:
+        run_str += " --output-rocs 0"
+
+    if roc_delta:
+        run_str += " --roc-delta %f" % roc_delta
+
+    if roc_regions:
+        for r in roc_regions:
+            run_str += " --roc-regions '%s'" % r
+
+    if artifact:
+        run_str += " --output-artifact '%s'" % artifact
+
+    _run_logged(run_str)
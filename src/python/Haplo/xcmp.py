@@ -35,10 +35,15 @@ def xcmpWrapper(location_str, args):
                                      suffix=".bcf")
     tf.close()
 
+    vcf1, vcf2 = args.vcf1, args.vcf2
+    if args.parts:
+        # preprocessed per contig, see pre.preprocessByContig
+        vcf1, vcf2 = args.parts[location_str]
+
     to_run = "xcmp %s %s -l %s -o %s -r %s -f %i -n %i --expand-hapblocks %i " \
-             "--window %i --no-hapcmp %i --qq %s" % \
-             (args.vcf1.replace(" ", "\\ "),
-              args.vcf2.replace(" ", "\\ "),
+             "--window %i --no-hapcmp %i --qq %s --threads %i" % \
+             (vcf1.replace(" ", "\\ "),
+              vcf2.replace(" ", "\\ "),
               location_str,
               tf.name,
               args.ref,
@@ -47,7 +52,19 @@ def xcmpWrapper(location_str, args):
               args.hb_expand,
               args.window,
               1 if args.no_hc else 0,
-              args.roc if args.roc else "QUAL")
+              args.roc if args.roc else "QUAL",
+              args.xcmp_threads)
+
+    if args.engine == "xcmp-dp":
+        to_run += " --hap-engine dp"
+
+    if args.block_time_limit_ms:
+        to_run += " --block-time-limit-ms %i --block-time-report %s" % (args.block_time_limit_ms,
+                                                                         tf.name + ".timeouts.bed")
+
+    if args.profile_blocks:
+        to_run += " --profile-blocks %i --profile-output %s" % (args.profile_blocks,
+                                                                tf.name + ".profile.tsv")
 
     if args.verbose:
         # this prints information on failed sites
@@ -83,3 +100,56 @@ def xcmpWrapper(location_str, args):
     logging.info("xcmp for chunk %s -- time taken %.2f" % (location_str, elapsed))
 
     return tf.name
+
+
+def mergeBlockProfiles(locations, results, top_n, output_prefix):
+    """ Merge the --profile-blocks outputs of the xcmp runs for all chunks
+
+    Writes the top_n slowest blocks to output_prefix.block_profile.tsv, and the
+    totals for each chunk to output_prefix.block_profile.chunks.tsv.
+
+    :param locations: list of chunk locations
+    :param results: xcmp output file names for each location (see xcmpWrapper)
+    :param top_n: number of blocks to output
+    :param output_prefix: output file prefix
+    :return: list of per-chunk profile files (these can be deleted)
+    """
+    header = None
+    blocks = []
+    chunks = []
+    profile_files = []
+    for location, result in zip(locations, results):
+        pf = result + ".profile.tsv"
+        profile_files.append(pf)
+        with open(pf) as f:
+            for l in f:
+                l = l.rstrip("\n")
+                if l.startswith("#total"):
+                    totals = dict(x.split("=", 1) for x in l.split("\t")[1:])
+                    chunks.append([location,
+                                   int(totals["blocks"]),
+                                   int(totals["hapcmp_blocks"]),
+                                   float(totals["compare_ms"]),
+                                   float(totals["wall_ms"])])
+                elif l.startswith("#"):
+                    header = l
+                elif l:
+                    blocks.append(l.split("\t"))
+
+    blocks.sort(key=lambda x: -float(x[3]))
+    with open(output_prefix + ".block_profile.tsv", "w") as f:
+        if header:
+            print >> f, header
+        for b in blocks[:top_n]:
+            print >> f, "\t".join(b)
+
+    with open(output_prefix + ".block_profile.chunks.tsv", "w") as f:
+        print >> f, "#location\tblocks\thapcmp_blocks\tcompare_ms\twall_ms"
+        for c in chunks:
+            print >> f, "%s\t%i\t%i\t%.3f\t%.3f" % tuple(c)
+
+    if chunks:
+        logging.info("Block profile: %i blocks, %i haplotype comparisons, %.2fs comparing blocks in %i chunks" %
+                     (sum(c[1] for c in chunks), sum(c[2] for c in chunks),
+                      sum(c[3] for c in chunks) / 1000.0, len(chunks)))
+    return profile_files
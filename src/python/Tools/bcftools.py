@@ -17,6 +17,8 @@ import tempfile
 import gzip
 
 import Tools
+from Tools.parallel import runParallel, splitEvery
+from Tools.vcfextract import readHeaderLines
 
 
 def runBcftools(*args):
@@ -98,51 +100,118 @@ def makeIndex(inputfile, output_name=None):
     return output_name
 
 
-def concatenateParts(output, *args):
+def concatenateParts(output, *args, **kwargs):
     """ Concatenate BCF files
 
 
     Trickier than it sounds because when there are many files we might run into
     various limits like the number of open files, or the length of a command line.
 
-    This function will bcftools concat in a tree-like fashion to avoid this.
+    This function will bcftools concat in a tree-like fashion to avoid this. Groups
+    of files on the same level of the tree are concatenated in parallel.
+
+    :param output: output file name
+    :param args: input file names
+    :param pool: multiprocessing.Pool or None
+    :param ordered: the inputs are sorted and non-overlapping, and ordered by chromosome
+                    as in the header. In this case, the inputs don't need to be indexed,
+                    and BCF files with identical headers are concatenated without
+                    re-encoding the records.
     """
+    pool = kwargs.pop("pool", None)
+    ordered = kwargs.pop("ordered", False)
+    if kwargs:
+        raise TypeError("Unexpected arguments for concatenateParts: %s" % ", ".join(kwargs.keys()))
+
+    if output.endswith(".bcf"):
+        outputext = ".bcf"
+    else:
+        outputext = ".vcf.gz"
+
+    parts = list(args)
     to_delete = []
     try:
-        if output.endswith(".bcf"):
-            outputformat = "b"
-            outputext = ".bcf"
+        while len(parts) >= 10:
+            # at most 9 files per group, and groups of equal size
+            ngroups = (len(parts) + 8) / 9
+            groupsize = (len(parts) + ngroups - 1) / ngroups
+            jobs = []
+            for group in splitEvery(groupsize, parts):
+                tf = tempfile.NamedTemporaryFile(suffix=outputext, delete=False)
+                tf.close()
+                to_delete.append(tf.name)
+                to_delete.append(tf.name + ".csi")
+                jobs.append((tf.name, group))
+
+            res = runParallel(pool, concatenateGroup, jobs, ordered)
+            if None in res:
+                raise Exception("One of the bcftools concat jobs failed.")
+            parts = res
+
+        concatenateGroup((output, parts), ordered)
+    finally:
+        for f in to_delete:
+            try:
+                os.unlink(f)
+            except:
+                pass
+
+
+def concatenateGroup(output_and_parts, ordered=False):
+    """ Concatenate files using a single bcftools concat call
+
+    :param output_and_parts: tuple (output file name, list of input file names)
+    :param ordered: inputs are in order, see concatenateParts
+    :return: the output file name
+    """
+    output, parts = output_and_parts
+    if output.endswith(".bcf"):
+        outputformat = "b"
+    else:
+        outputformat = "z"
+
+    to_delete = []
+    try:
+        if ordered and outputformat == "b" and all([x.endswith(".bcf") for x in parts]) \
+                and sameHeaders(parts):
+            # copy compressed blocks
+            cmdlist = ["concat", "--naive", "-o", output]
+        elif ordered:
+            cmdlist = ["concat", "-O", outputformat, "-o", output]
         else:
-            outputformat = "z"
-            outputext = ".vcf.gz"
-        if len(args) < 10:
-            for x in args:
+            for x in parts:
                 if not os.path.exists(x + ".tbi") and not os.path.exists(x + ".csi"):
                     to_delete.append(x + ".csi")
                     runBcftools("index", "-f", x)
-            cmdlist = ["concat", "-a", "-O", outputformat, "-o", output] + list(args)
-            runBcftools(*cmdlist)
-        else:
-            # block in chunks (TODO: make parallel)
-            tf1 = tempfile.NamedTemporaryFile(suffix=outputext, delete=False)
-            tf2 = tempfile.NamedTemporaryFile(suffix=outputext, delete=False)
-            to_delete.append(tf1.name)
-            to_delete.append(tf2.name)
-            to_delete.append(tf1.name + ".csi")
-            to_delete.append(tf2.name + ".csi")
-            half1 = [tf1.name] + list(args[:len(args)/2])
-            half2 = [tf2.name] + list(args[len(args)/2:])
-            concatenateParts(*half1)
-            runBcftools("index", tf1.name)
-            concatenateParts(*half2)
-            runBcftools("index", tf2.name)
-            concatenateParts(output, tf1.name, tf2.name)
+            cmdlist = ["concat", "-a", "-O", outputformat, "-o", output]
+        runBcftools(*(cmdlist + list(parts)))
     finally:
         for f in to_delete:
             try:
                 os.unlink(f)
             except:
                 pass
+    return output
+
+
+def sameHeaders(parts):
+    """ Check if files have identical headers, which bcftools concat --naive requires
+
+    :param parts: list of file names
+    :return: True if all headers are the same
+    """
+    first = None
+    for x in parts:
+        try:
+            lines = readHeaderLines(x)[0]
+        except Exception:
+            return False
+        if first is None:
+            first = lines
+        elif lines != first:
+            logging.info("Headers of %s and %s differ, re-encoding records when concatenating." % (parts[0], x))
+            return False
+    return True
 
 
 # noinspection PyShadowingBuiltins
@@ -233,6 +302,46 @@ def preprocessVCF(input, output, location="",
             pass
 
 
+def streamVCF(input, location="",
+              pass_only=True,
+              chrprefix=True,
+              targets=None,
+              filters_only=None):
+    """ Return a shell pipeline which writes the filtered records of a VCF to stdout
+
+    This applies the same filtering as preprocessVCF, but without writing and
+    indexing an output file, so the result can be piped into another process.
+
+    :param input: the input VCF / BCF (must be indexed when location is given)
+    :param location: optional location to read -- this must use the contig names
+                     in the input file (i.e. before fixing the chr prefix)
+    :param pass_only: only return passing variants
+    :param chrprefix: fix chromosome prefix
+    :param targets: specify a subset of target regions (streaming traversal)
+    :param filters_only: require a set of filters (overridden by pass_only)
+    :return: the command line as a string
+    """
+    vargs = ["bcftools", "view", input.replace(" ", "\\ ")]
+
+    if location:
+        vargs += ["-r", location]
+
+    if pass_only:
+        vargs += ["-f", "PASS,."]
+    elif filters_only:
+        vargs += ["-f", filters_only]
+
+    if chrprefix:
+        vargs += ["|", "perl", "-pe", "'s/^([0-9XYM])/chr$1/'", "|", "perl", "-pe", "'s/chrMT/chrM/'",
+                  "|", "bcftools", "view"]
+
+    if targets:
+        vargs += ["-T", targets, "|", "bcftools", "view"]
+
+    vargs += ["-O", "v"]
+    return " ".join(vargs)
+
+
 def bedOverlapCheck(filename):
     """ Check for overlaps / out of order in a bed file """
     if filename.endswith(".gz"):
@@ -0,0 +1,194 @@
+# coding=utf-8
+#
+# Copyright (c) 2010-2015 Illumina, Inc.
+# All rights reserved.
+#
+# This file is distributed under the simplified BSD license.
+# The full text can be found here (and in LICENSE.txt in the root folder of
+# this distribution):
+#
+# https://github.com/Illumina/licenses/blob/master/Simplified-BSD-License.txt
+#
+# Content-addressed cache for preprocessed files
+#
+# Entries are directories named after their key. They are written to a
+# temporary directory first and renamed into place, so readers never see
+# partial entries. A lock file serialises insertion / eviction against
+# readers, which allows several processes on one host to share a cache.
+
+import os
+import json
+import fcntl
+import shutil
+import logging
+import hashlib
+import tempfile
+import contextlib
+
+
+def fileChecksum(filename, blocksize=1024*1024):
+    """ Compute the SHA1 checksum of a file
+    :param filename: file name
+    :return: hex digest
+    """
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        while True:
+            block = f.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class FileCache(object):
+    """ Size-bounded LRU cache for files + their indexes and metadata """
+
+    def __init__(self, path, max_size=None):
+        """
+        :param path: cache directory (created if it doesn't exist)
+        :param max_size: maximum total size of cache entries in bytes (None for unlimited)
+        """
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.checksum_path = os.path.join(self.path, "checksums")
+        self.entry_path = os.path.join(self.path, "entries")
+        for p in [self.path, self.checksum_path, self.entry_path]:
+            try:
+                os.makedirs(p)
+            except OSError:
+                if not os.path.isdir(p):
+                    raise
+
+    @contextlib.contextmanager
+    def _lock(self, exclusive):
+        """ hold the cache lock while in context """
+        with open(os.path.join(self.path, "cache.lock"), "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def checksum(self, filename):
+        """ Checksum for a file, remembered across runs for as long as its size and mtime don't change
+        :param filename: file name
+        :return: hex digest
+        """
+        filename = os.path.abspath(filename)
+        st = os.stat(filename)
+        stamp = "%i %f" % (st.st_size, st.st_mtime)
+        memo = os.path.join(self.checksum_path, hashlib.sha1(filename).hexdigest())
+        try:
+            with open(memo) as f:
+                mstamp, digest = f.read().strip().rsplit(" ", 1)
+            if mstamp == stamp:
+                return digest
+        except:
+            pass
+
+        digest = fileChecksum(filename)
+        tf = tempfile.NamedTemporaryFile(delete=False, dir=self.checksum_path)
+        tf.write("%s %s\n" % (stamp, digest))
+        tf.close()
+        os.rename(tf.name, memo)
+        return digest
+
+    def key(self, files, **params):
+        """ Make a cache key
+        :param files: list of input files (None entries are ignored), hashed by content
+        :param params: other parameters, these must be JSON-serialisable
+        :return: the key
+        """
+        h = hashlib.sha1()
+        for f in files:
+            h.update(self.checksum(f) if f else "-")
+            h.update("\0")
+        h.update(json.dumps(params, sort_keys=True))
+        return h.hexdigest()
+
+    def get(self, key, filename, suffixes=(".tbi", ".csi")):
+        """ Retrieve a file from the cache
+        :param key: the cache key
+        :param filename: destination file name
+        :param suffixes: suffixes of extra files (e.g. indexes) to retrieve alongside filename
+        :return: the metadata stored with the file, or None if the key is not in the cache
+        """
+        entry = os.path.join(self.entry_path, key)
+        with self._lock(False):
+            if not os.path.isdir(entry):
+                return None
+            with open(os.path.join(entry, "meta.json")) as f:
+                meta = json.load(f)
+            for s in [""] + list(suffixes):
+                src = os.path.join(entry, "data" + s)
+                if os.path.exists(src):
+                    _linkOrCopy(src, filename + s)
+            # mark as recently used
+            os.utime(entry, None)
+        logging.info("Using cached file %s for %s" % (entry, filename))
+        return meta
+
+    def put(self, key, filename, meta, suffixes=(".tbi", ".csi")):
+        """ Add a file to the cache
+        :param key: the cache key
+        :param filename: file to add
+        :param meta: JSON-serialisable metadata to store with the file
+        :param suffixes: suffixes of extra files (e.g. indexes) to store alongside filename
+        """
+        tmp = tempfile.mkdtemp(dir=self.entry_path, prefix=".tmp.")
+        try:
+            for s in [""] + list(suffixes):
+                if os.path.exists(filename + s):
+                    _linkOrCopy(filename + s, os.path.join(tmp, "data" + s))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+
+            with self._lock(True):
+                entry = os.path.join(self.entry_path, key)
+                if os.path.isdir(entry):
+                    # another process got here first
+                    os.utime(entry, None)
+                else:
+                    os.rename(tmp, entry)
+                    logging.info("Added %s to cache as %s" % (filename, entry))
+                self._evict(key)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _evict(self, keep):
+        """ Remove least recently used entries until the cache fits into max_size (must hold the exclusive lock)
+        :param keep: key of an entry which is never removed
+        """
+        if self.max_size is None:
+            return
+        entries = []
+        total = 0
+        for k in os.listdir(self.entry_path):
+            entry = os.path.join(self.entry_path, k)
+            if k.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, x)) for x in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), k, size))
+            total += size
+
+        for _, k, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            if k == keep:
+                continue
+            logging.info("Removing %s from cache" % k)
+            shutil.rmtree(os.path.join(self.entry_path, k), ignore_errors=True)
+            total -= size
+
+
+def _linkOrCopy(src, dst):
+    """ hard-link src to dst, copy if that is not possible """
+    try:
+        os.remove(dst)
+    except OSError:
+        pass
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
@@ -24,6 +24,8 @@
 
 import os
 import logging
+import struct
+import subprocess
 
 
 def fastaContigLengths(fastafile):
@@ -69,3 +71,34 @@ def calculateLength(fastacontiglengths, locations):
         total_length += length
 
     return total_length
+
+
+def packedReferenceIsCurrent(fastafile):
+    """ Check if there is a packed image of a fasta file (see packref) which was
+        built from the current fasta file and index
+    """
+    packed = fastafile + ".packed"
+    if not os.path.exists(packed):
+        return False
+
+    # see PackedHeader in Fasta.cpp
+    with open(packed, "rb") as f:
+        header = f.read(32)
+    if len(header) < 32:
+        return False
+    magic, _, fasta_size, fasta_mtime = struct.unpack("<8sQQq", header)
+
+    st = os.stat(fastafile)
+    return magic == "HAPPACK\x01" and \
+        fasta_size == st.st_size and fasta_mtime == int(st.st_mtime) and \
+        os.path.getmtime(fastafile + ".fai") <= os.path.getmtime(packed)
+
+
+def packReference(fastafile):
+    """ Build the packed image of a fasta file unless there is an up-to-date one
+    """
+    if packedReferenceIsCurrent(fastafile):
+        logging.info("Using packed reference %s.packed" % fastafile)
+        return
+    logging.info("Packing reference %s" % fastafile)
+    subprocess.check_call(["packref", fastafile])
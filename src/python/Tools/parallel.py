@@ -19,7 +19,7 @@ import subprocess
 import multiprocessing
 import cPickle
 import tempfile
-from itertools import islice, izip, repeat
+from itertools import islice
 
 from . import LoggingWriter
 
@@ -82,6 +82,11 @@ def parMapper(arg):
     return None
 
 
+def indexedMapper(arg):
+    """ run parMapper and keep track of the index of the item """
+    return arg[0], parMapper(arg[1])
+
+
 def runParallel(pool, fun, par, *args, **kwargs):
     """ run a function in parallel on all elements in par
 
@@ -92,10 +97,40 @@ def runParallel(pool, fun, par, *args, **kwargs):
     :param kwargs: more function arguments for fun
 
     """
+    return runScheduled(pool, fun, par, None, *args, **kwargs)
+
+
+def runScheduled(pool, fun, par, costs, *args, **kwargs):
+    """ run a function in parallel on all elements in par, starting with the most expensive ones
+
+    Items are handed to the pool processes one at a time as they become free, so
+    a few long-running items don't hold up a whole batch of work.
+
+    :param pool: multiprocessing.Pool or None
+    :param fun: a function
+    :param par: a list of things to map to (each item is passed as the first argument to fun)
+    :param costs: list of cost hints, one for each item in par (None or missing
+                  values keep the input order)
+    :param args: more function arguments for fun
+    :param kwargs: more function arguments for fun
+    :return: list of results in the same order as par
+    """
+    par = list(par)
+    context = {"fun": fun, "args": args, "kwargs": kwargs}
+    order = range(len(par))
+    if costs is not None:
+        costs = list(costs)
+        if len(costs) != len(par):
+            raise Exception("Need one cost hint per item (got %i for %i items)." % (len(costs), len(par)))
+        # sort is stable, so items with equal cost keep their order
+        order = sorted(order, key=lambda i: -(costs[i] or 0))
+
+    result = [None] * len(par)
     if pool:
-        result = pool.map(parMapper, izip(par, repeat( { "fun": fun, "args": args, "kwargs": kwargs } )))
+        for i, r in pool.imap_unordered(indexedMapper, ((i, (par[i], context)) for i in order), chunksize=1):
+            result[i] = r
     else:
-        result = []
-        for c in par:
-            result.append(parMapper( (c, { "fun": fun, "args": args, "kwargs": kwargs } ) ))
+        # the order doesn't matter when running sequentially
+        for i, c in enumerate(par):
+            result[i] = parMapper((c, context))
     return result
@@ -9,12 +9,11 @@
 #
 # https://github.com/sequencing/licenses/blob/master/Simplified-BSD-License.txt
 
-import tempfile
 import itertools
 import subprocess
 import logging
-import os
-import json
+
+from Tools.vcfextract import extractHeadersJSON
 
 
 class CallerInfo(object):
@@ -40,23 +39,7 @@ class CallerInfo(object):
         """ Add caller versions from a VCF
         :param vcfname: VCF file name
         """
-        tf = tempfile.NamedTemporaryFile(delete=False)
-        tf.close()
-        vfh = {}
-        try:
-            sp = subprocess.Popen("vcfhdr2json '%s' '%s'" % (vcfname, tf.name),
-                shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            o, e = sp.communicate()
-
-            if sp.returncode != 0:
-                raise Exception("vcfhdr2json call failed: %s / %s" % (o, e))
-
-            vfh = json.load(open(tf.name))
-        finally:
-            try:
-                os.unlink(tf.name)
-            except:
-                pass
+        vfh = extractHeadersJSON(vcfname)
 
         cp = ['unknown', 'unknown', '']
         gatk_callers = ["haplotypecaller", "unifiedgenotyper", "mutect"]
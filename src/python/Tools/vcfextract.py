@@ -17,6 +17,8 @@ import gzip
 import re
 import time
 import json
+import copy
+import struct
 
 
 def field(val):
@@ -209,8 +211,321 @@ def extractHeaders(vcfname):
             break
 
 
+def parseHeaderLine(line):
+    """ Parse a VCF header line the same way as htslib's bcf_hdr_parse_line
+
+    :param line: the header line
+    :return: tuple (key, value, list of (key, value) pairs); value is None for
+             structured lines, and the list of pairs is None for others. Returns
+             None if the line cannot be parsed.
+    """
+    if not line.startswith("##"):
+        return None
+    eq = line.find("=", 2)
+    if eq <= 2:
+        return None
+    key = line[2:eq]
+    if not line[eq+1:].startswith("<"):
+        return key, line[eq+1:].split("\n", 1)[0], None
+
+    n = len(line)
+
+    def at(i):
+        return line[i] if i < n else ""
+
+    # structured line, e.g.
+    # ##INFO=<ID=PV1,Number=1,Type=Float,Description="P-value for baseQ bias">
+    pairs = []
+    q = eq + 1
+    nopen = 1
+    while at(q) and at(q) != "\n" and nopen > 0:
+        q += 1
+        p = q
+        while at(q) == " ":
+            p += 1
+            q += 1
+        if p == q and at(q) and (at(q).isalpha() or at(q) == "_"):
+            q += 1
+            while at(q) and (at(q).isalnum() or at(q) in "_."):
+                q += 1
+        kn = q - p
+        m = 0
+        while at(q) == " ":
+            q += 1
+            m += 1
+        if at(q) != "=" or not kn:
+            logging.warn("Could not parse the header line: %s" % line)
+            return None
+        k = line[p:q-m]
+        q += 1
+        p = q
+        while at(q) == " ":
+            p += 1
+            q += 1
+        quoted = at(p) == '"'
+        if quoted:
+            p += 1
+            q += 1
+        while at(q) and at(q) != "\n":
+            if quoted:
+                if at(q) == '"':
+                    # check for escaped quotes
+                    nesc = 0
+                    while q - nesc - 1 >= p and line[q - nesc - 1] == "\\":
+                        nesc += 1
+                    if nesc % 2 == 0:
+                        break
+            else:
+                if at(q) == "<":
+                    nopen += 1
+                if at(q) == ">":
+                    nopen -= 1
+                if not nopen:
+                    break
+                if at(q) == "," and nopen == 1:
+                    break
+            q += 1
+        r = q
+        while r > p and line[r-1] == " ":
+            r -= 1
+        if quoted:
+            pairs.append((k, '"' + line[p:r] + '"'))
+        else:
+            pairs.append((k, line[p:r]))
+        if quoted and at(q) == '"':
+            q += 1
+        if at(q) == ">":
+            nopen -= 1
+            q += 1
+    return key, None, pairs
+
+
+def readHeaderLines(vcfname):
+    """ Read the header text from a VCF or BCF file
+
+    :param vcfname: file name
+    :return: tuple (list of header lines, True if the file is a BCF file)
+    """
+    with open(vcfname, "rb") as f:
+        magic = f.read(2)
+    if magic == "\x1f\x8b":
+        ff = gzip.GzipFile(vcfname)
+    else:
+        ff = open(vcfname, "rb")
+    try:
+        magic = ff.read(5)
+        if magic[:3] == "BCF":
+            if magic != "BCF\2\2" and magic != "BCF\2\1":
+                raise Exception("Unsupported BCF version in %s" % vcfname)
+            l_text = struct.unpack("<I", ff.read(4))[0]
+            text = ff.read(l_text).split("\0", 1)[0]
+            return [l for l in text.split("\n") if l], True
+
+        lines = []
+        line = magic + ff.readline()
+        while line:
+            line = line.rstrip("\r\n")
+            if line:
+                if not line.startswith("#"):
+                    raise Exception("No sample line in %s" % vcfname)
+                lines.append(line)
+                if not line.startswith("##"):
+                    break
+            line = ff.readline()
+        return lines, False
+    finally:
+        ff.close()
+
+
+def readIndexContigs(vcfname, contigs):
+    """ Read the contig names from the tabix / CSI index of a file, like tbx_seqnames / bcf_index_seqnames
+
+    :param vcfname: file name
+    :param contigs: contig names from the header in the order of their index (for BCF files)
+    :return: list of contig names or None if the file isn't indexed
+    """
+    index = None
+    # htslib looks for a .csi index first
+    for ext in [".csi", ".tbi"]:
+        for candidate in [vcfname + ext, vcfname[:vcfname.rfind(".")] + ext]:
+            if os.path.exists(candidate):
+                index = candidate
+                break
+        if index:
+            break
+    if not index:
+        return None
+
+    f = gzip.GzipFile(index)
+    try:
+        magic = f.read(4)
+        if magic == "CSI\1":
+            _, _, l_aux = struct.unpack("<iii", f.read(12))
+            meta = f.read(l_aux)
+            if l_aux < 28:
+                # BCF: the index refers to the contigs in the header
+                n_ref = struct.unpack("<i", f.read(4))[0]
+                return [contigs[i] if i < len(contigs) else None for i in range(n_ref)]
+        elif magic == "TBI\1":
+            x = struct.unpack("<8i", f.read(32))
+            meta = struct.pack("<7i", *x[1:]) + f.read(x[7])
+        else:
+            raise Exception("Unknown index format: %s" % index)
+    finally:
+        f.close()
+
+    l_nm = struct.unpack("<i", meta[24:28])[0]
+    result = []
+    for name in meta[28:28+l_nm].split("\0"):
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def readHeaders(vcfname):
+    """ Read the VCF header and index information for a file
+
+    This gives the same result as vcfhdr2json: records which htslib would not
+    add to the header are dropped, and IDX keys are added to FILTER / INFO / FORMAT
+    and contig records.
+
+    :param vcfname: VCF / BCF file name
+    :return: dictionary with samples, fields (header records) and tabix (contigs in the index)
+    """
+    lines, is_bcf = readHeaderLines(vcfname)
+    fields = []
+    samples = []
+    # dictionaries for FILTER / INFO / FORMAT IDs and contigs: name -> [IDX, types]
+    ids = {}
+    contigs = {}
+    nids = [0, 0]
+
+    def register(field, dictionary, dtype, name, ftype):
+        """ add to dictionary and set IDX """
+        idx = [v for k, v in field["_pairs"] if k == "IDX"]
+        if name in dictionary:
+            if ftype in dictionary[name][1]:
+                return False
+            dictionary[name][1].add(ftype)
+        else:
+            if idx:
+                try:
+                    i = int(idx[0])
+                except ValueError:
+                    return False
+                nids[dtype] = max(nids[dtype], i + 1)
+            else:
+                i = nids[dtype]
+                nids[dtype] += 1
+            dictionary[name] = [i, set([ftype])]
+        if not idx:
+            field["_pairs"].append(("IDX", str(dictionary[name][0])))
+        return True
+
+    def add(hrec):
+        key, value, pairs = hrec
+        field = {"key": key, "_pairs": pairs}
+        if key == "contig":
+            ci = dict((k.lower(), v) for k, v in reversed(pairs or []))
+            if "length" in ci and not re.match(r"^\s*[+-]?[0-9]", ci["length"]):
+                return
+            if "id" not in ci or not register(field, contigs, 1, ci["id"], key):
+                return
+        elif key in ["INFO", "FILTER", "FORMAT"]:
+            fid = [v for k, v in pairs or [] if k == "ID"]
+            if not fid or not register(field, ids, 0, fid[0], key):
+                return
+        elif pairs is None:
+            for f in fields:
+                if "value" in f and f["key"] == key and (key == "fileformat" or f["value"] == value):
+                    return
+            field["value"] = value
+        fields.append(field)
+
+    first = parseHeaderLine(lines[0]) if lines else None
+    if first:
+        add(first)
+    add(parseHeaderLine('##FILTER=<ID=PASS,Description="All filters passed">'))
+    for l in lines:
+        hrec = parseHeaderLine(l)
+        if not hrec:
+            if l.startswith("#CHROM"):
+                samples = l.split("\t")[9:]
+            break
+        add(hrec)
+
+    for f in fields:
+        pairs = f.pop("_pairs")
+        if pairs is not None:
+            f["values"] = dict(pairs)
+
+    contig_names = [None] * nids[1]
+    for k, v in contigs.iteritems():
+        contig_names[v[0]] = k
+
+    chromosomes = readIndexContigs(vcfname, contig_names)
+    if not is_bcf and chromosomes:
+        # htslib adds contigs which are in the index but not in the header
+        for c in chromosomes:
+            if c not in contigs:
+                field = {"key": "contig", "values": {"ID": c}, "_pairs": [("ID", c)]}
+                register(field, contigs, 1, c, "contig")
+                field["values"] = dict(field.pop("_pairs"))
+                fields.append(field)
+
+    result = {"samples": samples, "fields": fields, "tabix": None}
+    if chromosomes is not None:
+        result["tabix"] = {"chromosomes": [c for c in chromosomes if c is not None] or None}
+    # use the same (unicode) string types as the vcfhdr2json output
+    return json.loads(json.dumps(result))
+
+
+# results of extractHeadersJSON, keyed by file name and modification time
+HEADER_CACHE = {}
+
+
 def extractHeadersJSON(vcfname):
     """ Extract the VCF header and turn into JSON
+
+    Results are remembered for as long as the file and its index are not modified.
+
+    :param vcfname: VCF file name
+    :return: VCF header in JSON format
+    """
+    path = os.path.abspath(vcfname)
+    stamp = []
+    for f in [path, path + ".csi", path + ".tbi"]:
+        try:
+            st = os.stat(f)
+            stamp.append((st.st_mtime, st.st_size))
+        except OSError:
+            stamp.append(None)
+    cache_key = (path, tuple(stamp))
+    if cache_key in HEADER_CACHE:
+        return copy.deepcopy(HEADER_CACHE[cache_key])
+
+    try:
+        vfh = readHeaders(vcfname)
+    except Exception as e:
+        logging.info("Cannot read header of %s (%s), using vcfhdr2json" % (vcfname, str(e)))
+        vfh = extractHeadersJSONExternal(vcfname)
+
+    # fix empty chr list
+    if "tabix" not in vfh or not vfh["tabix"]:
+        vfh["tabix"] = {}
+    if "chromosomes" not in vfh["tabix"]:
+        vfh["tabix"]["chromosomes"] = None
+    if not vfh["tabix"]["chromosomes"]:
+        vfh["tabix"]["chromosomes"] = []
+    if type(vfh["tabix"]["chromosomes"]) is not list:
+        vfh["tabix"]["chromosomes"] = [vfh["tabix"]["chromosomes"]]
+
+    HEADER_CACHE[cache_key] = vfh
+    return copy.deepcopy(vfh)
+
+
+def extractHeadersJSONExternal(vcfname):
+    """ Extract the VCF header using vcfhdr2json
     :param vcfname: VCF file name
     :return: VCF header in JSON format
     """
@@ -227,16 +542,6 @@ def extractHeadersJSON(vcfname):
             raise Exception("vcfhdr2json call failed on file %s: %s / %s" % (vcfname, o, e))
 
         vfh = json.load(open(tf.name))
-
-        # fix empty chr list
-        if "tabix" not in vfh or not vfh["tabix"]:
-            vfh["tabix"] = {}
-        if "chromosomes" not in vfh["tabix"]:
-            vfh["tabix"]["chromosomes"] = None
-        if not vfh["tabix"]["chromosomes"]:
-            vfh["tabix"]["chromosomes"] = []
-        if type(vfh["tabix"]["chromosomes"]) is not list:
-            vfh["tabix"]["chromosomes"] = [vfh["tabix"]["chromosomes"]]
     finally:
         try:
             os.unlink(tf.name)
@@ -245,3 +550,35 @@ def extractHeadersJSON(vcfname):
 
     return vfh
 
+
+def sortByContigOrder(locations, files, header):
+    """ Sort per-location files by the order of the contigs in a VCF header
+
+    :param locations: list of locations (chr or chr:start-end)
+    :param files: list of files, one per location
+    :param header: VCF header in JSON format, see vcfextract.extractHeadersJSON
+    :return: list of files sorted by contig order and start position; contigs
+             which are not in the header come last, in the order they are given
+    """
+    order = {}
+    for f in header["fields"]:
+        if f["key"] == "contig" and f["values"]["ID"] not in order:
+            order[f["values"]["ID"]] = len(order)
+
+    def split(l):
+        if l not in order and ":" in l:
+            c, rng = l.rsplit(":", 1)
+            try:
+                return c, int(rng.split("-")[0])
+            except ValueError:
+                pass
+        return l, 0
+
+    keys = []
+    for l in locations:
+        contig, start = split(l)
+        if contig not in order:
+            order[contig] = len(order)
+        keys.append((order[contig], start))
+
+    return [f for _, f in sorted(zip(keys, files), key=lambda x: x[0]) if f is not None]
@@ -30,7 +30,9 @@ import logging
 import traceback
 import subprocess
 import multiprocessing
+from multiprocessing.pool import ThreadPool
 import gzip
+import copy
 import tempfile
 import time
 
@@ -38,11 +40,12 @@ scriptDir = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(os.path.abspath(os.path.join(scriptDir, '..', 'lib', 'python27')))
 
 import Tools
+import Tools.cache
 from Tools import vcfextract
 from Tools import bcftools
-from Tools.parallel import runParallel, getPool
+from Tools.parallel import runScheduled, getPool
 from Tools.bcftools import preprocessVCF, bedOverlapCheck
-from Tools.fastasize import fastaContigLengths
+from Tools.fastasize import fastaContigLengths, calculateLength, packReference
 import Haplo.blocksplit
 import Haplo.xcmp
 import Haplo.vcfeval
@@ -53,6 +56,33 @@ import qfy
 import pre
 
 
+def readBatch(filename):
+    """ Read a batch file for hap.py --batch
+
+    Each line gives a query VCF and a report prefix, separated by a tab.
+    Query VCFs which don't exist relative to the working directory are
+    looked up relative to the location of the batch file.
+
+    :param filename: batch TSV file name
+    :return: list of tuples (query VCF, report prefix)
+    """
+    queries = []
+    base = os.path.abspath(os.path.dirname(filename))
+    with open(filename) as f:
+        for l in f:
+            l = l.strip()
+            if not l or l.startswith("#"):
+                continue
+            vcf, _, prefix = l.partition("\t")
+            prefix = prefix.strip()
+            if not prefix:
+                raise Exception("No report prefix for query %s in %s" % (vcf, filename))
+            if not os.path.exists(vcf):
+                vcf = os.path.join(base, vcf)
+            queries.append((vcf, prefix))
+    return queries
+
+
 def main():
     parser = argparse.ArgumentParser("Haplotype Comparison")
 
@@ -61,6 +91,9 @@ def main():
                         help="Show version number and exit.")
 
     parser.add_argument("-r", "--reference", dest="ref", default=None, help="Specify a reference file.")
+    parser.add_argument("--pack-reference", dest="pack_reference", action="store_true", default=False,
+                        help="Build the packed reference image <reference>.packed which the comparison "
+                             "processes share, unless there is an up-to-date one.")
 
     # output
     parser.add_argument("-o", "--report-prefix", dest="reports_prefix",
@@ -83,6 +116,16 @@ def main():
                         help="Preprocess truth file with same settings as query (default is to accept truth in original format).")
     parser.add_argument("--usefiltered-truth", dest="usefiltered_truth", action="store_true", default=False,
                         help="Use filtered variant calls in truth file (by default, only PASS calls in the truth file are used)")
+    parser.add_argument("--stream-preprocessing", dest="stream_preprocessing", action="store_true", default=False,
+                        help="Preprocess truth and query per contig and pass the results to the comparison "
+                             "directly rather than writing, concatenating and re-indexing whole preprocessed "
+                             "VCF files. Both inputs must be indexed.")
+    parser.add_argument("--cache-dir", dest="cache_dir", default=None,
+                        help="Directory to cache preprocessed truth files in. Later runs with the same truth, "
+                             "reference and preprocessing settings will reuse the cached file.")
+    parser.add_argument("--cache-max-size", dest="cache_max_size", default=20, type=float,
+                        help="Maximum size of the truth cache in GB; least recently used files are removed "
+                             "when this is exceeded.")
     parser.add_argument("--preprocessing-window-size", dest="preprocess_window",
                         default=10000, type=int,
                         help="Preprocessing window size (variants further apart than that size are not expected to interfere).")
@@ -103,13 +146,31 @@ def main():
     parser.add_argument("--xcmp-expand-hapblocks", dest="hb_expand",
                         default=30, type=int,
                         help="Expand haplotype blocks by this many basepairs left and right.")
+
+    parser.add_argument("--xcmp-block-time-limit-ms", dest="block_time_limit_ms",
+                        default=None, type=int,
+                        help="Maximum time in milliseconds to spend comparing the haplotypes in a single block. "
+                             "Blocks which exceed this use the result of the simple comparison, have BI=timeout "
+                             "in the output VCF, and are listed in {output}.timeouts.bed.")
+
+    parser.add_argument("--profile-blocks", dest="profile_blocks",
+                        default=0, type=int,
+                        help="Record the time taken to compare each haplotype block, and write the N slowest "
+                             "blocks to {output}.block_profile.tsv and per-chunk totals to "
+                             "{output}.block_profile.chunks.tsv.")
     parser.add_argument("--threads", dest="threads",
                         default=multiprocessing.cpu_count(), type=int,
                         help="Number of threads to use.")
 
+    parser.add_argument("--xcmp-threads", dest="xcmp_threads",
+                        default=1, type=int,
+                        help="Number of threads to use within each xcmp process. When this is larger than "
+                             "one, hap.py will run correspondingly fewer xcmp processes.")
+
     parser.add_argument("--engine", dest="engine",
-                        default="xcmp", choices=["xcmp", "vcfeval"],
-                        help="Comparison engine to use.")
+                        default="xcmp", choices=["xcmp", "xcmp-dp", "vcfeval"],
+                        help="Comparison engine to use. xcmp-dp runs xcmp with a dynamic programming "
+                             "haplotype comparison instead of enumerating haplotypes.")
 
     parser.add_argument("--engine-vcfeval-path", dest="engine_vcfeval", required=False,
                         default=Haplo.vcfeval.findVCFEval(),
@@ -128,6 +189,10 @@ def main():
 
     parser.add_argument("_vcfs", help="Two VCF files.", default=[], nargs="*")
 
+    parser.add_argument("--batch", dest="batch", default=None,
+                        help="Compare the truth VCF to each of the query VCFs listed in this tab-separated "
+                             "file (columns: query VCF, report prefix). The truth is preprocessed once.")
+
     parser.add_argument("--logfile", dest="logfile", default=None,
                         help="Write logging information into file rather than to stderr")
 
@@ -193,34 +258,98 @@ def main():
     if not os.path.exists(args.ref):
         raise Exception("Please specify a valid reference path using -r.")
 
-    if not args.reports_prefix:
-        raise Exception("Please specify an output prefix using -o ")
-
-    if not os.path.exists(os.path.dirname(os.path.abspath(args.reports_prefix))):
-        raise Exception("The output path does not exist. Please specify a valid output path and prefix using -o")
+    if args.pack_reference:
+        packReference(args.ref)
 
-    if os.path.basename(args.reports_prefix) == "" or os.path.isdir(args.reports_prefix):
-        raise Exception("The output path should specify a file name prefix. Please specify a valid output path "
-                        "and prefix using -o. For example, -o /tmp/test will create files named /tmp/test* .")
-
-    # noinspection PyProtectedMember
-    if not args._vcfs or len(args._vcfs) != 2:
-        raise Exception("Please specify exactly two input VCFs.")
+    if args.batch:
+        # noinspection PyProtectedMember
+        if not args._vcfs or len(args._vcfs) != 1:
+            raise Exception("Please specify exactly one truth VCF when using --batch.")
+        queries = readBatch(args.batch)
+        if not queries:
+            raise Exception("No query VCFs found in %s." % args.batch)
+    else:
+        # noinspection PyProtectedMember
+        if not args._vcfs or len(args._vcfs) != 2:
+            raise Exception("Please specify exactly two input VCFs.")
+        # noinspection PyProtectedMember
+        queries = [(args._vcfs[1], args.reports_prefix)]
 
     # noinspection PyProtectedMember
     args.vcf1 = args._vcfs[0]
-    # noinspection PyProtectedMember
-    args.vcf2 = args._vcfs[1]
 
     if not os.path.exists(args.vcf1):
         raise Exception("Input file %s does not exist." % args.vcf1)
-    if not os.path.exists(args.vcf2):
-        raise Exception("Input file %s does not exist." % args.vcf2)
+
+    for vcf2, reports_prefix in queries:
+        if not os.path.exists(vcf2):
+            raise Exception("Input file %s does not exist." % vcf2)
+
+        if not reports_prefix:
+            raise Exception("Please specify an output prefix using -o ")
+
+        if not os.path.exists(os.path.dirname(os.path.abspath(reports_prefix))):
+            raise Exception("The output path does not exist. Please specify a valid output path and prefix using -o")
+
+        if os.path.basename(reports_prefix) == "" or os.path.isdir(reports_prefix):
+            raise Exception("The output path should specify a file name prefix. Please specify a valid output path "
+                            "and prefix using -o. For example, -o /tmp/test will create files named /tmp/test* .")
+
+    if args.stream_preprocessing and (args.engine not in ["xcmp", "xcmp-dp"] or args.regions_bedfile or args.preprocessing_norm):
+        logging.warn("Streaming preprocessing is only supported when using xcmp without -R or --bcftools-norm, "
+                     "falling back to preprocessing whole files.")
+        args.stream_preprocessing = False
+
+    # the truth is preprocessed once and shared by all queries
+    truth = {}
+    failed = []
+    try:
+        for vcf2, reports_prefix in queries:
+            qargs = copy.copy(args)
+            qargs.vcf2 = vcf2
+            qargs.reports_prefix = reports_prefix
+            if not args.batch:
+                compareVCFs(qargs, truth)
+                continue
+            logging.info("Batch: comparing %s, writing reports to %s" % (vcf2, reports_prefix))
+            try:
+                compareVCFs(qargs, truth)
+            except Exception as e:
+                logging.error("Comparison failed for %s: %s" % (vcf2, str(e)))
+                traceback.print_exc(file=Tools.LoggingWriter(logging.ERROR))
+                failed.append(vcf2)
+    finally:
+        if args.delete_scratch:
+            for x in truth.get("tempfiles", []):
+                try:
+                    os.remove(x)
+                except:
+                    pass
+        else:
+            logging.info("Scratch files kept : %s" % (str(truth.get("tempfiles", []))))
+
+    if failed:
+        raise Exception("Comparison failed for %i of %i query files: %s" % (len(failed), len(queries),
+                                                                             ", ".join(failed)))
+
+
+def compareVCFs(args, truth):
+    """ Compare args.vcf1 (truth) and args.vcf2 (query) and write reports to args.reports_prefix
+
+    :param args: hap.py arguments
+    :param truth: dictionary for the preprocessed truth. When empty, the truth is preprocessed
+                  and the result is stored here, so it can be reused by subsequent calls with the
+                  same truth and settings. Temporary files for the truth are added to
+                  truth["tempfiles"], and are not removed by this function.
+    """
+    # per-location (truth, query) files when streaming preprocessing is used
+    args.parts = None
 
     tempfiles = []
+    truth_tempfiles = truth.setdefault("tempfiles", [])
 
     # xcmp supports bcf; others don't
-    if args.engine == "xcmp" and (args.bcf or (args.vcf1.endswith(".bcf") and args.vcf2.endswith(".bcf"))):
+    if args.engine in ["xcmp", "xcmp-dp"] and (args.bcf or (args.vcf1.endswith(".bcf") and args.vcf2.endswith(".bcf"))):
         internal_format_suffix = ".bcf"
     else:
         internal_format_suffix = ".vcf.gz"
@@ -228,116 +357,253 @@ def main():
     try:
         logging.info("Comparing %s and %s" % (args.vcf1, args.vcf2))
 
-        logging.info("Preprocessing truth: %s" % args.vcf1)
+        logging.info("Preprocessing truth: %s and query: %s" % (args.vcf1, args.vcf2))
         starttime = time.time()
 
-        ttf = tempfile.NamedTemporaryFile(delete=False,
-                                          dir=args.scratch_prefix,
-                                          prefix="truth.pp",
-                                          suffix=internal_format_suffix)
-        ttf.close()
-        tempfiles.append(ttf.name)
-        tempfiles.append(ttf.name + ".csi")
-        tempfiles.append(ttf.name + ".tbi")
-        args.gender = pre.preprocess(args.vcf1,
-                                     ttf.name,
-                                     args.ref,
-                                     args.locations,
-                                     None if args.usefiltered_truth else "*",  # filters
-                                     args.fixchr,
-                                     args.regions_bedfile,
-                                     args.targets_bedfile,
-                                     args.preprocessing_leftshift if args.preprocessing_truth else False,
-                                     args.preprocessing_decompose if args.preprocessing_truth else False,
-                                     args.preprocessing_norm if args.preprocessing_truth else False,
-                                     args.preprocess_window,
-                                     args.threads,
-                                     args.gender)
-
-        args.vcf1 = ttf.name
-        h1 = vcfextract.extractHeadersJSON(args.vcf1)
-
-        elapsed = time.time() - starttime
-        logging.info("preprocess for %s -- time taken %.2f" % (args.vcf1, elapsed))
-
-        # once we have preprocessed the truth file we can resolve the locations
-        # doing this here improves the time for query preprocessing below
-        reference_contigs = set(fastaContigLengths(args.ref).keys())
-
+        truth_cache = None
+        truth_cached = None
+        if "headers" in truth:
+            # preprocessed by a previous comparison (hap.py --batch)
+            truth_cached = truth
+            truth_vcf = truth.get("vcf")
+        elif not args.stream_preprocessing:
+            ttf = tempfile.NamedTemporaryFile(delete=False,
+                                              dir=args.scratch_prefix,
+                                              prefix="truth.pp",
+                                              suffix=internal_format_suffix)
+            ttf.close()
+            truth_tempfiles.append(ttf.name)
+            truth_tempfiles.append(ttf.name + ".csi")
+            truth_tempfiles.append(ttf.name + ".tbi")
+            truth_vcf = ttf.name
+
+            if args.cache_dir:
+                truth_cache = Tools.cache.FileCache(args.cache_dir, int(args.cache_max_size * 1024 * 1024 * 1024))
+                truth_cache_key = truth_cache.key([args.vcf1, args.ref, args.regions_bedfile, args.targets_bedfile],
+                                                  version=Tools.version,
+                                                  locations=args.locations,
+                                                  filters=None if args.usefiltered_truth else "*",
+                                                  fixchr=args.fixchr,
+                                                  leftshift=args.preprocessing_leftshift and args.preprocessing_truth,
+                                                  decompose=args.preprocessing_decompose and args.preprocessing_truth,
+                                                  norm=args.preprocessing_norm and args.preprocessing_truth,
+                                                  window=args.preprocess_window,
+                                                  gender=args.gender,
+                                                  format=internal_format_suffix)
+                truth_cached = truth_cache.get(truth_cache_key, truth_vcf)
+        elif args.cache_dir:
+            logging.warn("The preprocessed truth is not cached when using --stream-preprocessing.")
+
+        # the query needs the same gender as the truth
+        if truth_cached:
+            args.gender = truth_cached["gender"]
+        elif args.gender == "auto":
+            args.gender = pre.detectGender(args.vcf1)
+
+        # resolve the locations for the query up front so truth and query
+        # can be preprocessed at the same time
         if not args.locations:
-            # default set of locations is the overlap between truth and reference
-            args.locations = list(reference_contigs & set(h1["tabix"]["chromosomes"]))
-            if not args.locations:
+            query_locations = pre.resolveLocations(args.vcf1, args.ref, args.fixchr)
+            if query_locations is not None and not query_locations:
                 raise Exception("Truth and reference have no chromosomes in common!")
         elif type(args.locations) is not list:
-            args.locations = args.locations.split(",")
-
-        args.locations = sorted(args.locations)
-
-        logging.info("Preprocessing query: %s" % args.vcf2)
-        starttime = time.time()
+            query_locations = sorted(args.locations.split(","))
+        else:
+            query_locations = sorted(args.locations)
 
         if args.pass_only:
             filtering = "*"
         else:
             filtering = args.filters_only
 
-        qtf = tempfile.NamedTemporaryFile(delete=False,
-                                          dir=args.scratch_prefix,
-                                          prefix="query.pp",
-                                          suffix=internal_format_suffix)
-        qtf.close()
-        tempfiles.append(qtf.name)
-        tempfiles.append(qtf.name + ".csi")
-        tempfiles.append(qtf.name + ".tbi")
-        pre.preprocess(args.vcf2,
-                       qtf.name,
-                       args.ref,
-                       str(",".join(args.locations)),
-                       filtering,
-                       args.fixchr,
-                       args.regions_bedfile,
-                       args.targets_bedfile,
-                       args.preprocessing_leftshift,
-                       args.preprocessing_decompose,
-                       args.preprocessing_norm,
-                       args.preprocess_window,
-                       args.threads,
-                       args.gender)  # same gender as truth above
-
-        args.vcf2 = qtf.name
-        h2 = vcfextract.extractHeadersJSON(args.vcf2)
-
-        elapsed = time.time() - starttime
-        logging.info("preprocess for %s -- time taken %.2f" % (args.vcf2, elapsed))
-
-        if not h1["tabix"]:
-            raise Exception("Truth file is not indexed after preprocesing.")
-
-        if not h2["tabix"]:
-            raise Exception("Query file is not indexed after preprocessing.")
-
-        for _xc in args.locations:
-            if _xc not in h2["tabix"]["chromosomes"]:
-                logging.warn("No calls for location %s in query!" % _xc)
+        # both preprocessing runs share the process pool
+        getPool(args.threads)
+        pp_pool = ThreadPool(2 if args.threads > 1 else 1)
+        try:
+            if args.stream_preprocessing:
+                if query_locations is None:
+                    raise Exception("Truth file %s must be indexed for streaming preprocessing." % args.vcf1)
+                args.locations = query_locations
+
+                truth_pp = None
+                if truth_cached:
+                    truth_parts = truth_cached["parts"]
+                    args.locations = sorted(truth_parts.keys())
+                else:
+                    ttf = tempfile.NamedTemporaryFile(delete=False,
+                                                      dir=args.scratch_prefix,
+                                                      prefix="truth.pp")
+                    ttf.close()
+                    truth_tempfiles.append(ttf.name)
+                    truth_pp = pp_pool.apply_async(pre.preprocessByContig,
+                                                   (args.vcf1,
+                                                    ttf.name,
+                                                    args.ref,
+                                                    args.locations,
+                                                    None if args.usefiltered_truth else "*",
+                                                    args.fixchr,
+                                                    args.targets_bedfile,
+                                                    args.preprocessing_leftshift if args.preprocessing_truth else False,
+                                                    args.preprocessing_decompose if args.preprocessing_truth else False,
+                                                    args.threads,
+                                                    args.gender,
+                                                    internal_format_suffix == ".bcf"))
+
+                qtf = tempfile.NamedTemporaryFile(delete=False,
+                                                  dir=args.scratch_prefix,
+                                                  prefix="query.pp")
+                qtf.close()
+                tempfiles.append(qtf.name)
+                query_pp = pp_pool.apply_async(pre.preprocessByContig,
+                                               (args.vcf2,
+                                                qtf.name,
+                                                args.ref,
+                                                args.locations,
+                                                filtering,
+                                                args.fixchr,
+                                                args.targets_bedfile,
+                                                args.preprocessing_leftshift,
+                                                args.preprocessing_decompose,
+                                                args.threads,
+                                                args.gender,
+                                                internal_format_suffix == ".bcf"))
+                if truth_pp:
+                    _, truth_parts = truth_pp.get()
+                _, query_parts = query_pp.get()
+            else:
+                if query_locations is not None:
+                    query_locations = str(",".join(query_locations))
+
+                qtf = tempfile.NamedTemporaryFile(delete=False,
+                                                  dir=args.scratch_prefix,
+                                                  prefix="query.pp",
+                                                  suffix=internal_format_suffix)
+                qtf.close()
+                tempfiles.append(qtf.name)
+                tempfiles.append(qtf.name + ".csi")
+                tempfiles.append(qtf.name + ".tbi")
+
+                truth_pp = None
+                if not truth_cached:
+                    truth_pp = pp_pool.apply_async(pre.preprocess,
+                                                   (args.vcf1,
+                                                    truth_vcf,
+                                                    args.ref,
+                                                    args.locations,
+                                                    None if args.usefiltered_truth else "*",  # filters
+                                                    args.fixchr,
+                                                    args.regions_bedfile,
+                                                    args.targets_bedfile,
+                                                    args.preprocessing_leftshift if args.preprocessing_truth else False,
+                                                    args.preprocessing_decompose if args.preprocessing_truth else False,
+                                                    args.preprocessing_norm if args.preprocessing_truth else False,
+                                                    args.preprocess_window,
+                                                    args.threads,
+                                                    args.gender))
+                query_pp = pp_pool.apply_async(pre.preprocess,
+                                               (args.vcf2,
+                                                qtf.name,
+                                                args.ref,
+                                                query_locations,
+                                                filtering,
+                                                args.fixchr,
+                                                args.regions_bedfile,
+                                                args.targets_bedfile,
+                                                args.preprocessing_leftshift,
+                                                args.preprocessing_decompose,
+                                                args.preprocessing_norm,
+                                                args.preprocess_window,
+                                                args.threads,
+                                                args.gender))
+                if truth_pp:
+                    truth_pp.get()
+                query_pp.get()
+        finally:
+            pp_pool.close()
+            pp_pool.join()
+
+        if args.stream_preprocessing:
+            # blocksplit / xcmp read the per-contig files directly
+            args.parts = {}
+            for l in args.locations:
+                args.parts[l] = (truth_parts[l], query_parts[l])
+                if not truth_cached:
+                    truth_tempfiles += [truth_parts[l], truth_parts[l] + ".csi", truth_parts[l] + ".tbi"]
+                tempfiles += [query_parts[l], query_parts[l] + ".csi", query_parts[l] + ".tbi"]
+
+            if truth_cached:
+                h1 = truth_cached["headers"]
+            else:
+                h1 = vcfextract.extractHeadersJSON(truth_parts[args.locations[0]])
+            h2 = vcfextract.extractHeadersJSON(query_parts[args.locations[0]])
+            truth.update({"gender": args.gender, "headers": h1, "parts": truth_parts})
+
+            elapsed = time.time() - starttime
+            logging.info("preprocess for %s and %s -- time taken %.2f" % (args.vcf1, args.vcf2, elapsed))
+        else:
+            args.vcf1 = truth_vcf
+            if truth_cached:
+                h1 = truth_cached["headers"]
+            else:
+                h1 = vcfextract.extractHeadersJSON(args.vcf1)
+                if truth_cache:
+                    truth_cache.put(truth_cache_key, args.vcf1, {"gender": args.gender, "headers": h1})
+            truth.update({"gender": args.gender, "headers": h1, "vcf": truth_vcf})
+            args.vcf2 = qtf.name
+            h2 = vcfextract.extractHeadersJSON(args.vcf2)
+
+            elapsed = time.time() - starttime
+            logging.info("preprocess for %s and %s -- time taken %.2f" % (args.vcf1, args.vcf2, elapsed))
+
+            reference_contigs = set(fastaContigLengths(args.ref).keys())
+
+            if not args.locations:
+                # default set of locations is the overlap between truth and reference
+                args.locations = list(reference_contigs & set(h1["tabix"]["chromosomes"]))
+                if not args.locations:
+                    raise Exception("Truth and reference have no chromosomes in common!")
+            elif type(args.locations) is not list:
+                args.locations = args.locations.split(",")
+
+            args.locations = sorted(args.locations)
+
+            if not h1["tabix"]:
+                raise Exception("Truth file is not indexed after preprocesing.")
+
+            if not h2["tabix"]:
+                raise Exception("Query file is not indexed after preprocessing.")
+
+            for _xc in args.locations:
+                if _xc not in h2["tabix"]["chromosomes"]:
+                    logging.warn("No calls for location %s in query!" % _xc)
 
         pool = getPool(args.threads)
-        if args.threads > 1 and args.engine == "xcmp":
+        # cost hints for scheduling xcmp jobs
+        location_costs = None
+        # xcmp outputs can be concatenated without sorting when we compare whole chromosomes
+        locations_ordered = not [l for l in args.locations if ":" in l]
+        if args.threads > 1 and args.engine in ["xcmp", "xcmp-dp"]:
             logging.info("Running using %i parallel processes." % args.threads)
 
             # find balanced pieces
             # cap parallelism at 64 since otherwise bcftools concat below might run out
             # of file handles
-            args.pieces = min(args.threads, 64)
-            res = runParallel(pool, Haplo.blocksplit.blocksplitWrapper, args.locations, args)
+            args.pieces = min(max(1, args.threads / max(1, args.xcmp_threads)), 64)
+            contig_lengths = fastaContigLengths(args.ref)
+            res = runScheduled(pool, Haplo.blocksplit.blocksplitWrapper, args.locations,
+                               [calculateLength(contig_lengths, l) for l in args.locations],
+                               args)
 
             if None in res:
                 raise Exception("One of the blocksplit processes failed.")
 
             tempfiles += res
 
+            parts = {}
+            blocksplit_locations = args.locations
             args.locations = []
-            for f in res:
+            location_costs = []
+            for f, bl in zip(res, blocksplit_locations):
                 with open(f) as fp:
                     for l in fp:
                         ll = l.strip().split("\t", 3)
@@ -347,6 +613,12 @@ def main():
                         start = int(ll[1]) + 1
                         end = int(ll[2])
                         args.locations.append("%s:%i-%i" % (xchr, start, end))
+                        # estimated comparison cost from blocksplit
+                        location_costs.append(int(ll[3]) if len(ll) > 3 else None)
+                        if args.parts:
+                            parts[args.locations[-1]] = args.parts[bl]
+            if args.parts:
+                args.parts = parts
 
         # count variants before normalisation
         if "samples" not in h1 or not h1["samples"]:
@@ -365,15 +637,32 @@ def main():
         tempfiles.append(tf.name + ".csi")
         output_name = tf.name
 
-        if args.engine == "xcmp":
+        if args.engine in ["xcmp", "xcmp-dp"]:
             # do xcmp
             logging.info("Using xcmp for comparison")
-            res = runParallel(pool, Haplo.xcmp.xcmpWrapper, args.locations, args)
+            res = runScheduled(pool, Haplo.xcmp.xcmpWrapper, args.locations, location_costs, args)
             tempfiles += [x for x in res if x is not None]  # VCFs
 
             if None in res:
                 raise Exception("One of the xcmp jobs failed.")
 
+            if args.block_time_limit_ms:
+                n_timeouts = 0
+                with open(args.reports_prefix + ".timeouts.bed", "w") as tof:
+                    for x in res:
+                        tempfiles.append(x + ".timeouts.bed")
+                        with open(x + ".timeouts.bed") as tif:
+                            for l in tif:
+                                tof.write(l)
+                                n_timeouts += 1
+                if n_timeouts:
+                    logging.warn("%i haplotype blocks exceeded the time limit, see %s" %
+                                 (n_timeouts, args.reports_prefix + ".timeouts.bed"))
+
+            if args.profile_blocks:
+                tempfiles += Haplo.xcmp.mergeBlockProfiles(args.locations, res,
+                                                           args.profile_blocks, args.reports_prefix)
+
             if len(res) == 0:
                 raise Exception("Input files/regions do not contain variants (0 haplotype blocks were processed).")
 
@@ -383,8 +672,13 @@ def main():
             if len(runme_list) == 0:
                 raise Exception("No outputs to concatenate!")
 
+            if locations_ordered:
+                # locations are sorted by name, the outputs must follow the contig order of the header
+                runme_list = vcfextract.sortByContigOrder(args.locations, res,
+                                                         vcfextract.extractHeadersJSON(runme_list[0]))
+
             logging.info("Concatenating...")
-            bcftools.concatenateParts(output_name, *runme_list)
+            bcftools.concatenateParts(output_name, *runme_list, pool=pool, ordered=locations_ordered)
             logging.info("Indexing...")
             bcftools.runBcftools("index", output_name)
             # passed to quantify
@@ -33,15 +33,16 @@ import multiprocessing
 import gzip
 import tempfile
 import time
+import re
 
 scriptDir = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(os.path.abspath(os.path.join(scriptDir, '..', 'lib', 'python27')))
 
 import Tools
 from Tools import vcfextract
-from Tools.bcftools import preprocessVCF, bedOverlapCheck
-from Tools.parallel import runParallel, getPool
-from Tools.fastasize import fastaContigLengths
+from Tools.bcftools import preprocessVCF, streamVCF, bedOverlapCheck
+from Tools.parallel import runScheduled, getPool
+from Tools.fastasize import fastaContigLengths, calculateLength
 
 import Haplo.partialcredit
 
@@ -62,6 +63,141 @@ def hasChrPrefix(chrlist):
     return count_noprefix < count_prefix
 
 
+def fixChrName(name):
+    """ return a contig name with the chr prefix added in the same way as preprocessVCF """
+    if re.match(r"^[0-9XYM]", name):
+        name = "chr" + name
+    return name.replace("chrMT", "chrM", 1)
+
+
+def detectGender(vcf_input):
+    """ Determine the gender of the sample in a VCF file using vcfcheck
+
+    When the input is indexed, only the calls from chrX onwards are checked.
+
+    :param vcf_input: input file name
+    :return: "male" or "female"
+    """
+    h = vcfextract.extractHeadersJSON(vcf_input)
+    if h["tabix"]:
+        chrx = [c for c in h["tabix"]["chromosomes"] if c in ["X", "chrX", "x", "chrx"]]
+        if not chrx:
+            # vcfcheck assumes female when there are no calls on chrX
+            return "female"
+        mf = subprocess.check_output("vcfcheck %s -l %s" % (vcf_input, chrx[0]), shell=True)
+    else:
+        mf = subprocess.check_output("vcfcheck %s" % vcf_input, shell=True)
+
+    logging.info(mf)
+    if "female" in mf:
+        return "female"
+    else:
+        return "male"
+
+
+def resolveLocations(vcf_input, reference, fixchr=None):
+    """ Find the contigs shared between an input VCF and the reference
+
+    This uses the index of the input, so the locations are known before
+    preprocessing.
+
+    :param vcf_input: input file name
+    :param reference: reference fasta name
+    :param fixchr: None for auto, or True/False -- fix chr prefix to match reference
+    :return: sorted list of contig names [naming after preprocessing], or None if the
+             input is not indexed
+    """
+    h = vcfextract.extractHeadersJSON(vcf_input)
+    if not h["tabix"]:
+        return None
+
+    chrlist = h["tabix"]["chromosomes"]
+    reference_contigs = set(fastaContigLengths(reference).keys())
+    if fixchr is None:
+        fixchr = hasChrPrefix(reference_contigs) and not hasChrPrefix(chrlist)
+    if fixchr:
+        chrlist = [fixChrName(c) for c in chrlist]
+
+    return sorted(list(reference_contigs & set(chrlist)))
+
+
+def checkInput(vcf_input,
+               reference,
+               filters=None,
+               fixchr=None,
+               gender=None,
+               check_bcf=False,
+               int_suffix=".vcf.gz",
+               int_format="z",
+               tempfiles=None):
+    """ Check a VCF file before preprocessing
+
+    :param vcf_input: input file name
+    :param reference: reference fasta name
+    :param filters: list of filters to apply ("*" to only allow PASS)
+    :param fixchr: None for auto, or True/False -- fix chr prefix to match reference
+    :param gender: the gender of the sample ("male" / "female" / "auto" / None)
+    :param check_bcf: check that the file can be converted to BCF
+    :param int_suffix: suffix for intermediate files
+    :param int_format: bcftools format for intermediate files
+    :param tempfiles: list to add names of temporary files to
+
+    :return: tuple (gender, fixchr, required_filters, headers)
+    """
+    if tempfiles is None:
+        tempfiles = []
+
+    mf = subprocess.check_output("vcfcheck %s --check-bcf-errors %i" % (vcf_input, 1 if check_bcf else 0),
+                                 shell=True)
+
+    if gender == "auto":
+        logging.info(mf)
+        if "female" in mf:
+            gender = "female"
+        else:
+            gender = "male"
+
+    h = vcfextract.extractHeadersJSON(vcf_input)
+    reference_contigs = set(fastaContigLengths(reference).keys())
+    reference_has_chr_prefix = hasChrPrefix(reference_contigs)
+
+    allfilters = []
+    for f in h["fields"]:
+        try:
+            if f["key"] == "FILTER":
+                allfilters.append(f["values"]["ID"])
+        except:
+            logging.warn("ignoring header: %s" % str(f))
+
+    required_filters = None
+    if filters:
+        fts = filters.split(",")
+        required_filters = ",".join(list(set(["PASS", "."] + [x for x in allfilters if x not in fts])))
+
+    if fixchr is None:
+        try:
+            if not h["tabix"]:
+                logging.warn("input file is not tabix indexed, consider doing this in advance for performance reasons")
+                vtf = tempfile.NamedTemporaryFile(delete=False,
+                                                  suffix=int_suffix)
+                vtf.close()
+                tempfiles.append(vtf.name)
+                runBcftools("view", "-o", vtf.name, "-O", int_format, vcf_input)
+                runBcftools("index", vtf.name)
+                h2 = vcfextract.extractHeadersJSON(vcf_input)
+                chrlist = h2["tabix"]["chromosomes"]
+            else:
+                chrlist = h["tabix"]["chromosomes"]
+            vcf_has_chr_prefix = hasChrPrefix(h["tabix"]["chromosomes"])
+
+            if reference_has_chr_prefix and not vcf_has_chr_prefix:
+                fixchr = True
+        except:
+            logging.warn("Guessing the chr prefix in %s has failed." % vcf_input)
+
+    return gender, fixchr, required_filters, h
+
+
 def preprocess(vcf_input,
                vcf_output,
                reference,
@@ -117,55 +253,15 @@ def preprocess(vcf_input,
             int_suffix = ".vcf.gz"
             int_format = "z"
 
-        if vcf_output.endswith(".bcf"):
-            mf = subprocess.check_output("vcfcheck %s --check-bcf-errors 1" % vcf_input, shell=True)
-        else:
-            mf = subprocess.check_output("vcfcheck %s --check-bcf-errors 0" % vcf_input, shell=True)
-
-        if gender == "auto":
-            logging.info(mf)
-            if "female" in mf:
-                gender = "female"
-            else:
-                gender = "male"
-
-        h = vcfextract.extractHeadersJSON(vcf_input)
-        reference_contigs = set(fastaContigLengths(reference).keys())
-        reference_has_chr_prefix = hasChrPrefix(reference_contigs)
-
-        allfilters = []
-        for f in h["fields"]:
-            try:
-                if f["key"] == "FILTER":
-                    allfilters.append(f["values"]["ID"])
-            except:
-                logging.warn("ignoring header: %s" % str(f))
-
-        required_filters = None
-        if filters:
-            fts = filters.split(",")
-            required_filters = ",".join(list(set(["PASS", "."] + [x for x in allfilters if x not in fts])))
-
-        if fixchr is None:
-            try:
-                if not h["tabix"]:
-                    logging.warn("input file is not tabix indexed, consider doing this in advance for performance reasons")
-                    vtf = tempfile.NamedTemporaryFile(delete=False,
-                                                      suffix=int_suffix)
-                    vtf.close()
-                    tempfiles.append(vtf.name)
-                    runBcftools("view", "-o", vtf.name, "-O", int_format, vcf_input)
-                    runBcftools("index", vtf.name)
-                    h2 = vcfextract.extractHeadersJSON(vcf_input)
-                    chrlist = h2["tabix"]["chromosomes"]
-                else:
-                    chrlist = h["tabix"]["chromosomes"]
-                vcf_has_chr_prefix = hasChrPrefix(h["tabix"]["chromosomes"])
-
-                if reference_has_chr_prefix and not vcf_has_chr_prefix:
-                    fixchr = True
-            except:
-                logging.warn("Guessing the chr prefix in %s has failed." % vcf_input)
+        gender, fixchr, required_filters, h = checkInput(vcf_input,
+                                                         reference,
+                                                         filters,
+                                                         fixchr,
+                                                         gender,
+                                                         vcf_output.endswith(".bcf"),
+                                                         int_suffix,
+                                                         int_format,
+                                                         tempfiles)
 
         # all these require preprocessing
         vtf = vcf_input
@@ -209,6 +305,106 @@ def preprocess(vcf_input,
 
     return gender
 
+def preprocessByContig(vcf_input,
+                       output_prefix,
+                       reference,
+                       locations=None,
+                       filters=None,
+                       fixchr=None,
+                       targets=None,
+                       leftshift=True,
+                       decompose=True,
+                       threads=1,
+                       gender=None,
+                       bcf=False):
+    """ Preprocess a single VCF file into one output file per contig
+
+    Records are streamed from the (indexed) input through bcftools and
+    preprocess for each contig in parallel. No intermediate whole-file
+    VCFs are written, and the outputs are not concatenated, so they can be
+    passed to the comparison directly.
+
+    :param vcf_input: input file name
+    :param output_prefix: prefix for output file names
+    :param reference: reference fasta name
+    :param locations: list of locations [naming after preprocessing] or None for all contigs
+                      shared between the input and the reference
+    :param filters: list of filters to apply ("*" to only allow PASS)
+    :param fixchr: None for auto, or True/False -- fix chr prefix to match reference
+    :param targets: targets bed file
+    :param leftshift: left-shift variants
+    :param decompose: decompose variants
+    :param threads: number of threads to for preprcessing
+    :param gender: the gender of the sample ("male" / "female" / "auto" / None)
+    :param bcf: write BCF rather than VCF.gz outputs
+
+    :return: tuple (gender, dictionary of location -> output file name)
+    """
+    gender, fixchr, required_filters, h = checkInput(vcf_input,
+                                                     reference,
+                                                     filters,
+                                                     fixchr,
+                                                     gender,
+                                                     bcf)
+
+    if not h["tabix"]:
+        raise Exception("Input file %s must be indexed for streaming preprocessing." % vcf_input)
+
+    # map contig names after preprocessing to the names in the input
+    input_contigs = {}
+    for c in h["tabix"]["chromosomes"]:
+        input_contigs[fixChrName(c) if fixchr else c] = c
+
+    contig_lengths = fastaContigLengths(reference)
+    if not locations:
+        locations = sorted(list(set(contig_lengths.keys()) & set(input_contigs.keys())))
+    elif type(locations) is not list:
+        locations = locations.split(",")
+
+    suffix = ".bcf" if bcf else ".vcf.gz"
+    jobs = []
+    outputs = {}
+    for i, l in enumerate(locations):
+        input_location = None
+        if l in input_contigs:
+            input_location = input_contigs[l]
+        elif ":" in l and l.rsplit(":", 1)[0] in input_contigs:
+            contig, rng = l.rsplit(":", 1)
+            input_location = "%s:%s" % (input_contigs[contig], rng)
+
+        if input_location:
+            source = streamVCF(vcf_input,
+                               input_location,
+                               filters == "*",
+                               fixchr,
+                               targets,
+                               required_filters)
+        else:
+            # no records: write the header only
+            source = "bcftools view -h %s" % vcf_input.replace(" ", "\\ ")
+        # locations may contain ":" (chr1:100-200), which we can't use in file names
+        # (see the file:sample parsing in xcmp / blocksplit), so number the parts
+        outputs[l] = "%s.part%i%s" % (output_prefix, i, suffix)
+        jobs.append((source, l, outputs[l]))
+
+    # start with the longest contigs
+    res = runScheduled(getPool(threads),
+                       Haplo.partialcredit.preprocessWrapper,
+                       jobs,
+                       [calculateLength(contig_lengths, l) for l in locations],
+                       {"reference": reference,
+                        "decompose": decompose,
+                        "leftshift": leftshift,
+                        "haploid_x": gender == "male",
+                        "bcf": bcf,
+                        "stream": True})
+
+    if None in res:
+        raise Exception("One of the preprocess jobs failed")
+
+    return gender, outputs
+
+
 def preprocessWrapper(args):
     """ wrapper for running in parallel """
 
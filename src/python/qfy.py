@@ -44,8 +44,8 @@ import Haplo.quantify
 import Haplo.happyroc
 
 
-def quantify(args):
-    """ Run quantify and write tables """
+def _count_variants(args, roc_table, artifact):
+    """ Run quantify on the input VCF to write the ROC table """
     vcf_name = args.in_vcf[0]
 
     if not vcf_name or not os.path.exists(vcf_name):
@@ -67,7 +67,6 @@ def quantify(args):
         internal_format_suffix = ".vcf.gz"
 
     output_vcf = args.reports_prefix + internal_format_suffix
-    roc_table = args.reports_prefix + ".roc.tsv"
 
     qfyregions = {}
 
@@ -93,6 +92,9 @@ def quantify(args):
                     raise Exception("Quantification region file %s not found" % f)
                 qfyregions[n] = f
 
+    if args.strat_index and not os.path.exists(args.strat_index):
+        raise Exception("Stratification index %s not found" % args.strat_index)
+
     if vcf_name == output_vcf or vcf_name == output_vcf + internal_format_suffix:
         raise Exception("Cannot overwrite input VCF: %s would overwritten with output name %s." % (vcf_name, output_vcf))
 
@@ -108,6 +110,7 @@ def quantify(args):
                                 qfyregions,
                                 args.ref,
                                 threads=args.threads,
+                                shards=args.threads if args.quantify_shards else 0,
                                 output_vtc=args.output_vtc,
                                 output_rocs=args.do_roc,
                                 qtype=args.type,
@@ -115,9 +118,38 @@ def quantify(args):
                                 roc_header=roc_header,
                                 roc_filter=args.roc_filter,
                                 roc_delta=args.roc_delta,
+                                roc_bins=args.roc_bins,
                                 roc_regions=args.roc_regions,
                                 clean_info=not args.preserve_info,
-                                strat_fixchr=args.strat_fixchr)
+                                strat_fixchr=args.strat_fixchr,
+                                strat_index=args.strat_index,
+                                artifact=artifact)
+
+
+def quantify(args):
+    """ Run quantify and write tables """
+    roc_table = args.reports_prefix + ".roc.tsv"
+    artifact = args.reports_prefix + ".roc.artifact.gz" if args.write_artifact else None
+
+    try:
+        merge = args.merge
+    except AttributeError:
+        # only qfy.py merges artifacts
+        merge = False
+
+    if merge:
+        logging.info("Merging ROC artifacts...")
+        for a in args.in_vcf:
+            if not os.path.exists(a):
+                raise Exception("Cannot read ROC artifact %s." % a)
+        Haplo.quantify.merge_artifacts(args.in_vcf,
+                                       roc_table,
+                                       output_rocs=args.do_roc,
+                                       roc_delta=args.roc_delta,
+                                       roc_regions=args.roc_regions,
+                                       artifact=artifact)
+    else:
+        _count_variants(args, roc_table, artifact)
 
     metrics_output = makeMetricsObject("%s.comparison" % args.runner)
 
@@ -216,6 +248,15 @@ def updateArgs(parser):
                         default=None, action="store_true",
                         help="Add chr prefix to stratification files if necessary")
 
+    parser.add_argument("--stratification-index", dest="strat_index",
+                        default=None, type=str,
+                        help="Stratification index written by strat-index. This is loaded much faster than "
+                             "the bed files given via --stratification.")
+
+    parser.add_argument("--quantify-shards", dest="quantify_shards",
+                        default=False, action="store_true",
+                        help="Quantify each contig separately, using --threads contigs in parallel.")
+
     parser.add_argument("-V", "--write-vcf", dest="write_vcf",
                         default=False, action="store_true",
                         help="Write an annotated VCF.")
@@ -251,12 +292,21 @@ def updateArgs(parser):
     parser.add_argument("--roc-delta", dest="roc_delta", default=0.5, type=float,
                         help="Minimum spacing between ROC QQ levels.")
 
+    parser.add_argument("--roc-bins", dest="roc_bins", default=0, type=int,
+                        help="Bin QQ values into at most this many bins per ROC to bound memory use for "
+                             "continuous QQ values. Bins are --roc-delta wide initially and are doubled in width "
+                             "when needed; ROC levels are then accurate to within one bin width.")
+
     parser.add_argument("--ci-alpha", dest="ci_alpha", default=0.0, type=float,
                         help="Confidence level for Jeffrey's CI for recall, precision and fraction of non-assessed calls.")
 
     parser.add_argument("--no-json", dest="write_json", default=True, action="store_false",
                         help="Disable JSON file output.")
 
+    parser.add_argument("--write-artifact", dest="write_artifact", default=False, action="store_true",
+                        help="Write the ROCs to <prefix>.roc.artifact.gz. Artifacts from runs on different "
+                             "parts of the input can be added up using qfy.py --merge.")
+
 
 
 def main():
@@ -265,7 +315,13 @@ def main():
     parser.add_argument("-v", "--version", dest="version", action="store_true",
                         help="Show version number and exit.")
 
-    parser.add_argument("in_vcf", help="VCF file to quantify", nargs=1)
+    parser.add_argument("in_vcf", help="VCF file to quantify, or ROC artifacts to add up when using --merge",
+                        nargs="+")
+
+    parser.add_argument("--merge", dest="merge", action="store_true", default=False,
+                        help="Add up the ROCs in artifacts written using --write-artifact (e.g. by runs on "
+                             "different chromosomes), and write tables as if the inputs had been quantified "
+                             "together.")
 
     updateArgs(parser)
 
@@ -332,6 +388,9 @@ def main():
         print "qfy.py %s" % Tools.version
         exit(0)
 
+    if len(args.in_vcf) > 1 and not args.merge:
+        raise Exception("Only one input VCF can be quantified at a time, use --merge to add up ROC artifacts.")
+
     quantify(args)
 
 if __name__ == "__main__":
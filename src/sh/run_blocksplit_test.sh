@@ -61,4 +61,85 @@ else
 	rm -f ${TF_X1} ${TF_X2}
 fi
 
+TF_e=`mktemp -t blocksplit.XXXXXXXXXX` || exit 1
+
+${HCDIR}/blocksplit $VCF1 $VCF2 \
+	-o ${TF_e} -l chr21 -w 10000 -e 1
+
+cut -f 1-3 ${TF_e} | diff ${TF_r} -
+if [ $? -ne 0 ]; then
+	echo "blocksplit test FAILED -- cost estimates change the blocks. You can inspect ${TF_r} / ${TF_e} for the failed result."
+	exit 1
+fi
+
+awk -F'\t' 'NF != 4 || $4 !~ /^[0-9]+$/ { exit 1 }' ${TF_e}
+if [ $? -ne 0 ]; then
+	echo "blocksplit test FAILED -- missing cost estimates. You can inspect ${TF_e} for the failed result."
+	exit 1
+else
+	rm -f ${TF_e}
+fi
+
+##############################################################
+# Test that blocks are balanced by estimated cost
+##############################################################
+
+# example/blocksplit/cost.vcf.gz has a dense region of het SNPs and indels at
+# chr1:100000-130000, followed by a long region of sparse hom-alt SNPs.
+VCF3=${DIR}/../../example/blocksplit/cost.vcf.gz
+NBLOCKS=8
+DENSE_END=130000
+
+TF_c=`mktemp -t blocksplit.XXXXXXXXXX` || exit 1
+TF_n=`mktemp -t blocksplit.XXXXXXXXXX` || exit 1
+
+${HCDIR}/blocksplit $VCF3 -o ${TF_c} -l chr1 -w 100 -b ${NBLOCKS} -v 20 -e 1
+
+# split the same variants into blocks with equal numbers of variants, breaking
+# only between variants which are further apart than the window
+N_VARS=`${HCDIR}/bcftools view -H $VCF3 | wc -l`
+${HCDIR}/bcftools view -H $VCF3 | \
+	awk -F'\t' -v n=${N_VARS} -v b=${NBLOCKS} -v w=100 '
+		BEGIN { start = 0; count = 0; last = -1 }
+		{
+			if (last >= 0 && $2 > last + w && count >= n / b) {
+				mid = int((last + $2) / 2);
+				print $1 "\t" start "\t" mid;
+				start = mid; count = 0;
+			}
+			count++; last = $2 + length($4) - 1;
+		}
+		END { print $1 "\t" start "\t" last + w + 1 }' | \
+	while read c s e; do
+		${HCDIR}/blocksplit $VCF3 -o - -l ${c}:$((s+1))-${e} -w 100 -b 1 -v 20 -e 1 2> /dev/null | \
+			awk -F'\t' -v c=${c} -v s=${s} -v e=${e} '{ t += $4 } END { print c "\t" s "\t" e "\t" t }'
+	done > ${TF_n}
+
+# blocks which start in the dense region, and the ratio of the largest / smallest block cost
+summarize() {
+	awk -F'\t' -v d=${DENSE_END} '
+		$2 < d { dense++ }
+		NR == 1 || $4 > max { max = $4 }
+		NR == 1 || $4 < min { min = $4 }
+		END { printf "%d %d %.2f\n", dense, NR, max / (min > 0 ? min : 1) }' $1
+}
+
+read C_DENSE C_N C_RATIO <<< `summarize ${TF_c}`
+read N_DENSE N_N N_RATIO <<< `summarize ${TF_n}`
+
+echo "Cost-balanced: ${C_DENSE} of ${C_N} blocks in the dense region, max / min block cost ${C_RATIO}"
+echo "Count-balanced: ${N_DENSE} of ${N_N} blocks in the dense region, max / min block cost ${N_RATIO}"
+
+if [[ ${C_DENSE} -le ${N_DENSE} ]]; then
+	echo "blocksplit test FAILED -- the dense region should get more blocks than with a split by variant count. You can inspect ${TF_c} / ${TF_n} for the failed result."
+	exit 1
+fi
+
+if ! awk -v c=${C_RATIO} -v n=${N_RATIO} 'BEGIN { exit !(c < n) }'; then
+	echo "blocksplit test FAILED -- block costs are not more even than with a split by variant count. You can inspect ${TF_c} / ${TF_n} for the failed result."
+	exit 1
+else
+	rm -f ${TF_c} ${TF_n}
+fi
+
 echo "Blocksplit test was successful"
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#
+# Test the preprocessing cache in Tools/cache.py: key computation,
+# invalidation when inputs change, eviction and concurrent access.
+
+import sys
+import os
+import time
+import shutil
+import logging
+import tempfile
+import traceback
+import multiprocessing
+logging.getLogger().setLevel(logging.INFO)
+
+scriptDir = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.abspath(os.path.join(scriptDir, '..', 'python', 'Tools')))
+
+from cache import FileCache
+
+
+def writeFile(filename, contents, mtime=None):
+    with open(filename, "w") as f:
+        f.write(contents)
+    if mtime is not None:
+        os.utime(filename, (mtime, mtime))
+
+
+def testKey(tmp):
+    """ keys depend on file contents and parameters only """
+    fc = FileCache(os.path.join(tmp, "cache"))
+    a = os.path.join(tmp, "a.vcf")
+    b = os.path.join(tmp, "b.vcf")
+    c = os.path.join(tmp, "c.vcf")
+    writeFile(a, "contents A")
+    writeFile(b, "contents A")
+    writeFile(c, "contents C")
+
+    k = fc.key([a, None], reference="ref.fa", leftshift=True)
+    assert len(k) == 40
+    assert k == fc.key([a, None], leftshift=True, reference="ref.fa")
+    # same contents in a different file
+    assert k == fc.key([b, None], reference="ref.fa", leftshift=True)
+    assert k != fc.key([c, None], reference="ref.fa", leftshift=True)
+    assert k != fc.key([a, c], reference="ref.fa", leftshift=True)
+    assert k != fc.key([None, a], reference="ref.fa", leftshift=True)
+    assert k != fc.key([a, None], reference="ref.fa", leftshift=False)
+    assert k != fc.key([a, None], reference="ref.fa")
+
+    # a new cache object in the same place reads the remembered checksums
+    fc2 = FileCache(os.path.join(tmp, "cache"))
+    assert fc2.checksum(a) == fc.checksum(a)
+    assert k == fc2.key([a, None], reference="ref.fa", leftshift=True)
+
+
+def testInvalidation(tmp):
+    """ changing an input changes its key, remembered checksums are not reused """
+    fc = FileCache(os.path.join(tmp, "cache"))
+    a = os.path.join(tmp, "a.vcf")
+    writeFile(a, "version 1", 1000000)
+    k1 = fc.key([a])
+
+    out = os.path.join(tmp, "out.vcf.gz")
+    writeFile(out, "preprocessed 1")
+    writeFile(out + ".tbi", "index 1")
+    fc.put(k1, out, {"gender": "female"})
+
+    # same size, different contents and mtime
+    writeFile(a, "version 2", 2000000)
+    k2 = fc.key([a])
+    assert k2 != k1
+
+    dest = os.path.join(tmp, "dest.vcf.gz")
+    assert fc.get(k2, dest) is None
+    assert not os.path.exists(dest)
+
+    assert fc.get(k1, dest) == {"gender": "female"}
+    assert open(dest).read() == "preprocessed 1"
+    assert open(dest + ".tbi").read() == "index 1"
+    assert not os.path.exists(dest + ".csi")
+
+    # changing the file back gives the original key
+    writeFile(a, "version 1", 3000000)
+    assert fc.key([a]) == k1
+
+
+def testEviction(tmp):
+    """ least recently used entries are removed when the cache is too big """
+    fc = FileCache(os.path.join(tmp, "cache"), max_size=250)
+    src = os.path.join(tmp, "src.vcf.gz")
+    for i, k in enumerate(["k1", "k2", "k3"]):
+        writeFile(src, str(i) * 100)
+        fc.put(k, src, {})
+        os.utime(os.path.join(fc.entry_path, k), (1000000 + i, 1000000 + i))
+
+    dest = os.path.join(tmp, "dest.vcf.gz")
+    # k1 was evicted when adding k3
+    assert fc.get("k1", dest) is None
+    # mark k2 as used, so k3 is evicted next
+    assert fc.get("k2", dest) == {}
+    writeFile(src, "x" * 100)
+    fc.put("k4", src, {})
+    assert fc.get("k3", dest) is None
+    assert fc.get("k2", dest) == {}
+    assert fc.get("k4", dest) == {}
+
+    # entries larger than the cache are kept until the next put
+    writeFile(src, "y" * 1000)
+    fc.put("k5", src, {})
+    assert fc.get("k5", dest) == {}
+    assert sorted(os.listdir(fc.entry_path)) == ["k5"]
+
+
+def _putAndGet(args):
+    """ add an entry and read it back from a separate process """
+    path, n, tmp = args
+    fc = FileCache(path, max_size=300)
+    src = os.path.join(tmp, "src.%i.vcf.gz" % n)
+    dest = os.path.join(tmp, "dest.%i.vcf.gz" % n)
+    # every entry is written by several processes, and only two fit into the cache
+    k = "k%i" % (n % 5)
+    writeFile(src, k * 50)
+    writeFile(src + ".tbi", k)
+    fc.put(k, src, {"n": n % 5})
+    meta = fc.get(k, dest)
+    if meta is None:
+        # may have been evicted by another process
+        return True
+    return meta == {"n": n % 5} and open(dest).read() == k * 50 and open(dest + ".tbi").read() == k
+
+
+def _lockedGet(args):
+    """ read from the cache and report when we're done """
+    path, dest, done = args
+    FileCache(path).get("k", dest)
+    done.set()
+
+
+def testConcurrency(tmp):
+    """ several processes can add and read the same entries """
+    path = os.path.join(tmp, "cache")
+    pool = multiprocessing.Pool(4)
+    try:
+        res = pool.map(_putAndGet, [(path, n, tmp) for n in range(40)])
+    finally:
+        pool.close()
+        pool.join()
+    assert all(res)
+    # no partial entries are left behind
+    entries = os.listdir(os.path.join(path, "entries"))
+    assert not [x for x in entries if x.startswith(".")]
+    for k in entries:
+        assert sorted(os.listdir(os.path.join(path, "entries", k))) == ["data", "data.tbi", "meta.json"]
+
+    # readers wait while the exclusive lock is held
+    fc = FileCache(path)
+    src = os.path.join(tmp, "src.vcf.gz")
+    writeFile(src, "locked")
+    fc.put("k", src, {})
+    done = multiprocessing.Event()
+    with fc._lock(True):
+        p = multiprocessing.Process(target=_lockedGet, args=((path, os.path.join(tmp, "locked.vcf.gz"), done),))
+        p.start()
+        time.sleep(0.5)
+        assert not done.is_set()
+    p.join(10)
+    assert done.is_set()
+    assert open(os.path.join(tmp, "locked.vcf.gz")).read() == "locked"
+
+
+def main():
+    failed = 0
+    for test in [testKey, testInvalidation, testEviction, testConcurrency]:
+        tmp = tempfile.mkdtemp(prefix="happy.cache.")
+        try:
+            test(tmp)
+            logging.info("%s: OK" % test.__name__)
+        except Exception:
+            logging.error("%s failed:\n%s" % (test.__name__, traceback.format_exc()))
+            failed += 1
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if failed:
+        logging.error("Cache test FAILED!")
+        sys.exit(1)
+    logging.info("Cache test SUCCEEDED!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/bin/bash
+
+# Test that parallel preprocessing and comparison keep the contig order of the
+# input header. The contigs in example/contigorder are chr2 and chr10, so
+# sorting them by name gives a different order.
+#
+
+set +e
+
+DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+. ${DIR}/detect_vars.sh
+
+echo "Contig order test for ${HCVERSION} from ${HCDIR}"
+
+ID=${DIR}/../../example/contigorder
+
+TMP_OUT=`mktemp -t happy.XXXXXXXXXX`
+
+# contig order in the header, and the order of the records in a file
+header_contigs() {
+	${HCDIR}/bcftools view -h $1 | grep "^##contig" | sed 's/.*ID=\([^,>]*\).*/\1/' | tr '\n' ' '
+}
+
+record_contigs() {
+	${HCDIR}/bcftools view -H $1 | cut -f 1 | uniq | tr '\n' ' '
+}
+
+EXPECTED=`header_contigs ${ID}/in.vcf.gz`
+if [[ "$EXPECTED" != "chr2 chr10 " ]]; then
+	echo "Unexpected contigs in test input: $EXPECTED"
+	exit 1
+fi
+
+${PYTHON} ${HCDIR}/pre.py \
+	${ID}/in.vcf.gz \
+	${TMP_OUT}.pre.vcf.gz \
+	-r ${ID}/ref.fa \
+	-w 1000 --threads 4 \
+	--force-interactive
+
+if [[ $? != 0 ]]; then
+	echo "pre.py failed!"
+	exit 1
+fi
+
+RESULT=`record_contigs ${TMP_OUT}.pre.vcf.gz`
+if [[ "$RESULT" != "$EXPECTED" ]]; then
+	echo "pre.py output contigs are out of order: $RESULT (expected $EXPECTED)"
+	exit 1
+fi
+
+${PYTHON} ${HCDIR}/hap.py \
+	${ID}/in.vcf.gz \
+	${ID}/in.vcf.gz \
+	-r ${ID}/ref.fa \
+	-o ${TMP_OUT} \
+	--preprocess-truth --preprocessing-window-size 1000 \
+	-w 1000 --threads 4 \
+	-V --force-interactive
+
+if [[ $? != 0 ]]; then
+	echo "hap.py failed!"
+	exit 1
+fi
+
+RESULT=`record_contigs ${TMP_OUT}.vcf.gz`
+if [[ "$RESULT" != "$EXPECTED" ]]; then
+	echo "hap.py output contigs are out of order: $RESULT (expected $EXPECTED)"
+	exit 1
+fi
+
+rm -rf ${TMP_OUT} ${TMP_OUT}.*
+
+echo "Contig order test was successful."
@@ -246,6 +246,38 @@ if [[ $? != 0 ]]; then
 	exit 1
 fi
 
+# streaming preprocessing should produce same result
+# run hap.py
+${PYTHON} ${HCDIR}/hap.py $@ \
+			 	-l chr21 \
+			 	${DIR}/../../example/PG_performance.vcf.gz \
+			 	${DIR}/../../example/performance.vcf.gz \
+			 	-o ${TMP_OUT}.performance.stream \
+			 	-V -X --output-vtc --stream-preprocessing \
+			 	-f ${DIR}/../../example/performance.confident.bed.gz \
+                -r ${DIR}/../../example/chr21.fa \
+			 	--force-interactive --threads 4
+
+if [[ $? != 0 ]]; then
+	echo "hap.py failed!"
+	exit 1
+fi
+
+cat ${TMP_OUT}.performance.stream.vcf.gz | gunzip | grep -v ^# > ${TMP_OUT}.performance.stream.vcf
+
+echo "Comparing vcfs"
+diff -I ^# ${TMP_OUT}.performance.stream.vcf ${DIR}/../../example/integration/integrationtest.performance.vcf
+if [[ $? != 0 ]]; then
+    echo "Performance output variants differ (stream)! vimdiff ${TMP_OUT}.performance.stream.vcf ${DIR}/../../example/integration/integrationtest.performance.vcf "
+	exit 1
+fi
+
+${PYTHON} ${DIR}/compare_summaries.py ${TMP_OUT}.performance.stream.summary.csv ${DIR}/../../example/integration/integrationtest.performance.summary.csv
+if [[ $? != 0 ]]; then
+	echo "Pass summary differs! vimdiff ${TMP_OUT}.performance.stream.summary.csv ${DIR}/../../example/integration/integrationtest.performance.summary.csv"
+	exit 1
+fi
+
 rm -f ${TMP_OUT}*
 echo "Integration test SUCCEEDED!"
 
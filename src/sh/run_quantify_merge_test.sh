@@ -0,0 +1,93 @@
+#!/bin/bash
+
+# Test adding up ROC artifacts from quantify runs on disjoint parts of the input
+#
+
+set +e
+
+DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+. ${DIR}/detect_vars.sh
+
+echo "Quantify artifact merge test for ${HCVERSION} from ${HCDIR}"
+
+ID=${DIR}/../../example/quantify_merge
+
+TMP_OUT=`mktemp -t happy.XXXXXXXXXX`
+
+# quantify the whole file, and each half of it
+for part in full h1 h2; do
+	if [[ "$part" == "full" ]]; then
+		ONLY=""
+	else
+		ONLY="--only ${ID}/${part}.bed"
+	fi
+	${HCDIR}/quantify ${ID}/in.vcf.gz \
+		-o ${TMP_OUT}.${part}.tsv \
+		-r ${ID}/ref.fa \
+		-R TS:${ID}/strat.bed \
+		--type ga4gh --qq QQ \
+		--output-rocs 1 --roc-regions '*' --roc-regions TS \
+		--output-artifact ${TMP_OUT}.${part}.artifact.gz \
+		${ONLY}
+
+	if [[ $? != 0 ]]; then
+		echo "quantify failed for ${part}!"
+		exit 1
+	fi
+done
+
+# write tables for the full run, and for the sum of both halves
+${PYTHON} ${HCDIR}/qfy.py --merge \
+	${TMP_OUT}.full.artifact.gz \
+	-o ${TMP_OUT}.full \
+	--roc-regions TS \
+	--no-json --verbose
+
+if [[ $? != 0 ]]; then
+	echo "qfy.py --merge failed for the full run!"
+	exit 1
+fi
+
+${PYTHON} ${HCDIR}/qfy.py --merge \
+	${TMP_OUT}.h1.artifact.gz \
+	${TMP_OUT}.h2.artifact.gz \
+	-o ${TMP_OUT}.merged \
+	--roc-regions TS \
+	--no-json --verbose
+
+if [[ $? != 0 ]]; then
+	echo "qfy.py --merge failed!"
+	exit 1
+fi
+
+diff ${TMP_OUT}.full.summary.csv ${TMP_OUT}.merged.summary.csv
+if [[ $? != 0 ]]; then
+	echo "Merged summary differs! -- diff ${TMP_OUT}.full.summary.csv ${TMP_OUT}.merged.summary.csv"
+	exit 1
+fi
+
+diff ${TMP_OUT}.full.roc.tsv ${TMP_OUT}.merged.roc.tsv
+if [[ $? != 0 ]]; then
+	echo "Merged ROC table differs! -- diff ${TMP_OUT}.full.roc.tsv ${TMP_OUT}.merged.roc.tsv"
+	exit 1
+fi
+
+N_ROCS=0
+for f in ${TMP_OUT}.full.roc.*.csv.gz; do
+	m=${TMP_OUT}.merged${f#${TMP_OUT}.full}
+	diff <(gunzip -c ${f}) <(gunzip -c ${m})
+	if [[ $? != 0 ]]; then
+		echo "Merged ROC differs! -- diff ${f} ${m}"
+		exit 1
+	fi
+	N_ROCS=$((N_ROCS+1))
+done
+
+if [[ $N_ROCS == 0 ]]; then
+	echo "No ROC tables were written!"
+	exit 1
+fi
+
+rm -rf ${TMP_OUT} ${TMP_OUT}.*
+
+echo "Quantify artifact merge test was successful."
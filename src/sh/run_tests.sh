@@ -60,6 +60,19 @@ else
 	echo "Hapcmp test SUCCEEDED!"
 fi
 
+##############################################################
+# Test xcmp on exact matches within a repeat
+##############################################################
+
+/bin/bash ${DIR}/run_xcmp_repeat_test.sh
+
+if [[ $? -ne 0 ]]; then
+	echo "xcmp repeat test FAILED!"
+	exit 1
+else
+	echo "xcmp repeat test SUCCEEDED!"
+fi
+
 ##############################################################
 # Test Hap.py + path traversals
 ##############################################################
@@ -163,6 +176,30 @@ else
     echo "Contig length calculation test SUCCEEDED!"
 fi
 
+##############################################################
+# Test the preprocessing cache
+##############################################################
+
+${PYTHON} ${DIR}/run_cache_test.py
+if [[ $? -ne 0 ]]; then
+    echo "Cache test FAILED!"
+    exit 1
+else
+    echo "Cache test SUCCEEDED!"
+fi
+
+##############################################################
+# Test VCF header parsing against vcfhdr2json
+##############################################################
+
+${PYTHON} ${DIR}/run_vcfheader_test.py ${HCDIR}/vcfhdr2json
+if [[ $? -ne 0 ]]; then
+    echo "VCF header test FAILED!"
+    exit 1
+else
+    echo "VCF header test SUCCEEDED!"
+fi
+
 ##############################################################
 # Test Hap.py + integration
 ##############################################################
@@ -215,6 +252,32 @@ else
 	echo "Quantify integration test SUCCEEDED!"
 fi
 
+##############################################################
+# Test adding up ROC artifacts
+##############################################################
+
+/bin/bash ${DIR}/run_quantify_merge_test.sh
+
+if [[ $? -ne 0 ]]; then
+	echo "Quantify artifact merge test FAILED!"
+	exit 1
+else
+	echo "Quantify artifact merge test SUCCEEDED!"
+fi
+
+##############################################################
+# Test contig order with parallel preprocessing
+##############################################################
+
+/bin/bash ${DIR}/run_contigorder_test.sh
+
+if [[ $? -ne 0 ]]; then
+	echo "Contig order test FAILED!"
+	exit 1
+else
+	echo "Contig order test SUCCEEDED!"
+fi
+
 ##############################################################
 # Test PG Counting
 ##############################################################
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# Compare the VCF header parsing in vcfextract with the output of vcfhdr2json
+#
+# Usage: run_vcfheader_test.py <path to vcfhdr2json>
+#
+# Checks all example VCF / BCF files, including example/vcfheader which has
+# quoted / escaped values and contigs which are only listed in the index.
+
+import sys
+import os
+import json
+import logging
+import subprocess
+import tempfile
+logging.getLogger().setLevel(logging.INFO)
+
+scriptDir = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.abspath(os.path.join(scriptDir, '..', 'python', 'Tools')))
+
+from vcfextract import readHeaders
+
+
+def vcfhdr2json(vcfhdr2json_bin, vcfname):
+    """ Read the header of a file using vcfhdr2json, None if that fails """
+    tf = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
+    tf.close()
+    try:
+        if subprocess.call([vcfhdr2json_bin, vcfname, tf.name],
+                           stdout=open(os.devnull, "w"), stderr=subprocess.STDOUT) != 0:
+            return None
+        return json.load(open(tf.name))
+    finally:
+        os.unlink(tf.name)
+
+
+def main():
+    vcfhdr2json_bin = sys.argv[1] if len(sys.argv) > 1 else "vcfhdr2json"
+
+    files = []
+    for d in [os.path.join(scriptDir, '..', '..', 'example'), os.path.join(scriptDir, '..', 'data')]:
+        for root, _, names in os.walk(d):
+            for n in names:
+                if n.endswith(".vcf") or n.endswith(".vcf.gz") or n.endswith(".bcf"):
+                    files.append(os.path.abspath(os.path.join(root, n)))
+    files.sort()
+
+    failed = 0
+    checked = 0
+    for f in files:
+        expected = vcfhdr2json(vcfhdr2json_bin, f)
+        if expected is None:
+            logging.info("Skipping %s, vcfhdr2json cannot read it." % f)
+            continue
+        try:
+            result = readHeaders(f)
+        except Exception as e:
+            result = str(e)
+        checked += 1
+        if result != expected:
+            logging.error("Headers differ for %s:\n%s\n%s" % (f,
+                                                              json.dumps(result, sort_keys=True, indent=1),
+                                                              json.dumps(expected, sort_keys=True, indent=1)))
+            failed += 1
+
+    if not checked or failed:
+        logging.error("VCF header test FAILED (%i of %i files differ)!" % (failed, checked))
+        sys.exit(1)
+    logging.info("VCF header test SUCCEEDED (%i files)!" % checked)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/bin/bash
+
+# Test that xcmp compares exact matches inside a repeat when
+# neighbouring records mismatch
+#
+
+set +e
+
+DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+. ${DIR}/detect_vars.sh
+
+echo "xcmp repeat test ${HCVERSION} from ${HCDIR}"
+
+ID="${DIR}/../../example/xcmp_repeat"
+TMP_OUT=`mktemp -t happy.XXXXXXXXXX`
+
+${HCDIR}/xcmp ${ID}/truth.vcf.gz ${ID}/query.vcf.gz \
+	-r ${ID}/ref.fa \
+	-o ${TMP_OUT}.vcf
+
+if [[ $? != 0 ]]; then
+	echo "xcmp failed!"
+	exit 1
+fi
+
+diff -I ^# ${TMP_OUT}.vcf ${ID}/expected.vcf
+if [[ $? != 0 ]]; then
+	echo "Variants differ! diff ${TMP_OUT}.vcf ${ID}/expected.vcf"
+	exit 1
+fi
+
+rm -rf ${TMP_OUT} ${TMP_OUT}.*
+
+echo "xcmp repeat test was successful."